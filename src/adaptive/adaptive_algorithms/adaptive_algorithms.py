@@ -0,0 +1,739 @@
+import ctypes
+import os
+from abc import ABC, abstractmethod
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+from fixed_point.q_format.q_format import Q15, QFormat, wrap
+
+# Number of samples solved together by the block recursion of LMS and NLMS, a
+# power of two. The updates of a block form a (block, block) triangular system
+# per channel; the systems of BLOCKS_PER_CHUNK blocks are inverted together.
+BLOCK_SIZE = 16
+BLOCKS_PER_CHUNK = 32
+
+# Shared library built from the c/ folder with CMake:
+#   cmake -S c -B c/build && cmake --build c/build
+C_LIBRARY_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "c", "build")
+C_LIBRARY_NAMES = ["liblms.so", "liblms.dylib", "lms.dll"]
+
+_c_library = None
+_c_library_loaded = False
+
+
+def load_c_library():
+    """
+    Load the compiled LMS kernel, if it has been built.
+
+    Returns:
+        ctypes.CDLL | None: The loaded library, or None if it is not available
+    """
+    global _c_library, _c_library_loaded
+    if not _c_library_loaded:
+        _c_library_loaded = True
+        for name in C_LIBRARY_NAMES:
+            path = os.path.join(C_LIBRARY_DIRECTORY, name)
+            if os.path.exists(path):
+                try:
+                    library = ctypes.CDLL(path)
+                except OSError:
+                    continue
+                # Arrays are passed as the addresses of C-contiguous float64
+                # buffers, which is cheaper than building ctypes pointers
+                library.lms_process.argtypes = [
+                    ctypes.c_void_p,
+                    ctypes.c_void_p,
+                    ctypes.c_void_p,
+                    ctypes.c_int,
+                    ctypes.c_int,
+                    ctypes.c_int,
+                    ctypes.c_double,
+                    ctypes.c_double,
+                    ctypes.c_int,
+                    ctypes.c_void_p,
+                    ctypes.c_void_p,
+                ]
+                library.lms_process.restype = None
+                _c_library = library
+                break
+    return _c_library
+
+
+class AdaptiveAlgorithm(ABC):
+    def __init__(self, num_taps: int, num_channels: int = 1):
+        """
+        Base class of the weight update rules shared by the adaptive filter front ends.
+
+        An algorithm owns the weights of every channel, of shape
+        (num_channels, num_taps), with the coefficient of the most recent input
+        sample first. All channels are adapted towards the same desired signal.
+        The weights array is updated in place, so front ends can expose it directly.
+        Subclasses must implement update; a subclass without it cannot be instantiated.
+
+        Args:
+            num_taps (int): The number of filter taps (filter length)
+            num_channels (int): Number of input channels. Defaults to 1.
+
+        Raises:
+            ValueError: If num_taps or num_channels is not positive
+        """
+        if num_taps < 1:
+            raise ValueError("num_taps must be positive")
+        if num_channels < 1:
+            raise ValueError("num_channels must be positive")
+        self.num_taps = num_taps
+        self.num_channels = num_channels
+        self.weights = np.zeros((num_channels, num_taps))
+
+    @abstractmethod
+    def update(self, x: np.ndarray, desired_signal: float) -> tuple:
+        """
+        Filter one sample and update the weights.
+
+        Args:
+            x (np.ndarray): Input vectors of shape (num_channels, num_taps),
+            most recent sample first
+            desired_signal (float): Desired sample
+
+        Returns:
+            outputs (np.ndarray): Filter output of every channel, shape (num_channels,)
+            errors (np.ndarray): Error of every channel, shape (num_channels,)
+        """
+
+    def process(self, x: np.ndarray, desired_signal: np.ndarray) -> tuple:
+        """
+        Filter a block of samples, updating the weights after every sample.
+
+        The default implementation calls update for every sample; subclasses
+        override it with faster block engines that give the same result.
+
+        Args:
+            x (np.ndarray): Input signals of shape (num_channels, num_taps - 1 + samples),
+            oldest sample first: the num_taps - 1 samples preceding the block,
+            then the block
+            desired_signal (np.ndarray): Desired signal of shape (samples,)
+
+        Returns:
+            outputs (np.ndarray): Filter outputs of shape (samples, num_channels)
+            errors (np.ndarray): Error signals of shape (samples, num_channels)
+
+        Raises:
+            ValueError: If the shapes of x and desired_signal do not match
+        """
+        x, desired_signal = self._check_block(x, desired_signal)
+        num_samples = len(desired_signal)
+        outputs = np.zeros((num_samples, self.num_channels))
+        errors = np.zeros((num_samples, self.num_channels))
+        if num_samples == 0:
+            return outputs, errors
+
+        # Input vectors of every sample, most recent sample first
+        x_vectors = _input_vectors(x, self.num_taps)[:, :, ::-1]
+        for n, desired_sample in enumerate(desired_signal.tolist()):
+            outputs[n], errors[n] = self.update(x_vectors[:, n], desired_sample)
+        return outputs, errors
+
+    def reset(self):
+        """Reset the weights and the algorithm state."""
+        self.weights[...] = 0.0
+
+    def state_vector(self) -> np.ndarray:
+        """
+        Everything the algorithm has adapted, as a flat float64 array.
+
+        The front ends embed it in the state of the filter (see get_state).
+
+        Returns:
+            np.ndarray: The weights, followed by the algorithm state of the subclass
+        """
+        return self.weights.ravel()
+
+    def load_state_vector(self, values: np.ndarray):
+        """
+        Restore what state_vector returned.
+
+        Args:
+            values (np.ndarray): Flat float64 array of state_vector_size values
+        """
+        self.weights[...] = values.reshape(self.weights.shape)
+
+    @property
+    def state_vector_size(self) -> int:
+        """Number of values of state_vector."""
+        return self.weights.size
+
+    def _check_block(self, x: np.ndarray, desired_signal: np.ndarray) -> tuple:
+        """
+        Validate the arguments of process.
+
+        Returns:
+            tuple: x and desired_signal as C-contiguous float64 arrays
+        """
+        x = np.ascontiguousarray(x, dtype=np.float64)
+        desired_signal = np.asarray(desired_signal, dtype=np.float64).ravel()
+        if x.shape != (self.num_channels, self.num_taps - 1 + len(desired_signal)):
+            raise ValueError(
+                "x must have shape (num_channels, num_taps - 1 + samples), "
+                f"expected {(self.num_channels, self.num_taps - 1 + len(desired_signal))}, got {x.shape}"
+            )
+        return x, desired_signal
+
+
+class LMS(AdaptiveAlgorithm):
+    def __init__(self, num_taps: int, num_channels: int = 1, mu: float = 0.01, backend: str = "auto"):
+        """
+        Least mean squares: w += mu * e * x.
+
+        process runs the compiled kernel of the c/ folder when it has been
+        built, and a NumPy block recursion otherwise; both give the result of
+        update called sample by sample.
+
+        Args:
+            num_taps (int): The number of filter taps (filter length)
+            num_channels (int): Number of input channels. Defaults to 1.
+            mu (float): The learning rate (step size). Defaults to 0.01.
+            backend (str): 'c' for the compiled kernel, 'python' for the NumPy
+            block recursion, 'auto' for the compiled kernel when it has been
+            built. Defaults to 'auto'.
+
+        Raises:
+            ValueError: If mu is not positive
+            ValueError: If backend is not 'auto', 'c' or 'python'
+            ValueError: If backend is 'c' and the compiled library is not available
+        """
+        super().__init__(num_taps, num_channels)
+        if mu <= 0:
+            raise ValueError("mu must be positive")
+        if backend not in ("auto", "c", "python"):
+            raise ValueError("backend must be 'auto', 'c' or 'python'")
+        self.mu = mu
+
+        library = load_c_library() if backend != "python" else None
+        if backend == "c" and library is None:
+            raise ValueError(f"The compiled LMS kernel was not found in {C_LIBRARY_DIRECTORY}, build it with CMake")
+        self.backend = "c" if library is not None else "python"
+
+    def update(self, x: np.ndarray, desired_signal: float) -> tuple:
+        outputs = np.einsum("ct,ct->c", self.weights, x)
+        errors = desired_signal - outputs
+        self.weights += self.mu * errors[:, np.newaxis] * x
+        return outputs, errors
+
+    def process(self, x: np.ndarray, desired_signal: np.ndarray) -> tuple:
+        x, desired_signal = self._check_block(x, desired_signal)
+        if self.backend == "python":
+            return _block_lms(x, desired_signal, self.weights, self._step_sizes)
+
+        num_samples = len(desired_signal)
+        outputs = np.empty((num_samples, self.num_channels))
+        errors = np.empty((num_samples, self.num_channels))
+        load_c_library().lms_process(
+            x.ctypes.data,
+            desired_signal.ctypes.data,
+            self.weights.ctypes.data,
+            self.num_channels,
+            self.num_taps,
+            num_samples,
+            self.mu,
+            *self._c_normalization(),
+            outputs.ctypes.data,
+            errors.ctypes.data,
+        )
+        return outputs, errors
+
+    def _step_sizes(self, x_vectors: np.ndarray) -> float:
+        """Step size of every sample of a block, here the constant mu."""
+        return self.mu
+
+    def _c_normalization(self) -> tuple:
+        """epsilon and normalized arguments of the compiled kernel."""
+        return 0.0, 0
+
+
+class NLMS(LMS):
+    def __init__(
+        self, num_taps: int, num_channels: int = 1, mu: float = 0.5, epsilon: float = 1e-8, backend: str = "auto"
+    ):
+        """
+        Normalized LMS: w += mu * e * x / (epsilon + x . x).
+
+        The step is normalized by the energy of the input vector, so the
+        convergence speed does not depend on the input scale; it is stable
+        for 0 < mu < 2.
+
+        Args:
+            num_taps (int): The number of filter taps (filter length)
+            num_channels (int): Number of input channels. Defaults to 1.
+            mu (float): The normalized step size. Defaults to 0.5.
+            epsilon (float): Regularization of the input energy. Defaults to 1e-8.
+            backend (str): 'c', 'python' or 'auto', see LMS. Defaults to 'auto'.
+
+        Raises:
+            ValueError: If mu is not positive or epsilon is negative
+            ValueError: If backend is not valid or not available, see LMS
+        """
+        super().__init__(num_taps, num_channels, mu, backend)
+        if epsilon < 0:
+            raise ValueError("epsilon must be non-negative")
+        self.epsilon = epsilon
+
+    def update(self, x: np.ndarray, desired_signal: float) -> tuple:
+        outputs = np.einsum("ct,ct->c", self.weights, x)
+        errors = desired_signal - outputs
+        step_sizes = self.mu / (self.epsilon + np.einsum("ct,ct->c", x, x))
+        self.weights += (step_sizes * errors)[:, np.newaxis] * x
+        return outputs, errors
+
+    def _step_sizes(self, x_vectors: np.ndarray) -> np.ndarray:
+        """Step size of every sample of a block, of shape (num_channels, samples)."""
+        return self.mu / (self.epsilon + np.einsum("cbt,cbt->cb", x_vectors, x_vectors))
+
+    def _c_normalization(self) -> tuple:
+        return float(self.epsilon), 1
+
+
+class SignErrorLMS(AdaptiveAlgorithm):
+    def __init__(self, num_taps: int, num_channels: int = 1, mu: float = 0.01):
+        """
+        Sign-error LMS: w += mu * sign(e) * x.
+
+        Only the sign of the error is used, which makes the update robust to
+        error outliers and cheap in fixed point.
+
+        Args:
+            num_taps (int): The number of filter taps (filter length)
+            num_channels (int): Number of input channels. Defaults to 1.
+            mu (float): The learning rate (step size). Defaults to 0.01.
+
+        Raises:
+            ValueError: If mu is not positive
+        """
+        super().__init__(num_taps, num_channels)
+        if mu <= 0:
+            raise ValueError("mu must be positive")
+        self.mu = mu
+
+    def update(self, x: np.ndarray, desired_signal: float) -> tuple:
+        outputs = np.einsum("ct,ct->c", self.weights, x)
+        errors = desired_signal - outputs
+        self.weights += self.mu * np.sign(errors)[:, np.newaxis] * x
+        return outputs, errors
+
+
+class RLS(AdaptiveAlgorithm):
+    def __init__(self, num_taps: int, num_channels: int = 1, forgetting_factor: float = 0.999, delta: float = 0.01):
+        """
+        Recursive least squares with exponential forgetting.
+
+        RLS converges in a few times num_taps samples whatever the input
+        correlation, at a cost of O(num_taps^2) per sample and channel.
+
+        Args:
+            num_taps (int): The number of filter taps (filter length)
+            num_channels (int): Number of input channels. Defaults to 1.
+            forgetting_factor (float): Weight of past errors, in (0, 1]. Defaults to 0.999.
+            delta (float): Regularization of the initial inverse correlation
+            matrix, which starts as identity / delta. Defaults to 0.01.
+
+        Raises:
+            ValueError: If forgetting_factor is not in (0, 1] or delta is not positive
+        """
+        super().__init__(num_taps, num_channels)
+        if not 0 < forgetting_factor <= 1:
+            raise ValueError("forgetting_factor must be in (0, 1]")
+        if delta <= 0:
+            raise ValueError("delta must be positive")
+        self.forgetting_factor = forgetting_factor
+        self.delta = delta
+        # Inverse correlation matrix of the input of every channel
+        self.inverse_correlation = np.tile(np.eye(num_taps) / delta, (num_channels, 1, 1))
+
+    def update(self, x: np.ndarray, desired_signal: float) -> tuple:
+        p = self.inverse_correlation
+        p_x = np.einsum("cij,cj->ci", p, x)
+        gain = p_x / (self.forgetting_factor + np.einsum("ci,ci->c", x, p_x))[:, np.newaxis]
+
+        outputs = np.einsum("ct,ct->c", self.weights, x)
+        errors = desired_signal - outputs
+        self.weights += gain * errors[:, np.newaxis]
+
+        # P = (P - k (P x)^T) / lambda, P being symmetric
+        p -= gain[:, :, np.newaxis] * p_x[:, np.newaxis, :]
+        p /= self.forgetting_factor
+        return outputs, errors
+
+    def reset(self):
+        super().reset()
+        self.inverse_correlation[...] = np.eye(self.num_taps) / self.delta
+
+    def state_vector(self) -> np.ndarray:
+        return np.concatenate((self.weights.ravel(), self.inverse_correlation.ravel()))
+
+    def load_state_vector(self, values: np.ndarray):
+        num_weights = self.weights.size
+        self.weights[...] = values[:num_weights].reshape(self.weights.shape)
+        self.inverse_correlation[...] = values[num_weights:].reshape(self.inverse_correlation.shape)
+
+    @property
+    def state_vector_size(self) -> int:
+        return self.weights.size + self.inverse_correlation.size
+
+
+class FrequencyDomainBlockLMS(AdaptiveAlgorithm):
+    def __init__(self, num_taps: int, num_channels: int = 1, mu: float = 0.01, block_size: int = None):
+        """
+        Block LMS computed in the frequency domain.
+
+        The weights are held constant over a block of block_size samples and
+        then updated with the gradient summed over the block:
+        w += mu * sum_n e[n] * x[n]. process computes the outputs and the
+        gradient with FFT convolutions, O(log num_taps) operations per sample
+        instead of O(num_taps) for long filters. update gives the same result
+        sample by sample, at O(num_taps) per sample.
+
+        Args:
+            num_taps (int): The number of filter taps (filter length)
+            num_channels (int): Number of input channels. Defaults to 1.
+            mu (float): The learning rate (step size). Defaults to 0.01.
+            block_size (int): Number of samples between weight updates.
+            Defaults to num_taps.
+
+        Raises:
+            ValueError: If mu or block_size is not positive
+        """
+        super().__init__(num_taps, num_channels)
+        if block_size is None:
+            block_size = num_taps
+        if mu <= 0:
+            raise ValueError("mu must be positive")
+        if block_size < 1:
+            raise ValueError("block_size must be positive")
+        self.mu = mu
+        self.block_size = block_size
+        self._gradient = np.zeros((num_channels, num_taps))
+        self._block_position = 0
+
+    def update(self, x: np.ndarray, desired_signal: float) -> tuple:
+        outputs = np.einsum("ct,ct->c", self.weights, x)
+        errors = desired_signal - outputs
+        self._gradient += errors[:, np.newaxis] * x
+        self._block_position += 1
+        if self._block_position == self.block_size:
+            self._end_block()
+        return outputs, errors
+
+    def process(self, x: np.ndarray, desired_signal: np.ndarray) -> tuple:
+        x, desired_signal = self._check_block(x, desired_signal)
+        num_taps = self.num_taps
+        num_samples = len(desired_signal)
+        outputs = np.zeros((num_samples, self.num_channels))
+        errors = np.zeros((num_samples, self.num_channels))
+
+        start = 0
+        while start < num_samples:
+            # Segment up to the end of the current block
+            stop = min(start + self.block_size - self._block_position, num_samples)
+            length = stop - start
+            segment = x[:, start : stop + num_taps - 1]
+
+            # Circular convolution and correlation are linear on the samples
+            # used as long as the FFT covers the segment
+            fft_size = 1 << (segment.shape[1] - 1).bit_length()
+            segment_spectrum = np.fft.rfft(segment, fft_size)
+
+            filtered = np.fft.irfft(segment_spectrum * np.fft.rfft(self.weights, fft_size), fft_size)
+            outputs[start:stop] = filtered[:, num_taps - 1 : num_taps - 1 + length].T
+            errors[start:stop] = desired_signal[start:stop, np.newaxis] - outputs[start:stop]
+
+            # Gradient: correlation of the errors with the input, most recent tap first
+            correlation = np.fft.irfft(
+                np.conj(np.fft.rfft(errors[start:stop].T, fft_size)) * segment_spectrum, fft_size
+            )
+            self._gradient += correlation[:, num_taps - 1 :: -1]
+
+            self._block_position += length
+            if self._block_position == self.block_size:
+                self._end_block()
+            start = stop
+        return outputs, errors
+
+    def reset(self):
+        super().reset()
+        self._gradient[...] = 0.0
+        self._block_position = 0
+
+    def state_vector(self) -> np.ndarray:
+        return np.concatenate((self.weights.ravel(), self._gradient.ravel(), [self._block_position]))
+
+    def load_state_vector(self, values: np.ndarray):
+        num_weights = self.weights.size
+        self.weights[...] = values[:num_weights].reshape(self.weights.shape)
+        self._gradient[...] = values[num_weights:-1].reshape(self._gradient.shape)
+        self._block_position = int(values[-1])
+
+    @property
+    def state_vector_size(self) -> int:
+        return 2 * self.weights.size + 1
+
+    def _end_block(self):
+        """Apply the gradient accumulated over the block."""
+        self.weights += self.mu * self._gradient
+        self._gradient[...] = 0.0
+        self._block_position = 0
+
+
+class FixedPointLMS(AdaptiveAlgorithm):
+    def __init__(
+        self,
+        num_taps: int,
+        num_channels: int = 1,
+        mu: float = 0.01,
+        data_format: QFormat = Q15,
+        weight_format: QFormat = None,
+        accumulator_bits: int = 64,
+    ):
+        """
+        LMS simulated in fixed-point arithmetic, as run on a microcontroller.
+
+        Inputs, desired samples, outputs and errors are integers of
+        data_format, the weights are integers of weight_format and mu is
+        quantized to the word length of data_format. Every sample:
+            - y = sum(w * x), accumulated in accumulator_bits bits (wrapping
+              around on overflow) and shifted back to data_format
+            - e = d - y, in data_format
+            - w += (mu * e) * x, the step mu * e being shifted back to
+              data_format before the product with x
+        Every shift rounds and every result is brought into its word with the
+        rounding and overflow rules of its format. The float weights, outputs
+        and errors are the dequantized integers.
+
+        Args:
+            num_taps (int): The number of filter taps (filter length)
+            num_channels (int): Number of input channels. Defaults to 1.
+            mu (float): The learning rate (step size). Defaults to 0.01.
+            data_format (QFormat): Format of the samples. Defaults to Q15.
+            weight_format (QFormat): Format of the weights. Defaults to data_format.
+            accumulator_bits (int): Size of the accumulator, at most 64. Defaults to 64.
+
+        Raises:
+            ValueError: If mu is not positive or rounds to zero
+            ValueError: If accumulator_bits is not in [2, 64]
+        """
+        super().__init__(num_taps, num_channels)
+        if mu <= 0:
+            raise ValueError("mu must be positive")
+        if not 2 <= accumulator_bits <= 64:
+            raise ValueError("accumulator_bits must be between 2 and 64")
+        self.mu = mu
+        self.data_format = data_format
+        self.weight_format = data_format if weight_format is None else weight_format
+        self.accumulator_bits = accumulator_bits
+        self.mu_format = QFormat.for_values(mu, data_format.word_length)
+        self.mu_q = self.mu_format.quantize(mu)
+        if self.mu_q == 0:
+            raise ValueError(f"mu rounds to zero in {data_format.word_length} bits")
+        # Quantized weights, most recent tap first
+        self.weights_q = np.zeros((num_channels, num_taps), dtype=np.int64)
+
+    def update(self, x: np.ndarray, desired_signal: float) -> tuple:
+        return self._update(self.data_format.quantize(np.asarray(x, dtype=np.float64)), self.data_format.quantize(desired_signal))
+
+    def process(self, x: np.ndarray, desired_signal: np.ndarray) -> tuple:
+        x, desired_signal = self._check_block(x, desired_signal)
+        num_samples = len(desired_signal)
+        outputs = np.zeros((num_samples, self.num_channels))
+        errors = np.zeros((num_samples, self.num_channels))
+        if num_samples == 0:
+            return outputs, errors
+
+        # Quantize the whole block once, then run the integer recursion
+        x_vectors = _input_vectors(self.data_format.quantize(x), self.num_taps)[:, :, ::-1]
+        desired_q = self.data_format.quantize(desired_signal).tolist()
+        for n, desired_sample in enumerate(desired_q):
+            outputs[n], errors[n] = self._update(x_vectors[:, n], desired_sample)
+        return outputs, errors
+
+    def reset(self):
+        super().reset()
+        self.weights_q[...] = 0
+
+    def state_vector(self) -> np.ndarray:
+        # The float weights are the dequantized integers
+        return self.weights_q.ravel().astype(np.float64)
+
+    def load_state_vector(self, values: np.ndarray):
+        self.weights_q[...] = values.reshape(self.weights_q.shape).astype(np.int64)
+        self.weights[...] = self.weight_format.to_float(self.weights_q)
+
+    def _update(self, x_q: np.ndarray, desired_q: int) -> tuple:
+        """
+        Integer update of one sample.
+
+        Args:
+            x_q (np.ndarray): Quantized input vectors of shape (num_channels, num_taps)
+            desired_q (int): Quantized desired sample
+
+        Returns:
+            tuple: Dequantized outputs and errors, of shape (num_channels,)
+        """
+        data_format = self.data_format
+        weight_format = self.weight_format
+
+        accumulator = wrap(np.einsum("ct,ct->c", self.weights_q, x_q), self.accumulator_bits)
+        outputs_q = data_format.rescale(accumulator, weight_format.fractional_bits + data_format.fractional_bits)
+        errors_q = data_format.fit(desired_q - outputs_q)
+
+        steps_q = data_format.rescale(self.mu_q * errors_q, self.mu_format.fractional_bits + data_format.fractional_bits)
+        increments_q = weight_format.rescale(steps_q[:, np.newaxis] * x_q, 2 * data_format.fractional_bits)
+        self.weights_q[...] = weight_format.fit(self.weights_q + increments_q)
+        self.weights[...] = weight_format.to_float(self.weights_q)
+        return data_format.to_float(outputs_q), data_format.to_float(errors_q)
+
+
+def _input_vectors(x: np.ndarray, num_taps: int) -> np.ndarray:
+    """
+    Strided view of the input vectors of every sample.
+
+    Args:
+        x (np.ndarray): C-contiguous input signals of shape (channels, num_taps - 1 + samples)
+        num_taps (int): The number of filter taps
+
+    Returns:
+        np.ndarray: Read-only view of shape (channels, samples, num_taps), oldest sample first
+    """
+    step = x.strides[1]
+    return as_strided(
+        x,
+        shape=(x.shape[0], x.shape[1] - num_taps + 1, num_taps),
+        strides=(x.strides[0], step, step),
+        writeable=False,
+    )
+
+
+def _unit_lower_inverse(lower: np.ndarray) -> np.ndarray:
+    """
+    Invert a stack of unit lower triangular matrices I + lower.
+
+    The inverses of the diagonal blocks double in size at every step,
+        inv([[A, 0], [C, D]]) = [[inv(A), 0], [-inv(D) C inv(A), inv(D)]]
+    so a stack of (n, n) matrices takes log2(n) batched products, where
+    np.linalg.solve runs a general LU per matrix.
+
+    Args:
+        lower (np.ndarray): C-contiguous strictly lower triangular matrices of
+        shape (..., n, n), n a power of two and at least 2
+
+    Returns:
+        np.ndarray: The inverses of I + lower, of shape (..., n, n)
+    """
+    size = lower.shape[-1]
+    batch_shape = lower.shape[:-2]
+    batch_axes = tuple(range(len(batch_shape)))
+    negative_lower = -lower
+
+    # Inverses of the (2, 2) diagonal blocks: inv([[1, 0], [c, 1]]) = [[1, 0], [-c, 1]]
+    inverse = np.zeros(batch_shape + (size // 2, 2, 2))
+    inverse[..., 0, 0] = 1
+    inverse[..., 1, 1] = 1
+    inverse[..., 1, 0] = negative_lower[..., 1::2, 0::2].diagonal(axis1=-2, axis2=-1)
+    half = 2
+    while half < size:
+        num_blocks = size // (2 * half)
+        # Diagonal (2 half, 2 half) blocks of -lower, as a view
+        blocks = negative_lower.reshape(batch_shape + (num_blocks, 2 * half, num_blocks, 2 * half))
+        blocks = blocks.diagonal(axis1=-4, axis2=-2).transpose(batch_axes + (-1, -3, -2))
+
+        upper_left = inverse[..., 0::2, :, :]
+        lower_right = inverse[..., 1::2, :, :]
+        inverse = np.zeros(batch_shape + (num_blocks, 2 * half, 2 * half))
+        inverse[..., :half, :half] = upper_left
+        inverse[..., half:, half:] = lower_right
+        np.matmul(np.matmul(lower_right, blocks[..., half:, :half]), upper_left, out=inverse[..., half:, :half])
+        half *= 2
+    return inverse[..., 0, :, :]
+
+
+def _block_lms(x: np.ndarray, desired_signal: np.ndarray, weights: np.ndarray, step_sizes) -> tuple:
+    """
+    Exact LMS recursion, BLOCK_SIZE samples at a time, for every channel at once.
+
+    Within a block starting with weights w, the output of sample n is
+        y[n] = w . x[n] + sum_{k < n} mu[k] * e[k] * (x[k] . x[n])
+    so the errors of the block solve the unit lower triangular system
+        (I + L diag(mu)) e = d - X w
+    where L is the strictly lower part of the Gram matrix of the input vectors
+    X. The systems do not depend on the weights: the inverses M of the systems
+    of a chunk of blocks are computed together, then every block only takes
+        e = M (d - X w)
+        w += (mu e) X
+    instead of a Python loop over samples and channels.
+
+    Args:
+        x (np.ndarray): C-contiguous input signals of shape (channels, num_taps - 1 + samples)
+        desired_signal (np.ndarray): Desired signal of shape (samples,)
+        weights (np.ndarray): Weights of shape (channels, num_taps), most recent
+        sample first, updated in place
+        step_sizes (Callable): Maps the input vectors of a chunk, of shape
+        (channels, samples, num_taps), to the step size of every sample: a
+        scalar or an array of shape (channels, samples)
+
+    Returns:
+        outputs (np.ndarray): Filter outputs of shape (samples, channels)
+        errors (np.ndarray): Error signals of shape (samples, channels)
+    """
+    num_channels, num_taps = weights.shape
+    num_samples = len(desired_signal)
+    outputs = np.zeros((num_samples, num_channels))
+    errors = np.zeros((num_samples, num_channels))
+    if num_samples == 0:
+        return outputs, errors
+
+    x_vectors = _input_vectors(x, num_taps)
+    # Weights in the order of the input vectors (oldest sample first), copied
+    # back at the end
+    weights_oldest_first = weights[:, ::-1, np.newaxis].copy()
+    strictly_lower = np.tri(BLOCK_SIZE, k=-1)
+    chunk_size = BLOCK_SIZE * BLOCKS_PER_CHUNK
+
+    for start in range(0, num_samples, chunk_size):
+        stop = min(start + chunk_size, num_samples)
+        length = stop - start
+        num_blocks = -(-length // BLOCK_SIZE)
+
+        # Whole blocks: the zero input vectors and step sizes past the end
+        # give zero errors and leave the weights unchanged
+        vectors = np.zeros((num_channels, num_blocks * BLOCK_SIZE, num_taps))
+        vectors[:, :length] = x_vectors[:, start:stop]
+        steps = np.zeros((num_channels, num_blocks * BLOCK_SIZE))
+        steps[:, :length] = step_sizes(x_vectors[:, start:stop])
+        desired = np.zeros(num_blocks * BLOCK_SIZE)
+        desired[:length] = desired_signal[start:stop]
+        vectors = vectors.reshape(num_channels, num_blocks, BLOCK_SIZE, num_taps)
+        steps = steps.reshape(num_channels, num_blocks, BLOCK_SIZE)
+        desired = desired.reshape(num_blocks, BLOCK_SIZE)
+
+        system = np.matmul(vectors, vectors.transpose(0, 1, 3, 2))
+        system *= strictly_lower
+        system *= steps[:, :, np.newaxis, :]
+        inverse = _unit_lower_inverse(system)
+
+        # Only the weights are carried from block to block: the loop keeps the
+        # residuals d - X w, and the weights take mu e = (diag(mu) M) r
+        residuals = np.empty((num_blocks, num_channels, BLOCK_SIZE, 1))
+        step_inverse = inverse * steps[..., np.newaxis]
+        for block_vectors, block_step_inverse, block_desired, block_residuals in zip(
+            vectors.transpose(1, 0, 2, 3), step_inverse.transpose(1, 0, 2, 3), desired[..., np.newaxis], residuals
+        ):
+            np.subtract(block_desired, np.matmul(block_vectors, weights_oldest_first), out=block_residuals)
+            # Update weights of all channels with the errors of the block
+            weights_oldest_first += np.matmul(
+                block_vectors.transpose(0, 2, 1), np.matmul(block_step_inverse, block_residuals)
+            )
+
+        # Errors of all the blocks of the chunk at once
+        block_errors = np.matmul(inverse, residuals.transpose(1, 0, 2, 3))
+        errors[start:stop] = block_errors.reshape(num_channels, -1)[:, :length].T
+        outputs[start:stop] = desired_signal[start:stop, np.newaxis] - errors[start:stop]
+    weights[:, ::-1] = weights_oldest_first[:, :, 0]
+    return outputs, errors
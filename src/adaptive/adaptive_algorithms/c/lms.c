@@ -0,0 +1,35 @@
+#include "lms.h"
+
+void lms_process(const double* x, const double* desired, double* weights,
+                 int num_channels, int num_taps, int num_samples,
+                 double mu, double epsilon, int normalized,
+                 double* outputs, double* errors) {
+    int row_length = num_taps - 1 + num_samples;
+
+    for (int c = 0; c < num_channels; c++) {
+        const double* row = x + (long)c * row_length;
+        double* w = weights + (long)c * num_taps;
+
+        for (int n = 0; n < num_samples; n++) {
+            // Input vector of sample n, most recent sample last
+            const double* vector = row + n;
+            double y = 0.0;
+            double energy = 0.0;
+            for (int k = 0; k < num_taps; k++) {
+                double sample = vector[num_taps - 1 - k];
+                y += w[k] * sample;
+                energy += sample * sample;
+            }
+
+            double e = desired[n] - y;
+            double step = normalized ? mu / (epsilon + energy) : mu;
+            double scaled_error = step * e;
+            for (int k = 0; k < num_taps; k++) {
+                w[k] += scaled_error * vector[num_taps - 1 - k];
+            }
+
+            outputs[(long)n * num_channels + c] = y;
+            errors[(long)n * num_channels + c] = e;
+        }
+    }
+}
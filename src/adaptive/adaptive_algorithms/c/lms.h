@@ -0,0 +1,17 @@
+#ifndef LMS_H
+#define LMS_H
+
+// Run LMS (normalized = 0) or NLMS (normalized = 1) over a block of samples,
+// updating the weights after every sample.
+//
+// x holds num_channels rows of num_taps - 1 + num_samples samples, oldest
+// first: the num_taps - 1 samples preceding the block, then the block.
+// weights holds num_channels rows of num_taps coefficients, the coefficient of
+// the most recent sample first, and is updated in place. outputs and errors
+// receive num_samples rows of num_channels values.
+void lms_process(const double* x, const double* desired, double* weights,
+                 int num_channels, int num_taps, int num_samples,
+                 double mu, double epsilon, int normalized,
+                 double* outputs, double* errors);
+
+#endif //LMS_H
@@ -1,29 +1,102 @@
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
 import numpy as np
-import matplotlib.pyplot as plt
+from numpy.lib.stride_tricks import sliding_window_view
+
+from adaptive.adaptive_algorithms.adaptive_algorithms import AdaptiveAlgorithm
 
 class AdaptiveLMSFilterArray:
-    def __init__(self, num_taps: int, mu: float):
+    def __init__(
+        self,
+        num_taps: int,
+        mu: float,
+        plot_directory: str = "plots/adaptive_filter",
+        algorithm: AdaptiveAlgorithm = None,
+        max_pending_plots: int = 4,
+        max_diagnostic_windows: int = None,
+        dtype=np.float64,
+    ):
         """
         Initialize the adaptive LMS filter.
-        
+
         Args:
             num_taps (int): The number of filter taps (filter length).
             mu (float): The learning rate (step size).
+            plot_directory (str): Folder where the window plots are saved.
+            Defaults to 'plots/adaptive_filter'.
+            algorithm (AdaptiveAlgorithm): Optional single-channel weight update
+            rule (e.g. NLMS or RLS) replacing plain LMS, in which case mu is
+            not used. Defaults to None.
+            max_pending_plots (int): Number of plots waiting to be saved above
+            which adapt blocks until the oldest one is saved, so that slow
+            plotting holds back the filter instead of queuing windows in
+            memory. Defaults to 4.
+            max_diagnostic_windows (int): Number of windows kept in
+            self.diagnostics, the oldest ones being dropped. Defaults to None
+            (all the windows, until self.diagnostics.clear()).
+            dtype (np.dtype): Floating point type of the buffer, of the
+            weights of plain LMS and of the outputs, float32 or float64. The
+            algorithms keep their state in float64. Defaults to float64.
+
+        Raises:
+            ValueError: If the algorithm does not have num_taps taps and a
+            single channel, or max_pending_plots is lower than 1
+            ValueError: If dtype is not float32 or float64, or float32 with an algorithm
         """
+        if max_pending_plots < 1:
+            raise ValueError("max_pending_plots must be at least 1")
+        if algorithm is not None and (algorithm.num_taps != num_taps or algorithm.num_channels != 1):
+            raise ValueError("The algorithm must have num_taps taps and a single channel")
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float64):
+            raise ValueError("dtype must be float32 or float64")
+        if algorithm is not None and self.dtype != np.float64:
+            raise ValueError("The algorithms keep their state in float64")
         self.num_taps = num_taps
         self.mu = mu
-        self.weights = np.zeros(num_taps)  # Initialize weights to zero
-        self.buffer = np.zeros(num_taps)   # Initialize buffer to store the input signal
+        self.algorithm = algorithm
+        # Initialize weights to zero (shared with the algorithm, if any)
+        self.weights = np.zeros(num_taps, dtype=self.dtype) if algorithm is None else algorithm.weights[0]
+        self.buffer = np.zeros(num_taps, dtype=self.dtype)   # Initialize buffer to store the input signal (most recent sample first)
         self.window_number = 0
+        self.plot_directory = plot_directory
+
+        # Per-window diagnostics, filled when adapt is called with collect_diagnostics=True
+        self.diagnostics = deque(maxlen=max_diagnostic_windows)
+
+        # Plots are rendered by a background thread, created on the first plot.
+        # The futures of the plots not saved yet, oldest first
+        self._plot_executor = None
+        self._plot_futures = deque()
+        self.max_pending_plots = max_pending_plots
 
-    def adapt(self, x: np.ndarray, desired_signal: np.ndarray, plot_results: bool = True) -> tuple:
+    def adapt(
+        self,
+        x: np.ndarray,
+        desired_signal: np.ndarray,
+        plot_results: bool = False,
+        collect_diagnostics: bool = False,
+    ) -> tuple:
         """
         Adapt the filter to minimize the error between the filter output and the desired signal.
-        
+
+        The delay line is never shifted: the window is appended to the last
+        num_taps - 1 input samples, and the tap vector of every sample is a
+        strided view of that array, matched against the weights in reverse order.
+
         Args:
             x (np.ndarray): The input signal array.
             desired_signal (np.ndarray): The desired signal array (reference).
-        
+            plot_results (bool): Save a plot of the window in plot_directory.
+            The plot is rendered in a background thread: call wait_for_plots
+            to make sure that it is written. Blocks while max_pending_plots
+            plots are waiting to be saved. Defaults to False.
+            collect_diagnostics (bool): Append the signals and final weights of
+            the window to self.diagnostics (see get_diagnostics), which keeps
+            the last max_diagnostic_windows windows. Defaults to False.
+
         Returns:
             output (np.ndarray): The output of the filter.
             error (np.ndarray): The error signal.
@@ -31,71 +104,195 @@ class AdaptiveLMSFilterArray:
         # Ensure input arrays have the same length
         assert len(x) == len(desired_signal), "Input and desired signal must have the same length"
 
-        output = np.zeros(len(x))
-        error = np.zeros(len(x))
+        x = np.asarray(x, dtype=self.dtype)
+        desired_signal = np.asarray(desired_signal, dtype=self.dtype)
+        num_taps = self.num_taps
+        mu = self.mu
+
+        output = np.zeros(len(x), dtype=self.dtype)
+        error = np.zeros(len(x), dtype=self.dtype)
+        if len(x) == 0:
+            return output, error
+
+        # Past samples followed by the window, oldest first: the tap vector of
+        # sample i is the contiguous view x_extended[i + 1 : i + 1 + num_taps]
+        x_extended = np.concatenate([self.buffer[::-1], x])
+        self.buffer[:] = x_extended[: -num_taps - 1 : -1]
 
-        for i in range(len(x)):
-            # Shift buffer and add new input sample
-            self.buffer[1:] = self.buffer[:-1]  # Shift buffer to the right
-            self.buffer[0] = x[i]  # Insert the new sample at the beginning
+        if self.algorithm is not None:
+            output, error = self.algorithm.process(x_extended[np.newaxis, 1:], desired_signal)
+            return self._finish_window(x, desired_signal, output[:, 0], error[:, 0], plot_results, collect_diagnostics)
 
+        tap_vectors = sliding_window_view(x_extended[1:], num_taps)
+
+        # Weights in the order of the tap vectors (oldest sample first)
+        weights = self.weights[::-1].copy()
+        desired = desired_signal.tolist()
+
+        for i, tap_vector in enumerate(tap_vectors):
             # Filter output (dot product of weights and buffer)
-            output[i] = np.dot(self.weights, self.buffer)
+            output_sample = np.dot(weights, tap_vector)
 
             # Calculate error signal
-            error[i] = desired_signal[i] - output[i]
+            error_sample = desired[i] - output_sample
 
             # Update weights using the LMS rule
-            self.weights += self.mu * error[i] * self.buffer
-        
+            weights += (mu * error_sample) * tap_vector
+
+            output[i] = output_sample
+            error[i] = error_sample
+
+        self.weights[:] = weights[::-1]
+        return self._finish_window(x, desired_signal, output, error, plot_results, collect_diagnostics)
+
+    def _finish_window(
+        self,
+        x: np.ndarray,
+        desired_signal: np.ndarray,
+        output: np.ndarray,
+        error: np.ndarray,
+        plot_results: bool,
+        collect_diagnostics: bool,
+    ) -> tuple:
+        """Collect the diagnostics and submit the plot of a window, then return its output and error."""
+        if collect_diagnostics:
+            self.diagnostics.append(
+                {
+                    "window_number": self.window_number,
+                    "input_signal": x.copy(),
+                    "desired_signal": desired_signal.copy(),
+                    "output_signal": output.copy(),
+                    "error": error.copy(),
+                    "weights": self.weights.copy(),
+                }
+            )
         if plot_results:
             self._plot_results(x, desired_signal, output, error)
+        if plot_results or collect_diagnostics:
             self.window_number += 1
 
         return output, error
-    
 
+    def get_diagnostics(self) -> dict:
+        """
+        Concatenate the collected diagnostics of the windows kept in self.diagnostics.
+
+        Returns:
+            dict: 'window_number' (window of every sample), 'input_signal',
+            'desired_signal', 'output_signal' and 'error' of shape (samples,),
+            and 'weights' of shape (windows, num_taps) with the weights at the
+            end of every window
+        """
+        if not self.diagnostics:
+            empty = np.zeros(0)
+            return {
+                "window_number": np.zeros(0, dtype=int),
+                "input_signal": empty,
+                "desired_signal": empty.copy(),
+                "output_signal": empty.copy(),
+                "error": empty.copy(),
+                "weights": np.zeros((0, self.num_taps)),
+            }
+
+        diagnostics = {
+            "window_number": np.concatenate(
+                [np.full(len(window["error"]), window["window_number"]) for window in self.diagnostics]
+            )
+        }
+        for name in ("input_signal", "desired_signal", "output_signal", "error"):
+            diagnostics[name] = np.concatenate([window[name] for window in self.diagnostics])
+        diagnostics["weights"] = np.stack([window["weights"] for window in self.diagnostics])
+        return diagnostics
 
-    def _plot_results(self, input_signal: np.ndarray, desired_signal: np.ndarray, output_signal: np.ndarray, error: np.ndarray):
+    def wait_for_plots(self):
         """
-        Plot the input signal, desired signal, filter output, and error signal.
-        
+        Wait until every plot submitted so far is saved.
+
+        Raises:
+            Exception: The first error raised while rendering a plot
+        """
+        futures, self._plot_futures = self._plot_futures, deque()
+        for future in futures:
+            future.result()
+
+    def close(self):
+        """Wait for the pending plots and stop the plotting thread."""
+        try:
+            self.wait_for_plots()
+        finally:
+            if self._plot_executor is not None:
+                self._plot_executor.shutdown()
+                self._plot_executor = None
+
+    def _plot_results(self, input_signal: np.ndarray, desired_signal: np.ndarray, output_signal: np.ndarray, error: np.ndarray) -> Future:
+        """
+        Submit the plot of the input signal, desired signal, filter output, and error signal.
+
+        Saved plots are dropped from the queue; when max_pending_plots plots
+        are still waiting, wait for the oldest one first.
+
         Args:
             input_signal (np.ndarray): The input signal array.
             desired_signal (np.ndarray): The desired signal array.
             output_signal (np.ndarray): The output of the filter.
             error (np.ndarray): The error signal.
+
+        Returns:
+            Future: Completes when the plot is saved
+
+        Raises:
+            Exception: The error raised while rendering an earlier plot
         """
-        plt.figure(figsize=(12, 10))
-
-        plt.subplot(5, 1, 1)
-        plt.plot(input_signal)
-        plt.title('Input Signal')
-        plt.ylabel('Amplitude')
-
-        plt.subplot(5, 1, 2)
-        plt.plot(desired_signal)
-        plt.title('Desired Signal')
-        plt.ylabel('Amplitude')
-
-        plt.subplot(5, 1, 3)
-        plt.plot(output_signal)
-        plt.title('Filter Output')
-        plt.ylabel('Amplitude')
-
-        plt.subplot(5, 1, 4)
-        plt.plot(error)
-        plt.title('Error Signal')
-        plt.xlabel('Samples')
-        plt.ylabel('Amplitude')
-
-        plt.subplot(5, 1, 5)
-        plt.plot(desired_signal - output_signal)
-        plt.title('Desired Signal - Filter Output')
-        plt.xlabel('Samples')
-        plt.ylabel('Amplitude')
-
-        plt.tight_layout()
-        plt.savefig(f"plots/adaptive_filter/window_{self.window_number}_adaptive_filter.png")
-        plt.close()
+        futures = self._plot_futures
+        while futures and (futures[0].done() or len(futures) >= self.max_pending_plots):
+            futures.popleft().result()
+
+        if self._plot_executor is None:
+            # A single thread: figures are rendered one at a time, in order
+            self._plot_executor = ThreadPoolExecutor(max_workers=1)
+        path = os.path.join(self.plot_directory, f"window_{self.window_number}_adaptive_filter.png")
+        future = self._plot_executor.submit(
+            _save_plot, path, input_signal.copy(), desired_signal.copy(), output_signal.copy(), error.copy()
+        )
+        self._plot_futures.append(future)
+        return future
+
+
+def _save_plot(path: str, input_signal: np.ndarray, desired_signal: np.ndarray, output_signal: np.ndarray, error: np.ndarray):
+    """
+    Render the window plot and save it to path.
+
+    The figure is built with the object-oriented Matplotlib API rather than
+    pyplot, whose global state is not safe to use outside the main thread.
+    """
+    # Matplotlib is only needed when plotting: import it on first use
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(12, 10))
+    axes = figure.subplots(5, 1)
+
+    axes[0].plot(input_signal)
+    axes[0].set_title('Input Signal')
+    axes[0].set_ylabel('Amplitude')
+
+    axes[1].plot(desired_signal)
+    axes[1].set_title('Desired Signal')
+    axes[1].set_ylabel('Amplitude')
+
+    axes[2].plot(output_signal)
+    axes[2].set_title('Filter Output')
+    axes[2].set_ylabel('Amplitude')
+
+    axes[3].plot(error)
+    axes[3].set_title('Error Signal')
+    axes[3].set_xlabel('Samples')
+    axes[3].set_ylabel('Amplitude')
+
+    axes[4].plot(desired_signal - output_signal)
+    axes[4].set_title('Desired Signal - Filter Output')
+    axes[4].set_xlabel('Samples')
+    axes[4].set_ylabel('Amplitude')
 
+    figure.tight_layout()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    figure.savefig(path)
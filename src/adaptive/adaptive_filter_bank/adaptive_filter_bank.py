@@ -0,0 +1,86 @@
+import numpy as np
+
+from iir.filter_bank.filter_bank import FilterBank
+
+
+class AdaptiveFilterBank(FilterBank):
+    def __init__(self, num_taps: int, mu: float, num_channels: int = 3, capacity: int = 16, dtype=np.float64):
+        """
+        Bank of independent multi-channel adaptive LMS filters.
+
+        Every stream runs the LMS filter of AdaptiveFilterSingleSample, with
+        its own buffers, weights and desired signal. The buffers and the
+        weights of all streams are (capacity, num_channels, num_taps) arrays,
+        and one call to step adapts every stream by one sample.
+
+        Args:
+            num_taps (int): The number of filter taps (filter length)
+            mu (float): The learning rate (step size)
+            num_channels (int): Number of input channels of every stream
+            (default 3 for accelerometer)
+            capacity (int): Number of streams allocated up front. Defaults to 16.
+            dtype (np.dtype): Floating point type of the buffers, the weights,
+            the arithmetic and the outputs, float32 or float64. float32 halves
+            the memory of large banks. Defaults to float64.
+
+        Raises:
+            ValueError: If num_taps or num_channels is not positive
+            ValueError: If dtype is not float32 or float64
+        """
+        if num_taps < 1:
+            raise ValueError("num_taps must be positive")
+        if num_channels < 1:
+            raise ValueError("num_channels must be positive")
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float64):
+            raise ValueError("dtype must be float32 or float64")
+        self.num_taps = num_taps
+        self.mu = mu
+        self.num_channels = num_channels
+        super().__init__(
+            {"buffer": (num_channels, num_taps), "weights": (num_channels, num_taps)}, capacity, state_dtype=self.dtype
+        )
+
+    @property
+    def weights(self) -> np.ndarray:
+        """Weights of the active streams, of shape (streams, num_channels, num_taps), most recent sample first."""
+        return self._weights[: self._size]
+
+    @property
+    def buffer(self) -> np.ndarray:
+        """Input buffers of the active streams, of shape (streams, num_channels, num_taps), most recent sample first."""
+        return self._buffer[: self._size]
+
+    def step(self, x, desired_signal) -> tuple:
+        """
+        Adapt every stream by one sample.
+
+        Args:
+            x (array): Input samples of shape (streams, num_channels), in the order of stream_ids
+            desired_signal (array): Desired sample of every stream, of shape (streams,)
+
+        Returns:
+            outputs (np.ndarray): Filter outputs of shape (streams, num_channels)
+            errors (np.ndarray): Error signals of shape (streams, num_channels)
+
+        Raises:
+            ValueError: If x or desired_signal does not have one row per stream
+        """
+        x = np.asarray(x, dtype=self.dtype)
+        desired_signal = np.asarray(desired_signal, dtype=self.dtype).ravel()
+        if x.shape != (self._size, self.num_channels):
+            raise ValueError(f"x must have shape {(self._size, self.num_channels)}, got {x.shape}")
+        if len(desired_signal) != self._size:
+            raise ValueError(f"Expected {self._size} desired samples, got {len(desired_signal)}")
+
+        buffer = self._buffer[: self._size]
+        weights = self._weights[: self._size]
+
+        # Shift the buffers of all streams and channels at once
+        buffer[:, :, 1:] = buffer[:, :, :-1]
+        buffer[:, :, 0] = x
+
+        outputs = np.einsum("sct,sct->sc", weights, buffer)
+        errors = desired_signal[:, np.newaxis] - outputs
+        weights += (self.mu * errors)[:, :, np.newaxis] * buffer
+        return outputs, errors
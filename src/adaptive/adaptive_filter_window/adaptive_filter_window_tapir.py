@@ -1,78 +1,155 @@
 import numpy as np
 
+from adaptive.adaptive_algorithms.adaptive_algorithms import LMS, AdaptiveAlgorithm
+from filter_state.state_buffer.state_buffer import StateBuffer, pack_state, read_state_header, unpack_state
+
 class WindowedAdaptiveFilterTapir:
-    def __init__(self, filter_order, learning_rate) -> None:
+    def __init__(self, filter_order, learning_rate, algorithm: AdaptiveAlgorithm = None) -> None:
+        """
+        Initialize the windowed multi-channel adaptive filter.
+
+        Args:
+            filter_order (int): Length of the FIR filter
+            learning_rate (float): Step size of the default LMS update
+            algorithm (AdaptiveAlgorithm): Optional weight update rule (e.g. NLMS
+            or RLS) with filter_order taps and one channel per input channel,
+            in which case learning_rate is not used. Defaults to None, which
+            adapts with LMS.
+
+        Raises:
+            ValueError: If the algorithm does not have filter_order taps
+        """
+        if algorithm is not None and algorithm.num_taps != filter_order:
+            raise ValueError("The algorithm must have filter_order taps")
         self.prev_weights = None
         self.prev_input_buffer = None
         self.filter_order = filter_order
         self.learning_rate = learning_rate
-        
+        self.algorithm = algorithm
+        self.samples_processed = 0
+
     def process_window(self, input_signal: np.ndarray, desired_signal: np.ndarray):
         """
         Process signal in windows while maintaining filter state between windows.
-        
+
+        All channels are adapted together by the algorithm's block engine
+        (for LMS, an exact block solve of the sample-by-sample recursion).
+
         Args:
             input_signal: Input signal array of shape (samples, channels)
             desired_signal: Desired signal array of shape (samples,)
-            filter_order: Length of the FIR filter
-            learning_rate: Step size for weight updates
-            overlap: Number of samples to overlap between windows
-            
+
         Returns:
-            output_signal: Filtered output signal
-            error_signal: Error signal for the current window
+            output_signal: Filtered output signal of shape (samples, channels).
+            As in the reference filter, the first filter_order samples of the
+            stream are not filtered and give zero output.
+
+        Raises:
+            ValueError: If the number of channels does not match the algorithm
         """
-        num_channels = len(input_signal[0])
-        num_samples = len(desired_signal)
-        
-        # Initialize or reuse weights from previous window
-        if self.prev_weights is None:
-            weights = np.zeros((num_channels, self.filter_order))
-        else:
-            weights = self.prev_weights.copy()
-            
-        # Initialize output and error signals
+        input_signal = np.asarray(input_signal, dtype=np.float64)
+        desired_signal = np.asarray(desired_signal, dtype=np.float64).ravel()
+        num_samples, num_channels = input_signal.shape
+        filter_order = self.filter_order
+
+        if self.algorithm is None:
+            self.algorithm = LMS(filter_order, num_channels, self.learning_rate)
+        elif self.algorithm.num_channels != num_channels:
+            raise ValueError(f"Expected {self.algorithm.num_channels} channels, got {num_channels}")
+
         output_signal = np.zeros((num_samples, num_channels))
-        error_signal = np.zeros((num_samples, num_channels))
-        subtract_idx = 0
 
-        # If we have a previous input buffer, prepend it to current input
+        # Channel-major input with the last samples of the previous window first
         if self.prev_input_buffer is not None:
-            input_buffer = np.vstack((self.prev_input_buffer, input_signal))
-            # Adjust starting index to account for buffer
-            start_idx = self.filter_order
-            subtract_idx = self.filter_order
-            num_samples += self.filter_order
+            input_buffer = np.concatenate((self.prev_input_buffer.T, input_signal.T), axis=1)
         else:
-            input_buffer = input_signal
-            start_idx = self.filter_order
-            subtract_idx = 0
-            
-        # Adaptive filtering using LMS
-        for n in range(start_idx, num_samples):
-            # Input vector (most recent samples) for each channel
-            x = input_buffer[n-self.filter_order+1:n+1, :]
-            
-            for channel in range(num_channels):
-                # Reverse the order for dot product (most recent sample first)
-                x_channel = x[::-1, channel]
-                
-                # Filter output for current channel
-                output_signal[n - subtract_idx, channel] = np.dot(weights[channel], x_channel)
-
-                # Error signal for current channel
-                error_signal[n - subtract_idx, channel] = desired_signal[n - subtract_idx] - output_signal[n - subtract_idx, channel]
-                
-                # Update weights for current channel
-                weights[channel] += self.learning_rate * error_signal[n - subtract_idx, channel] * x_channel
-        
-        # Store the last filter_order samples for the next window
-        self.prev_input_buffer = input_signal[-self.filter_order:]
-        # Store the final weights for the next window
-        self.prev_weights = weights
+            input_buffer = np.ascontiguousarray(input_signal.T)
+        history_length = input_buffer.shape[1] - num_samples
+
+        # The stream is filtered from its sample filter_order on
+        start_idx = max(0, filter_order - self.samples_processed)
+        if start_idx < num_samples:
+            output_signal[start_idx:], _ = self.algorithm.process(
+                input_buffer[:, history_length + start_idx - filter_order + 1 :],
+                desired_signal[start_idx:],
+            )
+
+        # Store the last filter_order samples for the next window, as (samples, channels)
+        self.prev_input_buffer = input_buffer[:, -filter_order:].copy().T
+        # The weights of the algorithm, most recent sample first, updated in place
+        self.prev_weights = self.algorithm.weights
+        self.samples_processed += num_samples
         return output_signal
 
+    def get_state(self) -> bytes:
+        """
+        Snapshot of the input history and the adapted weights, to continue the stream elsewhere with set_state.
+
+        Returns:
+            bytes: The number of samples processed, the last filter_order input
+            samples, then the weights and the rest of the algorithm state, see
+            filter_state.state_buffer. Before the first window of a filter
+            without an algorithm, the number of channels is not known yet and
+            the state only holds the number of samples processed.
+        """
+        num_channels = 0 if self.algorithm is None else self.algorithm.num_channels
+        history_size = self.filter_order * num_channels
+        adapted = np.zeros(0) if self.algorithm is None else self.algorithm.state_vector()
+        values = np.zeros(1 + history_size + adapted.size)
+        values[0] = self.samples_processed
+        if self.prev_input_buffer is not None:
+            # After fewer than filter_order samples the history is short: the
+            # missing past is zero, as in process_window
+            history = values[1 : 1 + history_size].reshape(self.filter_order, num_channels)
+            history[self.filter_order - len(self.prev_input_buffer) :] = self.prev_input_buffer
+        values[1 + history_size :] = adapted
+        return pack_state(self._state_kind(), (self.filter_order, num_channels), values)
+
+    def set_state(self, state: StateBuffer):
+        """
+        Restore a state returned by get_state.
+
+        A filter without an algorithm creates its LMS algorithm with the
+        number of channels of the state.
+
+        Args:
+            state (bytes): State of a filter with the same filter order,
+            number of channels and algorithm
+
+        Raises:
+            ValueError: If the state was taken from another kind of filter, or
+            with another filter order, number of channels or another algorithm
+        """
+        algorithm = self.algorithm
+        if algorithm is None:
+            num_channels = read_state_header(state)["shape"][-1]
+            if num_channels:
+                algorithm = LMS(self.filter_order, num_channels, self.learning_rate)
+        num_channels = 0 if algorithm is None else algorithm.num_channels
+        history_size = self.filter_order * num_channels
+        adapted_size = 0 if algorithm is None else algorithm.state_vector_size
+        values = unpack_state(
+            state, self._state_kind(), (self.filter_order, num_channels), 1 + history_size + adapted_size
+        )
+        if algorithm is None:
+            self.reset()
+            self.samples_processed = int(values[0])
+            return
+
+        self.algorithm = algorithm
+        algorithm.load_state_vector(values[1 + history_size :])
+        self.prev_input_buffer = values[1 : 1 + history_size].reshape(self.filter_order, num_channels).copy()
+        self.prev_weights = algorithm.weights
+        self.samples_processed = int(values[0])
+
+    def _state_kind(self) -> str:
+        algorithm_name = "LMS" if self.algorithm is None else type(self.algorithm).__name__
+        return f"WindowedAdaptiveFilterTapir/{algorithm_name}"
+
     def reset(self):
         """Reset the filter state."""
+        if self.algorithm is not None:
+            self.algorithm.reset()
         self.prev_weights = None
-        self.prev_input_buffer = None
\ No newline at end of file
+        self.prev_input_buffer = None
+        self.samples_processed = 0
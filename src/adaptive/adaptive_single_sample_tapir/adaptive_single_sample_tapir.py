@@ -1,7 +1,12 @@
 import numpy as np
 
+from adaptive.adaptive_algorithms.adaptive_algorithms import AdaptiveAlgorithm
+from filter_state.state_buffer.state_buffer import StateBuffer, pack_state, unpack_state
+
 class AdaptiveFilterSingleSampleTapir:
-    def __init__(self, num_taps: int, mu: float, num_channels: int = 3):
+    def __init__(
+        self, num_taps: int, mu: float, num_channels: int = 3, algorithm: AdaptiveAlgorithm = None, dtype=np.float64
+    ):
         """
         Initialize the multi-channel adaptive LMS filter.
         
@@ -9,14 +14,31 @@ class AdaptiveFilterSingleSampleTapir:
             num_taps (int): The number of filter taps (filter length)
             mu (float): The learning rate (step size)
             num_channels (int): Number of input channels (default 3 for accelerometer)
+            algorithm (AdaptiveAlgorithm): Optional weight update rule (e.g. NLMS or RLS)
+            replacing plain LMS, in which case mu is not used. Defaults to None.
+            dtype (np.dtype): Floating point type of the buffers and of the
+            weights of plain LMS, float32 or float64. The algorithms keep
+            their state in float64. Defaults to float64.
+
+        Raises:
+            ValueError: If the algorithm does not have num_taps taps and num_channels channels
+            ValueError: If dtype is not float32 or float64, or float32 with an algorithm
         """
+        if algorithm is not None and (algorithm.num_taps != num_taps or algorithm.num_channels != num_channels):
+            raise ValueError("The algorithm must have num_taps taps and num_channels channels")
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float64):
+            raise ValueError("dtype must be float32 or float64")
+        if algorithm is not None and self.dtype != np.float64:
+            raise ValueError("The algorithms keep their state in float64")
         self.num_taps = num_taps
         self.mu = mu
         self.num_channels = num_channels
+        self.algorithm = algorithm
         
-        # Initialize weights and buffers for each channel
-        self.weights = np.zeros((num_channels, num_taps))
-        self.buffer = np.zeros((num_channels, num_taps))
+        # Initialize weights and buffers for each channel (weights shared with the algorithm, if any)
+        self.weights = np.zeros((num_channels, num_taps), dtype=self.dtype) if algorithm is None else algorithm.weights
+        self.buffer = np.zeros((num_channels, num_taps), dtype=self.dtype)
         
         # Add tracking for buffer filling
         self.buffer_filled = False
@@ -52,7 +74,9 @@ class AdaptiveFilterSingleSampleTapir:
             self.buffer_filled = True
 
         # Only perform computation if buffer is filled
-        if self.buffer_filled:
+        if self.buffer_filled and self.algorithm is not None:
+            outputs, _ = self.algorithm.update(self.buffer, desired_signal)
+        elif self.buffer_filled:
             for channel in range(self.num_channels):
                 # Compute output for current channel
                 outputs[channel] = np.dot(self.weights[channel], self.buffer[channel])
@@ -63,4 +87,46 @@ class AdaptiveFilterSingleSampleTapir:
                 # Update weights for current channel
                 self.weights[channel] += self.mu * errors[channel] * self.buffer[channel]
 
-        return outputs.tolist()
\ No newline at end of file
+        return outputs.tolist()
+
+    def get_state(self) -> bytes:
+        """
+        Snapshot of the buffers and the adapted weights, to continue the stream elsewhere with set_state.
+
+        Returns:
+            bytes: The number of samples processed, the input buffers, then the
+            weights and the rest of the algorithm state, see filter_state.state_buffer
+        """
+        adapted = self.weights.ravel() if self.algorithm is None else self.algorithm.state_vector()
+        values = np.empty(1 + self.buffer.size + adapted.size)
+        values[0] = self.samples_processed
+        values[1 : 1 + self.buffer.size] = self.buffer.ravel()
+        values[1 + self.buffer.size :] = adapted
+        return pack_state(self._state_kind(), self.buffer.shape, values)
+
+    def set_state(self, state: StateBuffer):
+        """
+        Restore a state returned by get_state.
+
+        Args:
+            state (bytes): State of a filter with the same number of taps,
+            channels and algorithm
+
+        Raises:
+            ValueError: If the state was taken from another kind of filter, or
+            with another number of taps, channels or another algorithm
+        """
+        adapted_size = self.weights.size if self.algorithm is None else self.algorithm.state_vector_size
+        values = unpack_state(state, self._state_kind(), self.buffer.shape, 1 + self.buffer.size + adapted_size)
+        self.samples_processed = int(values[0])
+        self.buffer_filled = self.samples_processed >= self.num_taps + 1
+        self.buffer[...] = values[1 : 1 + self.buffer.size].reshape(self.buffer.shape)
+        adapted = values[1 + self.buffer.size :]
+        if self.algorithm is None:
+            self.weights[...] = adapted.reshape(self.weights.shape)
+        else:
+            self.algorithm.load_state_vector(adapted)
+
+    def _state_kind(self) -> str:
+        algorithm_name = "LMS" if self.algorithm is None else type(self.algorithm).__name__
+        return f"AdaptiveFilterSingleSampleTapir/{algorithm_name}"
@@ -1,5 +1,6 @@
 import sys
 import os
+import time
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -12,6 +13,20 @@ from adaptive.test.adaptive_filter_reference import AdaptiveFilter
 from adaptive.adaptive_filter_window.adaptive_filter_window_tapir import WindowedAdaptiveFilterTapir
 from adaptive_single_sample.adaptive_single_sample import AdaptiveFilterSingleSample
 from adaptive.adaptive_single_sample_tapir.adaptive_single_sample_tapir import AdaptiveFilterSingleSampleTapir
+from adaptive.adaptive_filter_array import adaptive_array
+from adaptive.adaptive_filter_array.adaptive_array import AdaptiveLMSFilterArray
+from adaptive.adaptive_filter_bank.adaptive_filter_bank import AdaptiveFilterBank
+from adaptive.adaptive_algorithms.adaptive_algorithms import (
+    AdaptiveAlgorithm,
+    LMS,
+    NLMS,
+    RLS,
+    FixedPointLMS,
+    FrequencyDomainBlockLMS,
+    SignErrorLMS,
+    load_c_library,
+)
+from fixed_point.q_format.q_format import Q15, Q31, QFormat
 
 
 
@@ -358,5 +373,432 @@ def test_adaptive_filter_simple():
     # Do the mean over the channels of y_single_sample
     y_single_sample = (y_single_sample[:, 0] + y_single_sample[:, 1] + y_single_sample[:, 2]) / 3
 
+def test_adaptive_filter_windowed_tapir_synthetic():
+    rng = np.random.default_rng(1)
+    input_signal = rng.standard_normal((3000, 3)) * 10
+    desired_signal = input_signal @ rng.standard_normal(3) + rng.standard_normal(3000)
+
+    AdaptiveFilterReferenceTapir = AdaptiveFilterTapir()
+    y = AdaptiveFilterReferenceTapir.adaptive_filter(
+        input_signal=input_signal,
+        desired_signal=desired_signal,
+        filter_order=50,
+        learning_rate=8e-5,
+    )
+
+    windowed_adaptive_filter_tapir = WindowedAdaptiveFilterTapir(
+        filter_order=50, learning_rate=8e-5
+    )
+    # Windows shorter than the filter, across the first filtered sample and
+    # longer than a block
+    boundaries = [0, 10, 30, 49, 51, 52, 64, 300, 1000, 3000]
+    y_windowed = np.concatenate(
+        [
+            windowed_adaptive_filter_tapir.process_window(
+                input_signal=input_signal[start:stop],
+                desired_signal=desired_signal[start:stop],
+            )
+            for start, stop in zip(boundaries[:-1], boundaries[1:])
+        ]
+    )
+
+    assert np.array_equal(y_windowed[:50], np.zeros((50, 3)))
+    mse = np.mean((y - y_windowed) ** 2)
+    mae = np.mean(np.abs(y - y_windowed))
+    max_abs_diff = np.max(np.abs(y - y_windowed))
+
+    assert mse < 1e-10
+    assert mae < 1e-5
+    assert max_abs_diff < 1e-5
+
+
+@pytest.mark.parametrize("algorithm, parameters", [(LMS, {"mu": 0.01}), (NLMS, {"mu": 0.5})])
+def test_adaptive_algorithm_backends(algorithm, parameters):
+    if load_c_library() is None:
+        pytest.skip("The compiled LMS kernel is not built")
+    rng = np.random.default_rng(5)
+    num_taps = 16
+    x = rng.standard_normal((3, num_taps - 1 + 500))
+    desired_signal = rng.standard_normal(500)
+
+    compiled = algorithm(num_taps, 3, backend="c", **parameters)
+    python = algorithm(num_taps, 3, backend="python", **parameters)
+    for start, stop in [(0, 7), (7, 200), (200, 500)]:
+        block = x[:, start : stop + num_taps - 1]
+        outputs_c, errors_c = compiled.process(block, desired_signal[start:stop])
+        outputs_python, errors_python = python.process(block, desired_signal[start:stop])
+        assert np.allclose(outputs_c, outputs_python, atol=1e-10)
+        assert np.allclose(errors_c, errors_python, atol=1e-10)
+    assert np.allclose(compiled.weights, python.weights, atol=1e-10)
+    assert python.backend == "python"
+
+
+def test_adaptive_lms_filter_array():
+    rng = np.random.default_rng(0)
+    input_signal = rng.standard_normal(1000)
+    desired_signal = np.convolve(input_signal, rng.standard_normal(8))[:1000]
+    num_taps = 16
+    mu = 0.01
+
+    # Reference LMS, shifting the buffer at every sample
+    weights = np.zeros(num_taps)
+    buffer = np.zeros(num_taps)
+    y = np.zeros(len(input_signal))
+    for i in range(len(input_signal)):
+        buffer[1:] = buffer[:-1]
+        buffer[0] = input_signal[i]
+        y[i] = np.dot(weights, buffer)
+        weights += mu * (desired_signal[i] - y[i]) * buffer
+
+    adaptive_filter_array = AdaptiveLMSFilterArray(num_taps=num_taps, mu=mu)
+    y_array = np.zeros(len(input_signal))
+    error_array = np.zeros(len(input_signal))
+    # Windows shorter and longer than the filter
+    for start, stop in [(0, 5), (5, 300), (300, 310), (310, 1000)]:
+        y_array[start:stop], error_array[start:stop] = adaptive_filter_array.adapt(
+            x=input_signal[start:stop],
+            desired_signal=desired_signal[start:stop],
+            collect_diagnostics=True,
+        )
+
+    assert np.allclose(y_array, y, atol=1e-12)
+    assert np.allclose(error_array, desired_signal - y_array)
+    assert np.allclose(adaptive_filter_array.weights, weights, atol=1e-12)
+    assert np.array_equal(adaptive_filter_array.buffer, buffer)
+
+    diagnostics = adaptive_filter_array.get_diagnostics()
+    assert np.array_equal(diagnostics["output_signal"], y_array)
+    assert np.array_equal(diagnostics["input_signal"], input_signal)
+    assert np.array_equal(np.unique(diagnostics["window_number"]), np.arange(4))
+    assert diagnostics["weights"].shape == (4, num_taps)
+    assert np.array_equal(diagnostics["weights"][-1], adaptive_filter_array.weights)
+
+
+def test_adaptive_lms_filter_array_plot(tmp_path):
+    pytest.importorskip("matplotlib")
+    rng = np.random.default_rng(0)
+    input_signal = rng.standard_normal(200)
+    desired_signal = np.roll(input_signal, 2)
+
+    adaptive_filter_array = AdaptiveLMSFilterArray(num_taps=8, mu=0.01, plot_directory=str(tmp_path))
+    for start in range(0, 200, 100):
+        adaptive_filter_array.adapt(
+            x=input_signal[start : start + 100],
+            desired_signal=desired_signal[start : start + 100],
+            plot_results=True,
+        )
+    adaptive_filter_array.close()
+
+    assert sorted(os.listdir(tmp_path)) == [
+        "window_0_adaptive_filter.png",
+        "window_1_adaptive_filter.png",
+    ]
+
+
+def test_adaptive_lms_filter_array_plot_backpressure(monkeypatch):
+    # Plots slower than filtering: adapt waits instead of queuing every window
+    saved = []
+
+    def slow_save_plot(path, *signals):
+        time.sleep(0.02)
+        saved.append(path)
+
+    monkeypatch.setattr(adaptive_array, "_save_plot", slow_save_plot)
+    rng = np.random.default_rng(0)
+    input_signal = rng.standard_normal(2000)
+    adaptive_filter_array = AdaptiveLMSFilterArray(num_taps=8, mu=0.01, max_pending_plots=2, max_diagnostic_windows=3)
+    for start in range(0, 2000, 100):
+        adaptive_filter_array.adapt(
+            x=input_signal[start : start + 100],
+            desired_signal=input_signal[start : start + 100],
+            plot_results=True,
+            collect_diagnostics=True,
+        )
+        assert len(adaptive_filter_array._plot_futures) <= 2
+        assert len(saved) >= start // 100 - 1
+    adaptive_filter_array.close()
+    assert len(saved) == 20
+    assert len(adaptive_filter_array._plot_futures) == 0
+
+    # Only the last windows of diagnostics are kept
+    diagnostics = adaptive_filter_array.get_diagnostics()
+    assert np.array_equal(np.unique(diagnostics["window_number"]), [17, 18, 19])
+    assert np.array_equal(diagnostics["input_signal"], input_signal[1700:])
+
+
+ALGORITHMS = [
+    (LMS, {"mu": 0.01}),
+    (NLMS, {"mu": 0.5}),
+    (SignErrorLMS, {"mu": 0.001}),
+    (RLS, {"forgetting_factor": 0.99}),
+    (FrequencyDomainBlockLMS, {"mu": 0.002}),
+    (FixedPointLMS, {"mu": 0.01, "data_format": QFormat(32, 27)}),
+]
+
+
+@pytest.mark.parametrize("algorithm, parameters", ALGORITHMS)
+def test_adaptive_algorithm_front_ends(algorithm, parameters):
+    rng = np.random.default_rng(2)
+    input_signal = rng.standard_normal((600, 3))
+    desired_signal = rng.standard_normal(600)
+    num_taps = 16
+
+    # Single-sample front ends, one update per sample
+    adaptive_filter_single_sample = AdaptiveFilterSingleSample(
+        num_taps=num_taps, mu=None, num_channels=3, algorithm=algorithm(num_taps, 3, **parameters)
+    )
+    adaptive_filter_single_sample_tapir = AdaptiveFilterSingleSampleTapir(
+        num_taps=num_taps, mu=None, num_channels=3, algorithm=algorithm(num_taps, 3, **parameters)
+    )
+    y_single_sample = np.zeros_like(input_signal)
+    y_single_sample_tapir = np.zeros_like(input_signal)
+    for i in range(len(input_signal)):
+        y_single_sample[i] = adaptive_filter_single_sample.adapt(
+            x=input_signal[i], desired_signal=desired_signal[i]
+        )
+        y_single_sample_tapir[i] = adaptive_filter_single_sample_tapir.adapt(
+            x=input_signal[i], desired_signal=desired_signal[i]
+        )
+
+    # Windowed front end, processing blocks of samples
+    windowed_adaptive_filter_tapir = WindowedAdaptiveFilterTapir(
+        filter_order=num_taps, learning_rate=None, algorithm=algorithm(num_taps, 3, **parameters)
+    )
+    boundaries = [0, 10, 40, 100, 350, 600]
+    y_windowed = np.concatenate(
+        [
+            windowed_adaptive_filter_tapir.process_window(
+                input_signal=input_signal[start:stop],
+                desired_signal=desired_signal[start:stop],
+            )
+            for start, stop in zip(boundaries[:-1], boundaries[1:])
+        ]
+    )
+    assert np.allclose(y_windowed, y_single_sample_tapir, atol=1e-10)
+
+    # Whole-array front end on the first channel
+    adaptive_filter_array = AdaptiveLMSFilterArray(
+        num_taps=num_taps, mu=None, algorithm=algorithm(num_taps, 1, **parameters)
+    )
+    adaptive_filter_single_channel = AdaptiveFilterSingleSample(
+        num_taps=num_taps, mu=None, num_channels=1, algorithm=algorithm(num_taps, 1, **parameters)
+    )
+    y_array = np.concatenate(
+        [
+            adaptive_filter_array.adapt(x=input_signal[start:stop, 0], desired_signal=desired_signal[start:stop])[0]
+            for start, stop in zip(boundaries[:-1], boundaries[1:])
+        ]
+    )
+    y_single_channel = np.array(
+        [
+            adaptive_filter_single_channel.adapt(x=input_signal[i, :1], desired_signal=desired_signal[i])[0]
+            for i in range(len(input_signal))
+        ]
+    )
+    assert np.allclose(y_array, y_single_channel, atol=1e-10)
+    assert np.allclose(adaptive_filter_array.weights, adaptive_filter_single_channel.weights[0], atol=1e-10)
+
+
+@pytest.mark.parametrize("algorithm, parameters", [(None, {"mu": 0.01})] + ALGORITHMS)
+def test_adaptive_filter_state(algorithm, parameters):
+    rng = np.random.default_rng(4)
+    input_signal = rng.standard_normal((600, 3))
+    desired_signal = rng.standard_normal(600)
+    num_taps = 16
+
+    def make_algorithm():
+        return None if algorithm is None else algorithm(num_taps, 3, **parameters)
+
+    # A stream moved to another filter after 300 samples gives the output of a single filter
+    for front_end in (AdaptiveFilterSingleSample, AdaptiveFilterSingleSampleTapir):
+        filters = [front_end(num_taps=num_taps, mu=0.01, num_channels=3, algorithm=make_algorithm()) for _ in range(3)]
+        y = [filters[0].adapt(x=input_signal[i], desired_signal=desired_signal[i]) for i in range(300)]
+        filters[1].set_state(filters[0].get_state())
+        y += [filters[1].adapt(x=input_signal[i], desired_signal=desired_signal[i]) for i in range(300, 600)]
+        y_reference = [filters[2].adapt(x=input_signal[i], desired_signal=desired_signal[i]) for i in range(600)]
+        assert np.array_equal(y, y_reference)
+        assert np.array_equal(filters[1].weights, filters[2].weights)
+
+    filters = [WindowedAdaptiveFilterTapir(filter_order=num_taps, learning_rate=0.01, algorithm=make_algorithm()) for _ in range(3)]
+    # The state of a filter that has not processed anything yet
+    filters[1].set_state(filters[0].get_state())
+    y = filters[0].process_window(input_signal=input_signal[:10], desired_signal=desired_signal[:10])
+    y_restored = filters[1].process_window(input_signal=input_signal[:10], desired_signal=desired_signal[:10])
+    assert np.array_equal(y, y_restored)
+
+    y = [y, filters[0].process_window(input_signal=input_signal[10:300], desired_signal=desired_signal[10:300])]
+    filters[1] = WindowedAdaptiveFilterTapir(filter_order=num_taps, learning_rate=0.01, algorithm=make_algorithm())
+    filters[1].set_state(filters[0].get_state())
+    y.append(filters[1].process_window(input_signal=input_signal[300:], desired_signal=desired_signal[300:]))
+    y_reference = [
+        filters[2].process_window(input_signal=input_signal[start:stop], desired_signal=desired_signal[start:stop])
+        for start, stop in ((0, 10), (10, 300), (300, 600))
+    ]
+    assert np.array_equal(np.concatenate(y), np.concatenate(y_reference))
+    assert filters[1].samples_processed == 600
+
+    # A stream moved after a first window shorter than the filter order
+    filters = [WindowedAdaptiveFilterTapir(filter_order=num_taps, learning_rate=0.01, algorithm=make_algorithm()) for _ in range(3)]
+    y = [filters[0].process_window(input_signal=input_signal[:10], desired_signal=desired_signal[:10])]
+    filters[1].set_state(filters[0].get_state())
+    y.append(filters[1].process_window(input_signal=input_signal[10:], desired_signal=desired_signal[10:]))
+    y_reference = [
+        filters[2].process_window(input_signal=input_signal[start:stop], desired_signal=desired_signal[start:stop])
+        for start, stop in ((0, 10), (10, 600))
+    ]
+    assert np.array_equal(np.concatenate(y), np.concatenate(y_reference))
+    assert np.array_equal(filters[1].prev_weights, filters[2].prev_weights)
+
+    # The state is checked against the filter restoring it
+    with pytest.raises(ValueError):
+        AdaptiveFilterSingleSampleTapir(num_taps=num_taps, mu=0.01, num_channels=2).set_state(
+            AdaptiveFilterSingleSampleTapir(num_taps=num_taps, mu=0.01, num_channels=3).get_state()
+        )
+    with pytest.raises(ValueError, match="WindowedAdaptiveFilterTapir"):
+        AdaptiveFilterSingleSampleTapir(num_taps=num_taps, mu=0.01, num_channels=3).set_state(filters[1].get_state())
+    if algorithm is not RLS:
+        with pytest.raises(ValueError, match="cannot be restored"):
+            WindowedAdaptiveFilterTapir(
+                filter_order=num_taps, learning_rate=None, algorithm=RLS(num_taps, 3)
+            ).set_state(filters[1].get_state())
+
+
+def test_adaptive_algorithm_convergence():
+    # Identify a 16 tap FIR system: NLMS and RLS converge much faster than LMS
+    # with a small step size
+    rng = np.random.default_rng(3)
+    num_taps = 16
+    system = rng.standard_normal(num_taps)
+    input_signal = rng.standard_normal(2000)
+    desired_signal = np.convolve(input_signal, system)[: len(input_signal)]
+    x = np.concatenate([np.zeros(num_taps - 1), input_signal])[np.newaxis]
+
+    errors = {}
+    for algorithm in (LMS(num_taps, mu=1e-3), NLMS(num_taps, mu=0.5), RLS(num_taps, forgetting_factor=0.999)):
+        _, error = algorithm.process(x, desired_signal)
+        errors[type(algorithm)] = np.mean(error[1000:] ** 2)
+
+    assert errors[NLMS] < errors[LMS] / 100
+    assert errors[RLS] < errors[LMS] / 100
+    assert np.allclose(algorithm.weights[0], system, atol=1e-6)
+
+
+def test_adaptive_filter_bank():
+    rng = np.random.default_rng(5)
+    num_taps = 8
+    num_streams = 5
+    input_signal = rng.standard_normal((300, num_streams, 3))
+    desired_signal = rng.standard_normal((300, num_streams))
+
+    adaptive_filter_bank = AdaptiveFilterBank(num_taps=num_taps, mu=0.01, num_channels=3, capacity=2)
+    references = {}
+    for stream in range(num_streams):
+        adaptive_filter_bank.add_stream()
+        references[stream] = AdaptiveFilterSingleSample(num_taps=num_taps, mu=0.01, num_channels=3)
+
+    for tick in range(300):
+        if tick == 100:
+            adaptive_filter_bank.remove_stream(0)
+            del references[0]
+        stream_ids = adaptive_filter_bank.stream_ids
+        outputs, errors = adaptive_filter_bank.step(input_signal[tick, stream_ids], desired_signal[tick, stream_ids])
+        for row, stream in enumerate(stream_ids):
+            output = references[stream].adapt(x=input_signal[tick, stream], desired_signal=desired_signal[tick, stream])
+            assert np.allclose(outputs[row], output, atol=1e-12)
+            assert np.allclose(errors[row], desired_signal[tick, stream] - outputs[row])
+
+    for stream in adaptive_filter_bank.stream_ids:
+        row = adaptive_filter_bank.index(stream)
+        assert np.allclose(adaptive_filter_bank.weights[row], references[stream].weights, atol=1e-12)
+
+    with pytest.raises(ValueError):
+        adaptive_filter_bank.step(np.zeros((4, 2)), np.zeros(4))
+
+
+def test_adaptive_filter_float32():
+    rng = np.random.default_rng(6)
+    input_signal = rng.standard_normal((500, 4, 3)).astype(np.float32)
+    desired_signal = rng.standard_normal((500, 4)).astype(np.float32)
+
+    # The bank keeps its buffers and weights in float32, close to float64
+    dtypes = (np.float32, np.float64)
+    banks = {dtype: AdaptiveFilterBank(num_taps=8, mu=0.01, num_channels=3, dtype=dtype) for dtype in dtypes}
+    for bank in banks.values():
+        for _ in range(4):
+            bank.add_stream()
+    for tick in range(500):
+        outputs = {dtype: bank.step(input_signal[tick], desired_signal[tick])[0] for dtype, bank in banks.items()}
+        assert outputs[np.float32].dtype == np.float32
+        assert np.allclose(outputs[np.float32], outputs[np.float64], rtol=0, atol=1e-4)
+    assert banks[np.float32].weights.dtype == np.float32 and banks[np.float32].buffer.dtype == np.float32
+
+    # The single-sample and array front ends of plain LMS
+    for filter_class in (AdaptiveFilterSingleSample, AdaptiveFilterSingleSampleTapir):
+        filters = {dtype: filter_class(num_taps=8, mu=0.01, num_channels=3, dtype=dtype) for dtype in dtypes}
+        for tick in range(500):
+            y = {
+                dtype: adaptive_filter.adapt(x=input_signal[tick, 0], desired_signal=desired_signal[tick, 0])
+                for dtype, adaptive_filter in filters.items()
+            }
+            assert np.allclose(y[np.float32], y[np.float64], rtol=0, atol=1e-4)
+        assert filters[np.float32].weights.dtype == np.float32 and filters[np.float32].buffer.dtype == np.float32
+    y_array = {
+        dtype: AdaptiveLMSFilterArray(num_taps=8, mu=0.01, dtype=dtype).adapt(input_signal[:, 0, 0], desired_signal[:, 0])[0]
+        for dtype in dtypes
+    }
+    assert y_array[np.float32].dtype == np.float32
+    assert np.allclose(y_array[np.float32], y_array[np.float64], rtol=0, atol=1e-4)
+
+    with pytest.raises(ValueError):
+        AdaptiveFilterBank(num_taps=8, mu=0.01, dtype=np.float16)
+    with pytest.raises(ValueError):
+        AdaptiveFilterSingleSample(num_taps=8, mu=None, num_channels=3, algorithm=NLMS(8, 3), dtype=np.float32)
+    with pytest.raises(ValueError):
+        AdaptiveLMSFilterArray(num_taps=8, mu=None, algorithm=NLMS(8, 1), dtype=np.float32)
+
+
+def test_fixed_point_lms():
+    # Identify a 16 tap FIR system in Q15 and Q31: the fixed-point LMS follows
+    # the float64 LMS up to the quantization noise
+    rng = np.random.default_rng(4)
+    num_taps = 16
+    system = rng.uniform(-0.1, 0.1, num_taps)
+    input_signal = rng.uniform(-0.5, 0.5, 3000)
+    desired_signal = np.convolve(input_signal, system)[: len(input_signal)]
+    x = np.concatenate([np.zeros(num_taps - 1), input_signal])[np.newaxis]
+
+    lms = LMS(num_taps, mu=0.05)
+    y_float, _ = lms.process(x, desired_signal)
+    for data_format, tolerance in ((Q15, 1e-3), (Q31, 1e-7)):
+        fixed_point_lms = FixedPointLMS(num_taps, mu=0.05, data_format=data_format)
+        y, _ = fixed_point_lms.process(x, desired_signal)
+        assert np.max(np.abs(y - y_float)) < tolerance
+        assert np.allclose(fixed_point_lms.weights, fixed_point_lms.weight_format.to_float(fixed_point_lms.weights_q))
+    assert np.allclose(fixed_point_lms.weights[0], system, atol=1e-3)
+
+    fixed_point_lms.reset()
+    assert not np.any(fixed_point_lms.weights_q)
+    with pytest.raises(ValueError):
+        FixedPointLMS(num_taps, mu=1e-6, data_format=Q15)
+
+
+def test_adaptive_algorithm_invalid():
+    with pytest.raises(ValueError):
+        LMS(num_taps=0)
+    with pytest.raises(ValueError):
+        RLS(num_taps=8, forgetting_factor=1.5)
+    with pytest.raises(ValueError):
+        LMS(num_taps=8).process(np.zeros((1, 10)), np.zeros(10))
+    with pytest.raises(ValueError):
+        AdaptiveFilterSingleSample(num_taps=8, mu=None, num_channels=3, algorithm=NLMS(8, 1))
+
+    # An update rule without update is caught at construction
+    class IncompleteAlgorithm(AdaptiveAlgorithm):
+        pass
+
+    with pytest.raises(TypeError):
+        IncompleteAlgorithm(num_taps=8)
+
+
 if __name__ == "__main__":
     pytest.main()
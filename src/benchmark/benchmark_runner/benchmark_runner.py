@@ -0,0 +1,557 @@
+"""
+Benchmark the filter front ends and engines over a sweep of signal shapes.
+
+Every benchmark filters a random signal and is timed for each combination of
+the sweep parameters it depends on (signal length, taps or filter order,
+channels, window size, engine). The results are saved as JSON; when a
+baseline file is given, any case slower than the baseline by more than the
+tolerance is reported and the run exits with status 1. The run also exits
+with status 1 when a case misses its speedup target over its reference
+implementation (see SPEEDUP_TARGETS).
+
+Example:
+    From the src folder, run the quick sweep, compare it with a stored
+    baseline and save the results:
+
+    $ python -m benchmark.benchmark_runner.benchmark_runner \\
+        --profile quick \\
+        --baseline benchmark_baseline.json \\
+        --output benchmark_results.json
+"""
+import argparse
+import itertools
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable
+
+import numpy as np
+
+from adaptive.adaptive_filter_array.adaptive_array import AdaptiveLMSFilterArray
+from adaptive.adaptive_filter_bank.adaptive_filter_bank import AdaptiveFilterBank
+from adaptive.adaptive_filter_window.adaptive_filter_window_tapir import WindowedAdaptiveFilterTapir
+from adaptive.adaptive_single_sample.adaptive_single_sample import AdaptiveFilterSingleSample
+from adaptive.adaptive_single_sample_tapir.adaptive_single_sample_tapir import AdaptiveFilterSingleSampleTapir
+from adaptive.test.adaptive_filter_reference_tapir import AdaptiveFilterTapir
+from fir.fir_array.fir_array import FIRArray
+from fir.fir_single_sample.fir_single_sample import FIRSingleSample
+from fir.fir_window_array.fir_window_array import FIRWindowArray
+from iir.filter_bank.filter_bank import IIRFilterBank
+from iir.iir_array.iir_array import IIRArray
+from iir.iir_single_sample.iir_single_sample import IIRSingleSample, load_c_library
+from iir.iir_window_array.iir_window_array import IIRWindowArray
+from iir.sos_filter.sos_filter import SOSFilter
+from iir.utils.coefficient import compute_impulse_response_coefficient, compute_sos_coefficient
+
+# Values of every sweep parameter. Single-sample front ends run a Python call
+# per sample, so they use the shorter single_sample_length; the filter banks
+# run single_sample_length ticks of all their streams.
+SWEEPS = {
+    "quick": {
+        "signal_length": [4_000],
+        "single_sample_length": [500],
+        "taps": [8, 64],
+        "order": [2],
+        "channels": [1, 3],
+        "streams": [100],
+        "window_size": [256],
+        "fir_method": ["direct", "overlap_save"],
+        "iir_backend": ["python", "c"],
+    },
+    "full": {
+        "signal_length": [1_000, 10_000, 100_000],
+        "single_sample_length": [5_000],
+        "taps": [8, 32, 128, 512],
+        "order": [1, 2, 4],
+        "channels": [1, 3, 8],
+        "streams": [10, 1_000, 10_000],
+        "window_size": [64, 256, 1024],
+        "fir_method": ["direct", "fft", "overlap_save"],
+        "iir_backend": ["python", "c"],
+    },
+}
+
+# Relative slowdown over the baseline above which a case is a regression
+DEFAULT_TOLERANCE = 0.25
+
+# Benchmark name -> (reference benchmark, minimum speedup). Every case must be
+# at least that many times faster than the reference case with the same
+# values of the parameters of the reference.
+SPEEDUP_TARGETS = {
+    "windowed_adaptive_filter_tapir": ("adaptive_filter_reference_tapir", 10.0),
+}
+
+
+def _iir_coefficients(order: int) -> tuple:
+    """Bandpass Butterworth transfer function used by the IIR benchmarks (2 * order poles)."""
+    return compute_impulse_response_coefficient(filter_order=order, fs=100, fc=[0.5, 5], band_type="bandpass")
+
+
+def _fir_array(rng, signal_length, taps, fir_method):
+    x = rng.standard_normal(signal_length)
+    h = rng.standard_normal(taps)
+    return lambda: FIRArray.apply_fir_filter(x, h, method=fir_method)
+
+
+def _fir_single_sample(rng, single_sample_length, taps):
+    x = rng.standard_normal(single_sample_length).tolist()
+    h = rng.standard_normal(taps)
+
+    def run():
+        fir_single_sample = FIRSingleSample(filter_order=taps - 1, coefficients=h)
+        for sample in x:
+            fir_single_sample.apply_fir_filter(sample)
+
+    return run
+
+
+def _fir_window_array(rng, signal_length, taps, window_size):
+    x = rng.standard_normal(signal_length)
+    h = rng.standard_normal(taps)
+
+    def run():
+        fir_window_array = FIRWindowArray(h)
+        for start in range(0, signal_length, window_size):
+            fir_window_array.apply_fir_filter(x[start : start + window_size])
+
+    return run
+
+
+def _iir_array(rng, signal_length, order, channels):
+    x = rng.standard_normal((channels, signal_length))
+    b, a = _iir_coefficients(order)
+    iir_array = IIRArray(b=b, a=a)
+    return lambda: iir_array.apply_iir_filter(x, axis=-1)
+
+
+def _iir_single_sample(rng, single_sample_length, order, iir_backend):
+    if iir_backend == "c" and load_c_library() is None:
+        return None
+    x = rng.standard_normal(single_sample_length).tolist()
+    b, a = _iir_coefficients(order)
+
+    def run():
+        iir_single_sample = IIRSingleSample(b=b, a=a, filter_order=len(b) - 1, backend=iir_backend)
+        apply_iir_filter = iir_single_sample.apply_iir_filter
+        for sample in x:
+            apply_iir_filter(sample)
+
+    return run
+
+
+def _iir_single_sample_block(rng, signal_length, order, window_size, iir_backend):
+    if iir_backend == "c" and load_c_library() is None:
+        return None
+    x = rng.standard_normal(signal_length)
+    b, a = _iir_coefficients(order)
+    y = np.empty(signal_length)
+
+    def run():
+        iir_single_sample = IIRSingleSample(b=b, a=a, filter_order=len(b) - 1, backend=iir_backend)
+        for start in range(0, signal_length, window_size):
+            iir_single_sample.apply_iir_filter_block(x[start : start + window_size], out=y[start : start + window_size])
+
+    return run
+
+
+def _iir_window_array(rng, signal_length, order, window_size):
+    x = rng.standard_normal(signal_length)
+    b, a = _iir_coefficients(order)
+    y = np.empty(signal_length)
+
+    def run():
+        iir_window_array = IIRWindowArray(b=b, a=a)
+        for start in range(0, signal_length, window_size):
+            iir_window_array.apply_iir_filter(x[start : start + window_size], out=y[start : start + window_size])
+
+    return run
+
+
+def _iir_filter_bank(rng, single_sample_length, order, streams):
+    x = rng.standard_normal((single_sample_length, streams))
+    b, a = _iir_coefficients(order)
+
+    def run():
+        iir_filter_bank = IIRFilterBank(b=b, a=a, capacity=streams)
+        for _ in range(streams):
+            iir_filter_bank.add_stream()
+        for samples in x:
+            iir_filter_bank.step(samples)
+
+    return run
+
+
+def _sos_filter(rng, signal_length, order, channels):
+    x = rng.standard_normal((channels, signal_length))
+    sos_filter = SOSFilter(compute_sos_coefficient(filter_order=order, fs=100, fc=[0.5, 5], band_type="bandpass"))
+    return lambda: sos_filter.apply_sos_filter(x, axis=-1)
+
+
+def _adaptive_lms_filter_array(rng, signal_length, taps, window_size):
+    x = rng.standard_normal(signal_length)
+    desired_signal = rng.standard_normal(signal_length)
+
+    def run():
+        adaptive_filter_array = AdaptiveLMSFilterArray(num_taps=taps, mu=1e-4)
+        for start in range(0, signal_length, window_size):
+            adaptive_filter_array.adapt(x[start : start + window_size], desired_signal[start : start + window_size])
+
+    return run
+
+
+def _adaptive_filter_single_sample(rng, single_sample_length, taps, channels, filter_class=AdaptiveFilterSingleSample):
+    x = rng.standard_normal((single_sample_length, channels))
+    desired_signal = rng.standard_normal(single_sample_length).tolist()
+
+    def run():
+        adaptive_filter_single_sample = filter_class(num_taps=taps, mu=1e-4, num_channels=channels)
+        for sample, desired_sample in zip(x, desired_signal):
+            adaptive_filter_single_sample.adapt(x=sample, desired_signal=desired_sample)
+
+    return run
+
+
+def _adaptive_filter_single_sample_tapir(rng, single_sample_length, taps, channels):
+    return _adaptive_filter_single_sample(
+        rng, single_sample_length, taps, channels, filter_class=AdaptiveFilterSingleSampleTapir
+    )
+
+
+def _adaptive_filter_bank(rng, single_sample_length, taps, channels, streams):
+    x = rng.standard_normal((single_sample_length, streams, channels))
+    desired_signal = rng.standard_normal((single_sample_length, streams))
+
+    def run():
+        adaptive_filter_bank = AdaptiveFilterBank(num_taps=taps, mu=1e-4, num_channels=channels, capacity=streams)
+        for _ in range(streams):
+            adaptive_filter_bank.add_stream()
+        for samples, desired_samples in zip(x, desired_signal):
+            adaptive_filter_bank.step(samples, desired_samples)
+
+    return run
+
+
+def _adaptive_filter_reference_tapir(rng, signal_length, taps, channels):
+    x = rng.standard_normal((signal_length, channels))
+    desired_signal = rng.standard_normal(signal_length)
+    return lambda: AdaptiveFilterTapir().adaptive_filter(
+        input_signal=x, desired_signal=desired_signal, filter_order=taps, learning_rate=1e-4
+    )
+
+
+def _windowed_adaptive_filter_tapir(rng, signal_length, taps, channels, window_size):
+    x = rng.standard_normal((signal_length, channels))
+    desired_signal = rng.standard_normal(signal_length)
+
+    def run():
+        windowed_adaptive_filter_tapir = WindowedAdaptiveFilterTapir(filter_order=taps, learning_rate=1e-4)
+        for start in range(0, signal_length, window_size):
+            windowed_adaptive_filter_tapir.process_window(
+                x[start : start + window_size], desired_signal[start : start + window_size]
+            )
+
+    return run
+
+
+# Benchmark name -> (sweep parameters it depends on, builder). A builder takes
+# a random generator and the parameters and returns the function to time, or
+# None if the case cannot run here (e.g. the C backend is not built).
+BENCHMARKS = {
+    "fir_array": (("signal_length", "taps", "fir_method"), _fir_array),
+    "fir_single_sample": (("single_sample_length", "taps"), _fir_single_sample),
+    "fir_window_array": (("signal_length", "taps", "window_size"), _fir_window_array),
+    "iir_array": (("signal_length", "order", "channels"), _iir_array),
+    "iir_single_sample": (("single_sample_length", "order", "iir_backend"), _iir_single_sample),
+    "iir_single_sample_block": (
+        ("signal_length", "order", "window_size", "iir_backend"),
+        _iir_single_sample_block,
+    ),
+    "iir_window_array": (("signal_length", "order", "window_size"), _iir_window_array),
+    "iir_filter_bank": (("single_sample_length", "order", "streams"), _iir_filter_bank),
+    "sos_filter": (("signal_length", "order", "channels"), _sos_filter),
+    "adaptive_lms_filter_array": (("signal_length", "taps", "window_size"), _adaptive_lms_filter_array),
+    "adaptive_filter_single_sample": (("single_sample_length", "taps", "channels"), _adaptive_filter_single_sample),
+    "adaptive_filter_single_sample_tapir": (
+        ("single_sample_length", "taps", "channels"),
+        _adaptive_filter_single_sample_tapir,
+    ),
+    "adaptive_filter_reference_tapir": (("signal_length", "taps", "channels"), _adaptive_filter_reference_tapir),
+    "windowed_adaptive_filter_tapir": (
+        ("signal_length", "taps", "channels", "window_size"),
+        _windowed_adaptive_filter_tapir,
+    ),
+    "adaptive_filter_bank": (("single_sample_length", "taps", "channels", "streams"), _adaptive_filter_bank),
+}
+
+
+def case_id(name: str, parameters: dict) -> str:
+    """Identifier of a benchmark case, e.g. 'fir_array[signal_length=4000,taps=8,fir_method=direct]'."""
+    return f"{name}[{','.join(f'{key}={value}' for key, value in parameters.items())}]"
+
+
+def iter_cases(sweep: dict, name_filter: str = None):
+    """
+    Enumerate the benchmark cases of a sweep.
+
+    Args:
+        sweep (dict): Values of every sweep parameter, see SWEEPS
+        name_filter (str): Only keep the cases whose identifier contains this
+        substring. Defaults to None, which keeps every case.
+
+    Yields:
+        tuple: (case identifier, benchmark name, parameters)
+    """
+    for name, (parameter_names, _) in BENCHMARKS.items():
+        for values in itertools.product(*(sweep[parameter] for parameter in parameter_names)):
+            parameters = dict(zip(parameter_names, values))
+            identifier = case_id(name, parameters)
+            if name_filter is None or name_filter in identifier:
+                yield identifier, name, parameters
+
+
+def time_function(function: Callable, repeat: int = 5, min_time: float = 0.05) -> dict:
+    """
+    Time a function like timeit: calls are grouped so that every measure lasts at least min_time.
+
+    Args:
+        function (Callable): Function without arguments
+        repeat (int): Number of measures. Defaults to 5.
+        min_time (float): Minimum duration of a measure in seconds. Defaults to 0.05.
+
+    Returns:
+        dict: 'seconds' (best time per call), 'median_seconds' (median time
+        per call), 'number' (calls per measure) and 'repeat'
+    """
+    # Warm up (first-call allocations, lazy imports) and calibrate the number of calls
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed > 0 else 10
+
+    measures = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        measures.append((time.perf_counter() - start) / number)
+
+    return {
+        "seconds": min(measures),
+        "median_seconds": statistics.median(measures),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def run_benchmarks(
+    profile: str = "quick",
+    sweep: dict = None,
+    name_filter: str = None,
+    repeat: int = 5,
+    min_time: float = 0.05,
+    progress: Callable = None,
+) -> dict:
+    """
+    Run the benchmark cases of a sweep.
+
+    Args:
+        profile (str): Name of the sweep in SWEEPS. Defaults to 'quick'.
+        sweep (dict): Custom sweep, overriding profile. Defaults to None.
+        name_filter (str): See iter_cases. Defaults to None.
+        repeat (int): See time_function. Defaults to 5.
+        min_time (float): See time_function. Defaults to 0.05.
+        progress (Callable): Called with (case identifier, result) after every
+        case, e.g. to print it. Defaults to None.
+
+    Returns:
+        dict: 'metadata' (profile, versions, platform and date) and 'results',
+        mapping every case identifier to its 'benchmark', 'parameters',
+        'samples' and the timings of time_function, plus 'samples_per_second'
+
+    Raises:
+        ValueError: If profile is not in SWEEPS and no sweep is given
+    """
+    if sweep is None:
+        if profile not in SWEEPS:
+            raise ValueError(f"profile must be one of {sorted(SWEEPS)}")
+        sweep = SWEEPS[profile]
+    else:
+        profile = "custom"
+
+    results = {}
+    for identifier, name, parameters in iter_cases(sweep, name_filter):
+        # The same random signals for every run, so that runs are comparable
+        function = BENCHMARKS[name][1](np.random.default_rng(0), **parameters)
+        if function is None:
+            continue
+        result = {"benchmark": name, "parameters": parameters}
+        result["samples"] = (
+            parameters.get("signal_length", parameters.get("single_sample_length"))
+            * parameters.get("channels", 1)
+            * parameters.get("streams", 1)
+        )
+        result.update(time_function(function, repeat=repeat, min_time=min_time))
+        result["samples_per_second"] = result["samples"] / result["seconds"]
+        results[identifier] = result
+        if progress is not None:
+            progress(identifier, result)
+
+    return {
+        "metadata": {
+            "profile": profile,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+
+
+def save_results(results: dict, path: str):
+    """Save the output of run_benchmarks as JSON."""
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+def load_results(path: str) -> dict:
+    """Load results saved by save_results."""
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_results(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list[dict]:
+    """
+    Find the cases slower than the baseline.
+
+    Only the cases present in both runs are compared, on their best time.
+
+    Args:
+        results (dict): Output of run_benchmarks
+        baseline (dict): Output of run_benchmarks, e.g. loaded with load_results
+        tolerance (float): Relative slowdown allowed, e.g. 0.25 for 25%.
+        Defaults to DEFAULT_TOLERANCE.
+
+    Returns:
+        list[dict]: One entry per regression with 'case', 'baseline_seconds',
+        'seconds' and 'ratio' (seconds / baseline_seconds), slowest first
+    """
+    regressions = []
+    for identifier, result in results["results"].items():
+        baseline_result = baseline["results"].get(identifier)
+        if baseline_result is None:
+            continue
+        ratio = result["seconds"] / baseline_result["seconds"]
+        if ratio > 1 + tolerance:
+            regressions.append(
+                {
+                    "case": identifier,
+                    "baseline_seconds": baseline_result["seconds"],
+                    "seconds": result["seconds"],
+                    "ratio": ratio,
+                }
+            )
+    return sorted(regressions, key=lambda regression: regression["ratio"], reverse=True)
+
+
+def check_speedups(results: dict, targets: dict = None) -> list[dict]:
+    """
+    Find the cases slower than their speedup target over their reference.
+
+    Cases whose reference case was not run are not checked.
+
+    Args:
+        results (dict): Output of run_benchmarks
+        targets (dict): Benchmark name -> (reference benchmark, minimum
+        speedup). Defaults to None, which uses SPEEDUP_TARGETS.
+
+    Returns:
+        list[dict]: One entry per miss with 'case', 'reference', 'speedup'
+        (reference seconds / seconds) and 'target', smallest speedup first
+    """
+    if targets is None:
+        targets = SPEEDUP_TARGETS
+    misses = []
+    for identifier, result in results["results"].items():
+        if result["benchmark"] not in targets:
+            continue
+        reference_name, target = targets[result["benchmark"]]
+        reference_parameters = {
+            parameter: result["parameters"][parameter] for parameter in BENCHMARKS[reference_name][0]
+        }
+        reference_identifier = case_id(reference_name, reference_parameters)
+        reference_result = results["results"].get(reference_identifier)
+        if reference_result is None:
+            continue
+        speedup = reference_result["seconds"] / result["seconds"]
+        if speedup < target:
+            misses.append(
+                {"case": identifier, "reference": reference_identifier, "speedup": speedup, "target": target}
+            )
+    return sorted(misses, key=lambda miss: miss["speedup"])
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the filter front ends and engines.")
+    parser.add_argument("--profile", choices=sorted(SWEEPS), default="quick", help="Sweep to run")
+    parser.add_argument("-k", "--filter", dest="name_filter", default=None, help="Only run the cases containing this substring")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of measures per case")
+    parser.add_argument("--min-time", type=float, default=0.05, help="Minimum duration of a measure in seconds")
+    parser.add_argument("--output", default=None, help="JSON file where the results are saved")
+    parser.add_argument("--baseline", default=None, help="JSON results to compare with")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Relative slowdown allowed")
+    parser.add_argument("--list", action="store_true", help="List the cases and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for identifier, _, _ in iter_cases(SWEEPS[args.profile], args.name_filter):
+            print(identifier)
+        return 0
+
+    def progress(identifier, result):
+        print(f"{identifier}: {result['seconds'] * 1e3:.3f} ms, {result['samples_per_second']:.0f} samples/s")
+
+    results = run_benchmarks(
+        profile=args.profile,
+        name_filter=args.name_filter,
+        repeat=args.repeat,
+        min_time=args.min_time,
+        progress=progress,
+    )
+    if args.output is not None:
+        save_results(results, args.output)
+
+    failed = False
+    misses = check_speedups(results)
+    for miss in misses:
+        print(f"SLOW {miss['case']}: {miss['speedup']:.1f}x faster than {miss['reference']}, target {miss['target']:g}x")
+    if misses:
+        print(f"{len(misses)} case(s) below their speedup target")
+        failed = True
+
+    if args.baseline is not None:
+        regressions = compare_results(results, load_results(args.baseline), tolerance=args.tolerance)
+        for regression in regressions:
+            print(
+                f"REGRESSION {regression['case']}: {regression['seconds'] * 1e3:.3f} ms, "
+                f"baseline {regression['baseline_seconds'] * 1e3:.3f} ms ({regression['ratio']:.2f}x)"
+            )
+        if regressions:
+            print(f"{len(regressions)} case(s) slower than the baseline by more than {args.tolerance:.0%}")
+            failed = True
+        else:
+            print("No regression against the baseline")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""
+Measure the accuracy of the filter front ends run in float32.
+
+Every filter is run with dtype=float32 on float32 recordings and compared with
+scipy.signal.lfilter run in float64 on the original recordings. The report
+gives, for every filter, the worst case over the recordings of the maximum
+absolute error, of the same error relative to the peak of the reference
+output, and of the signal-to-error ratio.
+
+Example:
+    From the repository root, report the accuracy on the bundled PPG
+    recordings:
+
+    $ PYTHONPATH=src python -m benchmark.precision_report.precision_report \\
+        --signals "src/iir/test/considered_ppg/*.txt" \\
+        --output precision_report.json
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+from typing import Callable
+
+import numpy as np
+
+from fir.fir_array.fir_array import FIRArray
+from fir.fir_single_sample.fir_single_sample import FIRSingleSample
+from fir.fir_window_array.fir_window_array import FIRWindowArray
+from fixed_point.q_format.q_format import error_report
+from iir.iir_array.iir_array import IIRArray
+from iir.iir_window_array.iir_window_array import IIRWindowArray
+from iir.sos_filter.sos_filter import SOSFilter
+from iir.utils.coefficient import compute_impulse_response_coefficient
+
+# PPG recordings of the test folder and the filters applied to them
+DEFAULT_SIGNALS = "src/iir/test/considered_ppg/*.txt"
+SAMPLING_FREQUENCY = 32
+IIR_ORDER = 4
+IIR_CUTOFF = [0.4, 4]
+FIR_TAPS = 101
+FIR_CUTOFF = 4
+
+# Window length of the windowed front ends
+WINDOW_SIZE = 1024
+
+
+def _fir_array(method: str) -> Callable:
+    def run(x, design, dtype):
+        return FIRArray.apply_fir_filter(x, design["h"], method=method, dtype=dtype)
+
+    return run
+
+
+def _fir_window_array(x, design, dtype):
+    fir_window_array = FIRWindowArray(design["h"], dtype=dtype)
+    return np.concatenate(
+        [fir_window_array.apply_fir_filter(x[start : start + WINDOW_SIZE]) for start in range(0, len(x), WINDOW_SIZE)]
+    )
+
+
+def _fir_single_sample(x, design, dtype):
+    fir_single_sample = FIRSingleSample(len(design["h"]) - 1, design["h"], dtype=dtype)
+    return np.array([fir_single_sample.apply_fir_filter(sample) for sample in x], dtype=dtype)
+
+
+def _iir_array(x, design, dtype):
+    return IIRArray(design["b"], design["a"], dtype=dtype).apply_iir_filter(x)
+
+
+def _iir_window_array(x, design, dtype):
+    iir_window_array = IIRWindowArray(design["b"], design["a"], dtype=dtype)
+    y = np.empty(len(x), dtype=dtype)
+    for start in range(0, len(x), WINDOW_SIZE):
+        iir_window_array.apply_iir_filter(x[start : start + WINDOW_SIZE], out=y[start : start + WINDOW_SIZE])
+    return y
+
+
+def _sos_array(x, design, dtype):
+    return SOSFilter.from_tf(design["b"], design["a"], dtype=dtype).apply_sos_filter(x)
+
+
+def _sos_window(x, design, dtype):
+    sos_filter = SOSFilter.from_tf(design["b"], design["a"], dtype=dtype)
+    return np.concatenate(
+        [sos_filter.apply_sos_filter_window(x[start : start + WINDOW_SIZE]) for start in range(0, len(x), WINDOW_SIZE)]
+    )
+
+
+def _sos_single_sample(x, design, dtype):
+    sos_filter = SOSFilter.from_tf(design["b"], design["a"], dtype=dtype)
+    return np.array([sos_filter.apply_sos_filter_single_sample(sample) for sample in x.tolist()], dtype=dtype)
+
+
+# Name -> (reference transfer function, runs a Python call per sample, runner)
+PRECISION_FILTERS = {
+    "fir_array_direct": ("fir", False, _fir_array("direct")),
+    "fir_array_fft": ("fir", False, _fir_array("fft")),
+    "fir_array_overlap_save": ("fir", False, _fir_array("overlap_save")),
+    "fir_window_array": ("fir", False, _fir_window_array),
+    "fir_single_sample": ("fir", True, _fir_single_sample),
+    "iir_array": ("iir", False, _iir_array),
+    "iir_window_array": ("iir", False, _iir_window_array),
+    "sos_array": ("iir", False, _sos_array),
+    "sos_window": ("iir", False, _sos_window),
+    "sos_single_sample": ("iir", True, _sos_single_sample),
+}
+
+
+def design_filters() -> dict:
+    """
+    Coefficients of the filters of the report.
+
+    Returns:
+        dict: 'b' and 'a' of the IIR bandpass filter, 'h' of the FIR lowpass filter
+    """
+    # SciPy is only needed by the report, not by the filters
+    from scipy import signal
+
+    b, a = compute_impulse_response_coefficient(
+        filter_order=IIR_ORDER, fs=SAMPLING_FREQUENCY, fc=IIR_CUTOFF, band_type="bandpass"
+    )
+    h = signal.firwin(numtaps=FIR_TAPS, cutoff=FIR_CUTOFF, fs=SAMPLING_FREQUENCY)
+    return {"b": np.asarray(b, dtype=np.float64), "a": np.asarray(a, dtype=np.float64), "h": h}
+
+
+def load_signals(pattern: str = DEFAULT_SIGNALS, max_length: int = None) -> dict:
+    """
+    Load text recordings, one sample per line.
+
+    Args:
+        pattern (str): Glob pattern of the recordings. Defaults to DEFAULT_SIGNALS.
+        max_length (int): Keep only the first max_length samples. Defaults to None.
+
+    Returns:
+        dict: Name of the file -> float64 signal
+
+    Raises:
+        ValueError: If no file matches the pattern
+    """
+    paths = sorted(glob.glob(pattern))
+    if not paths:
+        raise ValueError(f"No signal matches {pattern}")
+    return {os.path.basename(path): np.loadtxt(path)[:max_length] for path in paths}
+
+
+def run_precision_report(
+    signals: dict,
+    dtype=np.float32,
+    single_sample_length: int = 20_000,
+    name_filter: str = None,
+    design: dict = None,
+) -> list[dict]:
+    """
+    Compare every filter run in dtype with the float64 reference.
+
+    Args:
+        signals (dict): Name -> float64 signal
+        dtype (np.dtype): Floating point type of the filters and of their
+        input. Defaults to float32.
+        single_sample_length (int): Number of samples filtered by the
+        single-sample front ends. Defaults to 20000.
+        name_filter (str): Only report the filters containing this substring. Defaults to None.
+        design (dict): Filter coefficients. Defaults to design_filters().
+
+    Returns:
+        list[dict]: One row per filter with 'filter', 'dtype', 'max_abs_error',
+        'max_relative_error' and 'min_snr_db' (worst cases over the signals)
+        and 'worst_signal' (signal of the largest relative error)
+    """
+    from scipy import signal as scipy_signal
+
+    if design is None:
+        design = design_filters()
+
+    references = {}
+    for name, x in signals.items():
+        references[name] = {
+            "fir": scipy_signal.lfilter(design["h"], 1.0, x),
+            "iir": scipy_signal.lfilter(design["b"], design["a"], x),
+        }
+
+    rows = []
+    for filter_name, (reference_kind, single_sample, runner) in PRECISION_FILTERS.items():
+        if name_filter is not None and name_filter not in filter_name:
+            continue
+        row = {
+            "filter": filter_name,
+            "dtype": np.dtype(dtype).name,
+            "max_abs_error": 0.0,
+            "max_relative_error": 0.0,
+            "min_snr_db": float("inf"),
+            "worst_signal": None,
+        }
+        for name, x in signals.items():
+            length = single_sample_length if single_sample else len(x)
+            reference = references[name][reference_kind][:length]
+            y = runner(x[:length].astype(dtype), design, dtype)
+            report = error_report(y, reference)
+            relative_error = report["max_abs_error"] / max(float(np.max(np.abs(reference))), np.finfo(float).tiny)
+
+            row["max_abs_error"] = max(row["max_abs_error"], report["max_abs_error"])
+            row["min_snr_db"] = min(row["min_snr_db"], report["snr_db"])
+            if row["worst_signal"] is None or relative_error > row["max_relative_error"]:
+                row["max_relative_error"] = relative_error
+                row["worst_signal"] = name
+        rows.append(row)
+    return rows
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure the accuracy of the filters run in float32.")
+    parser.add_argument("--signals", default=DEFAULT_SIGNALS, help="Glob pattern of the text recordings")
+    parser.add_argument("--max-length", type=int, default=None, help="Only filter the first samples of every recording")
+    parser.add_argument("--single-sample-length", type=int, default=20_000, help="Samples filtered by the single-sample front ends")
+    parser.add_argument("--dtype", choices=["float32", "float64"], default="float32", help="Type of the filters")
+    parser.add_argument("-k", "--filter", dest="name_filter", default=None, help="Only report the filters containing this substring")
+    parser.add_argument("--output", default=None, help="JSON file where the report is saved")
+    args = parser.parse_args(argv)
+
+    rows = run_precision_report(
+        load_signals(args.signals, args.max_length),
+        dtype=args.dtype,
+        single_sample_length=args.single_sample_length,
+        name_filter=args.name_filter,
+    )
+    for row in rows:
+        print(
+            f"{row['filter']} ({row['dtype']}): max abs error {row['max_abs_error']:.3g}, "
+            f"max relative error {row['max_relative_error']:.3g} ({row['worst_signal']}), "
+            f"min SNR {row['min_snr_db']:.1f} dB"
+        )
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import pytest
+from benchmark.benchmark_runner.benchmark_runner import (
+    BENCHMARKS,
+    SPEEDUP_TARGETS,
+    SWEEPS,
+    check_speedups,
+    compare_results,
+    iter_cases,
+    load_results,
+    main,
+    run_benchmarks,
+    save_results,
+)
+
+# A sweep small enough to time every benchmark in a few seconds
+TINY_SWEEP = {
+    "signal_length": [300],
+    "single_sample_length": [50],
+    "taps": [4],
+    "order": [1],
+    "channels": [2],
+    "streams": [3],
+    "window_size": [64],
+    "fir_method": ["direct"],
+    "iir_backend": ["python"],
+}
+
+
+def test_run_benchmarks(tmp_path):
+    results = run_benchmarks(sweep=TINY_SWEEP, repeat=2, min_time=0.001)
+
+    # One case per benchmark, all the front ends covered
+    assert sorted(result["benchmark"] for result in results["results"].values()) == sorted(BENCHMARKS)
+    for result in results["results"].values():
+        assert result["seconds"] > 0
+        assert result["seconds"] <= result["median_seconds"]
+        assert result["samples_per_second"] == pytest.approx(result["samples"] / result["seconds"])
+
+    path = tmp_path / "results.json"
+    save_results(results, str(path))
+    assert load_results(str(path)) == results
+
+    # No regression against itself
+    assert compare_results(results, results) == []
+
+
+def test_compare_results():
+    baseline = {"results": {"a": {"seconds": 1.0}, "b": {"seconds": 1.0}, "c": {"seconds": 1.0}}}
+    results = {"results": {"a": {"seconds": 1.2}, "b": {"seconds": 2.0}, "d": {"seconds": 5.0}}}
+
+    regressions = compare_results(results, baseline, tolerance=0.25)
+    assert [regression["case"] for regression in regressions] == ["b"]
+    assert regressions[0]["ratio"] == pytest.approx(2.0)
+    assert [regression["case"] for regression in compare_results(results, baseline, tolerance=0.1)] == ["b", "a"]
+
+
+def test_check_speedups():
+    def result(benchmark, seconds, **parameters):
+        identifier = f"{benchmark}[{','.join(f'{key}={value}' for key, value in parameters.items())}]"
+        return identifier, {"benchmark": benchmark, "parameters": parameters, "seconds": seconds}
+
+    results = {
+        "results": dict(
+            [
+                result("adaptive_filter_reference_tapir", 10.0, signal_length=100, taps=8, channels=1),
+                result("adaptive_filter_reference_tapir", 10.0, signal_length=100, taps=64, channels=1),
+                result("windowed_adaptive_filter_tapir", 0.5, signal_length=100, taps=8, channels=1, window_size=64),
+                result("windowed_adaptive_filter_tapir", 2.0, signal_length=100, taps=64, channels=1, window_size=64),
+                result("windowed_adaptive_filter_tapir", 20.0, signal_length=100, taps=512, channels=1, window_size=64),
+            ]
+        )
+    }
+    misses = check_speedups(results, targets={"windowed_adaptive_filter_tapir": ("adaptive_filter_reference_tapir", 10.0)})
+
+    # The case without a reference run is not checked
+    assert [miss["case"] for miss in misses] == [
+        "windowed_adaptive_filter_tapir[signal_length=100,taps=64,channels=1,window_size=64]"
+    ]
+    assert misses[0]["reference"] == "adaptive_filter_reference_tapir[signal_length=100,taps=64,channels=1]"
+    assert misses[0]["speedup"] == pytest.approx(5.0)
+
+
+def test_main_fails_on_speedup_miss(monkeypatch):
+    # fir_array against itself is 1x faster, below a 2x target
+    monkeypatch.setitem(SPEEDUP_TARGETS, "fir_array", ("fir_array", 2.0))
+    arguments = ["-k", "fir_array[signal_length=4000,taps=8,fir_method=direct]", "--repeat", "1", "--min-time", "0.001"]
+    assert main(arguments) == 1
+
+
+def test_main_fails_on_regression(tmp_path):
+    arguments = ["-k", "fir_array[signal_length=4000,taps=8,fir_method=direct]", "--repeat", "1", "--min-time", "0.001"]
+    output = tmp_path / "results.json"
+    assert main(arguments + ["--output", str(output)]) == 0
+
+    # A baseline 100 times faster than this run
+    baseline = load_results(str(output))
+    for result in baseline["results"].values():
+        result["seconds"] /= 100
+    save_results(baseline, str(tmp_path / "baseline.json"))
+    assert main(arguments + ["--baseline", str(tmp_path / "baseline.json")]) == 1
+
+
+def test_iter_cases():
+    cases = list(iter_cases(SWEEPS["quick"], name_filter="windowed_adaptive_filter_tapir"))
+    quick = SWEEPS["quick"]
+    assert len(cases) == len(quick["signal_length"]) * len(quick["taps"]) * len(quick["channels"]) * len(quick["window_size"])
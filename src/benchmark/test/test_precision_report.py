@@ -0,0 +1,42 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import json
+
+import numpy as np
+import pytest
+from benchmark.precision_report.precision_report import PRECISION_FILTERS, load_signals, main, run_precision_report
+
+SIGNALS = "src/iir/test/considered_ppg/considered_ppg_patient_1*.txt"
+
+
+def test_run_precision_report():
+    signals = load_signals(SIGNALS, max_length=6000)
+    assert len(signals) > 1
+
+    rows = run_precision_report(signals, dtype=np.float32, single_sample_length=2000)
+    assert [row["filter"] for row in rows] == list(PRECISION_FILTERS)
+    for row in rows:
+        assert row["dtype"] == "float32"
+        assert row["worst_signal"] in signals
+        # float32 keeps about 7 significant digits of the output peak
+        assert row["max_relative_error"] < 1e-5
+        assert row["min_snr_db"] > 100
+
+    # In float64 the filters match the reference up to rounding
+    for row in run_precision_report(signals, dtype=np.float64, single_sample_length=2000, name_filter="array"):
+        assert "array" in row["filter"]
+        assert row["max_relative_error"] < 1e-8
+
+
+def test_precision_report_main(tmp_path):
+    output = tmp_path / "precision.json"
+    assert main(["--signals", SIGNALS, "--max-length", "2000", "-k", "sos", "--output", str(output)]) == 0
+    with open(output) as f:
+        rows = json.load(f)
+    assert [row["filter"] for row in rows] == ["sos_array", "sos_window", "sos_single_sample"]
+
+    with pytest.raises(ValueError):
+        load_signals("no_such_folder/*.txt")
@@ -0,0 +1,53 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import numpy as np
+from state_buffer.state_buffer import STATE_MAGIC, pack_state, read_state_header, unpack_state
+
+
+def test_pack_state():
+    values = np.arange(12, dtype=np.float32).reshape(3, 4)
+    state = pack_state("SOSFilter", (3,), values)
+    assert isinstance(state, bytes)
+    assert state.startswith(STATE_MAGIC)
+
+    header = read_state_header(state)
+    assert header["kind"] == "SOSFilter"
+    assert header["shape"] == (3,)
+    assert header["size"] == 12
+    assert header["offset"] % 8 == 0
+
+    # The values come back as float64, without a copy of the payload
+    restored = unpack_state(state, "SOSFilter", (3,), 12)
+    assert restored.dtype == np.float64
+    assert np.array_equal(restored, values.ravel())
+    assert not restored.flags.writeable
+
+    # Any buffer holding a state can be restored, e.g. a slice of a larger message
+    message = bytearray(b"\0" * 8 + state)
+    assert np.array_equal(unpack_state(memoryview(message)[8:], "SOSFilter", (3,), 12), values.ravel())
+
+    # Empty states and shapes of several dimensions
+    assert unpack_state(pack_state("IIRWindowArray", (0,), []), "IIRWindowArray", (0,), 0).size == 0
+    assert read_state_header(pack_state("FIRResampler", (2, 3, 11), np.zeros(11)))["shape"] == (2, 3, 11)
+
+
+def test_unpack_state_invalid():
+    state = pack_state("SOSFilter", (3,), np.zeros(12))
+    with pytest.raises(ValueError, match="cannot be restored into a IIRWindowArray"):
+        unpack_state(state, "IIRWindowArray", (3,), 12)
+    with pytest.raises(ValueError, match="shape"):
+        unpack_state(state, "SOSFilter", (2,), 8)
+    with pytest.raises(ValueError, match="values"):
+        unpack_state(state, "SOSFilter", (3,), 13)
+    with pytest.raises(ValueError, match="truncated"):
+        unpack_state(state[:-4], "SOSFilter", (3,), 12)
+    with pytest.raises(ValueError, match="not a filter state"):
+        unpack_state(b"\0" * len(state), "SOSFilter", (3,), 12)
+    with pytest.raises(ValueError, match="too short"):
+        read_state_header(b"DF")
+    with pytest.raises(ValueError, match="version"):
+        read_state_header(state[:4] + b"\x02" + state[5:])
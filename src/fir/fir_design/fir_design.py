@@ -0,0 +1,215 @@
+"""
+Batched windowed-sinc FIR design.
+
+design_fir_filters designs many linear-phase filters at once, e.g. the
+candidates of a parameter sweep: all the filters are computed together on a
+(filters, taps) grid, without a Python loop over the designs. The sinusoids
+of the ideal responses come from a recurrence rather than a sine per
+coefficient, and the windows, which only depend on the order, are computed
+once per distinct order. Row i of the result holds the orders[i] + 1
+coefficients of filter i followed by zeros, which can be used directly as
+FIR taps: trailing zeros do not change the output, only the length.
+"""
+from typing import Literal, Union
+
+import numpy as np
+
+BandType = Literal["low", "high", "bandpass", "bandstop"]
+Window = Literal["rectangular", "hamming", "hann", "blackman", "kaiser"]
+
+
+def design_fir_filters(
+    filter_orders: Union[int, np.ndarray],
+    cutoffs: Union[float, np.ndarray],
+    fs: float = 2,
+    band_type: BandType = "low",
+    window: Window = "hamming",
+    beta: Union[float, np.ndarray] = 8.6,
+) -> np.ndarray:
+    """
+    Design windowed-sinc FIR filters in one vectorized pass.
+
+    The ideal response is windowed, then scaled to a unit gain at the center
+    of the passband: DC for low-pass and band-stop filters, the Nyquist
+    frequency for high-pass filters and the center of the band for
+    band-pass filters, as scipy.signal.firwin does. A low-pass filter with
+    the Hamming window is the filter of compute_impulse_response_coefficient
+    in fir/main.py.
+
+    Args:
+        filter_orders (int | np.ndarray): Order of every filter, of shape
+        (filters,), or a single order for all of them
+        cutoffs (float | np.ndarray): Cutoff frequencies in Hz. One per filter,
+        of shape (filters,), for low and high-pass filters, a pair per filter,
+        of shape (filters, 2), for band-pass and band-stop filters. A single
+        cutoff (or pair) is used for all the filters.
+        fs (float): Sampling frequency in Hz. Defaults to 2Hz, for cutoffs
+        relative to the Nyquist frequency.
+        band_type (str): 'low', 'high', 'bandpass' or 'bandstop'. Defaults to 'low'.
+        window (str): 'rectangular', 'hamming', 'hann', 'blackman' or
+        'kaiser'. Defaults to 'hamming'.
+        beta (float | np.ndarray): Shape parameter of the Kaiser window, one
+        per filter or a single value. Defaults to 8.6.
+
+    Returns:
+        np.ndarray: Coefficients of shape (filters, max(filter_orders) + 1),
+        each row padded with zeros after its filter_orders[i] + 1 coefficients
+
+    Raises:
+        ValueError: If band_type or window is not supported
+        ValueError: If an order is negative, or odd for a high-pass or band-stop filter
+        ValueError: If a cutoff is not between 0 and the Nyquist frequency,
+        or a band is not increasing
+    """
+    if band_type not in ("low", "high", "bandpass", "bandstop"):
+        raise ValueError("band_type must be 'low', 'high', 'bandpass' or 'bandstop'")
+    if window not in ("rectangular", "hamming", "hann", "blackman", "kaiser"):
+        raise ValueError("window must be 'rectangular', 'hamming', 'hann', 'blackman' or 'kaiser'")
+
+    band = band_type in ("bandpass", "bandstop")
+    # Cutoffs relative to the Nyquist frequency, one row per filter
+    cutoffs = np.asarray(cutoffs, dtype=np.float64) / (fs / 2)
+    cutoffs = cutoffs.reshape(-1, 2) if band else cutoffs.reshape(-1, 1)
+    filter_orders = np.asarray(filter_orders).reshape(-1, 1)
+    if not np.issubdtype(filter_orders.dtype, np.integer):
+        if np.any(filter_orders != np.round(filter_orders)):
+            raise ValueError("Filter orders must be integers")
+        filter_orders = filter_orders.astype(np.int64)
+    number_of_filters = np.broadcast_shapes((len(filter_orders),), (len(cutoffs),), np.shape(np.ravel(beta)))[0]
+    filter_orders = np.broadcast_to(filter_orders, (number_of_filters, 1))
+    cutoffs = np.broadcast_to(cutoffs, (number_of_filters, cutoffs.shape[1]))
+
+    if np.any(filter_orders < 0):
+        raise ValueError("Filter orders must not be negative")
+    if band_type in ("high", "bandstop") and np.any(filter_orders % 2):
+        raise ValueError(f"A {band_type} filter needs an even order: odd orders have a zero at the Nyquist frequency")
+    if np.any(cutoffs <= 0) or np.any(cutoffs >= 1):
+        raise ValueError("Cutoff frequencies must be between 0 and the Nyquist frequency")
+    if band and np.any(cutoffs[:, 0] >= cutoffs[:, 1]):
+        raise ValueError("Band cutoff frequencies must be increasing")
+
+    orders = filter_orders[:, 0]
+    number_of_taps = int(orders.max(initial=0)) + 1
+    center = orders / 2
+
+    # Windowed 1 / (pi * t) of every tap of every filter, t being the time
+    # from the center of the filter and the value zero past its end. It only
+    # depends on the order (and the Kaiser beta), so it is computed once per
+    # distinct window and gathered, tap-major like the sinusoids.
+    beta = np.broadcast_to(np.ravel(np.asarray(beta, dtype=np.float64)), (number_of_filters,))
+    if window == "kaiser" and number_of_filters and np.ptp(beta) > 0:
+        keys, index = np.unique(np.column_stack((orders, beta)), axis=0, return_inverse=True)
+        key_orders, key_beta, index = keys[:, 0], keys[:, 1], index.ravel()
+    else:
+        key_orders = np.arange(number_of_taps)
+        key_beta = np.full(number_of_taps, beta[0] if number_of_filters else 0.0)
+        index = orders
+    tap_gains = np.ascontiguousarray(_tap_gains(window, key_orders, key_beta, number_of_taps).T)[:, index]
+
+    # Ideal responses, as differences of low-pass filters sin(pi w t) / (pi t)
+    if band:
+        h = _sinusoids(-np.pi * cutoffs[:, 1] * center, np.pi * cutoffs[:, 1], number_of_taps)
+        h -= _sinusoids(-np.pi * cutoffs[:, 0] * center, np.pi * cutoffs[:, 0], number_of_taps)
+        center_value = cutoffs[:, 1] - cutoffs[:, 0]
+    else:
+        h = _sinusoids(-np.pi * cutoffs[:, 0] * center, np.pi * cutoffs[:, 0], number_of_taps)
+        center_value = cutoffs[:, 0]
+    h *= tap_gains
+    if band_type in ("high", "bandstop"):
+        # A unit impulse minus the complementary filter
+        h = -h
+        center_value = 1 - center_value
+    # At the center tap of even orders, where all the windows are 1, the
+    # response is the limit of sin(pi w t) / (pi t)
+    even = np.flatnonzero(orders % 2 == 0)
+    h[orders[even] // 2, even] = center_value[even]
+
+    # Unit gain at the center of the passband: the response of a
+    # linear-phase filter there is sum_k h[k] cos(pi * f * (k - center))
+    if band_type == "high":
+        # cos(pi * t), with t an integer for the even orders of high-pass filters
+        gain = (np.sum(h[::2], axis=0) - np.sum(h[1::2], axis=0)) * np.where(orders % 4, -1, 1)
+    elif band_type == "bandpass":
+        frequency = np.pi * cutoffs.mean(axis=1)
+        gain = np.sum(h * _sinusoids(np.pi / 2 - frequency * center, frequency, number_of_taps), axis=0)
+    else:
+        gain = np.sum(h, axis=0)
+    h /= gain
+    return np.ascontiguousarray(h.T)
+
+
+# Number of taps after which the sinusoid recurrence restarts from exact values
+RECURRENCE_RESTART = 64
+
+
+def _sinusoids(phase: np.ndarray, step: np.ndarray, number_of_taps: int) -> np.ndarray:
+    """
+    sin(phase + k * step) for k in [0, number_of_taps), on a (taps, filters) grid.
+
+    The values come from the recurrence s[k] = 2 cos(step) s[k - 1] - s[k - 2],
+    one multiply-add per value instead of a sine, restarted from exact values
+    every RECURRENCE_RESTART taps to bound the growth of rounding errors.
+
+    Args:
+        phase (np.ndarray): Phase at the first tap, of shape (filters,)
+        step (np.ndarray): Phase increment per tap, of shape (filters,)
+        number_of_taps (int): Number of taps
+
+    Returns:
+        np.ndarray: Values of shape (number_of_taps, filters), tap-major so
+        that every step of the recurrence writes a contiguous row
+    """
+    twice_cos_step = 2 * np.cos(step)
+    s = np.empty((number_of_taps, len(phase)))
+    for k in range(number_of_taps):
+        if k % RECURRENCE_RESTART < 2:
+            s[k] = np.sin(phase + k * step)
+        else:
+            np.multiply(twice_cos_step, s[k - 1], out=s[k])
+            s[k] -= s[k - 2]
+    return s
+
+
+def _tap_gains(window: str, filter_orders: np.ndarray, beta: np.ndarray, number_of_taps: int) -> np.ndarray:
+    """
+    Window divided by pi * t for the given orders, on a (orders, taps) grid.
+
+    Past the end of a filter the gains are zero. At the center tap of even
+    orders, where t is zero, the gain is the window value, 1.
+
+    Args:
+        window (str): Window name, see design_fir_filters
+        filter_orders (np.ndarray): Orders, of shape (orders,)
+        beta (np.ndarray): Kaiser beta of every order, of shape (orders,)
+        number_of_taps (int): Number of taps of the grid
+
+    Returns:
+        np.ndarray: Gains of shape (orders, number_of_taps)
+    """
+    filter_orders = filter_orders[:, np.newaxis]
+    taps = np.arange(number_of_taps)
+    # Position of every tap in [0, 1] along its filter; a filter of order 0
+    # has a single tap, where the windows are 1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        position = np.where(filter_orders > 0, taps / filter_orders, 0.5)
+
+    if window == "rectangular":
+        w = np.ones(position.shape)
+    elif window == "kaiser":
+        argument = np.clip(1 - (2 * position - 1) ** 2, 0, None)
+        w = np.i0(beta[:, np.newaxis] * np.sqrt(argument)) / np.i0(beta[:, np.newaxis])
+    else:
+        phase = np.cos(2 * np.pi * position)
+        if window == "hamming":
+            w = 0.54 - 0.46 * phase
+        elif window == "hann":
+            w = 0.5 - 0.5 * phase
+        else:
+            w = 0.42 - 0.5 * phase + 0.08 * np.cos(4 * np.pi * position)
+        w[filter_orders[:, 0] == 0] = 1
+
+    t = taps - filter_orders / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gains = np.where(t == 0, w, w / (np.pi * t))
+    gains[taps > filter_orders] = 0
+    return gains
@@ -0,0 +1,278 @@
+"""
+Polyphase FIR filters for sample-rate conversion by a rational factor up / down.
+
+Resampling by up / down is, in principle, inserting up - 1 zeros between the
+input samples, low-pass filtering at up times the input rate, and keeping one
+sample out of down. The polyphase form computes only the kept output samples
+and skips the products with the inserted zeros: the filter is split into up
+phases, h_p[j] = h[p + j * up], and each output sample is the dot product of
+one phase with the last input samples. Decimating by down costs
+len(h) / down products per input sample instead of len(h).
+"""
+from math import gcd
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from filter_state.state_buffer.state_buffer import StateBuffer, pack_state, unpack_state
+from fir.fir_array.fir_array import DIRECT_BLOCK_SIZE
+from fir.main import compute_impulse_response_coefficient
+
+
+def design_resampling_filter(up: int, down: int, filter_order: int = None) -> np.ndarray:
+    """
+    Windowed-sinc anti-aliasing and anti-imaging filter for resampling by up / down.
+
+    The low-pass filter runs at up times the input rate, with its cutoff at
+    the lower of the input and output Nyquist frequencies, and has a gain of
+    up to compensate for the inserted zeros.
+
+    Args:
+        up (int): Upsampling factor
+        down (int): Downsampling factor
+        filter_order (int): Filter order. Defaults to 20 * max(up, down),
+        which gives 10 input samples per phase on each side of the center.
+
+    Returns:
+        np.ndarray: Filter coefficients, of length filter_order + 1
+    """
+    if filter_order is None:
+        filter_order = 20 * max(up, down)
+    # At the upsampled rate, normalized to a Nyquist frequency of 1
+    return up * compute_impulse_response_coefficient(filter_order=filter_order, fs=2, fc=1 / max(up, down))
+
+
+class FIRResampler:
+    def __init__(self, up: int = 1, down: int = 1, h=None, filter_order: int = None):
+        """
+        Initialize a polyphase resampler by the rational factor up / down.
+
+        The output sample m is the filtered upsampled signal at index m * down,
+        so the first output sample is aligned with the first input sample.
+        The filter is causal: a linear-phase filter of order N delays the
+        signal by N / 2 samples of the upsampled rate.
+
+        Args:
+            up (int): Upsampling factor. Defaults to 1.
+            down (int): Downsampling factor. Defaults to 1.
+            h (array): Filter coefficients at the upsampled rate, with a gain
+            of up. Defaults to None, which uses design_resampling_filter.
+            filter_order (int): Order of the designed filter, when h is None.
+            Defaults to None, see design_resampling_filter.
+
+        Raises:
+            ValueError: If up or down is not a positive integer
+            ValueError: If the filter coefficients are not a non-empty 1D array
+        """
+        if int(up) != up or int(down) != down or up < 1 or down < 1:
+            raise ValueError("up and down must be positive integers")
+        # Resampling by 4 / 2 is resampling by 2 / 1
+        common_factor = gcd(int(up), int(down))
+        self.up = int(up) // common_factor
+        self.down = int(down) // common_factor
+
+        if h is None:
+            h = design_resampling_filter(self.up, self.down, filter_order)
+        self.h = np.asarray(h, dtype=np.float64)
+        if self.h.ndim != 1 or len(self.h) == 0:
+            raise ValueError("Filter coefficients must be a non-empty 1D array")
+
+        # Phase p holds h[p], h[p + up], h[p + 2 up], ... stored reversed,
+        # oldest input first, to be applied to windows of the input signal
+        self.taps_per_phase = -(-len(self.h) // self.up)
+        h_padded = np.zeros(self.taps_per_phase * self.up)
+        h_padded[: len(self.h)] = self.h
+        self._phases = np.ascontiguousarray(h_padded.reshape(self.taps_per_phase, self.up).T[:, ::-1])
+        # Most recent input first, for the single-sample mode
+        self._phases_list = self._phases[:, ::-1].tolist()
+
+        self.reset()
+
+    def output_length(self, input_length: int) -> int:
+        """
+        Number of output samples of apply_fir_filter for an input of input_length samples.
+
+        Args:
+            input_length (int): Number of input samples
+
+        Returns:
+            int: ceil(input_length * up / down)
+        """
+        return -(-input_length * self.up // self.down)
+
+    def apply_fir_filter(self, x) -> np.ndarray:
+        """
+        Resample a whole signal, starting from zero state.
+
+        The state of the windowed and single-sample modes is neither used nor modified.
+
+        Args:
+            x (array): Input signal
+
+        Returns:
+            np.ndarray: Resampled signal of output_length(len(x)) samples
+        """
+        input_signal = np.asarray(x, dtype=np.float64).ravel()
+        y, _ = self._resample(np.zeros(self.taps_per_phase - 1), input_signal, 0)
+        return y
+
+    def apply_fir_filter_window(self, x) -> np.ndarray:
+        """
+        Resample a signal window while maintaining state between calls.
+
+        Windows of any length can be used: the concatenated outputs are the
+        output of apply_fir_filter on the concatenated inputs.
+
+        Args:
+            x (array): Input signal window
+
+        Returns:
+            np.ndarray: Output samples whose position falls in the window
+        """
+        input_signal = np.asarray(x, dtype=np.float64).ravel()
+        y, self._position = self._resample(self.x_history, input_signal, self._position)
+        history_length = self.taps_per_phase - 1
+        if history_length:
+            self.x_history = np.concatenate([self.x_history, input_signal])[-history_length:]
+        self._input_buffer = self.x_history[::-1].tolist() + [0.0]
+        return y
+
+    def apply_fir_filter_single_sample(self, x: float) -> list[float]:
+        """
+        Resample one input sample while maintaining state between calls.
+
+        Args:
+            x (float): Input sample
+
+        Returns:
+            list[float]: The output samples produced by this input sample, from
+            none (when decimating) to ceil(up / down)
+        """
+        input_buffer = self._input_buffer
+        input_buffer.insert(0, float(x))
+        input_buffer.pop()
+
+        outputs = []
+        position = self._position
+        while position < self.up:
+            phase = self._phases_list[position]
+            outputs.append(sum(coefficient * sample for coefficient, sample in zip(phase, input_buffer)))
+            position += self.down
+        self._position = position - self.up
+        if self.taps_per_phase > 1:
+            self.x_history = np.asarray(input_buffer[-2::-1])
+        return outputs
+
+    def reset(self):
+        """Reset the filter state."""
+        # Previous inputs, oldest first
+        self.x_history = np.zeros(self.taps_per_phase - 1)
+        # Previous inputs, most recent first, with a slot for the new sample
+        self._input_buffer = [0.0] * self.taps_per_phase
+        # Upsampled index of the next output, relative to the next input sample
+        self._position = 0
+
+    def get_state(self) -> bytes:
+        """
+        Snapshot of the windowed and single-sample state, to continue the stream elsewhere with set_state.
+
+        Returns:
+            bytes: The position of the next output, then the input history,
+            oldest first, see filter_state.state_buffer
+        """
+        values = np.empty(self.taps_per_phase)
+        values[0] = self._position
+        values[1:] = self.x_history
+        return pack_state("FIRResampler", (self.up, self.down, self.taps_per_phase), values)
+
+    def set_state(self, state: StateBuffer):
+        """
+        Restore a state returned by get_state.
+
+        Args:
+            state (bytes): State of a resampler with the same factors and number of taps per phase
+
+        Raises:
+            ValueError: If the state was taken from another kind of filter, or
+            a resampler with other factors or another filter length
+        """
+        values = unpack_state(state, "FIRResampler", (self.up, self.down, self.taps_per_phase), self.taps_per_phase)
+        self._position = int(values[0])
+        self.x_history = values[1:].copy()
+        self._input_buffer = self.x_history[::-1].tolist() + [0.0]
+
+    def _resample(self, x_history: np.ndarray, x: np.ndarray, position: int) -> tuple[np.ndarray, int]:
+        """
+        Compute the output samples falling in a block of input samples.
+
+        Args:
+            x_history (np.ndarray): The taps_per_phase - 1 inputs before x, oldest first
+            x (np.ndarray): Input block
+            position (int): Upsampled index of the first output, relative to x[0]
+
+        Returns:
+            tuple[np.ndarray, int]: Output samples and the position of the next
+            output, relative to the sample after x
+        """
+        up, down = self.up, self.down
+        input_length = len(x)
+        output_length = max(0, -(-(input_length * up - position) // down))
+        y = np.empty(output_length)
+        if output_length == 0:
+            return y, position - input_length * up
+
+        # Row n holds the inputs x[n - taps_per_phase + 1 .. n], oldest first
+        windows = sliding_window_view(np.concatenate([x_history, x]), self.taps_per_phase)
+        # Outputs r, r + up, r + 2 up, ... share a phase, and their inputs
+        # are down samples apart: each group is a matrix-vector product,
+        # computed on contiguous copies of blocks of the strided windows
+        for r in range(min(up, output_length)):
+            t = position + r * down
+            group = windows[t // up :: down][: len(range(r, output_length, up))]
+            y_group = y[r::up]
+            phase = self._phases[t % up]
+            for start in range(0, len(group), DIRECT_BLOCK_SIZE):
+                stop = start + DIRECT_BLOCK_SIZE
+                y_group[start:stop] = np.ascontiguousarray(group[start:stop]) @ phase
+        return y, position + output_length * down - input_length * up
+
+
+class FIRDecimator(FIRResampler):
+    def __init__(self, down: int, h=None, filter_order: int = None):
+        """
+        Initialize a polyphase decimator, keeping one output sample out of down.
+
+        Only the kept output samples are computed.
+
+        Args:
+            down (int): Decimation factor
+            h (array): Filter coefficients. Defaults to None, which designs a
+            windowed-sinc low-pass filter with its cutoff at the output Nyquist frequency.
+            filter_order (int): Order of the designed filter, when h is None.
+            Defaults to None, see design_resampling_filter.
+
+        Raises:
+            ValueError: If down is not a positive integer
+        """
+        super().__init__(up=1, down=down, h=h, filter_order=filter_order)
+
+
+class FIRInterpolator(FIRResampler):
+    def __init__(self, up: int, h=None, filter_order: int = None):
+        """
+        Initialize a polyphase interpolator, producing up output samples per input sample.
+
+        The inserted zeros are never multiplied.
+
+        Args:
+            up (int): Interpolation factor
+            h (array): Filter coefficients at the output rate, with a gain of
+            up. Defaults to None, which designs a windowed-sinc low-pass filter
+            with its cutoff at the input Nyquist frequency.
+            filter_order (int): Order of the designed filter, when h is None.
+            Defaults to None, see design_resampling_filter.
+
+        Raises:
+            ValueError: If up is not a positive integer
+        """
+        super().__init__(up=up, down=1, h=h, filter_order=filter_order)
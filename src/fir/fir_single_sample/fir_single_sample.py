@@ -1,22 +1,63 @@
 import numpy as np
 
+from filter_state.state_buffer.state_buffer import StateBuffer, pack_state, unpack_state
+from fixed_point.q_format.q_format import QFormat, wrap
+
 
 class FIRSingleSample:
-    def __init__(self, filter_order: int, coefficients: np.ndarray):
+    def __init__(
+        self,
+        filter_order: int,
+        coefficients: np.ndarray,
+        data_format: QFormat = None,
+        coefficient_format: QFormat = None,
+        accumulator_bits: int = 64,
+        dtype=np.float64,
+    ):
         """
         Initialize FIR filter with filter order and coefficients.
 
         Args:
             filter_order (int): Filter order
             coefficients (array): Filter coefficients
+            data_format (QFormat): Format of the input and output samples to
+            simulate the filter in fixed-point arithmetic (see
+            FIRArray.apply_fir_filter_fixed_point, with which it is bit-exact).
+            Defaults to None, which filters in floating point.
+            coefficient_format (QFormat): Format of the coefficients in
+            fixed-point mode. Defaults to the format with the word length of
+            data_format and as many fractional bits as the coefficients allow.
+            accumulator_bits (int): Size of the accumulator in fixed-point
+            mode, at most 64. Defaults to 64.
+            dtype (np.dtype): Floating point type of the coefficients, the
+            input buffer and the output, float32 or float64. Defaults to float64.
 
         Returns:
             None
+
+        Raises:
+            ValueError: If accumulator_bits is not in [2, 64]
+            ValueError: If dtype is not float32 or float64
         """
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float64):
+            raise ValueError("dtype must be float32 or float64")
         self.filter_order = filter_order
         self.number_of_taps = filter_order + 1
-        self.coefficients = coefficients
-        self.input_buffer = np.zeros(filter_order)
+        self.coefficients = np.asarray(coefficients, dtype=self.dtype)
+        self.input_buffer = np.zeros(filter_order, dtype=self.dtype)
+
+        self.data_format = data_format
+        if data_format is not None:
+            if not 2 <= accumulator_bits <= 64:
+                raise ValueError("accumulator_bits must be between 2 and 64")
+            if coefficient_format is None:
+                coefficient_format = QFormat.for_values(coefficients, data_format.word_length)
+            self.coefficient_format = coefficient_format
+            self.accumulator_bits = accumulator_bits
+            self.coefficients_q = [int(c) for c in coefficient_format.quantize(np.asarray(coefficients, dtype=np.float64))]
+            # Quantized input samples, most recent first
+            self.input_buffer_q = [0] * filter_order
 
     def apply_fir_filter(self, x: float) -> float:
         """
@@ -28,6 +69,10 @@ class FIRSingleSample:
         Returns:
             float: Filtered sample
         """
+        if self.data_format is not None:
+            return self._apply_fir_filter_fixed_point(x)
+
+        x = self.dtype.type(x)
         out_filtered = x * self.coefficients[0]
         for i in range(1, self.number_of_taps):
             out_filtered = (
@@ -39,4 +84,63 @@ class FIRSingleSample:
             self.input_buffer[self.number_of_taps - 1 - i] = self.input_buffer[
                 self.number_of_taps - 2 - i
             ]
-        self.input_buffer[0] = x
+        if self.number_of_taps > 1:
+            self.input_buffer[0] = x
+
+        return out_filtered
+
+    def get_state(self) -> bytes:
+        """
+        Snapshot of the input buffer, to continue the stream elsewhere with set_state.
+
+        Returns:
+            bytes: The past inputs, most recent first (the quantized integers
+            in fixed-point mode), see filter_state.state_buffer
+        """
+        if self.data_format is not None:
+            return pack_state("FIRSingleSample/fixed_point", (self.filter_order,), self.input_buffer_q)
+        return pack_state("FIRSingleSample", (self.filter_order,), self.input_buffer)
+
+    def set_state(self, state: StateBuffer):
+        """
+        Restore a state returned by get_state.
+
+        Args:
+            state (bytes): State of a filter of the same order and arithmetic
+
+        Raises:
+            ValueError: If the state was taken from another kind of filter or another order
+        """
+        if self.data_format is None:
+            self.input_buffer[...] = unpack_state(state, "FIRSingleSample", (self.filter_order,), self.filter_order)
+            return
+        values = unpack_state(state, "FIRSingleSample/fixed_point", (self.filter_order,), self.filter_order)
+        self.input_buffer_q[:] = [int(value) for value in values.tolist()]
+        self.input_buffer[...] = self.data_format.to_float(values)
+
+    def _apply_fir_filter_fixed_point(self, x: float) -> float:
+        """
+        Apply the FIR filter to an input sample in fixed-point arithmetic.
+
+        Args:
+            x (float): Input sample
+
+        Returns:
+            float: Filtered sample, dequantized
+        """
+        data_format = self.data_format
+        x_q = data_format.quantize(x)
+
+        accumulator = x_q * self.coefficients_q[0]
+        for i in range(1, self.number_of_taps):
+            accumulator = wrap(accumulator + self.input_buffer_q[i - 1] * self.coefficients_q[i], self.accumulator_bits)
+        accumulator = wrap(accumulator, self.accumulator_bits)
+
+        if self.filter_order > 0:
+            self.input_buffer_q.pop()
+            self.input_buffer_q.insert(0, x_q)
+            self.input_buffer[1:] = self.input_buffer[:-1]
+            self.input_buffer[0] = data_format.to_float(x_q)
+
+        y_q = data_format.rescale(accumulator, data_format.fractional_bits + self.coefficient_format.fractional_bits)
+        return data_format.to_float(y_q)
@@ -0,0 +1,127 @@
+import numpy as np
+
+from filter_state.state_buffer.state_buffer import StateBuffer, pack_state, unpack_state
+from fir.fir_single_sample.fir_single_sample import FIRSingleSample
+
+
+class FIRWindowArray:
+    def __init__(self, h, dtype=np.float64):
+        """
+        Initialize FIR filter that maintains state between signal windows.
+
+        The last taps - 1 input samples are kept between calls, so filtering
+        a signal window by window gives exactly the same output as filtering
+        it in one call.
+
+        Args:
+            h (array): Filter coefficients
+            dtype (np.dtype): Floating point type of the coefficients, the
+            input history and the output, float32 or float64. Defaults to float64.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If the filter coefficients are not a non-empty 1D array
+            ValueError: If dtype is not float32 or float64
+        """
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float64):
+            raise ValueError("dtype must be float32 or float64")
+        self.h = np.asarray(h, dtype=self.dtype)
+        if self.h.ndim != 1 or len(self.h) == 0:
+            raise ValueError("Filter coefficients must be a non-empty 1D array")
+        self.taps = len(self.h)
+
+        # Previous inputs, oldest first
+        self.x_history = np.zeros(self.taps - 1, dtype=self.dtype)
+
+    @classmethod
+    def from_single_sample(cls, fir_single_sample: FIRSingleSample) -> "FIRWindowArray":
+        """
+        Create a windowed filter that continues from the state of a single-sample filter.
+
+        Args:
+            fir_single_sample (FIRSingleSample): Filter to take coefficients and input buffer from
+
+        Returns:
+            FIRWindowArray: Filter with the same coefficients, history and dtype
+        """
+        fir_window_array = cls(fir_single_sample.coefficients, dtype=fir_single_sample.dtype)
+        # The single-sample buffer holds the most recent input first
+        fir_window_array.x_history = np.asarray(fir_single_sample.input_buffer, dtype=fir_window_array.dtype)[::-1].copy()
+        return fir_window_array
+
+    def to_single_sample(self) -> FIRSingleSample:
+        """
+        Create a single-sample filter that continues from the current state.
+
+        Returns:
+            FIRSingleSample: Filter with the same coefficients, history and dtype
+        """
+        fir_single_sample = FIRSingleSample(filter_order=self.taps - 1, coefficients=self.h.copy(), dtype=self.dtype)
+        fir_single_sample.input_buffer = self.x_history[::-1].copy()
+        return fir_single_sample
+
+    def apply_fir_filter(self, x, out=None):
+        """
+        Apply FIR filter to input signal while maintaining state between calls.
+
+        Args:
+            x (array): Input signal window, of any length
+            out (array): Optional array of the same length as x where the
+            output is written. It may be x itself. Defaults to None, which
+            allocates a new array of the filter dtype.
+
+        Returns:
+            array: Filtered signal window (out, when given)
+
+        Raises:
+            ValueError: If out does not have the same length as x
+        """
+        # Ensure input is a numpy array
+        input_signal = np.asarray(x, dtype=self.dtype).flatten()
+        input_signal_length = len(input_signal)
+        if out is not None and out.shape != (input_signal_length,):
+            raise ValueError("out must be a 1D array with the same length as the input signal")
+
+        # Create extended input signal with history
+        x_extended = np.concatenate([self.x_history, input_signal])
+
+        # Accumulate one tap at a time over the whole window. Every output
+        # sample is computed with the same operations in the same order
+        # whatever the window boundaries (and as in FIRSingleSample).
+        history_length = self.taps - 1
+        y = np.multiply(x_extended[history_length:], self.h[0], out=out)
+        for k in range(1, self.taps):
+            y += x_extended[history_length - k : history_length - k + input_signal_length] * self.h[k]
+
+        # Update state for next window
+        self.x_history = x_extended[len(x_extended) - history_length :].copy()
+
+        return y
+
+    def get_state(self) -> bytes:
+        """
+        Snapshot of the input history, to continue the stream elsewhere with set_state.
+
+        Returns:
+            bytes: The last taps - 1 inputs, oldest first, see filter_state.state_buffer
+        """
+        return pack_state("FIRWindowArray", (self.taps,), self.x_history)
+
+    def set_state(self, state: StateBuffer):
+        """
+        Restore a state returned by get_state.
+
+        Args:
+            state (bytes): State of a filter with the same number of taps
+
+        Raises:
+            ValueError: If the state was taken from another kind of filter or another number of taps
+        """
+        self.x_history = unpack_state(state, "FIRWindowArray", (self.taps,), self.taps - 1).astype(self.dtype)
+
+    def reset(self):
+        """Reset the filter state."""
+        self.x_history = np.zeros(self.taps - 1, dtype=self.dtype)
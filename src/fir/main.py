@@ -1,6 +1,4 @@
 import numpy as np
-from scipy import signal
-from fir_array.fir_array import FIRArray
 
 
 def compute_impulse_response_coefficient(
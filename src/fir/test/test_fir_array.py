@@ -0,0 +1,295 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import numpy as np
+from scipy import signal
+from fir_array.fir_array import FIRArray
+from fir.fir_single_sample.fir_single_sample import FIRSingleSample
+from fir.fir_window_array.fir_window_array import FIRWindowArray
+from fir.fir_design.fir_design import design_fir_filters
+from fir.fir_resampler.fir_resampler import FIRDecimator, FIRInterpolator, FIRResampler
+from fir.main import compute_impulse_response_coefficient
+from fixed_point.q_format.q_format import Q15, Q31, QFormat, error_report
+
+
+@pytest.mark.parametrize("method", ["auto", "direct", "fft", "overlap_save"])
+@pytest.mark.parametrize("taps", [1, 5, 31, 101, 513])
+def test_apply_fir_filter_array(method, taps):
+    # Load input signal
+    with open("src/iir/test/input_signal.txt", "rb") as f:
+        input_signal = np.loadtxt(f)
+
+    h = signal.firwin(numtaps=taps, cutoff=4, fs=64) if taps > 1 else np.array([0.5])
+
+    y = FIRArray.apply_fir_filter(x=input_signal, h=h, method=method)
+
+    # Compute the expected output signal with scipy
+    y_scipy = signal.lfilter(b=h, a=1, x=input_signal)
+
+    max_abs_diff = np.max(np.abs(y - y_scipy))
+
+    assert y.shape == input_signal.shape
+    assert max_abs_diff < 1e-12 * np.max(np.abs(y_scipy))
+
+
+@pytest.mark.parametrize("method", ["direct", "fft", "overlap_save"])
+def test_apply_fir_filter_array_short_signal(method):
+    h = np.array([0.1, 0.2, 0.3, 0.2, 0.1])
+    assert FIRArray.apply_fir_filter(x=np.zeros(0), h=h, method=method).shape == (0,)
+    for length in [1, 3, 7]:
+        x = np.arange(length, dtype=float)
+        y = FIRArray.apply_fir_filter(x=x, h=h, method=method)
+        assert np.allclose(y, signal.lfilter(b=h, a=1, x=x), atol=1e-12)
+
+
+def test_apply_fir_filter_array_invalid_method():
+    with pytest.raises(ValueError):
+        FIRArray.apply_fir_filter(x=np.zeros(8), h=np.ones(3), method="winograd")
+
+
+def test_apply_fir_filter_array_dtype():
+    h = np.array([0.1, 0.2, 0.3, 0.2, 0.1])
+    x = np.random.default_rng(0).standard_normal(100)
+
+    # The dtype of floating point inputs is kept, other inputs give float64
+    assert FIRArray.apply_fir_filter(x=x.astype(np.float32), h=h).dtype == np.float32
+    assert FIRArray.apply_fir_filter(x=x, h=h).dtype == np.float64
+    assert FIRArray.apply_fir_filter(x=np.arange(10), h=h).dtype == np.float64
+    assert FIRArray.apply_fir_filter(x=x.astype(np.float32), h=h, dtype=np.float64).dtype == np.float64
+    with pytest.raises(ValueError):
+        FIRArray.apply_fir_filter(x=x, h=h, dtype=np.int64)
+
+
+def test_select_method():
+    assert FIRArray.select_method(500000, 5) == "direct"
+    assert FIRArray.select_method(500000, 101) == "overlap_save"
+    assert FIRArray.select_method(1000, 101) == "fft"
+
+
+def test_apply_fir_filter_window_array():
+    # Load input signal
+    with open("src/iir/test/input_signal.txt", "rb") as f:
+        input_signal = np.loadtxt(f)[:50000]
+
+    h = signal.firwin(numtaps=51, cutoff=4, fs=64)
+
+    # Reference: the whole signal in one call
+    y_one_pass = FIRWindowArray(h=h).apply_fir_filter(x=input_signal)
+    y_scipy = signal.lfilter(b=h, a=1, x=input_signal)
+    assert np.max(np.abs(y_one_pass - y_scipy)) < 1e-12 * np.max(np.abs(y_scipy))
+
+    # Windows of varying length, including windows shorter than the filter
+    fir_window = FIRWindowArray(h=h)
+    rng = np.random.default_rng(0)
+    boundaries = np.concatenate([[0], np.sort(rng.integers(0, len(input_signal), 500)), [len(input_signal)]])
+    y_window = np.concatenate(
+        [
+            fir_window.apply_fir_filter(x=input_signal[start:stop])
+            for start, stop in zip(boundaries[:-1], boundaries[1:])
+        ]
+    )
+    assert np.array_equal(y_window, y_one_pass)
+
+    # Output written in place over the input
+    x = input_signal.copy()
+    assert FIRWindowArray(h=h).apply_fir_filter(x=x, out=x) is x
+    assert np.array_equal(x, y_one_pass)
+
+
+@pytest.mark.parametrize("up, down", [(1, 2), (1, 3), (2, 1), (3, 2), (2, 3), (4, 2)])
+def test_fir_resampler(up, down):
+    # Load input signal
+    with open("src/iir/test/considered_ppg/considered_ppg_patient_1.txt", "rb") as f:
+        input_signal = np.loadtxt(f)[:5001]
+
+    fir_resampler = FIRResampler(up=up, down=down)
+    y = fir_resampler.apply_fir_filter(x=input_signal)
+    assert len(y) == fir_resampler.output_length(len(input_signal)) == -(-len(input_signal) * up // down)
+
+    # Zero insertion, filtering and decimation at the upsampled rate
+    y_scipy = signal.upfirdn(h=fir_resampler.h, x=input_signal, up=fir_resampler.up, down=fir_resampler.down)
+    assert np.allclose(y, y_scipy[: len(y)], rtol=1e-12, atol=1e-9)
+
+    # Windows of varying length, including empty windows and windows shorter than a phase
+    rng = np.random.default_rng(0)
+    boundaries = np.concatenate([[0, 0], np.sort(rng.integers(0, len(input_signal), 300)), [len(input_signal)]])
+    y_window = np.concatenate(
+        [
+            fir_resampler.apply_fir_filter_window(x=input_signal[start:stop])
+            for start, stop in zip(boundaries[:-1], boundaries[1:])
+        ]
+    )
+    assert np.allclose(y_window, y, rtol=1e-12, atol=1e-9)
+
+    # Single-sample mode, continuing after windows
+    fir_resampler.reset()
+    y_window = fir_resampler.apply_fir_filter_window(x=input_signal[:1000])
+    y_single_sample = [
+        output for sample in input_signal[1000:2000] for output in fir_resampler.apply_fir_filter_single_sample(x=sample)
+    ]
+    y_window_end = fir_resampler.apply_fir_filter_window(x=input_signal[2000:])
+    assert np.allclose(np.concatenate([y_window, y_single_sample, y_window_end]), y, rtol=1e-12, atol=1e-9)
+
+
+def test_fir_decimator_interpolator():
+    # PPG recorded at 64 Hz, with a component above the 16 Hz Nyquist frequency of 32 Hz
+    fs = 64
+    t = np.arange(6400) / fs
+    x = np.sin(2 * np.pi * 1.2 * t) + 0.5 * np.sin(2 * np.pi * 24 * t)
+
+    fir_decimator = FIRDecimator(down=2)
+    assert np.allclose(fir_decimator.h, compute_impulse_response_coefficient(filter_order=40, fs=2, fc=0.5))
+    # Each output sample costs one phase of the filter: half of the taps
+    assert fir_decimator.taps_per_phase == 41
+    y = fir_decimator.apply_fir_filter(x=x)
+    assert len(y) == 3200
+
+    # The 24 Hz component is removed instead of aliasing to 8 Hz, past the filter delay of 20 samples
+    delay = len(fir_decimator.h) // 2
+    expected = np.sin(2 * np.pi * 1.2 * (np.arange(3200) * 2 - delay) / fs)
+    assert np.max(np.abs(y[50:] - expected[50:])) < 0.02
+
+    # Interpolating back to 64 Hz
+    fir_interpolator = FIRInterpolator(up=2, filter_order=40)
+    assert fir_interpolator.taps_per_phase == 21
+    x_up = fir_interpolator.apply_fir_filter(x=expected)
+    # Delayed again by 20 samples of the output rate
+    expected_up = np.sin(2 * np.pi * 1.2 * (np.arange(6400) - 2 * delay) / fs)
+    assert np.max(np.abs(x_up[100:] - expected_up[100:])) < 0.02
+
+    with pytest.raises(ValueError):
+        FIRDecimator(down=0)
+    with pytest.raises(ValueError):
+        FIRResampler(up=1.5, down=1)
+    with pytest.raises(ValueError):
+        FIRInterpolator(up=2, h=[])
+
+
+@pytest.mark.parametrize("window", ["rectangular", "hamming", "hann", "blackman", "kaiser"])
+@pytest.mark.parametrize("band_type", ["low", "high", "bandpass", "bandstop"])
+def test_design_fir_filters(window, band_type):
+    rng = np.random.default_rng(0)
+    filter_orders = 2 * rng.integers(1, 60, 200)
+    if band_type in ("low", "bandpass"):
+        # Odd orders are allowed when the Nyquist frequency is in the stopband
+        filter_orders[::2] += 1
+    if band_type in ("bandpass", "bandstop"):
+        cutoffs = np.sort(rng.uniform(0.5, 15.5, (200, 2)), axis=1)
+    else:
+        cutoffs = rng.uniform(0.5, 15.5, 200)
+    beta = rng.uniform(2, 10, 200)
+
+    h = design_fir_filters(filter_orders, cutoffs, fs=32, band_type=band_type, window=window, beta=beta)
+    assert h.shape == (200, filter_orders.max() + 1)
+
+    scipy_window = {"rectangular": "boxcar"}.get(window, window)
+    for i in range(0, 200, 7):
+        taps = filter_orders[i] + 1
+        h_scipy = signal.firwin(
+            numtaps=taps,
+            cutoff=cutoffs[i],
+            window=(scipy_window, beta[i]) if window == "kaiser" else scipy_window,
+            pass_zero=band_type in ("low", "bandstop"),
+            fs=32,
+        )
+        assert np.allclose(h[i, :taps], h_scipy, rtol=0, atol=1e-12)
+        assert not np.any(h[i, taps:])
+
+
+def test_design_fir_filters_single_design():
+    # The low-pass Hamming design of fir/main.py, for a single order and cutoff
+    h = design_fir_filters(filter_orders=40, cutoffs=4, fs=64)
+    assert np.allclose(h[0], compute_impulse_response_coefficient(filter_order=40, fs=64, fc=4), rtol=0, atol=1e-14)
+
+    # One order for several cutoffs, one band for several orders
+    assert design_fir_filters(filter_orders=10, cutoffs=[0.2, 0.4, 0.6]).shape == (3, 11)
+    h = design_fir_filters(filter_orders=[0, 2, 6], cutoffs=[0.1, 0.4], band_type="bandpass")
+    assert h.shape == (3, 7)
+    assert np.array_equal(h[0], [1, 0, 0, 0, 0, 0, 0])
+
+    # An empty batch designs no filters, whatever the window
+    for window in ("hamming", "kaiser"):
+        assert design_fir_filters(filter_orders=np.zeros(0, dtype=int), cutoffs=0.4, window=window).shape == (0, 1)
+
+    with pytest.raises(ValueError):
+        design_fir_filters(filter_orders=11, cutoffs=0.4, band_type="high")
+    with pytest.raises(ValueError):
+        design_fir_filters(filter_orders=10, cutoffs=[0.4, 0.2], band_type="bandpass")
+    with pytest.raises(ValueError):
+        design_fir_filters(filter_orders=10, cutoffs=1.2)
+    with pytest.raises(ValueError):
+        design_fir_filters(filter_orders=-1, cutoffs=0.4)
+    with pytest.raises(ValueError):
+        design_fir_filters(filter_orders=10, cutoffs=0.4, window="triangle")
+    with pytest.raises(ValueError):
+        design_fir_filters(filter_orders=10, cutoffs=0.4, band_type="lowpass")
+
+
+def test_fir_window_array_single_sample_state():
+    # Load input signal
+    with open("src/iir/test/input_signal.txt", "rb") as f:
+        input_signal = np.loadtxt(f)[:3000]
+
+    h = signal.firwin(numtaps=11, cutoff=4, fs=64)
+    y_one_pass = FIRWindowArray(h=h).apply_fir_filter(x=input_signal)
+
+    # Single-sample filter for the first samples
+    fir_single_sample = FIRSingleSample(filter_order=len(h) - 1, coefficients=h)
+    y_single_sample = [fir_single_sample.apply_fir_filter(x=sample) for sample in input_signal[:1000]]
+
+    # Continue with windows, then export back to a single-sample filter
+    fir_window = FIRWindowArray.from_single_sample(fir_single_sample)
+    y_window = fir_window.apply_fir_filter(x=input_signal[1000:2000])
+    fir_single_sample = fir_window.to_single_sample()
+    y_single_sample_end = [fir_single_sample.apply_fir_filter(x=sample) for sample in input_signal[2000:]]
+
+    y = np.concatenate([y_single_sample, y_window, y_single_sample_end])
+    assert np.array_equal(y, y_one_pass)
+
+
+def test_fir_filter_state():
+    with open("src/iir/test/input_signal.txt", "rb") as f:
+        input_signal = np.loadtxt(f)[:2000]
+    h = signal.firwin(numtaps=11, cutoff=4, fs=64)
+
+    # A stream moved to another filter after 1000 samples gives the output of a single filter
+    for data_format in (None, Q15):
+        scale = 1 if data_format is None else 1 / 1000
+        fir_single_sample = FIRSingleSample(filter_order=len(h) - 1, coefficients=h, data_format=data_format)
+        y = [fir_single_sample.apply_fir_filter(x=sample * scale) for sample in input_signal[:1000]]
+        restored = FIRSingleSample(filter_order=len(h) - 1, coefficients=h, data_format=data_format)
+        restored.set_state(fir_single_sample.get_state())
+        y += [restored.apply_fir_filter(x=sample * scale) for sample in input_signal[1000:]]
+        reference = FIRSingleSample(filter_order=len(h) - 1, coefficients=h, data_format=data_format)
+        assert np.array_equal(y, [reference.apply_fir_filter(x=sample * scale) for sample in input_signal])
+
+    fir_window = FIRWindowArray(h=h, dtype=np.float32)
+    y = fir_window.apply_fir_filter(x=input_signal[:1000])
+    restored = FIRWindowArray(h=h, dtype=np.float32)
+    restored.set_state(fir_window.get_state())
+    y = np.concatenate([y, restored.apply_fir_filter(x=input_signal[1000:])])
+    assert y.dtype == np.float32
+    assert np.array_equal(y, FIRWindowArray(h=h, dtype=np.float32).apply_fir_filter(x=input_signal))
+
+    # The resampler continues in window or single-sample mode
+    resampler = FIRResampler(up=2, down=3)
+    y = [resampler.apply_fir_filter_window(x=input_signal[:1001])]
+    restored = FIRResampler(up=2, down=3)
+    restored.set_state(resampler.get_state())
+    y += [restored.apply_fir_filter_single_sample(x=sample) for sample in input_signal[1001:1500]]
+    resampler.set_state(restored.get_state())
+    y.append(resampler.apply_fir_filter_window(x=input_signal[1500:]))
+    y = np.concatenate([np.ravel(samples) for samples in y])
+    assert np.allclose(y, FIRResampler(up=2, down=3).apply_fir_filter(x=input_signal), rtol=0, atol=1e-9)
+
+    with pytest.raises(ValueError, match="FIRWindowArray cannot be restored into a FIRSingleSample"):
+        FIRSingleSample(filter_order=len(h) - 1, coefficients=h).set_state(fir_window.get_state())
+    with pytest.raises(ValueError):
+        FIRSingleSample(filter_order=len(h) - 1, coefficients=h, data_format=Q15).set_state(
+            FIRSingleSample(filter_order=len(h) - 1, coefficients=h).get_state()
+        )
+    with pytest.raises(ValueError, match="shape"):
+        FIRResampler(up=3, down=2).set_state(resampler.get_state())
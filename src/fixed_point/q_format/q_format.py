@@ -0,0 +1,263 @@
+"""
+Fixed-point number formats and integer arithmetic helpers.
+
+Values are held as integers in two's complement: a QFormat with word_length
+bits and fractional_bits fractional bits represents the integer q as the real
+value q / 2**fractional_bits. The helpers work both on NumPy int64 arrays
+(bulk simulation) and on Python ints (single-sample filters), with the same
+rounding and overflow rules, so both paths give bit-identical results.
+
+Products are accumulated in an accumulator of accumulator_bits bits that
+wraps around on overflow, as the multiply-accumulate instructions of
+microcontrollers do. The result is then shifted back to the output format,
+with rounding, and saturated (or wrapped) to its word length.
+"""
+from typing import Literal, Union
+
+import numpy as np
+
+Integer = Union[int, np.ndarray]
+
+
+class QFormat:
+    def __init__(
+        self,
+        word_length: int = 16,
+        fractional_bits: int = None,
+        rounding: Literal["nearest", "floor"] = "nearest",
+        overflow: Literal["saturate", "wrap"] = "saturate",
+    ):
+        """
+        Initialize a signed fixed-point format.
+
+        Args:
+            word_length (int): Total number of bits, sign included, from 2 to 32.
+            Defaults to 16.
+            fractional_bits (int): Number of fractional bits. Defaults to
+            word_length - 1 (Q15 for 16 bits, Q31 for 32 bits).
+            rounding (str): 'nearest' (add half an LSB, then shift: ties round
+            up) or 'floor' (plain arithmetic shift). Defaults to 'nearest'.
+            overflow (str): 'saturate' (clip to the representable range) or
+            'wrap' (two's complement wrap around). Defaults to 'saturate'.
+
+        Raises:
+            ValueError: If word_length is not in [2, 32]
+            ValueError: If fractional_bits is not in [0, word_length)
+            ValueError: If rounding or overflow is not supported
+        """
+        if fractional_bits is None:
+            fractional_bits = word_length - 1
+        # Two 32-bit words multiply into 64 bits: the products must fit in int64
+        if not 2 <= word_length <= 32:
+            raise ValueError("word_length must be between 2 and 32")
+        if not 0 <= fractional_bits < word_length:
+            raise ValueError("fractional_bits must be between 0 and word_length - 1")
+        if rounding not in ("nearest", "floor"):
+            raise ValueError("rounding must be 'nearest' or 'floor'")
+        if overflow not in ("saturate", "wrap"):
+            raise ValueError("overflow must be 'saturate' or 'wrap'")
+
+        self.word_length = word_length
+        self.fractional_bits = fractional_bits
+        self.rounding = rounding
+        self.overflow = overflow
+
+        self.scale = 1 << fractional_bits
+        self.min_int = -(1 << (word_length - 1))
+        self.max_int = (1 << (word_length - 1)) - 1
+
+    @classmethod
+    def for_values(cls, values: np.ndarray, word_length: int = 16, **kwargs) -> "QFormat":
+        """
+        Format with the most fractional bits that still represents every value.
+
+        Typically used for filter coefficients, which can exceed 1 in magnitude.
+
+        Args:
+            values (np.ndarray): Values to represent
+            word_length (int): Total number of bits. Defaults to 16.
+            **kwargs: rounding and overflow, see QFormat
+
+        Returns:
+            QFormat: The format
+
+        Raises:
+            ValueError: If the values do not fit in word_length bits
+        """
+        max_abs = float(np.max(np.abs(values))) if np.size(values) else 0.0
+        for fractional_bits in range(word_length - 1, -1, -1):
+            q_format = cls(word_length, fractional_bits, **kwargs)
+            if round(max_abs * q_format.scale) <= q_format.max_int:
+                return q_format
+        raise ValueError(f"The values do not fit in {word_length} bits")
+
+    @property
+    def name(self) -> str:
+        """Name of the format, e.g. 'Q15' or 'Q2.13'."""
+        integer_bits = self.word_length - 1 - self.fractional_bits
+        if integer_bits == 0:
+            return f"Q{self.fractional_bits}"
+        return f"Q{integer_bits}.{self.fractional_bits}"
+
+    @property
+    def lsb(self) -> float:
+        """Value of the least significant bit."""
+        return 1.0 / self.scale
+
+    def __repr__(self) -> str:
+        return (
+            f"QFormat(word_length={self.word_length}, fractional_bits={self.fractional_bits}, "
+            f"rounding={self.rounding!r}, overflow={self.overflow!r})"
+        )
+
+    def quantize(self, x) -> Integer:
+        """
+        Convert real values to integers of this format.
+
+        Args:
+            x (float | np.ndarray): Real values
+
+        Returns:
+            int | np.ndarray: Python int for a scalar input, int64 array otherwise
+        """
+        if np.ndim(x) == 0:
+            scaled = float(x) * self.scale
+            q = int(np.floor(scaled + 0.5)) if self.rounding == "nearest" else int(np.floor(scaled))
+            return self.fit(q)
+
+        scaled = np.asarray(x, dtype=np.float64) * self.scale
+        scaled = np.floor(scaled + 0.5) if self.rounding == "nearest" else np.floor(scaled)
+        # Clip far outside the word before the integer conversion, which
+        # would otherwise overflow for huge values; fit still applies the overflow rule
+        limit = float(1 << 62)
+        return self.fit(np.clip(scaled, -limit, limit).astype(np.int64))
+
+    def to_float(self, q: Integer):
+        """
+        Convert integers of this format to real values.
+
+        Args:
+            q (int | np.ndarray): Integers of this format
+
+        Returns:
+            float | np.ndarray: Real values
+        """
+        return q / self.scale
+
+    def fit(self, q: Integer) -> Integer:
+        """
+        Apply the overflow rule to bring integers into the word.
+
+        Args:
+            q (int | np.ndarray): Integers, e.g. the result of a shift
+
+        Returns:
+            int | np.ndarray: Integers of this format
+        """
+        if self.overflow == "saturate":
+            if isinstance(q, np.ndarray):
+                # Faster than np.clip on the small arrays of per-sample loops
+                return np.minimum(np.maximum(q, self.min_int), self.max_int)
+            return min(max(q, self.min_int), self.max_int)
+        return wrap(q, self.word_length)
+
+    def rescale(self, accumulator: Integer, fractional_bits: int) -> Integer:
+        """
+        Convert an accumulator to this format: shift, round and apply the overflow rule.
+
+        Args:
+            accumulator (int | np.ndarray): Integers with fractional_bits fractional bits
+            fractional_bits (int): Fractional bits of the accumulator
+
+        Returns:
+            int | np.ndarray: Integers of this format
+        """
+        return self.fit(shift_right(accumulator, fractional_bits - self.fractional_bits, self.rounding))
+
+
+# The formats of most DSP libraries
+Q15 = QFormat(16, 15)
+Q31 = QFormat(32, 31)
+
+
+def wrap(q: Integer, bits: int) -> Integer:
+    """
+    Wrap integers around to a signed two's complement word of the given size.
+
+    Args:
+        q (int | np.ndarray): Integers (NumPy arrays must be int64)
+        bits (int): Word size, at most 64
+
+    Returns:
+        int | np.ndarray: Wrapped integers
+    """
+    if bits >= 64 and isinstance(q, np.ndarray):
+        # int64 arithmetic already wraps around at 64 bits
+        return q
+    offset = 1 << (bits - 1)
+    return ((q + offset) & ((1 << bits) - 1)) - offset
+
+
+def shift_right(q: Integer, shift: int, rounding: Literal["nearest", "floor"] = "nearest") -> Integer:
+    """
+    Arithmetic shift with rounding, as done to drop the extra fractional bits of a product.
+
+    Args:
+        q (int | np.ndarray): Integers
+        shift (int): Number of bits dropped. A negative shift multiplies by 2**-shift.
+        rounding (str): 'nearest' (ties round up) or 'floor'. Defaults to 'nearest'.
+
+    Returns:
+        int | np.ndarray: Shifted integers
+    """
+    if shift <= 0:
+        return q << -shift
+    if rounding == "nearest":
+        return (q + (1 << (shift - 1))) >> shift
+    return q >> shift
+
+
+def error_report(y: np.ndarray, reference: np.ndarray, data_format: QFormat = None) -> dict:
+    """
+    Compare a fixed-point simulation with its float64 reference.
+
+    Args:
+        y (np.ndarray): Output of the fixed-point simulation, as real values
+        reference (np.ndarray): Output of the float64 filter
+        data_format (QFormat): Format of y, to express the errors in LSB and
+        count saturated samples. Defaults to None.
+
+    Returns:
+        dict: 'max_abs_error', 'mean_abs_error', 'rms_error' and 'snr_db'
+        (reference power over error power, inf if there is no error). With a
+        data_format, also 'max_abs_error_lsb', 'rms_error_lsb' and
+        'saturated_samples' (samples at either end of the range).
+    """
+    y = np.asarray(y, dtype=np.float64)
+    reference = np.asarray(reference, dtype=np.float64)
+    error = y - reference
+
+    error_power = float(np.mean(error**2)) if error.size else 0.0
+    reference_power = float(np.mean(reference**2)) if reference.size else 0.0
+    if error_power == 0:
+        snr_db = float("inf")
+    elif reference_power == 0:
+        snr_db = float("-inf")
+    else:
+        snr_db = 10 * np.log10(reference_power / error_power)
+
+    report = {
+        "max_abs_error": float(np.max(np.abs(error))) if error.size else 0.0,
+        "mean_abs_error": float(np.mean(np.abs(error))) if error.size else 0.0,
+        "rms_error": float(np.sqrt(error_power)),
+        "snr_db": float(snr_db),
+    }
+    if data_format is not None:
+        report["max_abs_error_lsb"] = report["max_abs_error"] * data_format.scale
+        report["rms_error_lsb"] = report["rms_error"] * data_format.scale
+        report["saturated_samples"] = int(
+            np.count_nonzero(
+                (y <= data_format.to_float(data_format.min_int)) | (y >= data_format.to_float(data_format.max_int))
+            )
+        )
+    return report
@@ -0,0 +1,75 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import numpy as np
+from q_format.q_format import Q15, Q31, QFormat, error_report, shift_right, wrap
+
+
+def test_q_format():
+    assert Q15.name == "Q15"
+    assert Q31.name == "Q31"
+    assert QFormat(16, 13).name == "Q2.13"
+    assert (Q15.min_int, Q15.max_int, Q15.scale) == (-32768, 32767, 32768)
+
+    # Rounding to nearest, saturation at both ends of the range
+    values = np.array([0.5, -0.5, 1.0, -1.0, 2.0, 1.5 / 32768, -1.5 / 32768])
+    assert Q15.quantize(values).tolist() == [16384, -16384, 32767, -32768, 32767, 2, -1]
+    assert QFormat(16, 15, rounding="floor").quantize(values).tolist() == [16384, -16384, 32767, -32768, 32767, 1, -2]
+    assert QFormat(16, 15, overflow="wrap").quantize(np.array([1.0])).tolist() == [-32768]
+
+    # Scalars give Python ints with the same rounding as arrays
+    for value in values:
+        assert Q15.quantize(value) == Q15.quantize(np.array([value]))[0]
+        assert isinstance(Q15.quantize(value), int)
+    assert Q15.to_float(Q15.quantize(0.25)) == 0.25
+
+
+def test_q_format_integer_helpers():
+    q = np.array([-(1 << 40) - 3, -5, -4, 3, 5, (1 << 40) + 7], dtype=np.int64)
+    for bits in (8, 24, 63, 64):
+        assert wrap(q, bits).tolist() == [wrap(value, bits) for value in q.tolist()]
+    assert wrap(np.array([128, -129], dtype=np.int64), 8).tolist() == [-128, 127]
+    for rounding in ("nearest", "floor"):
+        assert shift_right(q, 2, rounding).tolist() == [shift_right(value, 2, rounding) for value in q.tolist()]
+    assert shift_right(np.array([5, 6, -6, -7]), 2).tolist() == [1, 2, -1, -2]
+
+    # A Q30 accumulator brought back to Q15 rounds and saturates
+    assert Q15.rescale(np.array([1 << 29, 1 << 31], dtype=np.int64), 30).tolist() == [16384, 32767]
+
+
+def test_q_format_for_values():
+    assert QFormat.for_values(np.array([0.5, -0.9])).fractional_bits == 15
+    assert QFormat.for_values(np.array([1.9, -0.9])).fractional_bits == 14
+    assert QFormat.for_values(np.array([-3.5]), word_length=32).fractional_bits == 29
+    with pytest.raises(ValueError):
+        QFormat.for_values(np.array([1e6]), word_length=8)
+
+
+def test_q_format_invalid():
+    with pytest.raises(ValueError):
+        QFormat(64)
+    with pytest.raises(ValueError):
+        QFormat(16, 16)
+    with pytest.raises(ValueError):
+        QFormat(16, rounding="even")
+    with pytest.raises(ValueError):
+        QFormat(16, overflow="clip")
+
+
+def test_error_report():
+    reference = np.sin(np.linspace(0, 10, 1000)) * 0.9
+    y = Q15.to_float(Q15.quantize(reference))
+    report = error_report(y, reference, Q15)
+    assert report["max_abs_error_lsb"] <= 0.5
+    assert report["saturated_samples"] == 0
+    assert 80 < report["snr_db"] < 100
+
+    assert error_report(reference, reference)["snr_db"] == float("inf")
+    assert error_report(np.ones(4), np.ones(4) * 2, Q15)["saturated_samples"] == 4
+
+
+if __name__ == "__main__":
+    pytest.main()
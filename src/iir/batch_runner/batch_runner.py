@@ -0,0 +1,327 @@
+"""
+Filter many signal recordings in parallel over a process pool.
+
+Example:
+    From the src folder, filter all the PPG patients with the 4th order
+    bandpass and write the results in out/:
+
+    $ python -m iir.batch_runner.batch_runner \\
+        --coefficients iir/test/coefficient_4th_order.yaml \\
+        --output-directory out \\
+        "iir/test/considered_ppg/*.txt"
+"""
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Literal
+
+import numpy as np
+
+from iir.iir_array.iir_array import IIRArray
+from iir.sos_filter.sos_filter import SOSFilter
+from iir.utils.coefficient import (
+    compute_impulse_response_coefficient,
+    compute_sos_coefficient,
+    sos_to_tf,
+)
+from iir.utils.signal_io import load_signal
+
+
+def load_coefficient_spec(path: str) -> dict:
+    """
+    Load a coefficient spec from a YAML file.
+
+    The file holds one of:
+        - 'b' and 'a': transfer function coefficients
+        - 'sos': second-order sections, one [b0, b1, b2, a0, a1, a2] row per section
+        - 'filter_order', 'fs', 'fc' and optionally 'band_type' and
+          'filter_type': Butterworth design arguments
+    Other keys (e.g. 'description') are ignored.
+
+    Args:
+        path (str): Path of the YAML file
+
+    Returns:
+        dict: The coefficient spec
+
+    Raises:
+        ValueError: If the file does not hold any of the supported specs
+    """
+    import yaml
+
+    with open(path) as f:
+        spec = yaml.safe_load(f)
+
+    if not isinstance(spec, dict) or not (
+        {"b", "a"} <= spec.keys() or "sos" in spec or {"filter_order", "fs", "fc"} <= spec.keys()
+    ):
+        raise ValueError(
+            "The coefficient spec must define 'b' and 'a', 'sos', or 'filter_order', 'fs' and 'fc'"
+        )
+    return spec
+
+
+def build_filter(spec: dict, engine: Literal["array", "sos"] = "sos"):
+    """
+    Build the function that filters a whole signal from a coefficient spec.
+
+    Args:
+        spec (dict): Coefficient spec, see load_coefficient_spec
+        engine (str): 'array' for IIRArray, 'sos' for SOSFilter. Defaults to 'sos'.
+
+    Returns:
+        Callable[[np.ndarray], np.ndarray]: Function filtering a 1D signal
+
+    Raises:
+        ValueError: If engine is not 'array' or 'sos'
+    """
+    design = {
+        key: spec[key]
+        for key in ("filter_order", "fs", "fc", "filter_type", "band_type")
+        if key in spec
+    }
+
+    if engine == "array":
+        if "b" in spec:
+            b, a = spec["b"], spec["a"]
+        elif "sos" in spec:
+            b, a = sos_to_tf(spec["sos"])
+        else:
+            b, a = compute_impulse_response_coefficient(**design)
+        return IIRArray(b=b, a=a).apply_iir_filter
+    elif engine == "sos":
+        if "b" in spec:
+            sos_filter = SOSFilter.from_tf(spec["b"], spec["a"])
+        elif "sos" in spec:
+            sos_filter = SOSFilter(spec["sos"])
+        else:
+            sos_filter = SOSFilter(compute_sos_coefficient(**design))
+        return sos_filter.apply_sos_filter
+    else:
+        raise ValueError("engine must be 'array' or 'sos'")
+
+
+def expand_signal_files(patterns: list[str]) -> list[str]:
+    """
+    Expand a list of signal file paths and glob patterns.
+
+    Args:
+        patterns (list[str]): File paths or glob patterns
+
+    Returns:
+        list[str]: Sorted, de-duplicated file paths
+
+    Raises:
+        FileNotFoundError: If a pattern does not match any file
+    """
+    signal_files = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern)
+        if not matches:
+            raise FileNotFoundError(f"No signal file matches {pattern}")
+        signal_files.update(matches)
+    return sorted(signal_files)
+
+
+# Filter built once per worker process by _initialize_worker
+_worker_filter = None
+
+
+def _initialize_worker(spec: dict, engine: str):
+    global _worker_filter
+    _worker_filter = build_filter(spec=spec, engine=engine)
+
+
+def output_paths(
+    signal_files: list[str],
+    output_directory: str,
+    output_format: Literal["txt", "npy"] = "txt",
+) -> list[str]:
+    """
+    Map each signal file to the path of its filtered signal.
+
+    The folders of the inputs are kept relative to their common folder, so
+    that e.g. patient_1/ppg.txt and patient_2/ppg.txt are written to
+    patient_1/ppg.txt and patient_2/ppg.txt in output_directory.
+
+    Args:
+        signal_files (list[str]): Paths of the signal files
+        output_directory (str): Folder where the filtered signals are written
+        output_format (str): 'txt' or 'npy'. Defaults to 'txt'.
+
+    Returns:
+        list[str]: One output path per signal file
+
+    Raises:
+        ValueError: If two signal files map to the same output (e.g. a.txt and
+        a.npy), or if an output would overwrite a signal file
+    """
+    sources = [os.path.abspath(path) for path in signal_files]
+    if not sources:
+        return []
+    root = os.path.commonpath([os.path.dirname(path) for path in sources])
+
+    outputs = []
+    for path in sources:
+        name = os.path.splitext(os.path.relpath(path, root))[0]
+        outputs.append(os.path.join(output_directory, f"{name}.{output_format}"))
+
+    seen = {}
+    for path, output_path in zip(signal_files, outputs):
+        key = os.path.abspath(output_path)
+        if key in seen:
+            raise ValueError(f"{seen[key]} and {path} would both be written to {output_path}")
+        seen[key] = path
+    overwritten = set(seen) & set(sources)
+    if overwritten:
+        raise ValueError(f"The filtered signal would overwrite the input {sorted(overwritten)[0]}")
+    return outputs
+
+
+def filter_signal_file(path: str, output_path: str) -> dict:
+    """
+    Filter one signal file with the filter of the current worker and save the result.
+
+    Args:
+        path (str): Path of the input signal, a text recording (converted once
+        to a cached binary file) or a .npy file, see load_signal
+        output_path (str): Path of the filtered signal, written with np.save
+        if it ends with .npy and np.savetxt otherwise, see output_paths
+
+    Returns:
+        dict: 'path', 'output_path', 'samples', 'seconds' (time spent loading,
+        filtering and saving) and 'worker' (process id)
+    """
+    start = time.perf_counter()
+    input_signal = load_signal(path)
+
+    y = _worker_filter(input_signal)
+
+    if output_path.endswith(".npy"):
+        np.save(output_path, y)
+    else:
+        np.savetxt(output_path, y)
+
+    return {
+        "path": path,
+        "output_path": output_path,
+        "samples": len(input_signal),
+        "seconds": time.perf_counter() - start,
+        "worker": os.getpid(),
+    }
+
+
+def run_batch(
+    signal_files: list[str],
+    spec: dict,
+    output_directory: str,
+    engine: Literal["array", "sos"] = "sos",
+    max_workers: int = None,
+    chunksize: int = None,
+    output_format: Literal["txt", "npy"] = "txt",
+) -> dict:
+    """
+    Filter signal files in parallel over a ProcessPoolExecutor.
+
+    The filter is built once per worker. Files are scheduled in chunks of
+    `chunksize` files per task, which cuts inter-process traffic when there
+    are thousands of small recordings.
+
+    Args:
+        signal_files (list[str]): Paths of the signal files
+        spec (dict): Coefficient spec, see load_coefficient_spec
+        output_directory (str): Folder where the filtered signals are written,
+        in the subfolders of the signal files, see output_paths
+        engine (str): 'array' or 'sos', see build_filter. Defaults to 'sos'.
+        max_workers (int): Number of worker processes. Defaults to the number of CPUs.
+        chunksize (int): Number of files per task. Defaults to about four
+        tasks per worker.
+        output_format (str): 'txt' or 'npy'. Defaults to 'txt'.
+
+    Returns:
+        dict: Throughput report with 'files', 'samples', 'seconds' (wall
+        time), 'samples_per_second', 'results' (one entry per file, see
+        filter_signal_file) and 'workers', mapping each worker process id to
+        its 'files', 'samples', 'seconds' and 'samples_per_second'
+
+    Raises:
+        ValueError: If two signal files would be written to the same output,
+        or an output would overwrite a signal file
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, len(signal_files) // (4 * max_workers))
+    # Checked before any worker starts, so that no result is overwritten
+    outputs = output_paths(signal_files, output_directory, output_format)
+    os.makedirs(output_directory, exist_ok=True)
+    for folder in {os.path.dirname(output_path) for output_path in outputs}:
+        os.makedirs(folder, exist_ok=True)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_initialize_worker,
+        initargs=(spec, engine),
+    ) as executor:
+        results = list(
+            executor.map(filter_signal_file, signal_files, outputs, chunksize=chunksize)
+        )
+    seconds = time.perf_counter() - start
+
+    workers = {}
+    for result in results:
+        worker = workers.setdefault(result["worker"], {"files": 0, "samples": 0, "seconds": 0.0})
+        worker["files"] += 1
+        worker["samples"] += result["samples"]
+        worker["seconds"] += result["seconds"]
+    for worker in workers.values():
+        worker["samples_per_second"] = worker["samples"] / worker["seconds"] if worker["seconds"] else 0.0
+
+    samples = sum(result["samples"] for result in results)
+    return {
+        "files": len(results),
+        "samples": samples,
+        "seconds": seconds,
+        "samples_per_second": samples / seconds if seconds else 0.0,
+        "results": results,
+        "workers": workers,
+    }
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Filter signal files in parallel.")
+    parser.add_argument("signal_files", nargs="+", help="Signal files or glob patterns")
+    parser.add_argument("--coefficients", required=True, help="YAML coefficient spec")
+    parser.add_argument("--output-directory", required=True, help="Folder for the filtered signals")
+    parser.add_argument("--engine", choices=["array", "sos"], default="sos")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--chunksize", type=int, default=None, help="Number of files per task")
+    parser.add_argument("--output-format", choices=["txt", "npy"], default="txt")
+    args = parser.parse_args(argv)
+
+    report = run_batch(
+        signal_files=expand_signal_files(args.signal_files),
+        spec=load_coefficient_spec(args.coefficients),
+        output_directory=args.output_directory,
+        engine=args.engine,
+        max_workers=args.workers,
+        chunksize=args.chunksize,
+        output_format=args.output_format,
+    )
+
+    for pid, worker in sorted(report["workers"].items()):
+        print(
+            f"Worker {pid}: {worker['files']} files, {worker['samples']} samples, "
+            f"{worker['samples_per_second']:.0f} samples/s"
+        )
+    print(
+        f"Total: {report['files']} files, {report['samples']} samples in "
+        f"{report['seconds']:.2f} s, {report['samples_per_second']:.0f} samples/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
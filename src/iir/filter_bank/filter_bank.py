@@ -0,0 +1,262 @@
+import numpy as np
+
+from iir.utils.coefficient import InitialConditions, lfilter_zi, validate_initial_conditions
+
+
+class FilterBank:
+    def __init__(self, state_shapes: dict, capacity: int = 16, state_dtype=np.float64):
+        """
+        Base class of the banks of independent streams advanced together.
+
+        The state of every stream is a row of one contiguous array per state
+        variable, of shape (capacity, *state_shape). The active streams
+        occupy the first rows, in the order of stream_ids: removing a stream
+        moves the last stream into its row, and the arrays only grow (doubling
+        their capacity) when a stream is added to a full bank, so adding and
+        removing streams does not reallocate the state.
+
+        Args:
+            state_shapes (dict): Name of every state variable -> shape of the
+            variable for one stream. The arrays are exposed as attributes
+            `_<name>`, of shape (capacity, *shape).
+            capacity (int): Number of streams allocated up front. Defaults to 16.
+            state_dtype (np.dtype): Type of the state arrays. Defaults to float64.
+
+        Raises:
+            ValueError: If capacity is not positive
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self._state_shapes = dict(state_shapes)
+        self._state_dtype = np.dtype(state_dtype)
+        self._capacity = capacity
+        self._size = 0
+        self._next_id = 0
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._rows = {}
+        for name, shape in self._state_shapes.items():
+            setattr(self, f"_{name}", np.zeros((capacity, *shape), dtype=self._state_dtype))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, stream_id: int) -> bool:
+        return stream_id in self._rows
+
+    @property
+    def capacity(self) -> int:
+        """Number of streams the state arrays can hold without growing."""
+        return self._capacity
+
+    @property
+    def stream_ids(self) -> np.ndarray:
+        """Identifiers of the active streams, in the order of the samples given to step."""
+        return self._ids[: self._size].copy()
+
+    def index(self, stream_id: int) -> int:
+        """
+        Row of a stream in the samples and outputs of step.
+
+        Args:
+            stream_id (int): Identifier of the stream
+
+        Returns:
+            int: Row of the stream
+
+        Raises:
+            KeyError: If the stream is not in the bank
+        """
+        return self._rows[stream_id]
+
+    def add_stream(self, stream_id: int = None) -> int:
+        """
+        Add a stream at the end of the bank, with the initial state of the bank (zero by default).
+
+        Args:
+            stream_id (int): Identifier of the stream. Defaults to None, which
+            picks the next unused identifier.
+
+        Returns:
+            int: Identifier of the stream
+
+        Raises:
+            ValueError: If a stream with this identifier is already in the bank
+        """
+        if stream_id is None:
+            while self._next_id in self._rows:
+                self._next_id += 1
+            stream_id = self._next_id
+            self._next_id += 1
+        elif stream_id in self._rows:
+            raise ValueError(f"Stream {stream_id} is already in the bank")
+
+        if self._size == self._capacity:
+            self._grow(2 * self._capacity)
+        row = self._size
+        self._ids[row] = stream_id
+        self._rows[stream_id] = row
+        self._size += 1
+        self._reset_rows(slice(row, row + 1))
+        return stream_id
+
+    def remove_stream(self, stream_id: int):
+        """
+        Remove a stream. The last stream of the bank takes its row.
+
+        Args:
+            stream_id (int): Identifier of the stream
+
+        Raises:
+            KeyError: If the stream is not in the bank
+        """
+        row = self._rows.pop(stream_id)
+        last = self._size - 1
+        if row != last:
+            for name in self._state_shapes:
+                array = getattr(self, f"_{name}")
+                array[row] = array[last]
+            moved_id = int(self._ids[last])
+            self._ids[row] = moved_id
+            self._rows[moved_id] = row
+        self._size = last
+
+    def reset_stream(self, stream_id: int):
+        """
+        Reset the state of one stream.
+
+        Args:
+            stream_id (int): Identifier of the stream
+
+        Raises:
+            KeyError: If the stream is not in the bank
+        """
+        row = self._rows[stream_id]
+        self._reset_rows(slice(row, row + 1))
+
+    def reset(self):
+        """Reset the state of every stream."""
+        self._reset_rows(slice(0, self._size))
+
+    def _reset_rows(self, rows: slice):
+        """Set the state of the streams in rows to its initial value."""
+        for name in self._state_shapes:
+            getattr(self, f"_{name}")[rows] = 0.0
+
+    def _grow(self, capacity: int):
+        """Reallocate the state arrays with a larger capacity."""
+        for name, shape in self._state_shapes.items():
+            array = np.zeros((capacity, *shape), dtype=self._state_dtype)
+            array[: self._size] = getattr(self, f"_{name}")[: self._size]
+            setattr(self, f"_{name}", array)
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[: self._size] = self._ids[: self._size]
+        self._ids = ids
+        self._capacity = capacity
+
+
+class IIRFilterBank(FilterBank):
+    def __init__(
+        self, b, a, capacity: int = 16, dtype=np.float64, initial_conditions: InitialConditions = "zeros"
+    ):
+        """
+        Bank of independent streams filtered by the same IIR filter.
+
+        Every stream runs the direct form II transposed recursion of
+        IIRWindowArray, with the same operations, and its state is a row of
+        a (capacity, order) array. One call to step advances every stream by
+        one sample.
+
+        Args:
+            b (array): Numerator coefficients
+            a (array): Denominator coefficients
+            capacity (int): Number of streams allocated up front. Defaults to 16.
+            dtype (np.dtype): Floating point type of the outputs, float32 or
+            float64. The state and the arithmetic stay float64, as in
+            IIRWindowArray. Defaults to float64.
+            initial_conditions (str | np.ndarray): State every stream starts
+            from, when it is added or reset, as in IIRWindowArray: 'zeros',
+            'steady' (the steady state of the first sample of the stream) or
+            an array of shape (order,). Defaults to 'zeros'.
+
+        Raises:
+            ValueError: If the numerator or denominator coefficients are not 1D arrays
+            ValueError: If the first denominator coefficient is zero
+            ValueError: If dtype is not float32 or float64
+            ValueError: If initial_conditions is not 'zeros', 'steady' or an array of shape (order,)
+            ValueError: If initial_conditions is 'steady' and the filter has a pole at z = 1
+        """
+        b = np.asarray(b, dtype=np.float64)
+        a = np.asarray(a, dtype=np.float64)
+        if b.ndim != 1 or a.ndim != 1:
+            raise ValueError("Numerator and denominator coefficients must be 1D arrays")
+        if a[0] == 0:
+            raise ValueError("The first denominator coefficient must be different from zero")
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float64):
+            raise ValueError("dtype must be float32 or float64")
+
+        self.b = b
+        self.a = a
+        self.order = max(len(a), len(b)) - 1
+
+        # Normalized coefficients padded to the same length
+        self._b = np.zeros(self.order + 1)
+        self._a = np.zeros(self.order + 1)
+        self._b[: len(b)] = b / a[0]
+        self._a[: len(a)] = a / a[0]
+
+        self.initial_conditions = validate_initial_conditions(initial_conditions, (self.order,))
+        state_shapes = {"state": (self.order,)}
+        self._steady_state = None
+        if isinstance(self.initial_conditions, str) and self.initial_conditions == "steady":
+            # State for a unit input held forever, scaled by the first sample
+            # of every stream, whose row is flagged until then
+            self._steady_state = lfilter_zi(b, a)
+            state_shapes["pending"] = ()
+        super().__init__(state_shapes, capacity)
+
+    @property
+    def state(self) -> np.ndarray:
+        """Direct form II transposed state of the active streams, of shape (streams, order)."""
+        return self._state[: self._size]
+
+    def step(self, samples) -> np.ndarray:
+        """
+        Filter one sample of every stream.
+
+        Args:
+            samples (array): One sample per stream, in the order of stream_ids
+
+        Returns:
+            np.ndarray: One output per stream, in the order of stream_ids
+
+        Raises:
+            ValueError: If there is not one sample per stream
+        """
+        x = np.asarray(samples, dtype=np.float64).ravel()
+        if len(x) != self._size:
+            raise ValueError(f"Expected {self._size} samples, got {len(x)}")
+
+        b = self._b
+        a = self._a
+        z = self._state[: self._size]
+        if self._steady_state is not None:
+            pending = self._pending[: self._size]
+            if pending.any():
+                starting = pending != 0
+                z[starting] = x[starting, np.newaxis] * self._steady_state
+                pending[starting] = 0.0
+        y = b[0] * x
+        if self.order > 0:
+            y += z[:, 0]
+            # z[i] = z[i + 1] + b[i + 1] * x - a[i + 1] * y, the last one without z
+            z[:, :-1] = z[:, 1:] + b[1:-1] * x[:, np.newaxis] - a[1:-1] * y[:, np.newaxis]
+            z[:, -1] = b[-1] * x - a[-1] * y
+        return y.astype(self.dtype, copy=False)
+
+    def _reset_rows(self, rows: slice):
+        super()._reset_rows(rows)
+        if not isinstance(self.initial_conditions, str):
+            self._state[rows] = self.initial_conditions
+        elif self._steady_state is not None:
+            self._pending[rows] = 1.0
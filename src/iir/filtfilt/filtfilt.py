@@ -0,0 +1,179 @@
+"""
+Zero-phase forward-backward filtering, in memory or chunk by chunk.
+
+The signal is extended at both ends by padlen samples, filtered forward
+starting from the steady state of its first sample, then filtered backward
+starting from the steady state of the last forward output, as done by
+scipy.signal.filtfilt and sosfiltfilt with method='pad'.
+
+The filters (IIRArray and SOSFilter) provide the methods used here:
+- _default_padlen(): extension length used when padlen is None
+- _steady_state(x0): filter state for inputs held at x0 forever, x0 of shape (channels,)
+- _filter_block(x, state): filter x of shape (samples, channels) from state,
+  returning the float64 output and the state after the block
+
+Only the state crosses block boundaries, so filtering a recording block by
+block gives the same result as in one call. filtfilt_chunked relies on it to
+process memory-mapped recordings larger than RAM: the forward pass is written
+into the output, which the backward pass then overwrites from the end, with
+one block and the two padlen extensions in memory at any time.
+"""
+from typing import Literal, Optional
+
+import numpy as np
+
+PadType = Optional[Literal["odd", "even", "constant"]]
+
+# Number of values (samples x channels) read per block by filtfilt_chunked
+CHUNK_ELEMENTS = 1 << 20
+
+
+def edge_extensions(x: np.ndarray, padlen: int, padtype: PadType = "odd") -> tuple[np.ndarray, np.ndarray]:
+    """
+    Extensions of a signal before its first and after its last sample.
+
+    Only the padlen + 1 samples at each end of x are read.
+
+    Args:
+        x (np.ndarray): Signals of shape (samples, channels)
+        padlen (int): Number of samples of each extension
+        padtype (str): 'odd' (point reflection about the end samples), 'even'
+        (mirror reflection), 'constant' (end samples repeated) or None (no
+        extension). Defaults to 'odd'.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Left and right float64 extensions, of shape (padlen, channels)
+    """
+    if padtype is None or padlen == 0:
+        empty = np.empty((0,) + x.shape[1:])
+        return empty, empty.copy()
+
+    head = np.asarray(x[: padlen + 1], dtype=np.float64)
+    tail = np.asarray(x[len(x) - padlen - 1 :], dtype=np.float64)
+    if padtype == "constant":
+        return np.repeat(head[:1], padlen, axis=0), np.repeat(tail[-1:], padlen, axis=0)
+
+    left = head[padlen:0:-1]
+    right = tail[-2::-1]
+    if padtype == "odd":
+        return 2 * head[0] - left, 2 * tail[-1] - right
+    return left.copy(), right.copy()
+
+
+def validate_padding(padtype: PadType, padlen: Optional[int], length: int, default_padlen: int) -> int:
+    """
+    Check the padding options against the signal length.
+
+    Args:
+        padtype (str): 'odd', 'even', 'constant' or None
+        padlen (int): Number of extension samples, or None for default_padlen
+        length (int): Number of samples of the signal
+        default_padlen (int): Extension length used when padlen is None
+
+    Returns:
+        int: The extension length, 0 when padtype is None
+
+    Raises:
+        ValueError: If padtype is not supported
+        ValueError: If padlen is negative or not smaller than the signal length
+    """
+    if padtype not in ("odd", "even", "constant", None):
+        raise ValueError("padtype must be 'odd', 'even', 'constant' or None")
+    if padtype is None:
+        padlen = 0
+    elif padlen is None:
+        padlen = default_padlen
+    if padlen < 0:
+        raise ValueError("padlen must not be negative")
+    if length <= padlen:
+        raise ValueError(f"The signal must be longer than padlen, which is {padlen}")
+    return padlen
+
+
+def filtfilt(engine, x: np.ndarray, padlen: int, padtype: PadType = "odd") -> np.ndarray:
+    """
+    Forward-backward filtering of signals held in memory.
+
+    Args:
+        engine (IIRArray | SOSFilter): Filter providing _steady_state and _filter_block
+        x (np.ndarray): Signals of shape (samples, channels)
+        padlen (int): Number of extension samples at each end, see validate_padding
+        padtype (str): See edge_extensions. Defaults to 'odd'.
+
+    Returns:
+        np.ndarray: Float64 filtered signals of shape (samples, channels)
+    """
+    left, right = edge_extensions(x, padlen, padtype)
+    extended = np.concatenate([left, np.asarray(x, dtype=np.float64), right])
+
+    y, _ = engine._filter_block(extended, engine._steady_state(extended[0]))
+    y, _ = engine._filter_block(y[::-1], engine._steady_state(y[-1]))
+    return y[::-1][padlen : padlen + len(x)]
+
+
+def filtfilt_chunked(
+    engine,
+    x: np.ndarray,
+    out: np.ndarray = None,
+    padlen: int = None,
+    padtype: PadType = "odd",
+    chunk_samples: int = None,
+) -> np.ndarray:
+    """
+    Forward-backward filtering of long signals, e.g. memory-mapped recordings, block by block.
+
+    Args:
+        engine (IIRArray | SOSFilter): Filter providing _steady_state and _filter_block
+        x (np.ndarray): Signals of shape (samples,) or (samples, channels),
+        typically an np.memmap. Only chunk_samples samples are read at a time.
+        out (np.ndarray): Array of the shape of x where the output is written,
+        e.g. an np.memmap opened in write mode. It also holds the forward
+        pass, so a float64 out gives the same result as filtfilt. It may be x
+        itself. Defaults to None, which allocates a float64 array.
+        padlen (int): Number of extension samples at each end. Defaults to
+        None, the default of the filter's in-memory filtfilt.
+        padtype (str): See edge_extensions. Defaults to 'odd'.
+        chunk_samples (int): Number of samples per block. Defaults to about
+        CHUNK_ELEMENTS values per block.
+
+    Returns:
+        np.ndarray: out
+
+    Raises:
+        ValueError: If out does not have the shape of x
+        ValueError: If the padding options are invalid, see validate_padding
+    """
+    if out is None:
+        out = np.empty(x.shape)
+    if out.shape != x.shape:
+        raise ValueError("out must have the shape of x")
+    if x.ndim == 1:
+        filtfilt_chunked(engine, x[:, np.newaxis], out[:, np.newaxis], padlen, padtype, chunk_samples)
+        return out
+
+    length, number_of_channels = x.shape
+    padlen = validate_padding(padtype, padlen, length, engine._default_padlen())
+    if chunk_samples is None:
+        chunk_samples = max(256, CHUNK_ELEMENTS // max(number_of_channels, 1))
+    # Read both ends before out, which may be x, is written
+    left, right = edge_extensions(x, padlen, padtype)
+    first = left[0] if padlen else np.asarray(x[0], dtype=np.float64)
+
+    # Forward pass: left extension (output dropped), signal, right extension
+    state = engine._steady_state(first)
+    _, state = engine._filter_block(left, state)
+    for start in range(0, length, chunk_samples):
+        stop = min(start + chunk_samples, length)
+        y, state = engine._filter_block(np.asarray(x[start:stop], dtype=np.float64), state)
+        out[start:stop] = y
+    right_forward, state = engine._filter_block(right, state)
+    last = right_forward[-1] if padlen else np.asarray(out[-1], dtype=np.float64)
+
+    # Backward pass from the end of the right extension, overwriting out
+    state = engine._steady_state(last)
+    _, state = engine._filter_block(right_forward[::-1], state)
+    for stop in range(length, 0, -chunk_samples):
+        start = max(stop - chunk_samples, 0)
+        y, state = engine._filter_block(np.asarray(out[start:stop], dtype=np.float64)[::-1], state)
+        out[start:stop] = y[::-1]
+    return out
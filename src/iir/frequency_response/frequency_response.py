@@ -0,0 +1,321 @@
+"""
+Frequency response, group delay and stability of many filters at once.
+
+The filters are evaluated on a shared frequency grid: with the basis matrix
+E[k, m] = exp(-j * w_m * k), the numerators of all the filters are evaluated
+by a single matrix product (filters, taps) @ (taps, points), and so are the
+denominators. The basis depends only on the grid, so it is kept in an LRU
+cache keyed by (number of points, fs, whole) and reused by every call on the
+same grid.
+
+Coefficients are given as 1D arrays for one filter, or as 2D arrays with one
+filter per row, padded with zeros (as returned by design_fir_filters). FIR
+filters have no denominator (a is None).
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+# Poles closer to the unit circle than this are flagged as near-unstable:
+# the coefficient rounding of a deployed filter can move them outside
+DEFAULT_STABILITY_MARGIN = 1e-3
+
+
+class BasisCache:
+    def __init__(self, maxsize: int = 16):
+        """
+        Initialize a cache of complex exponential bases of frequency grids.
+
+        Args:
+            maxsize (int): Maximum number of grids kept. Defaults to 16.
+        """
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, num_points: int, fs: float, whole: bool, num_taps: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return the frequencies and basis of a grid, computing them on a miss.
+
+        A cached basis with fewer taps than requested is extended.
+
+        Args:
+            num_points (int): Number of frequencies
+            fs (float): Sampling frequency in Hz
+            whole (bool): Grid over [0, fs) instead of [0, fs / 2)
+            num_taps (int): Number of basis rows needed
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Frequencies in Hz of shape
+            (num_points,), and basis of shape (at least num_taps, num_points).
+            Both are read-only.
+        """
+        key = (int(num_points), float(fs), bool(whole))
+        entry = self._entries.get(key)
+        if entry is not None and len(entry[1]) >= num_taps:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        # Grow by doubling, so that a sweep of increasing orders rarely recomputes it
+        if entry is not None:
+            num_taps = max(num_taps, 2 * len(entry[1]))
+        span = 2 * np.pi if whole else np.pi
+        w = np.linspace(0, span, num_points, endpoint=False)
+        basis = np.exp(-1j * np.outer(np.arange(num_taps), w))
+        frequencies = w * fs / (2 * np.pi)
+        frequencies.flags.writeable = False
+        basis.flags.writeable = False
+
+        self._entries[key] = (frequencies, basis)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return frequencies, basis
+
+    def cache_info(self) -> dict:
+        """
+        Return the cache statistics.
+
+        Returns:
+            dict: 'hits', 'misses', 'size' (grids kept) and 'maxsize'
+        """
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+    def clear(self):
+        """Empty the cache and reset the statistics."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# Cache shared by all the analysis functions
+basis_cache = BasisCache()
+
+
+def frequency_response(b, a=None, num_points: int = 512, fs: float = 2, whole: bool = False) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Complex frequency response of one or many filters, as scipy.signal.freqz.
+
+    Args:
+        b (array): Numerator coefficients, of shape (taps,) or (filters, taps)
+        a (array): Denominator coefficients, of shape (taps,) or (filters,
+        taps). Defaults to None, for FIR filters.
+        num_points (int): Number of frequencies. Defaults to 512.
+        fs (float): Sampling frequency in Hz. Defaults to 2Hz.
+        whole (bool): Evaluate over [0, fs) instead of [0, fs / 2). Defaults to False.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Frequencies in Hz of shape
+        (num_points,), and the response of shape (num_points,) for 1D
+        coefficients or (filters, num_points)
+
+    Raises:
+        ValueError: If the coefficients are not 1D or 2D arrays, or a has a zero first coefficient
+    """
+    b, a, single = _coefficient_matrices(b, a)
+    frequencies, numerator, denominator = _evaluate(b, a, num_points, fs, whole)
+    response = numerator if denominator is None else numerator / denominator
+    return frequencies, response[0] if single else response
+
+
+def group_delay(b, a=None, num_points: int = 512, fs: float = 2, whole: bool = False) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Group delay in samples of one or many filters, as scipy.signal.group_delay.
+
+    For H = B / A, the group delay is Re(B' / B) - Re(A' / A), with
+    P'(z) = sum_k k p_k z^-k: the weighted polynomials use the same basis.
+
+    Args:
+        b (array): Numerator coefficients, of shape (taps,) or (filters, taps)
+        a (array): Denominator coefficients, or None for FIR filters. Defaults to None.
+        num_points (int): Number of frequencies. Defaults to 512.
+        fs (float): Sampling frequency in Hz. Defaults to 2Hz.
+        whole (bool): Evaluate over [0, fs) instead of [0, fs / 2). Defaults to False.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Frequencies in Hz, and the group delay
+        of the shape of the response. It is NaN at the zeros and poles on
+        the unit circle, where it is not defined.
+
+    Raises:
+        ValueError: If the coefficients are not 1D or 2D arrays, or a has a zero first coefficient
+    """
+    b, a, single = _coefficient_matrices(b, a)
+    frequencies, delay = _group_delay(b, a, num_points, fs, whole)
+    return frequencies, delay[0] if single else delay
+
+
+def analyze_filters(b, a=None, num_points: int = 512, fs: float = 2, whole: bool = False) -> dict:
+    """
+    Magnitude, phase and group delay of one or many filters on a shared grid.
+
+    Args:
+        b (array): Numerator coefficients, of shape (taps,) or (filters, taps)
+        a (array): Denominator coefficients, or None for FIR filters. Defaults to None.
+        num_points (int): Number of frequencies. Defaults to 512.
+        fs (float): Sampling frequency in Hz. Defaults to 2Hz.
+        whole (bool): Evaluate over [0, fs) instead of [0, fs / 2). Defaults to False.
+
+    Returns:
+        dict: 'frequencies' (Hz), 'response' (complex), 'magnitude',
+        'magnitude_db', 'phase' (unwrapped, in radians) and 'group_delay'
+        (samples), each of shape (num_points,) for 1D coefficients or
+        (filters, num_points). With a denominator, also the entries of
+        stability_report.
+
+    Raises:
+        ValueError: If the coefficients are not 1D or 2D arrays, or a has a zero first coefficient
+    """
+    b, a, single = _coefficient_matrices(b, a)
+    frequencies, numerator, denominator = _evaluate(b, a, num_points, fs, whole)
+    response = numerator if denominator is None else numerator / denominator
+    _, delay = _group_delay(b, a, num_points, fs, whole, numerator, denominator)
+
+    magnitude = np.abs(response)
+    with np.errstate(divide="ignore"):
+        magnitude_db = 20 * np.log10(magnitude)
+    analysis = {
+        "frequencies": frequencies,
+        "response": response,
+        "magnitude": magnitude,
+        "magnitude_db": magnitude_db,
+        "phase": np.unwrap(np.angle(response), axis=-1),
+        "group_delay": delay,
+    }
+    if single:
+        analysis = {name: value if name == "frequencies" else value[0] for name, value in analysis.items()}
+    if a is not None:
+        report = stability_report(a[0] if single else a)
+        analysis.update(report)
+    return analysis
+
+
+def stability_report(a, margin: float = DEFAULT_STABILITY_MARGIN) -> dict:
+    """
+    Pole radius and stability flags of one or many denominators.
+
+    The poles of all the filters are the eigenvalues of their companion
+    matrices, computed in one batched call.
+
+    Args:
+        a (array): Denominator coefficients, of shape (taps,) or (filters,
+        taps), e.g. IIRArray.a, or the sos[:, 3:] of a cascade for one row per section
+        margin (float): Distance to the unit circle below which a stable
+        filter is flagged as near-unstable. Defaults to DEFAULT_STABILITY_MARGIN.
+
+    Returns:
+        dict: 'pole_radius' (largest pole magnitude), 'stable' (all poles
+        strictly inside the unit circle) and 'near_unstable' (stable, with
+        a pole within margin of the unit circle), each a scalar for 1D
+        coefficients or an array of shape (filters,)
+
+    Raises:
+        ValueError: If the coefficients are not 1D or 2D arrays, or a has a zero first coefficient
+    """
+    _, a, single = _coefficient_matrices(np.ones(1), a)
+    # Trailing zero coefficients only add poles at the origin
+    order = a.shape[1] - 1
+    if order == 0:
+        pole_radius = np.zeros(len(a))
+    else:
+        companion = np.zeros((len(a), order, order))
+        companion[:, 0, :] = -a[:, 1:] / a[:, :1]
+        companion[:, np.arange(1, order), np.arange(order - 1)] = 1
+        pole_radius = np.max(np.abs(np.linalg.eigvals(companion)), axis=1)
+
+    stable = pole_radius < 1
+    report = {
+        "pole_radius": pole_radius,
+        "stable": stable,
+        "near_unstable": stable & (pole_radius >= 1 - margin),
+    }
+    if single:
+        return {name: value[0].item() for name, value in report.items()}
+    return report
+
+
+def require_stable(a, margin: float = DEFAULT_STABILITY_MARGIN):
+    """
+    Check that denominators are safe to deploy, e.g. before filtering with an IIRArray.
+
+    Args:
+        a (array): Denominator coefficients, see stability_report
+        margin (float): See stability_report. Defaults to DEFAULT_STABILITY_MARGIN.
+
+    Raises:
+        ValueError: If a filter is unstable or near-unstable, with the indices of the filters
+    """
+    report = stability_report(a, margin)
+    unstable = np.flatnonzero(~np.atleast_1d(report["stable"]))
+    near_unstable = np.flatnonzero(np.atleast_1d(report["near_unstable"]))
+    if len(unstable) or len(near_unstable):
+        raise ValueError(
+            f"Unstable filters: {unstable.tolist()}, near-unstable filters "
+            f"(pole radius >= {1 - margin}): {near_unstable.tolist()}"
+        )
+
+
+def _coefficient_matrices(b, a) -> tuple:
+    """
+    Coefficients as float64 matrices with one filter per row.
+
+    Returns:
+        tuple: b and a (None for FIR filters) of shape (filters, taps), and
+        whether the input was a single filter
+    """
+    b = np.asarray(b, dtype=np.float64)
+    single = b.ndim == 1 and (a is None or np.ndim(a) == 1)
+    if b.ndim not in (1, 2):
+        raise ValueError("Coefficients must be 1D or 2D arrays")
+    b = np.atleast_2d(b)
+    if a is None:
+        return b, None, single
+
+    a = np.asarray(a, dtype=np.float64)
+    if a.ndim not in (1, 2):
+        raise ValueError("Coefficients must be 1D or 2D arrays")
+    a = np.atleast_2d(a)
+    if np.any(a[:, 0] == 0):
+        raise ValueError("The first denominator coefficient must be different from zero")
+    number_of_filters = np.broadcast_shapes((len(b),), (len(a),))[0]
+    return (
+        np.broadcast_to(b, (number_of_filters, b.shape[1])),
+        np.broadcast_to(a, (number_of_filters, a.shape[1])),
+        single,
+    )
+
+
+def _evaluate(b: np.ndarray, a: np.ndarray, num_points: int, fs: float, whole: bool) -> tuple:
+    """Frequencies, and numerator and denominator (None for FIR filters) on the grid."""
+    num_taps = max(b.shape[1], 0 if a is None else a.shape[1])
+    frequencies, basis = basis_cache.get(num_points, fs, whole, num_taps)
+    numerator = b @ basis[: b.shape[1]]
+    denominator = None if a is None else a @ basis[: a.shape[1]]
+    return frequencies, numerator, denominator
+
+
+def _group_delay(b, a, num_points, fs, whole, numerator=None, denominator=None) -> tuple:
+    """Group delay on the grid, reusing the evaluated polynomials when given."""
+    if numerator is None:
+        frequencies, numerator, denominator = _evaluate(b, a, num_points, fs, whole)
+    num_taps = max(b.shape[1], 0 if a is None else a.shape[1])
+    frequencies, basis = basis_cache.get(num_points, fs, whole, num_taps)
+
+    delay = _polynomial_delay(b, numerator, basis)
+    if a is not None:
+        delay = delay - _polynomial_delay(a, denominator, basis)
+    return frequencies, delay
+
+
+def _polynomial_delay(p: np.ndarray, values: np.ndarray, basis: np.ndarray) -> np.ndarray:
+    """Re(P' / P) on the grid, NaN where P vanishes."""
+    weighted = (p * np.arange(p.shape[1])) @ basis[: p.shape[1]]
+    # Relative to the size of the coefficients, as scipy.signal.group_delay
+    singular = np.abs(values) < 10 * np.finfo(np.float64).eps * np.sum(np.abs(p), axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        delay = np.real(weighted / values)
+    delay[singular] = np.nan
+    return delay
@@ -1,39 +1,493 @@
+import warnings
+
 import numpy as np
 
+from fixed_point.q_format.q_format import Q15, QFormat, shift_right, wrap
+from iir.filtfilt.filtfilt import PadType, filtfilt, validate_padding
+from iir.utils.coefficient import InitialConditions, direct_form_i_history, validate_initial_conditions
+
+# Number of values (samples x channels) filtered per chunk: the float64
+# working buffers of the recursion are bounded by this size, whatever the
+# length of the signal and the dtype of the output.
+CHUNK_ELEMENTS = 1 << 18
+
 class IIRArray:
-    def __init__(self, b, a):
+    def __init__(self, b, a, dtype=None, initial_conditions: InitialConditions = "zeros"):
+        """
+        Initialize IIR filter.
+
+        Args:
+            b (array): Numerator coefficients
+            a (array): Denominator coefficients
+            dtype (np.dtype): Floating point type of the output, float32 or
+            float64. The recursion always accumulates in float64 (a direct
+            form with poles close to the unit circle is not accurate in
+            float32), chunk by chunk, so a float32 output never needs a
+            float64 copy of the whole signal. Defaults to None, which keeps
+            the dtype of floating point inputs and gives float64 otherwise.
+            initial_conditions (str | np.ndarray): State every signal starts from:
+                - 'zeros': zero state
+                - 'steady': the steady state of the first sample of the
+                  signal, as if the signal had been at that value forever,
+                  which removes the start-up transient of signals with an
+                  offset (scipy.signal.lfilter with zi=lfilter_zi(b, a) * x[0])
+                - an array of shape (max(len(a), len(b)) - 1,): the direct
+                  form II transposed state (the zi of scipy.signal.lfilter),
+                  shared by every signal
+                Defaults to 'zeros'.
+
+        Raises:
+            ValueError: If dtype is not None, float32 or float64
+            ValueError: If initial_conditions is not 'zeros', 'steady' or an array of the filter order
+        """
         self.b = b
         self.a = a
+        self.dtype = None if dtype is None else np.dtype(dtype)
+        if self.dtype is not None and self.dtype not in (np.float32, np.float64):
+            raise ValueError("dtype must be float32 or float64")
+        self.initial_conditions = validate_initial_conditions(initial_conditions, (max(len(a), len(b)) - 1,))
 
-    def apply_iir_filter(self, x):
+    def apply_iir_filter(self, x, axis=-1):
         """
         Apply IIR filter to input signal.
-        
+
+        The input can hold several signals (e.g. a (channels, samples) matrix):
+        every 1D slice along `axis` is filtered independently, and the
+        recursion runs once over time for all of them together. An N-D input
+        is no longer flattened into one signal: a (samples, 1) column is 'samples'
+        signals of one sample each with the default axis=-1, so pass axis=0,
+        or a 1D array, to filter it over time. A UserWarning flags that case.
+
         Args:
-            x (array): Input signal
-        
+            x (array): Input signal, 1D or N-D
+            axis (int): Axis of x along which the filter is applied. Defaults to -1.
+
         Returns:
-            array: Filtered signal
+            array: Filtered signal, with the same shape and memory layout as x.
+            Its dtype is the dtype of the filter, or, if it is None, the dtype
+            of floating point inputs and float64 for other inputs.
+
+        Raises:
+            ValueError: If the numerator or denominator coefficients are not 1D arrays
+            ValueError: If the first denominator coefficient is zero
+            ValueError: If initial_conditions is 'steady' and the filter has a pole at z = 1
         """
         # Ensure input is a numpy array
-        input_signal = np.asarray(x).flatten()
-        b = np.asarray(self.b)
-        a = np.asarray(self.a)
-        
-        if input_signal.ndim != 1 or b.ndim != 1 or a.ndim != 1:
-            raise ValueError("Input signal, numerator and denominator coefficients must be 1D arrays")
-
-        # Compute the number of taps
-        taps = len(b)
-        input_signal_length = len(input_signal)
-        y = np.zeros(input_signal_length)
-        
-        for n in range(input_signal_length):
-            for k in range(taps):
-                if n - k >= 0:
-                    y[n] = y[n] + b[k] * input_signal[n - k]
-            for k in range(1, taps):
-                if n - k >= 0:
-                    y[n] = y[n] - a[k] * y[n - k]
-            y[n] = y[n] / a[0]
-        return y
\ No newline at end of file
+        input_signal = np.asarray(x)
+        b, a = self._coefficients()
+        if input_signal.ndim == 0:
+            raise ValueError("Input signal must have at least one dimension")
+
+        _warn_single_sample_axis(input_signal, axis)
+
+        output_dtype = self._output_dtype(input_signal)
+        y = np.empty_like(input_signal, dtype=output_dtype)
+
+        # Bring the filtering axis first and stack the other axes as channels
+        input_signal_moved = np.moveaxis(input_signal, axis, 0)
+        input_signal_length = input_signal_moved.shape[0]
+        signals = input_signal_moved.reshape(input_signal_length, -1)
+
+        filtered = np.empty(signals.shape, dtype=output_dtype)
+        history = initial_history(b, a, self.initial_conditions, signals[0]) if input_signal_length else None
+        _lfilter_channels(b, a, signals, filtered, history=history)
+        np.moveaxis(y, axis, 0)[...] = filtered.reshape(input_signal_moved.shape)
+        return y
+
+    def apply_iir_filtfilt(self, x, axis=-1, padtype: PadType = "odd", padlen: int = None):
+        """
+        Apply the filter forward then backward, for zero-phase filtering.
+
+        The signal is extended at both ends, and each pass starts from the
+        steady state of its first sample, as scipy.signal.filtfilt with
+        method='pad' does. For recordings that do not fit in memory, see
+        iir.filtfilt.filtfilt.filtfilt_chunked.
+
+        Args:
+            x (array): Input signal, 1D or N-D
+            axis (int): Axis of x along which the filter is applied. Defaults to -1.
+            padtype (str): Extension of the signal ends, 'odd', 'even',
+            'constant' or None. Defaults to 'odd'.
+            padlen (int): Number of extension samples at each end. Defaults to
+            None, which uses 3 * max(len(a), len(b)).
+
+        Returns:
+            array: Filtered signal, with the same shape as x and the output
+            dtype of apply_iir_filter
+
+        Raises:
+            ValueError: If the numerator or denominator coefficients are not 1D arrays
+            ValueError: If the first denominator coefficient is zero
+            ValueError: If the padding options are invalid or the signal is not longer than padlen
+            ValueError: If the filter has a pole at z = 1, which has no steady state
+        """
+        input_signal = np.asarray(x)
+        self._coefficients()
+        if input_signal.ndim == 0:
+            raise ValueError("Input signal must have at least one dimension")
+        input_signal_moved = np.moveaxis(input_signal, axis, 0)
+        input_signal_length = input_signal_moved.shape[0]
+        padlen = validate_padding(padtype, padlen, input_signal_length, self._default_padlen())
+
+        filtered = filtfilt(self, input_signal_moved.reshape(input_signal_length, -1), padlen, padtype)
+        y = np.empty_like(input_signal, dtype=self._output_dtype(input_signal))
+        np.moveaxis(y, axis, 0)[...] = filtered.reshape(input_signal_moved.shape)
+        return y
+
+    def apply_iir_filter_fixed_point(
+        self,
+        x,
+        data_format: QFormat = Q15,
+        coefficient_format: QFormat = None,
+        accumulator_bits: int = 64,
+        axis=-1,
+    ):
+        """
+        Simulate the IIR filter in fixed-point arithmetic, as run on a microcontroller.
+
+        The coefficients are normalized by a[0] and quantized to
+        coefficient_format, the input is quantized to data_format. Every
+        output sample is the direct form I sum of products, accumulated in an
+        accumulator of accumulator_bits bits that wraps around on overflow,
+        then shifted back to data_format with its rounding and overflow rules.
+        It is bit-exact with IIRSingleSample in fixed-point mode, with the
+        same initial conditions, whose past inputs and outputs are quantized
+        to data_format.
+
+        Several signals (e.g. a (patients, samples) matrix) are filtered
+        together, as in apply_iir_filter, which makes sweeps over many
+        recordings fast: the feedback recursion runs once over time.
+
+        Args:
+            x (array): Input signal, 1D or N-D
+            data_format (QFormat): Format of the input and output samples.
+            Defaults to Q15.
+            coefficient_format (QFormat): Format of the coefficients. Defaults
+            to the format with the word length of data_format and as many
+            fractional bits as the normalized coefficients allow.
+            accumulator_bits (int): Size of the accumulator, at most 64.
+            Defaults to 64.
+            axis (int): Axis of x along which the filter is applied, see
+            apply_iir_filter. Defaults to -1.
+
+        Returns:
+            array: Filtered signal, dequantized to float64 (see error_report),
+            with the same shape as x
+
+        Raises:
+            ValueError: If the numerator or denominator coefficients are not 1D arrays
+            ValueError: If the first denominator coefficient is zero
+            ValueError: If accumulator_bits is not in [2, 64]
+            ValueError: If initial_conditions is 'steady' and the filter has a pole at z = 1
+        """
+        input_signal = np.asarray(x, dtype=np.float64)
+        b, a = self._coefficients()
+        if input_signal.ndim == 0:
+            raise ValueError("Input signal must have at least one dimension")
+        if not 2 <= accumulator_bits <= 64:
+            raise ValueError("accumulator_bits must be between 2 and 64")
+        _warn_single_sample_axis(input_signal, axis)
+
+        b_q, a_q, coefficient_format = quantize_iir_coefficients(b, a, data_format, coefficient_format)
+
+        input_signal_moved = np.moveaxis(input_signal, axis, 0)
+        input_signal_length = input_signal_moved.shape[0]
+        signals = data_format.quantize(input_signal_moved.reshape(input_signal_length, -1))
+
+        history = None
+        if input_signal_length:
+            history = initial_history(b, a, self.initial_conditions, data_format.to_float(signals[0]))
+        if history is not None:
+            history = tuple(data_format.quantize(values) for values in history)
+        filtered = _lfilter_channels_fixed_point(
+            b_q, a_q, signals, data_format, coefficient_format.fractional_bits, accumulator_bits, history
+        )
+        y = np.empty_like(input_signal)
+        np.moveaxis(y, axis, 0)[...] = data_format.to_float(filtered).reshape(input_signal_moved.shape)
+        return y
+
+    def _coefficients(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Validated float64 coefficients.
+
+        Raises:
+            ValueError: If the numerator or denominator coefficients are not 1D arrays
+            ValueError: If the first denominator coefficient is zero
+        """
+        b = np.asarray(self.b, dtype=np.float64)
+        a = np.asarray(self.a, dtype=np.float64)
+        if b.ndim != 1 or a.ndim != 1:
+            raise ValueError("Numerator and denominator coefficients must be 1D arrays")
+        if a[0] == 0:
+            raise ValueError("The first denominator coefficient must be different from zero")
+        return b, a
+
+    def _output_dtype(self, input_signal: np.ndarray) -> np.dtype:
+        """Dtype of the filter, or of floating point inputs, or float64."""
+        if self.dtype is not None:
+            return self.dtype
+        if np.issubdtype(input_signal.dtype, np.floating):
+            return input_signal.dtype
+        return np.dtype(np.float64)
+
+    def _default_padlen(self) -> int:
+        """Extension length of filtfilt, as in scipy.signal.filtfilt."""
+        return 3 * max(len(self.a), len(self.b))
+
+    def _steady_state(self, x0: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Direct form I history for inputs held at x0 forever.
+
+        Args:
+            x0 (np.ndarray): Input value of every channel, of shape (channels,)
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Input and output histories, see _lfilter_channels
+
+        Raises:
+            ValueError: If the filter has a pole at z = 1, which has no steady state
+        """
+        b, a = self._coefficients()
+        return initial_history(b, a, "steady", x0)
+
+    def _filter_block(self, x: np.ndarray, state: tuple) -> tuple[np.ndarray, tuple]:
+        """
+        Filter a block of signals from a direct form I history.
+
+        Args:
+            x (np.ndarray): Input signals of shape (samples, channels)
+            state (tuple): Input and output histories, see _lfilter_channels
+
+        Returns:
+            tuple: Float64 output of shape (samples, channels) and the histories after the block
+        """
+        b, a = self._coefficients()
+        y = np.empty(x.shape)
+        state = _lfilter_channels(b, a, x, y, history=state)
+        return y, state
+
+
+def initial_history(b: np.ndarray, a: np.ndarray, initial_conditions: InitialConditions, x0: np.ndarray):
+    """
+    Direct form I history a filter starts from.
+
+    Args:
+        b (np.ndarray): Numerator coefficients
+        a (np.ndarray): Denominator coefficients, a[0] != 0
+        initial_conditions (str | np.ndarray): 'zeros', 'steady' or a direct
+        form II transposed state, see IIRArray
+        x0 (np.ndarray): First input sample of every channel, of shape (channels,)
+
+    Returns:
+        tuple | None: Input and output histories of shape (order, channels),
+        oldest first (see _lfilter_channels), or None for zero state
+
+    Raises:
+        ValueError: If initial_conditions is 'steady' and the filter has a pole at z = 1
+    """
+    if isinstance(initial_conditions, str) and initial_conditions == "zeros":
+        return None
+    order = max(len(a), len(b)) - 1
+    x0 = np.asarray(x0, dtype=np.float64)
+    if isinstance(initial_conditions, str):
+        # Inputs held at x0 forever, and outputs at the DC gain times x0
+        if np.sum(a) == 0:
+            raise ValueError("The filter has a pole at z = 1: it has no steady state")
+        x_history = np.repeat(x0[np.newaxis], order, axis=0)
+        y_history = np.repeat(x0[np.newaxis] * (np.sum(b) / np.sum(a)), order, axis=0)
+        return x_history, y_history
+
+    # The same state for every channel
+    x_history, y_history = direct_form_i_history(b, a, initial_conditions)
+    num_channels = len(x0)
+    return (
+        np.repeat(x_history[:, np.newaxis], num_channels, axis=1),
+        np.repeat(y_history[:, np.newaxis], num_channels, axis=1),
+    )
+
+
+def _warn_single_sample_axis(input_signal: np.ndarray, axis: int):
+    """
+    Warn when the filtering axis of an N-D input has a single sample and another axis is longer.
+
+    Such an input, e.g. a (samples, 1) column filtered along axis=-1, was
+    flattened into one signal before apply_iir_filter supported N-D inputs:
+    now every slice is a one-sample signal, which is rarely what is meant.
+    """
+    if input_signal.ndim > 1 and input_signal.shape[axis] == 1 and max(input_signal.shape) > 1:
+        warnings.warn(
+            f"Filtering an input of shape {input_signal.shape} along axis {axis}, which has a single sample: "
+            "every slice is filtered as a one-sample signal. Pass the time axis, or a 1D array.",
+            UserWarning,
+            stacklevel=3,
+        )
+
+
+def quantize_iir_coefficients(
+    b: np.ndarray, a: np.ndarray, data_format: QFormat, coefficient_format: QFormat = None
+) -> tuple:
+    """
+    Normalize the coefficients by a[0] and quantize them to a common format.
+
+    Args:
+        b (np.ndarray): Numerator coefficients
+        a (np.ndarray): Denominator coefficients, a[0] != 0
+        data_format (QFormat): Format of the samples, whose word length is
+        used when coefficient_format is None
+        coefficient_format (QFormat): Format of the coefficients. Defaults to
+        the format with as many fractional bits as the coefficients allow.
+
+    Returns:
+        tuple: Quantized b and a (int64 arrays, a[0] is not used) and the coefficient format
+    """
+    b = np.asarray(b, dtype=np.float64) / a[0]
+    a = np.asarray(a, dtype=np.float64) / a[0]
+    if coefficient_format is None:
+        coefficient_format = QFormat.for_values(np.concatenate([b, a[1:]]), data_format.word_length)
+    return coefficient_format.quantize(b), coefficient_format.quantize(a), coefficient_format
+
+
+def _lfilter_channels(b: np.ndarray, a: np.ndarray, x: np.ndarray, y: np.ndarray, history: tuple = None) -> tuple:
+    """
+    Direct form I difference equation applied to every column of x.
+
+    The signals are filtered in chunks of about CHUNK_ELEMENTS values. In each
+    chunk the feed-forward part is computed at once, then the feedback
+    recursion runs over time with each step vectorized across channels. The
+    arithmetic is float64 whatever the dtypes of x and y, and the last inputs
+    and outputs of a chunk are carried over to the next one.
+
+    Args:
+        b (np.ndarray): Numerator coefficients
+        a (np.ndarray): Denominator coefficients, a[0] != 0
+        x (np.ndarray): Input signals of shape (samples, channels)
+        y (np.ndarray): Output signals of shape (samples, channels), written in place
+        history (tuple): The last max(len(a), len(b)) - 1 inputs and outputs
+        before x, as two arrays of shape (order, channels), oldest first.
+        Defaults to None, which starts from zero.
+
+    Returns:
+        tuple: Input and output histories after x, to filter the next block
+    """
+    # Normalize the coefficients so that a[0] == 1
+    b = b / a[0]
+    a = a / a[0]
+
+    input_signal_length, number_of_channels = x.shape
+    order = max(len(a), len(b)) - 1
+    chunk_length = max(256, CHUNK_ELEMENTS // max(number_of_channels, 1))
+
+    # Feedback coefficients in the order of the output history, oldest first
+    a_reversed = np.zeros(order)
+    a_reversed[order - len(a) + 1 :] = a[:0:-1]
+
+    # The last `order` inputs and outputs, oldest first, stored time-major so
+    # that the last `order` outputs of every channel form a contiguous block
+    if history is None:
+        x_history = np.zeros((order, number_of_channels))
+        y_history = np.zeros((order, number_of_channels))
+    else:
+        x_history, y_history = history
+    for start in range(0, input_signal_length, chunk_length):
+        stop = min(start + chunk_length, input_signal_length)
+        length = stop - start
+        x_chunk = np.concatenate([x_history, x[start:stop]]).astype(np.float64, copy=False)
+
+        # Feed-forward part: sum_k b[k] * x[n - k]
+        v = b[0] * x_chunk[order:]
+        for k in range(1, len(b)):
+            v += b[k] * x_chunk[order - k : order - k + length]
+        x_history = x_chunk[length:]
+
+        if len(a) == 1:
+            # Without feedback, the output history is never read
+            y[start:stop] = v
+            continue
+
+        # Feedback part: y[n] = v[n] - sum_k a[k] * y[n - k], the chunk being
+        # prefixed by the outputs of the previous one
+        y_chunk = np.empty((order + length, number_of_channels))
+        y_chunk[:order] = y_history
+        for n in range(length):
+            y_chunk[order + n] = v[n] - np.dot(a_reversed, y_chunk[n : order + n])
+        y_history = y_chunk[length:]
+        y[start:stop] = y_chunk[order:]
+    return x_history, y_history
+
+
+def _lfilter_channels_fixed_point(
+    b_q: np.ndarray,
+    a_q: np.ndarray,
+    x_q: np.ndarray,
+    data_format: QFormat,
+    coefficient_fractional_bits: int,
+    accumulator_bits: int,
+    history: tuple = None,
+) -> np.ndarray:
+    """
+    Fixed-point direct form I difference equation applied to every column of x_q.
+
+    As in _lfilter_channels, the feed-forward sums are computed for the whole
+    signal at once (the accumulator wraps around modulo 2**accumulator_bits,
+    so wrapping once is exact), then the feedback recursion runs over time
+    with each step vectorized across channels.
+
+    Args:
+        b_q (np.ndarray): Quantized numerator coefficients
+        a_q (np.ndarray): Quantized denominator coefficients, a_q[0] is not used
+        x_q (np.ndarray): Quantized input signals of shape (samples, channels)
+        data_format (QFormat): Format of the input and output samples
+        coefficient_fractional_bits (int): Fractional bits of the coefficients
+        accumulator_bits (int): Size of the accumulator
+        history (tuple): The last order quantized inputs and outputs before
+        x_q, as two int64 arrays of shape (order, channels), oldest first.
+        Defaults to None, which starts from zero.
+
+    Returns:
+        np.ndarray: Quantized output signals of shape (samples, channels), int64
+    """
+    input_signal_length, number_of_channels = x_q.shape
+    order = max(len(a_q), len(b_q)) - 1
+    shift = coefficient_fractional_bits
+
+    v = np.zeros((input_signal_length, number_of_channels), dtype=np.int64)
+    if history is None:
+        for k, coefficient in enumerate(b_q[:input_signal_length].tolist()):
+            if coefficient:
+                v[k:] += coefficient * x_q[: input_signal_length - k]
+    else:
+        x_extended = np.concatenate([history[0], x_q])
+        for k, coefficient in enumerate(b_q.tolist()):
+            if coefficient:
+                v += coefficient * x_extended[order - k : order - k + input_signal_length]
+
+    if len(a_q) == 1 or not np.any(a_q[1:]):
+        return data_format.rescale(wrap(v, accumulator_bits), data_format.fractional_bits + shift)
+
+    a_reversed = np.zeros(order, dtype=np.int64)
+    a_reversed[order - len(a_q) + 1 :] = a_q[:0:-1]
+    y = np.zeros((order + input_signal_length, number_of_channels), dtype=np.int64)
+    if history is not None:
+        y[:order] = history[1]
+
+    # The per-sample steps write into a preallocated buffer. Without a
+    # narrower accumulator to wrap, the rounding offset is added to the
+    # feed-forward sums once (int64 arithmetic is modular).
+    rounding_offset = 1 << (shift - 1) if data_format.rounding == "nearest" and shift > 0 else 0
+    wrap_accumulator = accumulator_bits < 64
+    if not wrap_accumulator:
+        v += rounding_offset
+    saturate = data_format.overflow == "saturate"
+    accumulator = np.empty(number_of_channels, dtype=np.int64)
+    for n in range(input_signal_length):
+        np.subtract(v[n], np.dot(a_reversed, y[n : order + n]), out=accumulator)
+        if wrap_accumulator:
+            accumulator = wrap(accumulator, accumulator_bits) + rounding_offset
+        np.right_shift(accumulator, shift, out=accumulator)
+        if saturate:
+            # np.clip has a much larger per-call overhead than maximum and minimum
+            np.maximum(accumulator, data_format.min_int, out=accumulator)
+            np.minimum(accumulator, data_format.max_int, out=y[order + n])
+        else:
+            y[order + n] = wrap(accumulator, data_format.word_length)
+    return y[order:]
@@ -6,6 +6,7 @@
 
 int iir_filter_init(IIRFilter* filter, const double* b, const double* a, int filter_order) {
     filter->num_taps = filter_order + 1;
+    filter->head = 0;
     
     // Allocate memory for coefficients and buffers
     filter->b = (double*)malloc(filter->num_taps * sizeof(double));
@@ -30,45 +31,45 @@ int iir_filter_init(IIRFilter* filter, const double* b, const double* a, int fil
 }
 
 double iir_filter_apply(IIRFilter* filter, double x) {
+    int filter_order = filter->num_taps - 1;
     double y = filter->b[0] * x;
-    
-    // Apply filter
+
+    // Apply filter, walking the circular buffers from the most recent
+    // sample (at head) to the oldest one
+    int index = filter->head;
     for (int i = 1; i < filter->num_taps; i++) {
-        y += filter->b[i] * filter->input_buffer[i - 1];
+        y += filter->b[i] * filter->input_buffer[index];
+        if (++index == filter_order) {
+            index = 0;
+        }
     }
+    index = filter->head;
     for (int i = 1; i < filter->num_taps; i++) {
-        y -= filter->a[i] * filter->output_buffer[i - 1];
-    }
-    
-    // Rotate input buffer
-    for (int i = filter->num_taps - 2; i > 0; i--) {
-        filter->input_buffer[i] = filter->input_buffer[i - 1];
+        y -= filter->a[i] * filter->output_buffer[index];
+        if (++index == filter_order) {
+            index = 0;
+        }
     }
-    filter->input_buffer[0] = x;
-    
-    // Print the input buffer
-    // printf("Input buffer: ");
-    // for (int i = 0; i < filter->num_taps - 1; i++) {
-    //     printf("%f ", filter->input_buffer[i]);
-    // }
-    // printf("\n");
 
-    // Rotate output buffer
-    for (int i = filter->num_taps - 2; i > 0; i--) {
-        filter->output_buffer[i] = filter->output_buffer[i - 1];
+    // Move the head one position back and overwrite the oldest sample,
+    // instead of rotating the buffers
+    if (filter_order > 0) {
+        filter->head = (filter->head == 0) ? filter_order - 1 : filter->head - 1;
+        filter->input_buffer[filter->head] = x;
+        filter->output_buffer[filter->head] = y;
     }
-    filter->output_buffer[0] = y;
-    
-    // Print the output buffer
-    // printf("Output buffer: ");
-    // for (int i = 0; i < filter->num_taps - 1; i++) {
-    //     printf("%f ", filter->output_buffer[i]);
-    // }
-    // printf("\n");
-    
+
     return y;
 }
 
+void iir_filter_apply_block(IIRFilter* filter, const double* x, double* y, int n) {
+    // One call for the whole block: the caller pays the cost of crossing
+    // into C once instead of once per sample
+    for (int i = 0; i < n; i++) {
+        y[i] = iir_filter_apply(filter, x[i]);
+    }
+}
+
 void iir_filter_destroy(IIRFilter* filter) {
     free(filter->b);
     free(filter->a);
@@ -4,13 +4,15 @@
 typedef struct {
     double* b;           // Numerator coefficients
     double* a;           // Denominator coefficients
-    double* input_buffer;  // Input history
-    double* output_buffer; // Output history
+    double* input_buffer;  // Input history (circular buffer)
+    double* output_buffer; // Output history (circular buffer)
     int num_taps;         // Filter order + 1
+    int head;             // Index of the most recent sample in the buffers
 } IIRFilter;
 
 int iir_filter_init(IIRFilter* filter, const double* b, const double* a, int filter_order);
 double iir_filter_apply(IIRFilter* filter, double x);
+void iir_filter_apply_block(IIRFilter* filter, const double* x, double* y, int n);
 void iir_filter_destroy(IIRFilter* filter);
 
 #endif
\ No newline at end of file
@@ -1,15 +1,134 @@
+import ctypes
+import os
+
 import numpy as np
 
+from filter_state.state_buffer.state_buffer import StateBuffer, pack_state, unpack_state
+from fixed_point.q_format.q_format import QFormat, wrap
+from iir.iir_array.iir_array import quantize_iir_coefficients
+from iir.utils.coefficient import (
+    InitialConditions,
+    direct_form_i_history,
+    restore_pending_steady_state,
+    validate_initial_conditions,
+)
+
+# Shared library built from the c/ folder with CMake:
+#   cmake -S c -B c/build && cmake --build c/build
+C_LIBRARY_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "c", "build")
+C_LIBRARY_NAMES = ["libiir_single_sample.so", "libiir_single_sample.dylib", "iir_single_sample.dll"]
+
+
+class _CIIRFilter(ctypes.Structure):
+    """Mirror of the IIRFilter struct in c/iir_single_sample.h"""
+
+    _fields_ = [
+        ("b", ctypes.POINTER(ctypes.c_double)),
+        ("a", ctypes.POINTER(ctypes.c_double)),
+        ("input_buffer", ctypes.POINTER(ctypes.c_double)),
+        ("output_buffer", ctypes.POINTER(ctypes.c_double)),
+        ("num_taps", ctypes.c_int),
+        ("head", ctypes.c_int),
+    ]
+
+
+_c_library = None
+_c_library_loaded = False
+
+
+def load_c_library():
+    """
+    Load the compiled IIR kernel, if it has been built.
+
+    Returns:
+        ctypes.CDLL | None: The loaded library, or None if it is not available
+    """
+    global _c_library, _c_library_loaded
+    if not _c_library_loaded:
+        _c_library_loaded = True
+        for name in C_LIBRARY_NAMES:
+            path = os.path.join(C_LIBRARY_DIRECTORY, name)
+            if os.path.exists(path):
+                try:
+                    library = ctypes.CDLL(path)
+                except OSError:
+                    continue
+                library.iir_filter_init.argtypes = [
+                    ctypes.POINTER(_CIIRFilter),
+                    ctypes.POINTER(ctypes.c_double),
+                    ctypes.POINTER(ctypes.c_double),
+                    ctypes.c_int,
+                ]
+                library.iir_filter_init.restype = ctypes.c_int
+                library.iir_filter_apply.argtypes = [ctypes.POINTER(_CIIRFilter), ctypes.c_double]
+                library.iir_filter_apply.restype = ctypes.c_double
+                # Blocks are passed as the addresses of C-contiguous float64 arrays
+                library.iir_filter_apply_block.argtypes = [
+                    ctypes.POINTER(_CIIRFilter),
+                    ctypes.c_void_p,
+                    ctypes.c_void_p,
+                    ctypes.c_int,
+                ]
+                library.iir_filter_apply_block.restype = None
+                library.iir_filter_destroy.argtypes = [ctypes.POINTER(_CIIRFilter)]
+                library.iir_filter_destroy.restype = None
+                _c_library = library
+                break
+    return _c_library
+
 
 class IIRSingleSample:
-    def __init__(self, b: np.ndarray, a: np.ndarray, filter_order: int):
+    def __init__(
+        self,
+        b: np.ndarray,
+        a: np.ndarray,
+        filter_order: int,
+        backend: str = "auto",
+        data_format: QFormat = None,
+        coefficient_format: QFormat = None,
+        accumulator_bits: int = 64,
+        initial_conditions: InitialConditions = "zeros",
+    ):
         """
         Initialize IIR filter.
 
+        The past inputs and outputs are kept in two circular buffers: `head` is
+        the index of the most recent sample, and older samples follow it
+        (wrapping around). Each new sample moves the head one position back
+        and overwrites the oldest sample, so no buffer is ever shifted.
+
         Args:
             b (np.ndarray): Numerator coefficients
             a (np.ndarray): Denominator coefficients
-            filter_order (int): Filter order 
+            filter_order (int): Filter order
+            backend (str): Implementation of the per-sample kernel:
+                - 'c': compiled kernel from the c/ folder, loaded with ctypes
+                - 'python': pure Python kernel
+                - 'auto': 'c' if the compiled library is available, else 'python'
+                Defaults to 'auto'. With the 'c' backend, apply_iir_filter
+                still costs about a microsecond per sample, most of it in the
+                ctypes call: apply_iir_filter_block filters a whole block in
+                one call, and IIRFilterBank steps many streams at once.
+            data_format (QFormat): Format of the input and output samples to
+            simulate the filter in fixed-point arithmetic, with the Python
+            kernel (see IIRArray.apply_iir_filter_fixed_point, with which it
+            is bit-exact). The backend is then 'fixed_point' and the buffers
+            hold quantized integers. Defaults to None, which filters in floating point.
+            coefficient_format (QFormat): Format of the normalized coefficients
+            in fixed-point mode. Defaults to the format with the word length of
+            data_format and as many fractional bits as the coefficients allow.
+            accumulator_bits (int): Size of the accumulator in fixed-point
+            mode, at most 64. Defaults to 64.
+            initial_conditions (str | np.ndarray): Memory the stream starts
+            from, after construction and after reset:
+                - 'zeros': zero past inputs and outputs
+                - 'steady': the steady state of the first input sample, set
+                  when it comes in, as if the input had been at that value forever
+                - an array of shape (filter_order,): the direct form II
+                  transposed state (the zi of scipy.signal.lfilter), converted
+                  to past inputs and outputs
+                In fixed-point mode, the past inputs and outputs are quantized
+                to data_format. Defaults to 'zeros'.
 
         Returns:
             None
@@ -18,6 +137,11 @@ class IIRSingleSample:
             ValueError: If the length of the numerator coefficients (b) is not equal to the filter order + 1
             ValueError: If the length of the denominator coefficients (a) is not equal to the filter order + 1
             ValueError: If the length of the numerator and denominator coefficients (b and a respectively) are not equal
+            ValueError: If backend is 'c' and the compiled library is not available
+            ValueError: If backend is 'c' and a data_format is given
+            ValueError: If accumulator_bits is not in [2, 64]
+            ValueError: If initial_conditions is not 'zeros', 'steady' or an array of shape (filter_order,)
+            ValueError: If initial_conditions is 'steady' and the filter has a pole at z = 1
 
         """
         self.b = b
@@ -29,10 +153,141 @@ class IIRSingleSample:
             raise ValueError("The length of the denominator coefficients (a) must be equal to the filter order + 1")
         if len(b) != len(a):
             raise ValueError("The length of the numerator and denominator coefficients (b and a respectively) must be equal")
-        
+        if backend not in ("auto", "c", "python"):
+            raise ValueError("backend must be 'auto', 'c' or 'python'")
+
+        self.filter_order = filter_order
         self.num_taps = filter_order + 1
-        self.input_buffer = np.zeros(filter_order)
-        self.output_buffer = np.zeros(filter_order)
+
+        if data_format is not None:
+            if backend == "c":
+                raise ValueError("The compiled IIR kernel does not support fixed-point arithmetic")
+            if not 2 <= accumulator_bits <= 64:
+                raise ValueError("accumulator_bits must be between 2 and 64")
+            if a[0] == 0:
+                raise ValueError("The first denominator coefficient must be different from zero")
+            b_q, a_q, coefficient_format = quantize_iir_coefficients(b, a, data_format, coefficient_format)
+            self.backend = "fixed_point"
+            self._c_filter = None
+            self.data_format = data_format
+            self.coefficient_format = coefficient_format
+            self.accumulator_bits = accumulator_bits
+            self._b = b_q.tolist()
+            self._a = a_q.tolist()
+            self.input_buffer = [0] * filter_order
+            self.output_buffer = [0] * filter_order
+            self._head = 0
+            self._set_initial_conditions(initial_conditions)
+            return
+
+        library = load_c_library() if backend != "python" else None
+        if backend == "c" and library is None:
+            raise ValueError(
+                f"The compiled IIR kernel was not found in {C_LIBRARY_DIRECTORY}, build it with CMake"
+            )
+
+        if library is not None and filter_order > 0:
+            self.backend = "c"
+            self._library = library
+            self._c_filter = _CIIRFilter()
+            b_c = (ctypes.c_double * self.num_taps)(*[float(value) for value in b])
+            a_c = (ctypes.c_double * self.num_taps)(*[float(value) for value in a])
+            if library.iir_filter_init(ctypes.byref(self._c_filter), b_c, a_c, filter_order) != 0:
+                raise MemoryError("Failed to initialize the compiled IIR kernel")
+            # The buffers live in C memory: expose them as NumPy views
+            self.input_buffer = np.ctypeslib.as_array(self._c_filter.input_buffer, shape=(filter_order,))
+            self.output_buffer = np.ctypeslib.as_array(self._c_filter.output_buffer, shape=(filter_order,))
+            # Look the kernel and the filter pointer up once: each call only
+            # converts x and the result
+            self._c_apply = library.iir_filter_apply
+            self._c_filter_reference = ctypes.byref(self._c_filter)
+        else:
+            self.backend = "python"
+            self._c_filter = None
+            self._b = [float(value) for value in b]
+            self._a = [float(value) for value in a]
+            self.input_buffer = [0.0] * filter_order
+            self.output_buffer = [0.0] * filter_order
+            self._head = 0
+        self._set_initial_conditions(initial_conditions)
+
+    def _set_initial_conditions(self, initial_conditions: InitialConditions):
+        """
+        Validate the initial conditions and start the filter from them.
+
+        Args:
+            initial_conditions (str | np.ndarray): See __init__
+        """
+        self.initial_conditions = validate_initial_conditions(initial_conditions, (self.filter_order,))
+        if isinstance(self.initial_conditions, str):
+            if self.initial_conditions == "steady":
+                b_sum = np.sum(np.asarray(self.b, dtype=np.float64))
+                a_sum = np.sum(np.asarray(self.a, dtype=np.float64))
+                if a_sum == 0:
+                    raise ValueError("The filter has a pole at z = 1: it has no steady state")
+                self._dc_gain = float(b_sum / a_sum)
+        else:
+            # Most recent first, as in the circular buffers
+            x_history, y_history = direct_form_i_history(self.b, self.a, self.initial_conditions)
+            self._initial_history = (x_history[::-1], y_history[::-1])
+        self.reset()
+
+    def reset(self):
+        """Reset the filter memory to its initial conditions."""
+        # With 'steady' initial conditions the memory is set by the first sample
+        self._pending_steady_state = isinstance(self.initial_conditions, str) and self.initial_conditions == "steady"
+        if isinstance(self.initial_conditions, str):
+            zeros = [0.0] * self.filter_order
+            self._load_buffers(zeros, zeros)
+            return
+
+        x_history, y_history = self._initial_history
+        if self.backend == "fixed_point":
+            x_history = self.data_format.quantize(x_history)
+            y_history = self.data_format.quantize(y_history)
+        self._load_buffers(x_history, y_history)
+
+    def _start_from_steady_state(self, x: float):
+        """
+        Load the steady state of the first input sample into the memory.
+
+        Args:
+            x (float): First input sample
+        """
+        self._pending_steady_state = False
+        order = self.filter_order
+        if self.backend == "fixed_point":
+            x_q = self.data_format.quantize(x)
+            y_q = self.data_format.quantize(self.data_format.to_float(x_q) * self._dc_gain)
+            self._load_buffers([x_q] * order, [y_q] * order)
+        else:
+            self._load_buffers([float(x)] * order, [float(x) * self._dc_gain] * order)
+
+    def _load_buffers(self, inputs, outputs):
+        """
+        Overwrite the circular buffers.
+
+        Args:
+            inputs (list | np.ndarray): The past filter_order inputs, most recent first
+            outputs (list | np.ndarray): The past filter_order outputs, most recent first
+        """
+        if self._c_filter is not None:
+            self.input_buffer[:] = inputs
+            self.output_buffer[:] = outputs
+            self._c_filter.head = 0
+            return
+
+        convert = int if self.backend == "fixed_point" else float
+        self.input_buffer[:] = [convert(value) for value in np.asarray(inputs).tolist()]
+        self.output_buffer[:] = [convert(value) for value in np.asarray(outputs).tolist()]
+        self._head = 0
+
+    @property
+    def head(self) -> int:
+        """Index of the most recent sample in the circular buffers."""
+        if self._c_filter is not None:
+            return self._c_filter.head
+        return self._head
 
     def apply_iir_filter(self, x: float) -> float:
         """
@@ -44,19 +299,166 @@ class IIRSingleSample:
         Returns:
             float: Filtered sample
         """
-        y = self.b[0] * x
-        for i in range(1, len(self.b)):
-            y = y + self.b[i] * self.input_buffer[i - 1]
-        for i in range(1, len(self.a)):
-            y = y - self.a[i] * self.output_buffer[i - 1]
-        
-        # Rotate the input buffer to the right of one position
-        for i in range(1, len(self.b) - 1):
-            self.input_buffer[self.num_taps - 1 - i] = self.input_buffer[self.num_taps - 2 - i]
-        self.input_buffer[0] = x
-
-        # Rotate the output buffer to the right of one position
-        for i in range(1, len(self.a) - 1):
-            self.output_buffer[self.num_taps - 1 - i] = self.output_buffer[self.num_taps - 2 -i]
-        self.output_buffer[0] = y
+        if self._pending_steady_state:
+            self._start_from_steady_state(x)
+        if self._c_filter is not None:
+            return self._c_apply(self._c_filter_reference, x)
+        if self.backend == "fixed_point":
+            return self._apply_iir_filter_fixed_point(x)
+
+        b = self._b
+        a = self._a
+        input_buffer = self.input_buffer
+        output_buffer = self.output_buffer
+        filter_order = self.filter_order
+        head = self._head
+
+        x = float(x)
+        y = b[0] * x
+        index = head
+        for i in range(1, self.num_taps):
+            y = y + b[i] * input_buffer[index]
+            index += 1
+            if index == filter_order:
+                index = 0
+        index = head
+        for i in range(1, self.num_taps):
+            y = y - a[i] * output_buffer[index]
+            index += 1
+            if index == filter_order:
+                index = 0
+
+        # Move the head one position back and overwrite the oldest sample
+        if filter_order > 0:
+            head = head - 1 if head > 0 else filter_order - 1
+            input_buffer[head] = x
+            output_buffer[head] = y
+            self._head = head
         return y
+
+    def apply_iir_filter_block(self, x: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """
+        Apply the IIR filter to a block of samples, continuing the stream.
+
+        Gives the outputs of apply_iir_filter called on every sample, with
+        the same backend. The 'c' backend filters the whole block in a single
+        call to the compiled kernel.
+
+        Args:
+            x (np.ndarray): Input samples
+            out (np.ndarray): Optional array of the same length as x where the
+            output is written. Defaults to None, which allocates a float64 array.
+
+        Returns:
+            np.ndarray: Filtered samples (out, when given)
+
+        Raises:
+            ValueError: If out does not have the same length as x
+        """
+        input_signal = np.ascontiguousarray(x, dtype=np.float64).ravel()
+        num_samples = len(input_signal)
+        if out is not None and out.shape != (num_samples,):
+            raise ValueError("out must be a 1D array with the same length as the input signal")
+
+        if self._c_filter is None:
+            y = np.empty(num_samples) if out is None else out
+            apply_iir_filter = self.apply_iir_filter
+            for n, sample in enumerate(input_signal.tolist()):
+                y[n] = apply_iir_filter(sample)
+            return y
+
+        if self._pending_steady_state and num_samples:
+            self._start_from_steady_state(input_signal[0])
+        # The kernel writes to a C-contiguous float64 buffer
+        direct = out is not None and out.dtype == np.float64 and out.flags.c_contiguous
+        y = out if direct else np.empty(num_samples)
+        self._library.iir_filter_apply_block(self._c_filter_reference, input_signal.ctypes.data, y.ctypes.data, num_samples)
+        if out is None or direct:
+            return y
+        out[...] = y
+        return out
+
+    def _apply_iir_filter_fixed_point(self, x: float) -> float:
+        """
+        Apply the IIR filter to an input sample in fixed-point arithmetic.
+
+        Args:
+            x (float): Input sample
+
+        Returns:
+            float: Filtered sample, dequantized
+        """
+        b = self._b
+        a = self._a
+        input_buffer = self.input_buffer
+        output_buffer = self.output_buffer
+        filter_order = self.filter_order
+        accumulator_bits = self.accumulator_bits
+        data_format = self.data_format
+        head = self._head
+
+        x_q = data_format.quantize(x)
+        accumulator = b[0] * x_q
+        index = head
+        for i in range(1, self.num_taps):
+            accumulator = wrap(accumulator + b[i] * input_buffer[index] - a[i] * output_buffer[index], accumulator_bits)
+            index += 1
+            if index == filter_order:
+                index = 0
+        accumulator = wrap(accumulator, accumulator_bits)
+        y_q = data_format.rescale(accumulator, data_format.fractional_bits + self.coefficient_format.fractional_bits)
+
+        if filter_order > 0:
+            head = head - 1 if head > 0 else filter_order - 1
+            input_buffer[head] = x_q
+            output_buffer[head] = y_q
+            self._head = head
+        return data_format.to_float(y_q)
+
+    def get_state(self) -> bytes:
+        """
+        Snapshot of the filter memory, to continue the stream elsewhere with set_state.
+
+        The past inputs then the past outputs, most recent first, whatever the
+        position of the head. The state of the 'c' and 'python' backends is
+        interchangeable; in fixed-point mode it holds the quantized integers.
+        The last value is 1 if the filter still starts from the steady state
+        of its next sample (no sample since a 'steady' start), else 0.
+
+        Returns:
+            bytes: The state, see filter_state.state_buffer
+        """
+        order = self.filter_order
+        head = self.head
+        values = np.empty(2 * order + 1)
+        values[: order - head] = self.input_buffer[head:]
+        values[order - head : order] = self.input_buffer[:head]
+        values[order : 2 * order - head] = self.output_buffer[head:]
+        values[2 * order - head : 2 * order] = self.output_buffer[:head]
+        values[-1] = self._pending_steady_state
+        return pack_state(self._state_kind(), (order,), values)
+
+    def set_state(self, state: StateBuffer):
+        """
+        Restore a state returned by get_state.
+
+        Args:
+            state (bytes): State of a filter of the same order and arithmetic
+
+        Raises:
+            ValueError: If the state was taken from another kind of filter or another order
+            ValueError: If the state is waiting for a steady-state start and
+            the filter does not have 'steady' initial conditions
+        """
+        order = self.filter_order
+        values = unpack_state(state, self._state_kind(), (order,), 2 * order + 1)
+        self._pending_steady_state = restore_pending_steady_state(values[-1], self.initial_conditions)
+        self._load_buffers(values[:order], values[order : 2 * order])
+
+    def _state_kind(self) -> str:
+        return "IIRSingleSample/fixed_point" if self.backend == "fixed_point" else "IIRSingleSample"
+
+    def __del__(self):
+        if getattr(self, "_c_filter", None) is not None:
+            self._library.iir_filter_destroy(self._c_filter)
+            self._c_filter = None
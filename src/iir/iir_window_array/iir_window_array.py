@@ -1,55 +1,172 @@
 import numpy as np
 
+from filter_state.state_buffer.state_buffer import StateBuffer, pack_state, unpack_state
+from iir.utils.coefficient import (
+    InitialConditions,
+    lfilter_zi,
+    restore_pending_steady_state,
+    validate_initial_conditions,
+)
+
 class IIRWindowArray:
-    def __init__(self, b, a):
+    def __init__(self, b, a, dtype=np.float64, initial_conditions: InitialConditions = "zeros"):
+        """
+        Initialize IIR filter that maintains state between signal windows.
+
+        The filter runs in direct form II transposed: its whole memory is a
+        state vector of `order` values, updated in place sample after sample,
+        so no history array is rebuilt when a new window comes in.
+
+        Args:
+            b (array): Numerator coefficients
+            a (array): Denominator coefficients
+            dtype (np.dtype): Floating point type of the output, float32 or
+            float64. The state (order values) and the arithmetic stay
+            float64: with poles close to the unit circle, a direct form
+            filter amplifies the float32 rounding errors. Defaults to float64.
+            initial_conditions (str | np.ndarray): State the stream starts
+            from, after construction and after reset:
+                - 'zeros': zero state
+                - 'steady': the steady state of the first input sample, set
+                  when it comes in (scipy.signal.lfilter_zi(b, a) * x[0])
+                - an array of shape (order,): the state itself
+                Defaults to 'zeros'.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If the numerator or denominator coefficients are not 1D arrays
+            ValueError: If the first denominator coefficient is zero
+            ValueError: If dtype is not float32 or float64
+            ValueError: If initial_conditions is not 'zeros', 'steady' or an array of shape (order,)
+            ValueError: If initial_conditions is 'steady' and the filter has a pole at z = 1
+        """
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float64):
+            raise ValueError("dtype must be float32 or float64")
         self.b = np.asarray(b)
         self.a = np.asarray(a)
         self.taps = len(b)
-        
-        # Initialize state buffers for previous inputs and outputs
-        self.x_history = np.zeros(self.taps - 1)  # Previous inputs
-        self.y_history = np.zeros(self.taps - 1)  # Previous outputs
-        
-    def apply_iir_filter(self, x):
+
+        if self.b.ndim != 1 or self.a.ndim != 1:
+            raise ValueError("Numerator and denominator coefficients must be 1D arrays")
+        if self.a[0] == 0:
+            raise ValueError("The first denominator coefficient must be different from zero")
+
+        self.order = max(len(self.a), len(self.b)) - 1
+
+        # Normalized coefficients padded to the same length, as Python floats
+        self._b = [0.0] * (self.order + 1)
+        self._a = [0.0] * (self.order + 1)
+        self._b[: len(self.b)] = (self.b / self.a[0]).tolist()
+        self._a[: len(self.a)] = (self.a / self.a[0]).tolist()
+
+        self.initial_conditions = validate_initial_conditions(initial_conditions, (self.order,))
+        if isinstance(self.initial_conditions, str) and self.initial_conditions == "steady":
+            # State for a unit input held forever, scaled by the first sample
+            self._steady_state = lfilter_zi(self.b, self.a).tolist()
+
+        # Direct form II transposed state, preallocated and updated in place
+        self._state = [0.0] * self.order
+        self.reset()
+
+    @property
+    def state(self) -> np.ndarray:
+        """Direct form II transposed state vector, of length order."""
+        return np.array(self._state)
+
+    @state.setter
+    def state(self, value: np.ndarray):
+        value = np.asarray(value, dtype=np.float64)
+        if value.shape != (self.order,):
+            raise ValueError(f"The state must have shape ({self.order},)")
+        self._state[:] = value.tolist()
+        self._pending_steady_state = False
+
+    def apply_iir_filter(self, x, out=None):
         """
         Apply IIR filter to input signal while maintaining state between calls.
-        
+
         Args:
             x (array): Input signal window
-        
+            out (array): Optional array of the same length as x where the
+            output is written, e.g. a slice of a preallocated output signal.
+            Defaults to None, which allocates a new array of the filter dtype.
+
         Returns:
-            array: Filtered signal window
+            array: Filtered signal window (out, when given)
+
+        Raises:
+            ValueError: If out does not have the same length as x
         """
         # Ensure input is a numpy array
-        input_signal = np.asarray(x).flatten()
-        
-        if input_signal.ndim != 1 or self.b.ndim != 1 or self.a.ndim != 1:
-            raise ValueError("Input signal, numerator and denominator coefficients must be 1D arrays")
-
+        input_signal = np.asarray(x, dtype=np.float64).ravel()
         input_signal_length = len(input_signal)
-        y = np.zeros(input_signal_length)
-        
-        # Create extended input signal with history
-        x_extended = np.concatenate([self.x_history, input_signal])
-        y_extended = np.concatenate([self.y_history, y])
-        
-        # Apply filter
-        for n in range(input_signal_length):
-            n_offset = n + len(self.x_history)  # Offset for extended arrays
-            
-            # Apply FIR part (b coefficients)
-            for k in range(self.taps):
-                y_extended[n_offset] += self.b[k] * x_extended[n_offset - k]
-            
-            # Apply IIR part (a coefficients)
-            for k in range(1, self.taps):
-                y_extended[n_offset] -= self.a[k] * y_extended[n_offset - k]
-            
-            y_extended[n_offset] /= self.a[0]
-            y[n] = y_extended[n_offset]
-        
-        # Update state for next window
-        self.x_history = x_extended[-self.taps+1:]
-        self.y_history = y_extended[-self.taps+1:]
-        
-        return y
\ No newline at end of file
+
+        if out is None:
+            out = np.empty(input_signal_length, dtype=self.dtype)
+        elif out.shape != (input_signal_length,):
+            raise ValueError("out must be a 1D array with the same length as the input signal")
+
+        b = self._b
+        a = self._a
+        z = self._state
+        order = self.order
+        b0 = b[0]
+
+        if order == 0:
+            out[...] = b0 * input_signal
+            return out
+        if self._pending_steady_state and input_signal_length:
+            x0 = float(input_signal[0])
+            z[:] = [value * x0 for value in self._steady_state]
+            self._pending_steady_state = False
+
+        last = order - 1
+        b_last = b[order]
+        a_last = a[order]
+        for n, sample in enumerate(input_signal.tolist()):
+            y = b0 * sample + z[0]
+            for i in range(last):
+                z[i] = z[i + 1] + b[i + 1] * sample - a[i + 1] * y
+            z[last] = b_last * sample - a_last * y
+            out[n] = y
+
+        return out
+
+    def get_state(self) -> bytes:
+        """
+        Snapshot of the filter memory, to continue the stream elsewhere with set_state.
+
+        Returns:
+            bytes: The direct form II transposed state, then 1 if the filter
+            still starts from the steady state of its next sample (no sample
+            since a 'steady' start), else 0, see filter_state.state_buffer
+        """
+        return pack_state("IIRWindowArray", (self.order,), self._state + [float(self._pending_steady_state)])
+
+    def set_state(self, state: StateBuffer):
+        """
+        Restore a state returned by get_state.
+
+        Args:
+            state (bytes): State of a filter of the same order
+
+        Raises:
+            ValueError: If the state was taken from another kind of filter or another order
+            ValueError: If the state is waiting for a steady-state start and
+            the filter does not have 'steady' initial conditions
+        """
+        values = unpack_state(state, "IIRWindowArray", (self.order,), self.order + 1)
+        pending_steady_state = restore_pending_steady_state(values[-1], self.initial_conditions)
+        self._state[:] = values[:-1].tolist()
+        self._pending_steady_state = pending_steady_state
+
+    def reset(self):
+        """Reset the filter state to its initial conditions."""
+        if isinstance(self.initial_conditions, str):
+            self._state[:] = [0.0] * self.order
+        else:
+            self._state[:] = self.initial_conditions.tolist()
+        self._pending_steady_state = isinstance(self.initial_conditions, str) and self.initial_conditions == "steady"
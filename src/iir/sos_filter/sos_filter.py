@@ -0,0 +1,452 @@
+import numpy as np
+
+from filter_state.state_buffer.state_buffer import StateBuffer, pack_state, unpack_state
+from iir.filtfilt.filtfilt import PadType, filtfilt, validate_padding
+from iir.utils.coefficient import (
+    InitialConditions,
+    direct_form_i_history,
+    restore_pending_steady_state,
+    tf_to_sos,
+    validate_initial_conditions,
+    zpk_to_sos,
+)
+
+# Number of samples solved per matrix product by the block recursion of each
+# biquad. It bounds the size of the precomputed (block, block) response matrix.
+BLOCK_SIZE = 128
+
+
+class SOSFilter:
+    def __init__(self, sos: np.ndarray, dtype=None, initial_conditions: InitialConditions = "zeros"):
+        """
+        Initialize a cascade of second-order sections (biquads).
+
+        Every section is a direct form I biquad. Its state holds the last two
+        inputs and the last two outputs, [x[n-1], x[n-2], y[n-1], y[n-2]],
+        and is shared by the windowed and the single-sample modes.
+
+        Args:
+            sos (np.ndarray): Second-order sections of shape (n_sections, 6),
+            each row being [b0, b1, b2, a0, a1, a2]
+            dtype (np.dtype): Floating point type of the state, the arithmetic
+            and the output, float32 or float64. Biquads keep their poles well
+            conditioned, so the cascade is accurate in float32. Defaults to
+            None: float64 arithmetic and state, and apply_sos_filter keeps the
+            dtype of floating point inputs.
+            initial_conditions (str | np.ndarray): State the cascade starts
+            from, for apply_sos_filter and for the stream after construction
+            and after reset:
+                - 'zeros': zero state
+                - 'steady': the steady state of the first input sample (set
+                  when it comes in, for the stream), as if the input had been
+                  at that value forever (scipy.signal.sosfilt_zi(sos) * x[0])
+                - an array of shape (n_sections, 2): the direct form II
+                  transposed state of every section (the zi of
+                  scipy.signal.sosfilt), converted to direct form I
+                Defaults to 'zeros'.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If sos does not have shape (n_sections, 6)
+            ValueError: If the a0 coefficient of a section is zero
+            ValueError: If dtype is not None, float32 or float64
+            ValueError: If initial_conditions is not 'zeros', 'steady' or an array of shape (n_sections, 2)
+            ValueError: If initial_conditions is an array that a direct form I
+            section cannot reproduce (a nonzero second value for a first-order section)
+        """
+        self.dtype = None if dtype is None else np.dtype(dtype)
+        if self.dtype is not None and self.dtype not in (np.float32, np.float64):
+            raise ValueError("dtype must be float32 or float64")
+        # Type of the state and the arithmetic
+        self._working_dtype = np.dtype(np.float64) if dtype is None else self.dtype
+        sos = np.atleast_2d(np.asarray(sos, dtype=np.float64))
+        if sos.ndim != 2 or sos.shape[1] != 6 or len(sos) == 0:
+            raise ValueError("sos must have shape (n_sections, 6)")
+        if np.any(sos[:, 3] == 0):
+            raise ValueError("The a0 coefficient of every section must be different from zero")
+
+        # Normalize every section so that a0 == 1
+        self.sos = sos / sos[:, 3:4]
+        self.num_sections = len(self.sos)
+        self._sections = self.sos.tolist()
+
+        self.initial_conditions = validate_initial_conditions(initial_conditions, (self.num_sections, 2))
+        if not isinstance(self.initial_conditions, str):
+            # [x[n-1], x[n-2], y[n-1], y[n-2]] of every section
+            self._initial_section_state = np.empty((self.num_sections, 4))
+            for section, zi in enumerate(self.initial_conditions):
+                x_history, y_history = direct_form_i_history(self.sos[section, :3], self.sos[section, 3:], zi)
+                self._initial_section_state[section] = [x_history[1], x_history[0], y_history[1], y_history[0]]
+        self.reset()
+
+        # Response matrices of the feedback recursion of every section,
+        # computed in float64 and rounded once to the working dtype
+        self._feed_forward = self.sos[:, :3].astype(self._working_dtype)
+        self._block_responses = [
+            tuple(
+                response.astype(self._working_dtype)
+                for response in _biquad_block_response(a1, a2, BLOCK_SIZE)
+            )
+            for a1, a2 in self.sos[:, 4:6]
+        ]
+
+    @classmethod
+    def from_tf(
+        cls, b: np.ndarray, a: np.ndarray, dtype=None, initial_conditions: InitialConditions = "zeros"
+    ) -> "SOSFilter":
+        """
+        Create the cascade from transfer function coefficients.
+
+        Args:
+            b (np.ndarray): Numerator coefficients
+            a (np.ndarray): Denominator coefficients
+            dtype (np.dtype): See SOSFilter. Defaults to None.
+            initial_conditions (str | np.ndarray): See SOSFilter, an array
+            being the state of every section of the cascade. Defaults to 'zeros'.
+
+        Returns:
+            SOSFilter: Cascade with conjugate poles paired in the same section
+        """
+        return cls(tf_to_sos(b, a), dtype=dtype, initial_conditions=initial_conditions)
+
+    @classmethod
+    def from_zpk(
+        cls, z: np.ndarray, p: np.ndarray, k: float, dtype=None, initial_conditions: InitialConditions = "zeros"
+    ) -> "SOSFilter":
+        """
+        Create the cascade from zeros, poles and gain.
+
+        Args:
+            z (np.ndarray): Zeros of the transfer function
+            p (np.ndarray): Poles of the transfer function
+            k (float): Gain of the transfer function
+            dtype (np.dtype): See SOSFilter. Defaults to None.
+            initial_conditions (str | np.ndarray): See SOSFilter, an array
+            being the state of every section of the cascade. Defaults to 'zeros'.
+
+        Returns:
+            SOSFilter: Cascade with conjugate poles paired in the same section
+        """
+        return cls(zpk_to_sos(z, p, k), dtype=dtype, initial_conditions=initial_conditions)
+
+    def apply_sos_filter(self, x, axis=-1):
+        """
+        Apply the cascade to a whole signal, starting from the initial conditions.
+
+        The filter state is neither used nor modified.
+
+        Args:
+            x (array): Input signal, 1D or N-D
+            axis (int): Axis of x along which the filter is applied. Defaults to -1.
+
+        Returns:
+            array: Filtered signal, with the same shape and memory layout as x.
+            Its dtype is the dtype of the filter, or, if it is None, the dtype
+            of floating point inputs and float64 for other inputs.
+
+        Raises:
+            ValueError: If initial_conditions is 'steady' and a section has a pole at z = 1
+        """
+        input_signal = np.asarray(x)
+        if input_signal.ndim == 0:
+            raise ValueError("Input signal must have at least one dimension")
+
+        y = np.empty_like(input_signal, dtype=self._output_dtype(input_signal))
+
+        # Bring the filtering axis first and stack the other axes as channels
+        input_signal_moved = np.moveaxis(input_signal, axis, 0)
+        input_signal_length = input_signal_moved.shape[0]
+        signals = input_signal_moved.reshape(input_signal_length, -1).astype(self._working_dtype)
+
+        state = self._initial_state(signals[0] if input_signal_length else np.zeros(signals.shape[1]))
+        filtered = self._apply_cascade(signals, state)
+        np.moveaxis(y, axis, 0)[...] = filtered.reshape(input_signal_moved.shape)
+        return y
+
+    def apply_sos_filtfilt(self, x, axis=-1, padtype: PadType = "odd", padlen: int = None):
+        """
+        Apply the cascade forward then backward, for zero-phase filtering.
+
+        The filter state is neither used nor modified. The signal is extended
+        at both ends, and each pass starts from the steady state of its first
+        sample, as scipy.signal.sosfiltfilt does. For recordings that do not
+        fit in memory, see iir.filtfilt.filtfilt.filtfilt_chunked.
+
+        Args:
+            x (array): Input signal, 1D or N-D
+            axis (int): Axis of x along which the filter is applied. Defaults to -1.
+            padtype (str): Extension of the signal ends, 'odd', 'even',
+            'constant' or None. Defaults to 'odd'.
+            padlen (int): Number of extension samples at each end. Defaults to
+            None, the default of scipy.signal.sosfiltfilt.
+
+        Returns:
+            array: Filtered signal, with the same shape as x and the output
+            dtype of apply_sos_filter
+
+        Raises:
+            ValueError: If the padding options are invalid or the signal is not longer than padlen
+            ValueError: If a section has a pole at z = 1, which has no steady state
+        """
+        input_signal = np.asarray(x)
+        if input_signal.ndim == 0:
+            raise ValueError("Input signal must have at least one dimension")
+        input_signal_moved = np.moveaxis(input_signal, axis, 0)
+        input_signal_length = input_signal_moved.shape[0]
+        padlen = validate_padding(padtype, padlen, input_signal_length, self._default_padlen())
+
+        filtered = filtfilt(self, input_signal_moved.reshape(input_signal_length, -1), padlen, padtype)
+        y = np.empty_like(input_signal, dtype=self._output_dtype(input_signal))
+        np.moveaxis(y, axis, 0)[...] = filtered.reshape(input_signal_moved.shape)
+        return y
+
+    def apply_sos_filter_window(self, x, out=None):
+        """
+        Apply the cascade to a signal window while maintaining state between calls.
+
+        Args:
+            x (array): Input signal window
+            out (array): Optional array of the same length as x where the
+            output is written. It may be x itself. Defaults to None.
+
+        Returns:
+            array: Filtered signal window (out, when given)
+
+        Raises:
+            ValueError: If out does not have the same length as x
+        """
+        input_signal = np.asarray(x, dtype=self._working_dtype).flatten()
+        if out is not None and out.shape != input_signal.shape:
+            raise ValueError("out must be a 1D array with the same length as the input signal")
+        if self._pending_steady_state and len(input_signal):
+            self.state = self._steady_state(input_signal[:1])[:, :, 0]
+            self._pending_steady_state = False
+
+        state = self.state[:, :, np.newaxis].copy()
+        y = self._apply_cascade(input_signal[:, np.newaxis], state)
+        self.state = state[:, :, 0]
+        if out is None:
+            return y[:, 0]
+        out[...] = y[:, 0]
+        return out
+
+    def apply_sos_filter_single_sample(self, x: float) -> float:
+        """
+        Apply the cascade to a single input sample while maintaining state between calls.
+
+        Args:
+            x (float): Input sample
+
+        Returns:
+            float: Filtered sample. With a float32 filter, the sample is
+            computed in double precision and the state is stored in float32.
+        """
+        if self._pending_steady_state:
+            self.state = self._steady_state(np.array([x], dtype=np.float64))[:, :, 0]
+            self._pending_steady_state = False
+        # Work on Python floats: indexing NumPy scalars is much slower
+        state = self.state.tolist()
+        y = float(x)
+        for section, (b0, b1, b2, _, a1, a2) in enumerate(self._sections):
+            x1, x2, y1, y2 = state[section]
+            section_input = y
+            y = b0 * section_input + b1 * x1 + b2 * x2 - a1 * y1 - a2 * y2
+            state[section] = [section_input, x1, y, y1]
+        self.state[...] = state
+        return y
+
+    def get_state(self) -> bytes:
+        """
+        Snapshot of the filter memory, to continue the stream elsewhere with set_state.
+
+        Returns:
+            bytes: The direct form I state of every section, then 1 if the
+            filter still starts from the steady state of its next sample (no
+            sample since a 'steady' start), else 0, see filter_state.state_buffer
+        """
+        values = np.append(self.state.astype(np.float64).ravel(), float(self._pending_steady_state))
+        return pack_state("SOSFilter", (self.num_sections,), values)
+
+    def set_state(self, state: StateBuffer):
+        """
+        Restore a state returned by get_state.
+
+        Args:
+            state (bytes): State of a cascade with the same number of sections
+
+        Raises:
+            ValueError: If the state was taken from another kind of filter or
+            another number of sections
+            ValueError: If the state is waiting for a steady-state start and
+            the filter does not have 'steady' initial conditions
+        """
+        values = unpack_state(state, "SOSFilter", (self.num_sections,), 4 * self.num_sections + 1)
+        pending_steady_state = restore_pending_steady_state(values[-1], self.initial_conditions)
+        self.state = values[:-1].reshape(self.num_sections, 4).astype(self._working_dtype)
+        self._pending_steady_state = pending_steady_state
+
+    def reset(self):
+        """Reset the filter state to its initial conditions."""
+        self.state = self._initial_state(np.zeros(1))[:, :, 0]
+        self._pending_steady_state = isinstance(self.initial_conditions, str) and self.initial_conditions == "steady"
+
+    def _initial_state(self, x0: np.ndarray) -> np.ndarray:
+        """
+        Section state the filter starts from.
+
+        Args:
+            x0 (np.ndarray): First input sample of every channel, of shape (channels,)
+
+        Returns:
+            np.ndarray: State of shape (n_sections, 4, channels), see _apply_cascade
+        """
+        num_channels = len(x0)
+        if isinstance(self.initial_conditions, str):
+            if self.initial_conditions == "steady":
+                return self._steady_state(x0)
+            return np.zeros((self.num_sections, 4, num_channels), dtype=self._working_dtype)
+        state = np.repeat(self._initial_section_state[:, :, np.newaxis], num_channels, axis=2)
+        return state.astype(self._working_dtype)
+
+    def _output_dtype(self, input_signal: np.ndarray) -> np.dtype:
+        """Dtype of the filter, or of floating point inputs, or float64."""
+        if self.dtype is not None:
+            return self.dtype
+        if np.issubdtype(input_signal.dtype, np.floating):
+            return input_signal.dtype
+        return np.dtype(np.float64)
+
+    def _default_padlen(self) -> int:
+        """Extension length of filtfilt, as in scipy.signal.sosfiltfilt."""
+        taps = 2 * self.num_sections + 1
+        taps -= min(np.sum(self.sos[:, 2] == 0), np.sum(self.sos[:, 5] == 0))
+        return 3 * int(taps)
+
+    def _steady_state(self, x0: np.ndarray) -> np.ndarray:
+        """
+        Section state for inputs held at x0 forever.
+
+        Args:
+            x0 (np.ndarray): Input value of every channel, of shape (channels,)
+
+        Returns:
+            np.ndarray: State of shape (n_sections, 4, channels), see _apply_cascade
+
+        Raises:
+            ValueError: If a section has a pole at z = 1, which has no steady state
+        """
+        denominators = np.sum(self.sos[:, 3:], axis=1)
+        if np.any(denominators == 0):
+            raise ValueError("A section has a pole at z = 1: it has no steady state")
+        gains = np.sum(self.sos[:, :3], axis=1) / denominators
+
+        level = np.asarray(x0, dtype=np.float64)
+        state = np.empty((self.num_sections, 4) + level.shape)
+        for section, gain in enumerate(gains):
+            state[section, 0:2] = level
+            level = gain * level
+            state[section, 2:4] = level
+        return state.astype(self._working_dtype)
+
+    def _filter_block(self, x: np.ndarray, state: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Filter a block of signals from a section state.
+
+        Args:
+            x (np.ndarray): Input signals of shape (samples, channels)
+            state (np.ndarray): State of shape (n_sections, 4, channels)
+
+        Returns:
+            tuple: Float64 output of shape (samples, channels) and the state after the block
+        """
+        state = state.copy()
+        y = self._apply_cascade(np.asarray(x, dtype=self._working_dtype), state)
+        return y.astype(np.float64, copy=False), state
+
+    def _apply_cascade(self, x: np.ndarray, state: np.ndarray) -> np.ndarray:
+        """
+        Run the signals through every section, updating state in place.
+
+        Args:
+            x (np.ndarray): Input signals of shape (samples, channels), of the working dtype
+            state (np.ndarray): Per-channel section state of shape (n_sections, 4, channels)
+
+        Returns:
+            np.ndarray: Filtered signals of shape (samples, channels)
+        """
+        y = x
+        for section in range(self.num_sections):
+            b0, b1, b2 = self._feed_forward[section]
+            section_input = y
+
+            # Feed-forward part, with the last two inputs of the previous call
+            x_extended = np.concatenate([state[section, 1::-1], section_input])
+            v = b0 * x_extended[2:] + b1 * x_extended[1:-1] + b2 * x_extended[:-2]
+
+            y = _biquad_feedback(self._block_responses[section], v, state[section, 3:1:-1])
+
+            # Keep the last two inputs and outputs, most recent first
+            state[section, 0:2] = x_extended[:-3:-1]
+            y_extended = np.concatenate([state[section, 3:1:-1], y])
+            state[section, 2:4] = y_extended[:-3:-1]
+        return y
+
+
+def _biquad_block_response(a1: float, a2: float, block_size: int) -> tuple:
+    """
+    Response matrices of y[n] = v[n] - a1 * y[n-1] - a2 * y[n-2] over a block.
+
+    For a block starting at sample n0, the recursion is linear in the block of
+    v and in the two outputs preceding the block:
+        y[n0 : n0 + block_size] = T @ v[n0 : n0 + block_size] + S @ [y[n0-2], y[n0-1]]
+    T is the lower triangular Toeplitz matrix of the impulse response of
+    1 / (1 + a1 z^-1 + a2 z^-2) and S the response to the initial outputs.
+    With only two poles per section the matrices stay well conditioned.
+
+    Args:
+        a1 (float): First feedback coefficient
+        a2 (float): Second feedback coefficient
+        block_size (int): Number of samples per block
+
+    Returns:
+        tuple: (T, S) of shapes (block_size, block_size) and (block_size, 2)
+    """
+    # Run the recursion on unit drives: one column per block sample plus one
+    # per initial output, prefixed by the two initial outputs
+    response = np.zeros((block_size + 2, block_size + 2))
+    response[0, block_size] = 1.0
+    response[1, block_size + 1] = 1.0
+    for n in range(block_size):
+        response[n + 2, n] = 1.0
+        response[n + 2] -= a1 * response[n + 1] + a2 * response[n]
+    return response[2:, :block_size], response[2:, block_size:]
+
+
+def _biquad_feedback(block_response: tuple, v: np.ndarray, y_history: np.ndarray) -> np.ndarray:
+    """
+    Solve the feedback recursion of a biquad block by block.
+
+    Args:
+        block_response (tuple): (T, S) matrices from _biquad_block_response
+        v (np.ndarray): Feed-forward output of shape (samples, channels)
+        y_history (np.ndarray): Outputs preceding v, [y[-2], y[-1]], of shape (2, channels)
+
+    Returns:
+        np.ndarray: Section output of shape (samples, channels)
+    """
+    block_t, block_s = block_response
+    block_size = len(block_t)
+    input_signal_length = len(v)
+
+    # The output buffer is prefixed by the two previous outputs
+    y = np.empty((input_signal_length + 2, v.shape[1]), dtype=v.dtype)
+    y[:2] = y_history
+    for start in range(0, input_signal_length, block_size):
+        stop = min(start + block_size, input_signal_length)
+        length = stop - start
+        y[start + 2 : stop + 2] = (
+            block_t[:length, :length] @ v[start:stop] + block_s[:length] @ y[start : start + 2]
+        )
+    return y[2:]
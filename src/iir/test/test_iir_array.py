@@ -1,5 +1,6 @@
 import sys
 import os
+import weakref
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -8,10 +9,29 @@ import numpy as np
 import yaml
 from scipy import signal
 from iir_array.iir_array import IIRArray
-from iir_single_sample.iir_single_sample import IIRSingleSample
+from iir_single_sample.iir_single_sample import IIRSingleSample, load_c_library
 from iir.iir_window_array.iir_window_array import IIRWindowArray
+from iir.sos_filter.sos_filter import SOSFilter
+from iir.filter_bank.filter_bank import IIRFilterBank
+from iir.filtfilt.filtfilt import filtfilt_chunked
+from iir.frequency_response.frequency_response import (
+    analyze_filters,
+    basis_cache,
+    frequency_response,
+    group_delay,
+    require_stable,
+    stability_report,
+)
+from fir.fir_design.fir_design import design_fir_filters
+from iir.batch_runner.batch_runner import expand_signal_files, load_coefficient_spec, output_paths, run_batch
+from fixed_point.q_format.q_format import Q15, Q31, QFormat, error_report
+from iir.utils.signal_io import convert_text_signal, filter_signal_chunks, load_signal
 from utils.coefficient import split_iir_filter
 from utils.coefficient import compute_impulse_response_coefficient
+from utils.coefficient import compute_sos_coefficient
+from utils.coefficient import CoefficientCache
+from utils.coefficient import lfilter_zi, sosfilt_zi
+import utils.coefficient
 
 def test_apply_iir_filter_array():
     # Load input signal
@@ -41,6 +61,57 @@ def test_apply_iir_filter_array():
     assert max_abs_diff < 1e-5
 
 
+def test_apply_iir_filter_array_multichannel():
+    # Load input signal and split it into 4 channels
+    with open("src/iir/test/input_signal.txt", "rb") as f:
+        input_signal = np.loadtxt(f)
+    input_signal = input_signal[: len(input_signal) // 4 * 4].reshape(4, -1)
+
+    b, a = compute_impulse_response_coefficient(
+        filter_order=4,
+        fs=64,
+        fc=[0.4, 4],
+        band_type="bandpass",
+    )
+
+    iir_array = IIRArray(b=b, a=a)
+
+    # (channels, samples) layout
+    y = iir_array.apply_iir_filter(x=input_signal, axis=-1)
+    y_scipy = signal.lfilter(b=b, a=a, x=input_signal, axis=-1)
+
+    assert y.shape == input_signal.shape
+    assert np.mean((y - y_scipy) ** 2) < 1e-10
+    assert np.mean(np.abs(y - y_scipy)) < 1e-5
+    assert np.max(np.abs(y - y_scipy)) < 1e-4
+
+    # Every channel must be filtered as when filtered on its own
+    for channel in range(input_signal.shape[0]):
+        y_channel = iir_array.apply_iir_filter(x=input_signal[channel])
+        assert np.max(np.abs(y[channel] - y_channel)) < 1e-4
+
+    # (samples, channels) layout in Fortran order keeps its layout
+    input_signal_t = np.asfortranarray(input_signal.T)
+    y_t = iir_array.apply_iir_filter(x=input_signal_t, axis=0)
+    assert y_t.flags["F_CONTIGUOUS"]
+    assert np.array_equal(y_t, y.T)
+
+    # 3D input and float32 input
+    input_signal_3d = input_signal.reshape(2, 2, -1).astype(np.float32)
+    y_3d = iir_array.apply_iir_filter(x=input_signal_3d)
+    assert y_3d.dtype == np.float32
+    assert np.allclose(y_3d, y.reshape(2, 2, -1), rtol=1e-4, atol=1e-3)
+
+    # A (samples, 1) column along axis -1 is a set of one-sample signals, which is flagged
+    column = input_signal[0, :, np.newaxis]
+    with pytest.warns(UserWarning, match="single sample"):
+        y_column = iir_array.apply_iir_filter(x=column)
+    assert np.allclose(y_column[:, 0], b[0] / a[0] * column[:, 0])
+    with pytest.warns(UserWarning, match="single sample"):
+        iir_array.apply_iir_filter_fixed_point(x=column / 1000)
+    assert np.array_equal(iir_array.apply_iir_filter(x=column, axis=0)[:, 0], iir_array.apply_iir_filter(x=column[:, 0]))
+
+
 def test_apply_iir_filter_window_array():
     # Load input signal
     with open("src/iir/test/input_signal.txt", "rb") as f:
@@ -93,6 +164,41 @@ def test_apply_iir_filter_window_array():
     assert max_abs_diff < 1e-5
 
 
+def test_apply_iir_filter_window_array_out():
+    # Load input signal
+    with open("src/iir/test/input_signal.txt", "rb") as f:
+        input_signal = np.loadtxt(f)
+
+    # Load coefficients
+    with open("src/iir/test/coefficient_4th_order.yaml") as f:
+        coefficient = yaml.safe_load(f)
+    b = coefficient["b"]
+    a = coefficient["a"]
+
+    # Stream 64-sample hops straight into a preallocated output signal
+    iir_window = IIRWindowArray(b=b, a=a)
+    window_shift_samples = 64
+    y = np.zeros_like(input_signal)
+    for i in range(0, len(input_signal), window_shift_samples):
+        returned = iir_window.apply_iir_filter(
+            x=input_signal[i : i + window_shift_samples],
+            out=y[i : i + window_shift_samples],
+        )
+        assert np.shares_memory(returned, y)
+
+    # Compute the expected output signal with scipy
+    y_scipy = signal.lfilter(b=b, a=a, x=input_signal)
+
+    assert np.max(np.abs(y - y_scipy)) < 1e-9
+
+    # The state is the direct form II transposed state of scipy
+    _, zf = signal.lfilter(b=b, a=a, x=input_signal, zi=np.zeros(len(a) - 1))
+    assert np.allclose(iir_window.state, zf, atol=1e-9)
+
+    with pytest.raises(ValueError):
+        iir_window.apply_iir_filter(x=input_signal[:64], out=np.zeros(32))
+
+
 def test_apply_iir_filter_single_sample():
     # Load input signal
     with open("src/iir/test/input_signal.txt", "rb") as f:
@@ -122,6 +228,223 @@ def test_apply_iir_filter_single_sample():
     assert mae < 1e-5
     assert max_abs_diff < 1e-5
 
+def test_iir_filter_bank():
+    # Load coefficients
+    with open("src/iir/test/coefficient_4th_order.yaml") as f:
+        coefficient = yaml.safe_load(f)
+    b = coefficient["b"]
+    a = coefficient["a"]
+
+    # One stream per patient, starting and stopping at different ticks
+    input_signals = {}
+    for patient in range(1, 5):
+        with open(f"src/iir/test/considered_ppg/considered_ppg_patient_{patient}.txt", "rb") as f:
+            input_signals[patient] = np.loadtxt(f)[:600]
+
+    iir_filter_bank = IIRFilterBank(b=b, a=a, capacity=2)
+    references = {}
+    outputs = {}
+    for tick in range(600):
+        if tick in (0, 50, 120):
+            patient = {0: 1, 50: 2, 120: 3}[tick]
+            assert iir_filter_bank.add_stream(stream_id=patient) == patient
+            references[patient] = IIRWindowArray(b=b, a=a)
+            outputs[patient] = []
+        if tick == 200:
+            iir_filter_bank.remove_stream(1)
+            iir_filter_bank.add_stream(stream_id=4)
+            references[4] = IIRWindowArray(b=b, a=a)
+            outputs[4] = []
+
+        stream_ids = iir_filter_bank.stream_ids
+        samples = [input_signals[patient][tick] for patient in stream_ids]
+        y = iir_filter_bank.step(samples)
+        for patient, sample in zip(stream_ids, y):
+            outputs[patient].append(sample)
+
+    # Every stream matches its own windowed filter, bit for bit
+    for patient, output in outputs.items():
+        start = {1: 0, 2: 50, 3: 120, 4: 200}[patient]
+        reference = references[patient].apply_iir_filter(x=input_signals[patient][start : start + len(output)])
+        assert np.array_equal(output, reference)
+
+    # The removed stream's row was taken by the last stream, the capacity doubled once
+    assert iir_filter_bank.stream_ids.tolist() == [3, 2, 4]
+    assert iir_filter_bank.index(3) == 0
+    assert 1 not in iir_filter_bank
+    assert len(iir_filter_bank) == 3 and iir_filter_bank.capacity == 4
+    assert iir_filter_bank.state.shape == (3, len(b) - 1)
+
+    iir_filter_bank.reset_stream(2)
+    assert not np.any(iir_filter_bank.state[iir_filter_bank.index(2)])
+    assert iir_filter_bank.add_stream() not in (2, 3, 4)
+    with pytest.raises(ValueError):
+        iir_filter_bank.add_stream(stream_id=2)
+    with pytest.raises(ValueError):
+        iir_filter_bank.step(np.zeros(2))
+    with pytest.raises(KeyError):
+        iir_filter_bank.remove_stream(1)
+
+
+def test_iir_float32():
+    b, a = compute_impulse_response_coefficient(
+        filter_order=4,
+        fs=32,
+        fc=[0.4, 4],
+        band_type="bandpass",
+    )
+
+    # Load input signal as float32, like the sensor data
+    with open("src/iir/test/considered_ppg/considered_ppg_patient_1.txt", "rb") as f:
+        input_signal = np.loadtxt(f)[:50000]
+    input_signal_float32 = input_signal.astype(np.float32)
+
+    y_scipy = signal.lfilter(b=b, a=a, x=input_signal)
+    tolerance = 1e-5 * np.max(np.abs(y_scipy))
+
+    # The direct form recursions accumulate in float64 and store float32
+    y_array = IIRArray(b=b, a=a, dtype=np.float32).apply_iir_filter(x=np.stack([input_signal_float32] * 2))
+    assert y_array.dtype == np.float32
+    assert np.max(np.abs(y_array - y_scipy)) < tolerance
+    assert IIRArray(b=b, a=a, dtype=np.float64).apply_iir_filter(x=input_signal_float32).dtype == np.float64
+
+    iir_window = IIRWindowArray(b=b, a=a, dtype=np.float32)
+    y_window = np.concatenate([iir_window.apply_iir_filter(x=window) for window in np.array_split(input_signal_float32, 7)])
+    assert y_window.dtype == np.float32
+    assert np.max(np.abs(y_window - y_scipy)) < tolerance
+
+    # The cascade of biquads runs in float32
+    sos_filter = SOSFilter.from_tf(b=b, a=a, dtype=np.float32)
+    y_sos = sos_filter.apply_sos_filter(x=input_signal)
+    assert y_sos.dtype == np.float32
+    assert np.max(np.abs(y_sos - y_scipy)) < tolerance
+    y_sos_window = np.concatenate(
+        [sos_filter.apply_sos_filter_window(x=window) for window in np.array_split(input_signal_float32, 7)]
+    )
+    assert y_sos_window.dtype == np.float32 and sos_filter.state.dtype == np.float32
+    assert np.max(np.abs(y_sos_window - y_scipy)) < tolerance
+
+    with pytest.raises(ValueError):
+        IIRArray(b=b, a=a, dtype=np.float16)
+    with pytest.raises(ValueError):
+        SOSFilter.from_tf(b=b, a=a, dtype=np.int64)
+
+
+@pytest.mark.parametrize(
+    "data_format, accumulator_bits",
+    [(Q15, 64), (Q31, 64), (QFormat(16, 13, rounding="floor", overflow="wrap"), 40), (Q31, 48)],
+)
+def test_apply_iir_filter_fixed_point(data_format, accumulator_bits):
+    # Load input signal, scaled into [-0.5, 0.5]
+    with open("src/iir/test/input_signal.txt", "rb") as f:
+        input_signal = np.loadtxt(f)[:3000]
+    input_signal = input_signal / (2 * np.max(np.abs(input_signal)))
+
+    # Load coefficients
+    with open("src/iir/test/coefficient_2nd_order.yaml") as f:
+        coefficient = yaml.safe_load(f)
+    b = coefficient["b"]
+    a = coefficient["a"]
+
+    y = IIRArray(b=b, a=a).apply_iir_filter_fixed_point(
+        x=input_signal, data_format=data_format, accumulator_bits=accumulator_bits
+    )
+
+    # Bit-exact with the single-sample filter in fixed-point mode
+    iir_single_sample = IIRSingleSample(
+        b=b, a=a, filter_order=len(b) - 1, data_format=data_format, accumulator_bits=accumulator_bits
+    )
+    assert iir_single_sample.backend == "fixed_point"
+    y_single_sample = [iir_single_sample.apply_iir_filter(x=sample) for sample in input_signal]
+    assert np.array_equal(y, y_single_sample)
+
+    # Several channels at once, filtered along the first axis
+    y_channels = IIRArray(b=b, a=a).apply_iir_filter_fixed_point(
+        x=np.stack([input_signal, input_signal[::-1]], axis=1),
+        data_format=data_format,
+        accumulator_bits=accumulator_bits,
+        axis=0,
+    )
+    assert np.array_equal(y_channels[:, 0], y)
+
+    if data_format is Q31 and accumulator_bits == 64:
+        report = error_report(y, signal.lfilter(b=b, a=a, x=input_signal), data_format)
+        assert report["max_abs_error"] < 1e-5
+        assert report["saturated_samples"] == 0
+
+
+def test_apply_iir_filter_fixed_point_invalid():
+    b, a = [1.0, 0.0, -1.0], [1.0, -1.5, 0.7]
+    with pytest.raises(ValueError):
+        IIRArray(b=b, a=a).apply_iir_filter_fixed_point(x=np.zeros(8), accumulator_bits=65)
+    with pytest.raises(ValueError):
+        IIRSingleSample(b=b, a=a, filter_order=2, backend="c", data_format=Q15)
+
+
+@pytest.mark.parametrize("backend", ["python", "c"])
+def test_apply_iir_filter_single_sample_backend(backend):
+    if backend == "c" and load_c_library() is None:
+        pytest.skip("The compiled IIR kernel has not been built")
+
+    b, a = compute_impulse_response_coefficient(
+        filter_order=4,
+        fs=32,
+        fc=[0.4, 4],
+        band_type="bandpass",
+    )
+
+    # Load input signal
+    with open("src/iir/test/considered_ppg/considered_ppg_patient_1.txt", "rb") as f:
+        input_signal = np.loadtxt(f)[:20000]
+
+    iir_single_sample = IIRSingleSample(b=b, a=a, filter_order=len(b) - 1, backend=backend)
+    assert iir_single_sample.backend == backend
+
+    y = np.zeros_like(input_signal)
+    for i in range(len(input_signal)):
+        y[i] = iir_single_sample.apply_iir_filter(x=input_signal[i])
+
+    # The circular buffers hold the last inputs, most recent at head
+    head = iir_single_sample.head
+    filter_order = len(b) - 1
+    for i in range(filter_order):
+        index = (head + i) % filter_order
+        assert iir_single_sample.input_buffer[index] == input_signal[-1 - i]
+        assert iir_single_sample.output_buffer[index] == y[-1 - i]
+
+    # Compute the expected output signal with scipy
+    y_scipy = signal.lfilter(b=b, a=a, x=input_signal)
+
+    assert np.mean((y - y_scipy) ** 2) < 1e-10
+    assert np.max(np.abs(y - y_scipy)) < 1e-4
+
+    # The block entry point continues the stream with the same outputs
+    iir_single_sample_block = IIRSingleSample(b=b, a=a, filter_order=len(b) - 1, backend=backend)
+    y_block = np.concatenate(
+        [
+            iir_single_sample_block.apply_iir_filter_block(x=input_signal[:7]),
+            iir_single_sample_block.apply_iir_filter_block(x=input_signal[7:]),
+        ]
+    )
+    assert np.array_equal(y_block, y)
+
+
+def test_apply_iir_filter_single_sample_backends_identical():
+    if load_c_library() is None:
+        pytest.skip("The compiled IIR kernel has not been built")
+
+    b, a = compute_impulse_response_coefficient(filter_order=4, fs=32, fc=[0.4, 4], band_type="bandpass")
+    with open("src/iir/test/considered_ppg/considered_ppg_patient_1.txt", "rb") as f:
+        input_signal = np.loadtxt(f)[:20000]
+
+    # Both backends run the same operations in the same order: bit-identical outputs
+    y = {}
+    for backend in ("python", "c"):
+        iir_single_sample = IIRSingleSample(b=b, a=a, filter_order=len(b) - 1, backend=backend)
+        y[backend] = np.array([iir_single_sample.apply_iir_filter(x=sample) for sample in input_signal])
+    assert np.array_equal(y["python"], y["c"])
+
+
 def test_apply_iir_filter_single_sample_tapir():
     
     # Load coefficients
@@ -213,6 +536,51 @@ def test_4th_order_coefficient():
     assert mse_a < 1e-10
 
 
+def test_coefficient_cache(tmp_path, monkeypatch):
+    cache = CoefficientCache(maxsize=2, directory=str(tmp_path))
+    monkeypatch.setattr(utils.coefficient, "coefficient_cache", cache)
+
+    b, a = compute_impulse_response_coefficient(filter_order=4, fs=64, fc=[0.4, 4])
+    assert cache.cache_info()["misses"] == 1
+
+    # List, tuple and array cutoffs share the same entry
+    b_tuple, a_tuple = compute_impulse_response_coefficient(filter_order=4, fs=64, fc=(0.4, 4.0))
+    compute_impulse_response_coefficient(filter_order=4, fs=64.0, fc=np.array([0.4, 4]))
+    assert cache.cache_info()["hits"] == 2
+    assert np.array_equal(b, b_tuple) and np.array_equal(a, a_tuple)
+
+    # Returned coefficients are copies
+    b_tuple[0] = 0
+    assert compute_impulse_response_coefficient(filter_order=4, fs=64, fc=[0.4, 4])[0][0] == b[0]
+
+    # LRU bound
+    compute_impulse_response_coefficient(filter_order=2, fs=64, fc=4, band_type="low")
+    compute_sos_coefficient(filter_order=4, fs=64, fc=[0.4, 4])
+    assert cache.cache_info()["size"] == 2
+
+    # A new process (here a new cache on the same folder) reads designs from disk
+    cache = CoefficientCache(directory=str(tmp_path))
+    monkeypatch.setattr(utils.coefficient, "coefficient_cache", cache)
+    b_disk, a_disk = compute_impulse_response_coefficient(filter_order=4, fs=64, fc=[0.4, 4])
+    sos_disk = compute_sos_coefficient(filter_order=4, fs=64, fc=[0.4, 4])
+    assert cache.cache_info() == {"hits": 0, "disk_hits": 2, "misses": 0, "size": 2, "maxsize": 128}
+    assert np.array_equal(b_disk, b) and np.array_equal(a_disk, a)
+    assert sos_disk.shape == (4, 6)
+
+    # Invalid designs are not cached
+    with pytest.raises(ValueError):
+        compute_impulse_response_coefficient(filter_order=4, fs=64, fc=4, band_type="bandpass")
+    assert cache.cache_info()["size"] == 2
+
+    # A non-integer order is refused, not served the design of its integer part
+    for filter_order in (4.5, "4"):
+        with pytest.raises(ValueError):
+            compute_impulse_response_coefficient(filter_order=filter_order, fs=64, fc=[0.4, 4])
+        with pytest.raises(ValueError):
+            compute_sos_coefficient(filter_order=filter_order, fs=64, fc=[0.4, 4])
+    assert np.array_equal(compute_impulse_response_coefficient(filter_order=4.0, fs=64, fc=[0.4, 4])[0], b)
+
+
 def test_double_2nd_order_filter():
     # Load coefficients
     with open("src/iir/test/coefficient_4th_order.yaml") as f:
@@ -242,6 +610,517 @@ def test_double_2nd_order_filter():
     assert max_abs_diff < 1e-4
 
 
+def test_sos_filter():
+    # 8th order bandpass at 32 Hz: unusable in direct form, fine as biquads
+    sos = compute_sos_coefficient(
+        filter_order=8,
+        fs=32,
+        fc=[0.4, 4],
+        band_type="bandpass",
+    )
+    assert sos.shape == (8, 6)
+
+    # Load input signal
+    with open("src/iir/test/considered_ppg/considered_ppg_patient_1.txt", "rb") as f:
+        input_signal = np.loadtxt(f)
+
+    y_scipy = signal.sosfilt(sos=sos, x=input_signal)
+
+    sos_filter = SOSFilter(sos=sos)
+
+    # Array mode
+    y = sos_filter.apply_sos_filter(x=input_signal)
+    assert np.max(np.abs(y - y_scipy)) < 1e-8
+
+    # Array mode on several channels
+    input_signal_2d = np.stack([input_signal, -input_signal])
+    y_2d = sos_filter.apply_sos_filter(x=input_signal_2d, axis=1)
+    assert np.max(np.abs(y_2d[0] - y_scipy)) < 1e-8
+    assert np.max(np.abs(y_2d[1] + y_scipy)) < 1e-8
+
+    # Windowed mode with windows of different lengths
+    window_shift_samples = 64
+    y_window = np.concatenate(
+        [
+            sos_filter.apply_sos_filter_window(x=input_signal[i : i + window_shift_samples])
+            for i in range(0, 10000, window_shift_samples)
+        ]
+        + [sos_filter.apply_sos_filter_window(x=input_signal[10048:10049])]
+        + [sos_filter.apply_sos_filter_window(x=input_signal[10049:])]
+    )
+    assert np.max(np.abs(y_window - y_scipy)) < 1e-8
+
+    # Single-sample mode
+    sos_filter.reset()
+    y_single_sample = np.zeros(5000)
+    for i in range(len(y_single_sample)):
+        y_single_sample[i] = sos_filter.apply_sos_filter_single_sample(x=input_signal[i])
+    assert np.max(np.abs(y_single_sample - y_scipy[:5000])) < 1e-8
+
+
+def test_sos_filter_from_tf():
+    b, a = compute_impulse_response_coefficient(
+        filter_order=4,
+        fs=64,
+        fc=[0.4, 4],
+        band_type="bandpass",
+    )
+
+    sos_filter = SOSFilter.from_tf(b=b, a=a)
+    assert sos_filter.num_sections == 4
+
+    # Every section holds a pair of complex conjugate poles
+    for section in sos_filter.sos:
+        poles = np.roots(section[3:])
+        assert np.iscomplexobj(poles)
+        assert np.isclose(poles[0], np.conj(poles[1]))
+
+    x = np.zeros(256)
+    x[0] = 1
+    assert np.allclose(sos_filter.apply_sos_filter(x=x), signal.lfilter(b=b, a=a, x=x), atol=1e-7)
+
+    # The initial conditions are forwarded to the cascade
+    offset = np.full(256, 100.0)
+    steady = SOSFilter.from_tf(b=b, a=a, initial_conditions="steady")
+    assert steady.initial_conditions == "steady"
+    assert np.allclose(steady.apply_sos_filter(x=offset), 0, atol=1e-8)
+    z, p, k = signal.tf2zpk(b, a)
+    steady_zpk = SOSFilter.from_zpk(z, p, k, initial_conditions="steady")
+    assert np.allclose(steady_zpk.apply_sos_filter(x=offset), 0, atol=1e-8)
+    zi = np.ones((sos_filter.num_sections, 2))
+    assert np.array_equal(SOSFilter.from_tf(b=b, a=a, initial_conditions=zi).initial_conditions, zi)
+
+
+@pytest.mark.parametrize("padtype", ["odd", "even", "constant", None])
+def test_filtfilt(padtype):
+    # Load input signal
+    with open("src/iir/test/considered_ppg/considered_ppg_patient_1.txt", "rb") as f:
+        input_signal = np.loadtxt(f)[:50000]
+
+    b, a = compute_impulse_response_coefficient(filter_order=2, fs=32, fc=[0.4, 4], band_type="bandpass")
+    sos = compute_sos_coefficient(filter_order=8, fs=32, fc=[0.4, 4], band_type="bandpass")
+    y_scipy = signal.filtfilt(b=b, a=a, x=input_signal, padtype=padtype)
+    y_sos_scipy = signal.sosfiltfilt(sos=sos, x=input_signal, padtype=padtype)
+
+    y = IIRArray(b=b, a=a).apply_iir_filtfilt(x=input_signal, padtype=padtype)
+    assert np.max(np.abs(y - y_scipy)) < 1e-8 * np.max(np.abs(y_scipy))
+    y_sos = SOSFilter(sos=sos).apply_sos_filtfilt(x=input_signal, padtype=padtype)
+    assert np.max(np.abs(y_sos - y_sos_scipy)) < 1e-10 * np.max(np.abs(y_sos_scipy))
+
+    # Several channels along the first axis, with a custom extension length
+    input_signal_2d = np.stack([input_signal, -2 * input_signal], axis=1)
+    y_2d = IIRArray(b=b, a=a).apply_iir_filtfilt(x=input_signal_2d, axis=0, padtype=padtype, padlen=40)
+    y_2d_scipy = signal.filtfilt(b=b, a=a, x=input_signal_2d, axis=0, padtype=padtype, padlen=40)
+    assert np.max(np.abs(y_2d - y_2d_scipy)) < 1e-8 * np.max(np.abs(y_2d_scipy))
+    y_2d = SOSFilter(sos=sos).apply_sos_filtfilt(x=input_signal_2d, axis=0, padtype=padtype, padlen=40)
+    y_2d_scipy = signal.sosfiltfilt(sos=sos, x=input_signal_2d, axis=0, padtype=padtype, padlen=40)
+    assert np.max(np.abs(y_2d - y_2d_scipy)) < 1e-10 * np.max(np.abs(y_2d_scipy))
+
+
+def test_filtfilt_chunked(tmp_path):
+    # Load input signal into a memory-mapped recording
+    with open("src/iir/test/considered_ppg/considered_ppg_patient_1.txt", "rb") as f:
+        input_signal = np.loadtxt(f)
+    recording = np.lib.format.open_memmap(tmp_path / "recording.npy", mode="w+", shape=input_signal.shape)
+    recording[:] = input_signal
+    recording.flush()
+
+    b, a = compute_impulse_response_coefficient(filter_order=2, fs=32, fc=[0.4, 4], band_type="bandpass")
+    sos = compute_sos_coefficient(filter_order=8, fs=32, fc=[0.4, 4], band_type="bandpass")
+    x = np.load(tmp_path / "recording.npy", mmap_mode="r")
+
+    # Blocks of any length give the in-memory result
+    out = np.lib.format.open_memmap(tmp_path / "filtered.npy", mode="w+", shape=x.shape)
+    assert filtfilt_chunked(IIRArray(b=b, a=a), x, out=out, chunk_samples=10007) is out
+    assert np.array_equal(out, IIRArray(b=b, a=a).apply_iir_filtfilt(x=input_signal))
+
+    y_sos = filtfilt_chunked(SOSFilter(sos=sos), x, chunk_samples=4096)
+    y_sos_scipy = signal.sosfiltfilt(sos=sos, x=input_signal)
+    assert np.max(np.abs(y_sos - y_sos_scipy)) < 1e-10 * np.max(np.abs(y_sos_scipy))
+
+    # In place, on several channels
+    x_2d = np.stack([input_signal, -input_signal], axis=1)[:20000]
+    y_2d_scipy = signal.sosfiltfilt(sos=sos, x=x_2d, axis=0, padtype="even")
+    filtfilt_chunked(SOSFilter(sos=sos), x_2d, out=x_2d, padtype="even", chunk_samples=1000)
+    assert np.max(np.abs(x_2d - y_2d_scipy)) < 1e-10 * np.max(np.abs(y_2d_scipy))
+
+    with pytest.raises(ValueError):
+        filtfilt_chunked(SOSFilter(sos=sos), x, out=np.empty(10))
+    with pytest.raises(ValueError):
+        filtfilt_chunked(SOSFilter(sos=sos), x[:20])
+    with pytest.raises(ValueError):
+        SOSFilter(sos=sos).apply_sos_filtfilt(x=input_signal, padtype="reflect")
+    with pytest.raises(ValueError):
+        IIRArray(b=[1, 0], a=[1, -1]).apply_iir_filtfilt(x=input_signal)
+
+
+def test_frequency_response():
+    basis_cache.clear()
+    b, a = compute_impulse_response_coefficient(filter_order=2, fs=64, fc=[0.4, 4], band_type="bandpass")
+
+    frequencies, response = frequency_response(b=b, a=a, fs=64)
+    frequencies_scipy, response_scipy = signal.freqz(b=b, a=a, fs=64)
+    assert np.allclose(frequencies, frequencies_scipy)
+    assert np.allclose(response, response_scipy, rtol=1e-10, atol=1e-12)
+
+    # Away from the zeros at DC and Nyquist, where it is not defined
+    _, delay = group_delay(b=b, a=a, fs=64, whole=True, num_points=1000)
+    _, delay_scipy = signal.group_delay(system=(b, a), w=1000, whole=True, fs=64)
+    assert np.allclose(delay[10:490], delay_scipy[10:490], rtol=1e-8)
+    assert np.isnan(delay[0])
+
+    # Many FIR filters of different lengths on a grid evaluated once
+    basis_cache.clear()
+    filter_orders = np.arange(10, 60, 7)
+    h = design_fir_filters(filter_orders=filter_orders, cutoffs=4, fs=64)
+    analysis = analyze_filters(b=h, fs=64)
+    assert analysis["response"].shape == (len(filter_orders), 512)
+    for i, filter_order in enumerate(filter_orders):
+        _, response_scipy = signal.freqz(b=h[i], fs=64)
+        assert np.allclose(analysis["response"][i], response_scipy, rtol=1e-10, atol=1e-12)
+        assert np.allclose(analysis["phase"][i], np.unwrap(np.angle(response_scipy)))
+        # Linear phase: a constant group delay of half the order in the passband
+        assert np.allclose(analysis["group_delay"][i][:32], filter_order / 2)
+    assert np.allclose(analysis["magnitude_db"], 20 * np.log10(analysis["magnitude"]))
+    frequency_response(b=h[:3], fs=64)
+    assert basis_cache.cache_info()["misses"] == 1
+    assert basis_cache.cache_info()["hits"] >= 2
+
+    # A longer filter extends the cached basis of the grid
+    frequency_response(b=np.ones(200), fs=64)
+    assert basis_cache.cache_info()["size"] == 1
+
+
+def test_stability_report():
+    with open("src/iir/test/coefficient_4th_order.yaml") as f:
+        coefficient = yaml.safe_load(f)
+    iir_array = IIRArray(b=coefficient["b"], a=coefficient["a"])
+    report = stability_report(iir_array.a)
+    assert report["stable"] and not report["near_unstable"]
+    require_stable(iir_array.a)
+
+    # A batch of denominators padded with zeros, one per row
+    a = np.array(
+        [
+            [1, -0.5, 0],
+            [1, -1.9, 0.9025],  # Double pole at 0.95
+            [1, -1.91, 0.909],  # Poles at 1.01 and 0.9
+            [1, -2.5, 1],  # Poles at 2 and 0.5
+            [1, -1.999, 0.999001],  # Poles at 0.9995 +- 0.0005j
+        ]
+    )
+    report = stability_report(a)
+    assert np.allclose(report["pole_radius"], [0.5, 0.95, 1.01, 2, np.abs(0.9995 + 0.0005j)], atol=1e-6)
+    assert report["stable"].tolist() == [True, True, False, False, True]
+    assert report["near_unstable"].tolist() == [False, False, False, False, True]
+    assert stability_report(a, margin=0.1)["near_unstable"].tolist() == [False, True, False, False, True]
+    with pytest.raises(ValueError, match=r"Unstable filters: \[2, 3\]"):
+        require_stable(a)
+
+    # The sections of a cascade
+    sos = compute_sos_coefficient(filter_order=8, fs=32, fc=[0.4, 4], band_type="bandpass")
+    assert np.all(stability_report(sos[:, 3:])["stable"])
+
+    # With a denominator, the analysis includes the stability flags
+    assert analyze_filters(b=coefficient["b"], a=coefficient["a"])["stable"]
+    with pytest.raises(ValueError):
+        stability_report([0, 1])
+
+
+def test_initial_conditions():
+    with open("src/iir/test/considered_ppg/considered_ppg_patient_1.txt", "rb") as f:
+        input_signal = np.loadtxt(f)[:2000] + 100
+    b, a = signal.butter(4, [0.4, 4], btype="bandpass", fs=32)
+    sos = signal.butter(4, [0.4, 4], btype="bandpass", fs=32, output="sos")
+    order = len(a) - 1
+    assert np.allclose(lfilter_zi(b, a), signal.lfilter_zi(b, a), rtol=1e-12, atol=1e-14)
+    assert np.allclose(sosfilt_zi(sos), signal.sosfilt_zi(sos), rtol=1e-12, atol=1e-14)
+
+    rng = np.random.default_rng(5)
+    zi = rng.standard_normal(order)
+    for initial_conditions, scipy_zi in (("steady", signal.lfilter_zi(b, a) * input_signal[0]), (zi, zi)):
+        reference = signal.lfilter(b, a, input_signal, zi=scipy_zi)[0]
+        tolerance = 1e-9 * np.max(np.abs(reference))
+
+        # Whole signals, every channel starting from its own first sample
+        signals = np.stack([input_signal, input_signal[::-1]])
+        y = IIRArray(b=b, a=a, initial_conditions=initial_conditions).apply_iir_filter(x=signals)
+        assert np.allclose(y[0], reference, rtol=0, atol=tolerance)
+        if isinstance(initial_conditions, str):
+            reference_reversed = signal.lfilter(b, a, input_signal[::-1], zi=signal.lfilter_zi(b, a) * input_signal[-1])[0]
+            assert np.allclose(y[1], reference_reversed, rtol=0, atol=tolerance)
+
+        # Streams, whose initial conditions come back with reset
+        iir_window = IIRWindowArray(b=b, a=a, initial_conditions=initial_conditions)
+        for _ in range(2):
+            y = np.concatenate([iir_window.apply_iir_filter(x=input_signal[:500]), iir_window.apply_iir_filter(x=input_signal[500:])])
+            assert np.allclose(y, reference, rtol=0, atol=tolerance)
+            iir_window.reset()
+        for backend in ["python", "c"] if load_c_library() is not None else ["python"]:
+            iir_single_sample = IIRSingleSample(b=b, a=a, filter_order=order, backend=backend, initial_conditions=initial_conditions)
+            for _ in range(2):
+                y = [iir_single_sample.apply_iir_filter(x=sample) for sample in input_signal]
+                assert np.allclose(y, reference, rtol=0, atol=tolerance)
+                iir_single_sample.reset()
+            out = np.empty(len(input_signal))
+            assert iir_single_sample.apply_iir_filter_block(x=input_signal, out=out) is out
+            assert np.allclose(out, reference, rtol=0, atol=tolerance)
+            # No reference cycle: the filter and its C buffers are freed on del
+            finalized = weakref.ref(iir_single_sample)
+            del iir_single_sample
+            assert finalized() is None
+
+        # Fixed point: bit-exact between the array and the single-sample filters
+        y = IIRArray(b=b, a=a, initial_conditions=initial_conditions).apply_iir_filter_fixed_point(
+            x=input_signal / 1000, data_format=Q31
+        )
+        iir_single_sample = IIRSingleSample(
+            b=b, a=a, filter_order=order, data_format=Q31, initial_conditions=initial_conditions
+        )
+        assert np.array_equal(y, [iir_single_sample.apply_iir_filter(x=sample / 1000) for sample in input_signal])
+
+    # The steady state removes the start-up transient of a constant offset
+    offset = np.full(200, 100.0)
+    assert np.max(np.abs(IIRArray(b=b, a=a).apply_iir_filter(x=offset))) > 10
+    assert np.allclose(IIRArray(b=b, a=a, initial_conditions="steady").apply_iir_filter(x=offset), 0, atol=1e-8)
+
+    # Second-order sections
+    zi_sections = rng.standard_normal((len(sos), 2))
+    for initial_conditions, scipy_zi in (("steady", signal.sosfilt_zi(sos) * input_signal[0]), (zi_sections, zi_sections)):
+        reference = signal.sosfilt(sos, input_signal, zi=scipy_zi)[0]
+        sos_filter = SOSFilter(sos, initial_conditions=initial_conditions)
+        assert np.allclose(sos_filter.apply_sos_filter(x=input_signal), reference, rtol=0, atol=1e-10)
+        y = [sos_filter.apply_sos_filter_single_sample(x=sample) for sample in input_signal[:100]]
+        y = np.concatenate([y, sos_filter.apply_sos_filter_window(x=input_signal[100:])])
+        assert np.allclose(y, reference, rtol=0, atol=1e-10)
+
+    # A bank of streams, each starting from the steady state of its first sample
+    iir_filter_bank = IIRFilterBank(b=b, a=a, capacity=2, initial_conditions="steady")
+    offsets = [0.0, 50.0, -20.0]
+    for _ in offsets:
+        iir_filter_bank.add_stream()
+    y = np.array([iir_filter_bank.step(input_signal[n] + np.array(offsets)) for n in range(500)])
+    for column, offset in enumerate(offsets):
+        reference = signal.lfilter(b, a, input_signal[:500] + offset, zi=signal.lfilter_zi(b, a) * (input_signal[0] + offset))[0]
+        assert np.allclose(y[:, column], reference, rtol=0, atol=1e-9)
+
+    with pytest.raises(ValueError):
+        IIRArray(b=b, a=a, initial_conditions="ones")
+    with pytest.raises(ValueError):
+        IIRWindowArray(b=b, a=a, initial_conditions=np.zeros(order + 1))
+    with pytest.raises(ValueError):
+        SOSFilter(sos, initial_conditions=np.zeros(order))
+    with pytest.raises(ValueError):
+        IIRSingleSample(b=[1, 0], a=[1, -1], filter_order=1, initial_conditions="steady")
+    with pytest.raises(ValueError):
+        IIRArray(b=[1, 0], a=[1, -1], initial_conditions="steady").apply_iir_filter(x=input_signal)
+
+
+def test_filter_state():
+    with open("src/iir/test/input_signal.txt", "rb") as f:
+        input_signal = np.loadtxt(f)[:2000]
+    b, a = signal.butter(4, [0.4, 4], btype="bandpass", fs=32)
+    sos = compute_sos_coefficient(filter_order=4, fs=32, fc=[0.4, 4], band_type="bandpass")
+    backends = ["python", "c"] if load_c_library() is not None else ["python"]
+
+    # A stream moved to another filter after 1000 samples gives the output of a single filter
+    for backend in backends:
+        first = IIRSingleSample(b=b, a=a, filter_order=len(b) - 1, backend=backend)
+        y_first = [first.apply_iir_filter(x=sample) for sample in input_signal[:1000]]
+        for continued in (
+            IIRSingleSample(b=b, a=a, filter_order=len(b) - 1, backend="python"),
+            IIRSingleSample(b=b, a=a, filter_order=len(b) - 1, backend=backends[-1]),
+        ):
+            continued.set_state(first.get_state())
+            y = y_first + [continued.apply_iir_filter(x=sample) for sample in input_signal[1000:]]
+            reference = IIRSingleSample(b=b, a=a, filter_order=len(b) - 1, backend=backend)
+            assert np.allclose(y, [reference.apply_iir_filter(x=sample) for sample in input_signal], rtol=0, atol=1e-9)
+
+    fixed_point = IIRSingleSample(b=b, a=a, filter_order=len(b) - 1, data_format=Q31)
+    y_fixed_point = [fixed_point.apply_iir_filter(x=sample / 1000) for sample in input_signal[:1000]]
+    restored = IIRSingleSample(b=b, a=a, filter_order=len(b) - 1, data_format=Q31)
+    restored.set_state(fixed_point.get_state())
+    y_fixed_point += [restored.apply_iir_filter(x=sample / 1000) for sample in input_signal[1000:]]
+    assert np.array_equal(y_fixed_point, IIRArray(b=b, a=a).apply_iir_filter_fixed_point(x=input_signal / 1000, data_format=Q31))
+
+    iir_window = IIRWindowArray(b=b, a=a)
+    sos_filter = SOSFilter(sos)
+    y_iir = iir_window.apply_iir_filter(x=input_signal[:1000])
+    sos_filter.apply_sos_filter_window(x=input_signal[:1000])
+    iir_window_restored = IIRWindowArray(b=b, a=a)
+    iir_window_restored.set_state(iir_window.get_state())
+    sos_filter_restored = SOSFilter(sos)
+    sos_filter_restored.set_state(sos_filter.get_state())
+    assert np.array_equal(
+        np.concatenate([y_iir, iir_window_restored.apply_iir_filter(x=input_signal[1000:])]),
+        IIRWindowArray(b=b, a=a).apply_iir_filter(x=input_signal),
+    )
+    # The block engine of the cascade rounds depending on the window boundaries
+    sos_filter_reference = SOSFilter(sos)
+    sos_filter_reference.apply_sos_filter_window(x=input_signal[:1000])
+    assert np.array_equal(
+        sos_filter_restored.apply_sos_filter_window(x=input_signal[1000:]),
+        sos_filter_reference.apply_sos_filter_window(x=input_signal[1000:]),
+    )
+
+    # A stream moved before its first sample still starts from the steady state
+    steady_input = input_signal[:200] + 100
+    for backend in backends:
+        steady = IIRSingleSample(b=b, a=a, filter_order=len(b) - 1, backend=backend, initial_conditions="steady")
+        restored = IIRSingleSample(b=b, a=a, filter_order=len(b) - 1, backend=backend, initial_conditions="steady")
+        restored.apply_iir_filter(x=1.0)
+        restored.set_state(steady.get_state())
+        assert np.allclose(
+            [restored.apply_iir_filter(x=sample) for sample in steady_input],
+            [steady.apply_iir_filter(x=sample) for sample in steady_input],
+            rtol=0,
+            atol=1e-9,
+        )
+        with pytest.raises(ValueError, match="steady"):
+            IIRSingleSample(b=b, a=a, filter_order=len(b) - 1, backend=backend).set_state(
+                IIRSingleSample(b=b, a=a, filter_order=len(b) - 1, initial_conditions="steady").get_state()
+            )
+    iir_window_steady = IIRWindowArray(b=b, a=a, initial_conditions="steady")
+    iir_window_steady_restored = IIRWindowArray(b=b, a=a, initial_conditions="steady")
+    iir_window_steady_restored.set_state(iir_window_steady.get_state())
+    assert np.array_equal(
+        iir_window_steady_restored.apply_iir_filter(x=steady_input), iir_window_steady.apply_iir_filter(x=steady_input)
+    )
+    sos_filter_steady = SOSFilter(sos, initial_conditions="steady")
+    sos_filter_steady_restored = SOSFilter(sos, initial_conditions="steady")
+    sos_filter_steady_restored.set_state(sos_filter_steady.get_state())
+    assert np.array_equal(
+        sos_filter_steady_restored.apply_sos_filter_window(x=steady_input),
+        sos_filter_steady.apply_sos_filter_window(x=steady_input),
+    )
+    with pytest.raises(ValueError, match="steady"):
+        IIRWindowArray(b=b, a=a).set_state(IIRWindowArray(b=b, a=a, initial_conditions="steady").get_state())
+    with pytest.raises(ValueError, match="steady"):
+        SOSFilter(sos).set_state(SOSFilter(sos, initial_conditions="steady").get_state())
+
+    # The state is checked against the filter restoring it
+    with pytest.raises(ValueError, match="IIRWindowArray cannot be restored into a SOSFilter"):
+        sos_filter.set_state(iir_window.get_state())
+    with pytest.raises(ValueError, match="shape"):
+        IIRWindowArray(b=b[:3], a=a[:3]).set_state(iir_window.get_state())
+    with pytest.raises(ValueError):
+        IIRSingleSample(b=b, a=a, filter_order=len(b) - 1, data_format=Q31).set_state(first.get_state())
+    with pytest.raises(ValueError):
+        iir_window.set_state(iir_window.get_state()[:-8])
+    with pytest.raises(ValueError):
+        iir_window.set_state(b"not a filter state")
+
+
+@pytest.mark.parametrize("engine", ["array", "sos"])
+def test_batch_runner(tmp_path, engine):
+    spec = load_coefficient_spec("src/iir/test/coefficient_2nd_order.yaml")
+    signal_files = expand_signal_files(
+        ["src/iir/test/considered_ppg/considered_ppg_patient_1*.txt"]
+    )[:3]
+
+    # Keep the recordings short to keep the test fast
+    for i, path in enumerate(signal_files):
+        with open(path, "rb") as f:
+            input_signal = np.loadtxt(f)[:5000]
+        np.savetxt(tmp_path / f"patient_{i}.txt", input_signal)
+    signal_files = expand_signal_files([str(tmp_path / "patient_*.txt")])
+
+    report = run_batch(
+        signal_files=signal_files,
+        spec=spec,
+        output_directory=str(tmp_path / "filtered"),
+        engine=engine,
+        max_workers=2,
+        output_format="npy",
+    )
+
+    assert report["files"] == 3
+    assert report["samples"] == 15000
+    assert sum(worker["files"] for worker in report["workers"].values()) == 3
+
+    for result in report["results"]:
+        input_signal = np.loadtxt(result["path"])
+        y = np.load(result["output_path"])
+        y_scipy = signal.lfilter(b=spec["b"], a=spec["a"], x=input_signal)
+        assert np.max(np.abs(y - y_scipy)) < 1e-4
+
+
+def test_batch_runner_output_paths(tmp_path):
+    spec = load_coefficient_spec("src/iir/test/coefficient_2nd_order.yaml")
+    with open("src/iir/test/input_signal.txt", "rb") as f:
+        input_signal = np.loadtxt(f)[:2000]
+
+    # Recordings with the same name in different folders keep their folder
+    for i in range(2):
+        (tmp_path / f"patient_{i}").mkdir()
+        np.savetxt(tmp_path / f"patient_{i}" / "ppg.txt", input_signal * (i + 1))
+    signal_files = expand_signal_files([str(tmp_path / "*" / "ppg.txt")])
+    report = run_batch(
+        signal_files=signal_files, spec=spec, output_directory=str(tmp_path / "filtered"), max_workers=2, output_format="npy"
+    )
+    assert sorted(result["output_path"] for result in report["results"]) == [
+        str(tmp_path / "filtered" / f"patient_{i}" / "ppg.npy") for i in range(2)
+    ]
+    for i in range(2):
+        y = np.load(tmp_path / "filtered" / f"patient_{i}" / "ppg.npy")
+        assert np.allclose(y, signal.lfilter(b=spec["b"], a=spec["a"], x=input_signal * (i + 1)))
+
+    # Outputs that would collide, or overwrite an input, are refused before filtering
+    np.save(tmp_path / "patient_0" / "ppg.npy", input_signal)
+    with pytest.raises(ValueError, match="both"):
+        output_paths([str(tmp_path / "patient_0" / name) for name in ("ppg.txt", "ppg.npy")], str(tmp_path / "out"))
+    with pytest.raises(ValueError, match="overwrite"):
+        run_batch(
+            signal_files=[str(tmp_path / "patient_0" / "ppg.npy")],
+            spec=spec,
+            output_directory=str(tmp_path / "patient_0"),
+            output_format="npy",
+        )
+    assert np.array_equal(np.load(tmp_path / "patient_0" / "ppg.npy"), input_signal)
+
+
+def test_signal_io(tmp_path):
+    # Load input signal
+    with open("src/iir/test/input_signal.txt", "rb") as f:
+        input_signal = np.loadtxt(f)[:20000]
+    source = tmp_path / "input_signal.txt"
+    np.savetxt(source, input_signal)
+
+    # The first load converts the text file, the second one reuses the binary file
+    path = convert_text_signal(str(source))
+    modified = os.path.getmtime(path)
+    y = load_signal(str(source))
+    assert isinstance(y, np.memmap)
+    assert np.array_equal(y, input_signal)
+    assert convert_text_signal(str(source)) == path
+    assert os.path.getmtime(path) == modified
+
+    # A modified source is converted again
+    np.savetxt(source, input_signal[:1000])
+    os.utime(source, ns=(0, 0))
+    assert len(load_signal(str(source))) == 1000
+    np.savetxt(source, input_signal)
+
+    # Raw float32 file
+    y_float32 = load_signal(str(source), dtype="float32", file_format="raw")
+    assert y_float32.dtype == np.float32
+    assert np.allclose(y_float32, input_signal, rtol=1e-6)
+
+    # Stream the memory-mapped signal through a window filter into a memory-mapped output
+    with open("src/iir/test/coefficient_4th_order.yaml") as f:
+        coefficient = yaml.safe_load(f)
+    b = coefficient["b"]
+    a = coefficient["a"]
+    y = filter_signal_chunks(
+        str(source),
+        IIRWindowArray(b=b, a=a).apply_iir_filter,
+        chunk_size=1000,
+        output_path=str(tmp_path / "filtered.npy"),
+    )
+    y_scipy = signal.lfilter(b=b, a=a, x=input_signal)
+    assert np.max(np.abs(np.load(tmp_path / "filtered.npy") - y_scipy)) < 1e-9
+
+
 if __name__ == "__main__":
     # pytest.main()
     test_apply_iir_filter_single_sample_tapir()
@@ -0,0 +1,88 @@
+import sys
+import os
+import json
+import subprocess
+
+
+SRC_DIRECTORY = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Modules that a filtering worker imports: they must only need NumPy
+RUNTIME_MODULES = [
+    "fir.fir_array.fir_array",
+    "fir.fir_single_sample.fir_single_sample",
+    "fir.fir_window_array.fir_window_array",
+    "fir.fir_design.fir_design",
+    "fir.fir_resampler.fir_resampler",
+    "iir.iir_array.iir_array",
+    "iir.iir_single_sample.iir_single_sample",
+    "iir.iir_window_array.iir_window_array",
+    "iir.sos_filter.sos_filter",
+    "iir.filter_bank.filter_bank",
+    "iir.filtfilt.filtfilt",
+    "iir.frequency_response.frequency_response",
+    "iir.utils.coefficient",
+    "iir.utils.signal_io",
+    "iir.batch_runner.batch_runner",
+    "adaptive.adaptive_algorithms.adaptive_algorithms",
+    "fixed_point.q_format.q_format",
+    "filter_state.state_buffer.state_buffer",
+    "adaptive.adaptive_filter_array.adaptive_array",
+    "adaptive.adaptive_filter_bank.adaptive_filter_bank",
+    "adaptive.adaptive_filter_window.adaptive_filter_window_tapir",
+    "adaptive.adaptive_single_sample.adaptive_single_sample",
+    "adaptive.adaptive_single_sample_tapir.adaptive_single_sample_tapir",
+    "pipeline.stages.stages",
+    "pipeline.async_pipeline.async_pipeline",
+    "pipeline.filter_pipeline.filter_pipeline",
+]
+
+# Design, plotting and configuration dependencies, loaded on first use only
+LAZY_MODULES = ["scipy", "matplotlib", "yaml"]
+
+# Time allowed to import all the runtime modules once NumPy is imported.
+# It takes ~0.06 s; importing scipy.signal alone takes several times more.
+IMPORT_TIME_BUDGET_SECONDS = 0.5
+
+
+def _measure_import(modules: list[str]) -> dict:
+    """
+    Import modules in a fresh interpreter.
+
+    Returns:
+        dict: 'numpy_seconds', 'seconds' (import time of modules after NumPy)
+        and 'loaded' (the LAZY_MODULES found in sys.modules)
+    """
+    code = f"""
+import importlib
+import json
+import sys
+import time
+
+start = time.perf_counter()
+import numpy
+numpy_seconds = time.perf_counter() - start
+
+start = time.perf_counter()
+for module in {modules!r}:
+    importlib.import_module(module)
+seconds = time.perf_counter() - start
+
+loaded = [module for module in {LAZY_MODULES!r} if module in sys.modules]
+print(json.dumps({{"numpy_seconds": numpy_seconds, "seconds": seconds, "loaded": loaded}}))
+"""
+    environment = dict(os.environ, PYTHONPATH=SRC_DIRECTORY)
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, env=environment, check=True
+    )
+    return json.loads(result.stdout)
+
+
+def test_runtime_modules_do_not_import_design_dependencies():
+    measure = _measure_import(RUNTIME_MODULES)
+    assert measure["loaded"] == []
+
+
+def test_runtime_modules_import_time():
+    # Best of three runs, to smooth out a cold file system cache
+    seconds = min(_measure_import(RUNTIME_MODULES)["seconds"] for _ in range(3))
+    assert seconds < IMPORT_TIME_BUDGET_SECONDS
@@ -1,6 +1,120 @@
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Callable, Union, Literal
+
 import numpy as np
-from scipy import signal
-from typing import Union, Literal
+
+# Environment variable pointing to the folder of the on-disk coefficient store
+COEFFICIENT_CACHE_DIRECTORY_VARIABLE = "DIGITAL_FILTERS_COEFFICIENT_CACHE"
+
+
+class CoefficientCache:
+    def __init__(self, maxsize: int = 128, directory: str = None):
+        """
+        Initialize a cache of designed filter coefficients.
+
+        Designs are kept in an in-process LRU of at most maxsize entries and,
+        when directory is set, in one .npz file per design, so that a new
+        process finds the coefficients on disk instead of designing them again.
+
+        Args:
+            maxsize (int): Maximum number of designs kept in memory. Defaults to 128.
+            directory (str): Folder of the on-disk store. Defaults to None (memory only).
+
+        Returns:
+            None
+        """
+        self.maxsize = maxsize
+        self.directory = directory
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key: tuple, compute: Callable[[], tuple]) -> tuple:
+        """
+        Return the cached design for key, computing and storing it on a miss.
+
+        Args:
+            key (tuple): Hashable, normalized design key
+            compute (Callable): Function returning the design as a tuple of
+            arrays and floats
+
+        Returns:
+            tuple: A copy of the design, safe to modify
+        """
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return _copy_design(value)
+
+        value = self._load(key)
+        if value is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            value = tuple(compute())
+            self._store(key, value)
+
+        self._entries[key] = value
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return _copy_design(value)
+
+    def cache_info(self) -> dict:
+        """
+        Return the cache statistics.
+
+        Returns:
+            dict: 'hits' (in memory), 'disk_hits', 'misses', 'size' (designs
+            in memory) and 'maxsize'
+        """
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+        }
+
+    def clear(self):
+        """Empty the in-memory cache and reset the statistics. The on-disk store is kept."""
+        self._entries.clear()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, key: tuple) -> str:
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode()).hexdigest() + ".npz")
+
+    def _load(self, key: tuple) -> tuple:
+        if self.directory is None:
+            return None
+        try:
+            with np.load(self._path(key)) as data:
+                return tuple(
+                    data[f"arr_{i}"].item() if data[f"arr_{i}"].ndim == 0 else data[f"arr_{i}"]
+                    for i in range(len(data.files))
+                )
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _store(self, key: tuple, value: tuple):
+        if self.directory is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        # Write to a temporary file first, so that a concurrent reader never
+        # sees a partially written file
+        temporary = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(temporary, *value)
+        os.replace(temporary, path)
+
+
+# Cache shared by compute_impulse_response_coefficient and compute_sos_coefficient
+coefficient_cache = CoefficientCache(directory=os.environ.get(COEFFICIENT_CACHE_DIRECTORY_VARIABLE))
 
 
 def compute_impulse_response_coefficient(
@@ -38,8 +152,8 @@ def compute_impulse_response_coefficient(
             - a: denominator coefficients
 
     Raises:
-        ValueError: If band_type/filter_type combination is invalid or if fc format
-        doesn't match the band_type requirements.
+        ValueError: If band_type/filter_type combination is invalid, if fc format
+        doesn't match the band_type requirements or if filter_order is not an integer.
 
     Example:
         >>> # Create a lowpass Butterworth filter at 30Hz, sampling at 1kHz
@@ -57,10 +171,119 @@ def compute_impulse_response_coefficient(
         ...     band_type='bandpass'
         ... )
     """
+    key = _design_key("ba", filter_order, fs, fc, filter_type, band_type)
+    return coefficient_cache.get_or_compute(
+        key,
+        lambda: _design_butterworth(
+            filter_order=filter_order,
+            fs=fs,
+            fc=fc,
+            filter_type=filter_type,
+            band_type=band_type,
+            output="ba",
+        ),
+    )
+
+
+def compute_sos_coefficient(
+    filter_order: int = 1,
+    fs: float = 2,
+    fc: Union[float, list[float]] = 1,
+    filter_type: str = "butter",
+    band_type: Literal["low", "high", "band", "bandpass", "bandstop"] = "bandpass",
+) -> np.ndarray:
+    """
+    Compute second-order sections for digital Butterworth filters.
+
+    Takes the same arguments as compute_impulse_response_coefficient, but the
+    filter is designed in zeros/poles/gain form and paired into biquads with
+    zpk_to_sos, without ever expanding the full transfer function. This keeps
+    high-order narrow band filters (e.g. an 8th-order 0.4-4Hz bandpass at 32Hz)
+    accurate in float64.
+
+    Args:
+        filter_order (int): Order of the filter. Defaults to 1.
+        fs (float): Sampling frequency in Hz. Defaults to 2Hz.
+        fc (float | list[float]): Cutoff frequency in Hz, [low_freq, high_freq]
+        for bandpass filters. Defaults to 1Hz.
+        filter_type (str): Type of filter to design. Currently only supports 'butter'.
+        band_type (str): Filter response type ('low', 'high' or 'bandpass').
+        Defaults to 'bandpass'.
+
+    Returns:
+        np.ndarray: Second-order sections of shape (n_sections, 6), each row
+        being [b0, b1, b2, a0, a1, a2] with a0 == 1.
+
+    Raises:
+        ValueError: If band_type/filter_type combination is invalid, if fc format
+        doesn't match the band_type requirements or if filter_order is not an integer.
+    """
+    def design() -> tuple:
+        z, p, k = _design_butterworth(
+            filter_order=filter_order,
+            fs=fs,
+            fc=fc,
+            filter_type=filter_type,
+            band_type=band_type,
+            output="zpk",
+        )
+        return (zpk_to_sos(z, p, k),)
+
+    key = _design_key("sos", filter_order, fs, fc, filter_type, band_type)
+    (sos,) = coefficient_cache.get_or_compute(key, design)
+    return sos
+
+
+def _design_key(
+    output: str,
+    filter_order: int,
+    fs: float,
+    fc: Union[float, list[float]],
+    filter_type: str,
+    band_type: str,
+) -> tuple:
+    """
+    Normalized coefficient_cache key: fc given as a float, list, tuple or
+    array maps to the same tuple of floats.
+
+    Raises:
+        ValueError: If filter_order is not an integer, which would otherwise
+        share the key of its integer part
+    """
+    order = int(filter_order)
+    if order != filter_order:
+        raise ValueError("filter_order must be an integer")
+    fc = tuple(float(value) for value in np.ravel(fc))
+    return (output, order, float(fs), fc, filter_type, band_type)
+
+
+def _copy_design(value: tuple) -> tuple:
+    return tuple(item.copy() if isinstance(item, np.ndarray) else item for item in value)
+
+
+def _design_butterworth(
+    filter_order: int,
+    fs: float,
+    fc: Union[float, list[float]],
+    filter_type: str,
+    band_type: str,
+    output: Literal["ba", "zpk"],
+) -> tuple:
+    """
+    Validate the design arguments and call scipy.signal.butter.
+
+    Returns:
+        tuple: (b, a) when output is 'ba', (z, p, k) when output is 'zpk'
+    """
+    # SciPy is only needed to design filters, not to run them: import it on first use
+    from scipy import signal
+
     if filter_type == "butter":
         if band_type == "bandpass":
             try:
-                b, a = signal.butter(N=filter_order, Wn=fc, btype=band_type, fs=fs)
+                coefficients = signal.butter(
+                    N=filter_order, Wn=fc, btype=band_type, fs=fs, output=output
+                )
             except Exception as e:
                 if band_type == "bandpass" and not isinstance(fc, list):
                     raise ValueError(
@@ -70,7 +293,9 @@ def compute_impulse_response_coefficient(
                     raise e
         elif band_type == "low" or band_type == "high":
             try:
-                b, a = signal.butter(N=filter_order, Wn=fc, btype=band_type, fs=fs)
+                coefficients = signal.butter(
+                    N=filter_order, Wn=fc, btype=band_type, fs=fs, output=output
+                )
             except Exception as e:
                 if band_type == "low" or band_type == "high" and isinstance(fc, list):
                     raise ValueError(
@@ -83,37 +308,42 @@ def compute_impulse_response_coefficient(
     else:
         raise ValueError("filter_type must be 'butter'") from None
 
-    return b, a
+    return coefficients
 
 
 def split_iir_filter(b: np.ndarray, a: np.ndarray) -> tuple:
     """
-    Split a 4th-order IIR filter into two 2nd-order filters.
+    Split an IIR filter into two cascaded filters of half the order.
 
-    This function finds the zeros (z), poles (p), and gain (k) of the original
-    4th-order filter using scipy.signal.tf2zpk, splits those roots evenly into
-    two separate filters, and then converts them back to polynomial coefficients
-    with scipy.signal.zpk2tf.
+    This function converts the filter into second-order sections with
+    tf_to_sos, so that complex conjugate poles and zeros always stay in the
+    same section, then multiplies the first and the second half of the
+    sections back into two polynomial filters.
 
     Parameters:
     -----------
     b : np.ndarray
-        The numerator coefficients of the 4th-order filter.
+        The numerator coefficients of the filter.
     a : np.ndarray
-        The denominator coefficients of the 4th-order filter.
+        The denominator coefficients of the filter.
 
     Returns:
     --------
     (b1, a1), (b2, a2) : tuple
-        Two pairs of 2nd-order filter coefficients. Each pair consists of a
-        1D array of numerator coefficients and a 1D array of denominator
-        coefficients.
+        Two pairs of filter coefficients. Each pair consists of a 1D array of
+        numerator coefficients and a 1D array of denominator coefficients.
+
+    Raises:
+    -------
+    ValueError
+        If the filter does not have an even number of second-order sections.
 
     Notes:
     ------
-    - The order of the split is assumed to be even (4th-order), dividing
-      the zeros and poles into two sets of equal size.
-    - The overall gain factor is split evenly by taking sqrt(k).
+    - A 4th-order Butterworth bandpass (8 poles, 4 sections) is split into
+      two filters of 4 poles each.
+    - Applying the two filters one after the other is equivalent to
+      applying the original filter.
 
     Example:
     --------
@@ -125,15 +355,234 @@ def split_iir_filter(b: np.ndarray, a: np.ndarray) -> tuple:
     >>> print(b1, a1)
     >>> print(b2, a2)
     """
-    # Get the roots of the numerator and denominator
+    sos = tf_to_sos(b, a)
+    if len(sos) % 2 != 0:
+        raise ValueError("The filter must have an even number of second-order sections")
+
+    half = len(sos) // 2
+    return sos_to_tf(sos[:half]), sos_to_tf(sos[half:])
+
+
+def tf_to_sos(b: np.ndarray, a: np.ndarray) -> np.ndarray:
+    """
+    Convert transfer function coefficients into second-order sections.
+
+    Args:
+        b (np.ndarray): Numerator coefficients
+        a (np.ndarray): Denominator coefficients
+
+    Returns:
+        np.ndarray: Second-order sections of shape (n_sections, 6)
+    """
+    from scipy import signal
+
     z, p, k = signal.tf2zpk(b, a)
-    
-    # Split roots into two groups for 2nd-order filters
-    z1, z2 = np.split(z, 2)
-    p1, p2 = np.split(p, 2)
-    
-    # Convert back to polynomial coefficients
-    b1, a1 = signal.zpk2tf(z1, p1, np.sqrt(k))  # Split the gain equally
-    b2, a2 = signal.zpk2tf(z2, p2, np.sqrt(k))
-    
-    return (b1, a1), (b2, a2)
\ No newline at end of file
+    return zpk_to_sos(z, p, k)
+
+
+def zpk_to_sos(z: np.ndarray, p: np.ndarray, k: float) -> np.ndarray:
+    """
+    Pair zeros and poles into second-order sections.
+
+    Complex conjugate poles are kept together in one section, and every pole
+    pair is matched with the zeros closest to it (scipy.signal.zpk2sos with
+    'nearest' pairing). Sections are ordered with the poles closest to the
+    unit circle last, which limits the gain of the intermediate signals.
+
+    Args:
+        z (np.ndarray): Zeros of the transfer function
+        p (np.ndarray): Poles of the transfer function
+        k (float): Gain of the transfer function
+
+    Returns:
+        np.ndarray: Second-order sections of shape (n_sections, 6), each row
+        being [b0, b1, b2, a0, a1, a2] with a0 == 1.
+    """
+    from scipy import signal
+
+    return signal.zpk2sos(z, p, k, pairing="nearest")
+
+
+def sos_to_tf(sos: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Multiply cascaded second-order sections back into a single transfer function.
+
+    Args:
+        sos (np.ndarray): Second-order sections of shape (n_sections, 6)
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Numerator and denominator coefficients (b, a)
+    """
+    sos = np.atleast_2d(np.asarray(sos, dtype=np.float64))
+    b = np.array([1.0])
+    a = np.array([1.0])
+    for section in sos:
+        b = np.convolve(b, section[:3])
+        a = np.convolve(a, section[3:])
+    return b, a
+
+
+# Initial state of the IIR filters: zero, the steady state of their first
+# input sample, or a given direct form II transposed state
+InitialConditions = Union[Literal["zeros", "steady"], np.ndarray]
+
+
+def lfilter_zi(b: np.ndarray, a: np.ndarray) -> np.ndarray:
+    """
+    Direct form II transposed state of the steady state of the step response.
+
+    A filter started from zi * x[0] outputs its steady-state value right away
+    when its input is constant, which removes the start-up transient of
+    signals with an offset (scipy.signal.lfilter_zi, in NumPy).
+
+    Args:
+        b (np.ndarray): Numerator coefficients
+        a (np.ndarray): Denominator coefficients
+
+    Returns:
+        np.ndarray: State of length max(len(a), len(b)) - 1
+
+    Raises:
+        ValueError: If the first denominator coefficient is zero
+        ValueError: If the filter has a pole at z = 1, which has no steady state
+    """
+    b = np.atleast_1d(np.asarray(b, dtype=np.float64))
+    a = np.atleast_1d(np.asarray(a, dtype=np.float64))
+    if a[0] == 0:
+        raise ValueError("The first denominator coefficient must be different from zero")
+    order = max(len(a), len(b)) - 1
+    b_padded = np.zeros(order + 1)
+    a_padded = np.zeros(order + 1)
+    b_padded[: len(b)] = b / a[0]
+    a_padded[: len(a)] = a / a[0]
+    if np.sum(a_padded) == 0:
+        raise ValueError("The filter has a pole at z = 1: it has no steady state")
+    if order == 0:
+        return np.zeros(0)
+
+    # zi = A zi + B, A being the transposed companion matrix of the denominator
+    i_minus_a = np.eye(order) - np.eye(order, k=1)
+    i_minus_a[:, 0] += a_padded[1:]
+    return np.linalg.solve(i_minus_a, b_padded[1:] - a_padded[1:] * b_padded[0])
+
+
+def sosfilt_zi(sos: np.ndarray) -> np.ndarray:
+    """
+    Direct form II transposed state of every section for the steady state of the step response.
+
+    Each section starts from the steady state of its own input, the step
+    scaled by the DC gain of the sections before it (scipy.signal.sosfilt_zi, in NumPy).
+
+    Args:
+        sos (np.ndarray): Second-order sections of shape (n_sections, 6)
+
+    Returns:
+        np.ndarray: States of shape (n_sections, 2)
+
+    Raises:
+        ValueError: If a section has a pole at z = 1, which has no steady state
+    """
+    sos = np.atleast_2d(np.asarray(sos, dtype=np.float64))
+    zi = np.empty((len(sos), 2))
+    scale = 1.0
+    for section, (b, a) in enumerate(zip(sos[:, :3], sos[:, 3:])):
+        zi[section] = scale * lfilter_zi(b, a)
+        scale *= np.sum(b) / np.sum(a)
+    return zi
+
+
+def validate_initial_conditions(initial_conditions: InitialConditions, shape: tuple) -> InitialConditions:
+    """
+    Check the initial_conditions argument of a filter.
+
+    Args:
+        initial_conditions (str | np.ndarray): 'zeros', 'steady' or a state
+        shape (tuple): Shape of the state of the filter
+
+    Returns:
+        str | np.ndarray: 'zeros', 'steady' or a float64 copy of the state
+
+    Raises:
+        ValueError: If initial_conditions is another string or an array of another shape
+    """
+    if isinstance(initial_conditions, str):
+        if initial_conditions not in ("zeros", "steady"):
+            raise ValueError("initial_conditions must be 'zeros', 'steady' or an array")
+        return initial_conditions
+    zi = np.array(initial_conditions, dtype=np.float64)
+    if zi.shape != tuple(shape):
+        raise ValueError(f"initial_conditions must have shape {tuple(shape)}, got {zi.shape}")
+    return zi
+
+
+def restore_pending_steady_state(pending: float, initial_conditions: InitialConditions) -> bool:
+    """
+    Check the pending steady-state flag of a restored filter state.
+
+    A state taken before the first sample of a filter with 'steady' initial
+    conditions still has to start from the steady state of the next sample,
+    which only a filter with 'steady' initial conditions can do.
+
+    Args:
+        pending (float): Flag stored in the state, 1 if the steady-state start is pending
+        initial_conditions (str | np.ndarray): Initial conditions of the filter restoring the state
+
+    Returns:
+        bool: Whether the steady-state start is pending
+
+    Raises:
+        ValueError: If the start is pending and initial_conditions is not 'steady'
+    """
+    if not pending:
+        return False
+    if not (isinstance(initial_conditions, str) and initial_conditions == "steady"):
+        raise ValueError(
+            "The state was taken before the first sample of a filter starting from the steady state: "
+            "it can only be restored into a filter with initial_conditions='steady'"
+        )
+    return True
+
+
+def direct_form_i_history(b: np.ndarray, a: np.ndarray, zi: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Past inputs and outputs of a direct form I filter equivalent to a direct form II transposed state.
+
+    Started from zi, the direct form II transposed filter adds zi[n] to the
+    difference equation of the first samples n < order. The direct form I
+    history giving the same contributions is the minimum-norm solution of
+    that linear system, so both forms then produce the same output.
+
+    Args:
+        b (np.ndarray): Numerator coefficients
+        a (np.ndarray): Denominator coefficients, a[0] != 0
+        zi (np.ndarray): State of shape (order,) or (order, channels), with
+        order = max(len(a), len(b)) - 1
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The last order inputs and outputs, oldest
+        first, each with the shape of zi
+
+    Raises:
+        ValueError: If zi cannot be reproduced by a direct form I history,
+        which happens when the last coefficients of b and a are both zero
+    """
+    b = np.asarray(b, dtype=np.float64)
+    a = np.asarray(a, dtype=np.float64)
+    zi = np.asarray(zi, dtype=np.float64)
+    order = len(zi)
+    b_padded = np.zeros(order + 1)
+    a_padded = np.zeros(order + 1)
+    b_padded[: len(b)] = b / a[0]
+    a_padded[: len(a)] = a / a[0]
+
+    # Row n: sum over k > n of b[k] x[n - k] - a[k] y[n - k], the history
+    # being x[-order], ..., x[-1], then y[-order], ..., y[-1]
+    contributions = np.zeros((order, 2 * order))
+    for n in range(order):
+        for k in range(n + 1, order + 1):
+            contributions[n, order + n - k] = b_padded[k]
+            contributions[n, 2 * order + n - k] = -a_padded[k]
+    history = np.linalg.lstsq(contributions, zi, rcond=None)[0]
+    if not np.allclose(contributions @ history, zi, rtol=1e-9, atol=1e-12 * max(1.0, float(np.max(np.abs(zi), initial=0)))):
+        raise ValueError("The initial conditions cannot be reproduced by a direct form I filter")
+    return history[:order], history[order:]
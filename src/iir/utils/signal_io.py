@@ -0,0 +1,224 @@
+import argparse
+import inspect
+import json
+import os
+from typing import Callable, Iterator, Literal, Union
+
+import numpy as np
+
+# Folder, created next to each text recording, holding its binary conversions
+CACHE_DIRECTORY_NAME = ".signal_cache"
+
+
+def convert_text_signal(
+    source: str,
+    dtype: Union[str, np.dtype] = "float64",
+    file_format: Literal["npy", "raw"] = "npy",
+    cache_directory: str = None,
+) -> str:
+    """
+    Convert a text recording (one sample per line, or one row of channels per line) to binary.
+
+    The conversion is cached: a JSON sidecar next to the binary file records
+    the modification time and size of the source, and the text is parsed
+    again only when they change.
+
+    Args:
+        source (str): Path of the text recording
+        dtype (str | np.dtype): Sample type of the binary file, 'float32' or 'float64'.
+        Defaults to 'float64'.
+        file_format (str): 'npy' (NumPy file with header) or 'raw' (bare samples,
+        shape and dtype stored in the sidecar). Defaults to 'npy'.
+        cache_directory (str): Folder for the binary files. Defaults to a
+        .signal_cache folder next to the source.
+
+    Returns:
+        str: Path of the binary file
+
+    Raises:
+        ValueError: If file_format is not 'npy' or 'raw'
+    """
+    if file_format not in ("npy", "raw"):
+        raise ValueError("file_format must be 'npy' or 'raw'")
+    dtype = np.dtype(dtype)
+
+    if cache_directory is None:
+        cache_directory = os.path.join(os.path.dirname(os.path.abspath(source)), CACHE_DIRECTORY_NAME)
+    name = os.path.splitext(os.path.basename(source))[0]
+    destination = os.path.join(cache_directory, f"{name}.{dtype.name}.{file_format}")
+
+    source_stat = os.stat(source)
+    metadata = _read_metadata(destination)
+    if (
+        metadata is not None
+        and metadata["source_mtime_ns"] == source_stat.st_mtime_ns
+        and metadata["source_size"] == source_stat.st_size
+        and os.path.exists(destination)
+    ):
+        return destination
+
+    with open(source, "rb") as f:
+        signal = np.loadtxt(f, dtype=dtype, ndmin=1)
+
+    os.makedirs(cache_directory, exist_ok=True)
+    # Write to a temporary file first, so that a concurrent reader never sees
+    # a partially written file
+    temporary = f"{destination}.{os.getpid()}.tmp"
+    if file_format == "npy":
+        with open(temporary, "wb") as f:
+            np.save(f, signal)
+    else:
+        signal.tofile(temporary)
+    os.replace(temporary, destination)
+
+    with open(f"{destination}.json", "w") as f:
+        json.dump(
+            {
+                "source": os.path.abspath(source),
+                "source_mtime_ns": source_stat.st_mtime_ns,
+                "source_size": source_stat.st_size,
+                "dtype": dtype.name,
+                "shape": list(signal.shape),
+            },
+            f,
+        )
+    return destination
+
+
+def load_signal(
+    path: str,
+    dtype: Union[str, np.dtype] = "float64",
+    file_format: Literal["npy", "raw"] = "npy",
+    cache_directory: str = None,
+) -> np.ndarray:
+    """
+    Memory-map a recording, converting it to binary first if it is a text file.
+
+    Args:
+        path (str): Path of a text recording, a .npy file or a raw file with its JSON sidecar
+        dtype (str | np.dtype): Sample type used when converting a text file. Defaults to 'float64'.
+        file_format (str): Binary format used when converting a text file. Defaults to 'npy'.
+        cache_directory (str): See convert_text_signal
+
+    Returns:
+        np.ndarray: Read-only memory-mapped signal (np.memmap)
+    """
+    extension = os.path.splitext(path)[1]
+    if extension not in (".npy", ".raw"):
+        path = convert_text_signal(
+            source=path,
+            dtype=dtype,
+            file_format=file_format,
+            cache_directory=cache_directory,
+        )
+        extension = f".{file_format}"
+
+    if extension == ".npy":
+        return np.load(path, mmap_mode="r")
+
+    metadata = _read_metadata(path)
+    if metadata is None:
+        raise ValueError(f"The raw file {path} has no JSON sidecar with its dtype and shape")
+    return np.memmap(path, dtype=metadata["dtype"], mode="r", shape=tuple(metadata["shape"]))
+
+
+def iter_signal_chunks(signal: Union[str, np.ndarray], chunk_size: int, **load_arguments) -> Iterator[np.ndarray]:
+    """
+    Iterate over a recording in chunks of chunk_size samples (the last one may be shorter).
+
+    Only the pages of the current chunk are read from disk.
+
+    Args:
+        signal (str | np.ndarray): Path of the recording (see load_signal) or an array
+        chunk_size (int): Number of samples per chunk
+        **load_arguments: Arguments forwarded to load_signal
+
+    Yields:
+        np.ndarray: Views of consecutive chunks along the first axis
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    if isinstance(signal, str):
+        signal = load_signal(signal, **load_arguments)
+    for start in range(0, len(signal), chunk_size):
+        yield signal[start : start + chunk_size]
+
+
+def filter_signal_chunks(
+    signal: Union[str, np.ndarray],
+    apply_filter: Callable,
+    chunk_size: int = 4096,
+    output_path: str = None,
+    **load_arguments,
+) -> np.ndarray:
+    """
+    Stream a recording chunk by chunk through a stateful window filter.
+
+    Args:
+        signal (str | np.ndarray): Path of the recording (see load_signal) or an array
+        apply_filter (Callable): Window filter method, e.g. IIRWindowArray.apply_iir_filter.
+        Filters accepting an `out` argument write straight into the output.
+        chunk_size (int): Number of samples per chunk. Defaults to 4096.
+        output_path (str): Optional .npy file for the output, written through a
+        memory map so that the output never needs to fit in memory either.
+        Defaults to None, which returns an in-memory array.
+        **load_arguments: Arguments forwarded to load_signal
+
+    Returns:
+        np.ndarray: Filtered signal (memory-mapped when output_path is given)
+    """
+    if isinstance(signal, str):
+        signal = load_signal(signal, **load_arguments)
+
+    if output_path is None:
+        y = np.empty(signal.shape)
+    else:
+        y = np.lib.format.open_memmap(output_path, mode="w+", dtype=np.float64, shape=signal.shape)
+
+    writes_out = "out" in inspect.signature(apply_filter).parameters
+    for start in range(0, len(signal), chunk_size):
+        stop = min(start + chunk_size, len(signal))
+        if writes_out:
+            apply_filter(signal[start:stop], out=y[start:stop])
+        else:
+            y[start:stop] = apply_filter(signal[start:stop])
+
+    if output_path is not None:
+        y.flush()
+    return y
+
+
+def _read_metadata(path: str) -> dict:
+    """
+    Read the JSON sidecar of a binary file, if any.
+
+    Returns:
+        dict | None: The metadata, or None if the sidecar does not exist or is unreadable
+    """
+    try:
+        with open(f"{path}.json") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(description="Convert text recordings to binary files.")
+    parser.add_argument("sources", nargs="+", help="Text recordings")
+    parser.add_argument("--dtype", choices=["float32", "float64"], default="float64")
+    parser.add_argument("--format", dest="file_format", choices=["npy", "raw"], default="npy")
+    parser.add_argument("--cache-directory", default=None, help="Folder for the binary files")
+    args = parser.parse_args(argv)
+
+    for source in args.sources:
+        destination = convert_text_signal(
+            source=source,
+            dtype=args.dtype,
+            file_format=args.file_format,
+            cache_directory=args.cache_directory,
+        )
+        print(f"{source} -> {destination}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+Asyncio pipeline streaming sensor chunks through processing stages.
+
+Chunks are pulled from an async source (a socket, a growing text file, an
+array), go through the stages in order and are yielded as they come out.
+Every stage has its own worker task, connected to the next one by a bounded
+queue, so consecutive chunks are processed by different stages at the same
+time. CPU-bound stages run in an executor, which keeps the event loop free to
+serve other connections. When the consumer falls behind, the queues fill up
+and the source is no longer read: on a socket, the TCP flow control then
+slows the sender down.
+
+Example:
+    One pipeline per connection, the filters of all connections sharing a
+    thread pool. Every sample is a row of 4 little-endian float32 values:
+    PPG then the 3 accelerometer axes.
+
+    executor = ThreadPoolExecutor(max_workers=4)
+
+    async def handle_connection(reader, writer):
+        stages = [IIRStage(b, a, field="ppg"), AdaptiveStage(filter_order=50, learning_rate=8e-5)]
+        source = stream_source(reader, fields={"ppg": 0, "accelerometer": [1, 2, 3]})
+        async for chunk in AsyncPipeline(stages, executor=executor).process(source):
+            await write_stream(writer, chunk, fields=["ppg_clean"])
+        writer.close()
+
+    server = await asyncio.start_server(handle_connection, "127.0.0.1", 8765)
+"""
+import asyncio
+import time
+from concurrent.futures import Executor
+from typing import AsyncIterable, AsyncIterator, Union
+
+import numpy as np
+
+from pipeline.stages.stages import Stage
+
+# Marks the end of the stream in the queues
+_END = object()
+
+
+class _Failure:
+    """Exception raised upstream, forwarded through the queues to the consumer."""
+
+    def __init__(self, exception: BaseException):
+        self.exception = exception
+
+
+class AsyncPipeline:
+    def __init__(self, stages: list[Stage], executor: Executor = None, max_queued_chunks: int = 4):
+        """
+        Initialize the pipeline.
+
+        Args:
+            stages (list[Stage]): Stages applied in order to every chunk. They
+            keep their state between chunks, so a pipeline serves one stream.
+            executor (Executor): Executor of the CPU-bound stages, typically a
+            ThreadPoolExecutor shared by the pipelines of all connections.
+            Defaults to None, the default executor of the event loop.
+            max_queued_chunks (int): Size of the queue in front of every stage
+            and of the output queue. Defaults to 4.
+
+        Raises:
+            ValueError: If max_queued_chunks is not positive
+        """
+        if max_queued_chunks < 1:
+            raise ValueError("max_queued_chunks must be positive")
+        self.stages = list(stages)
+        self.executor = executor
+        self.max_queued_chunks = max_queued_chunks
+
+    async def process(self, source: AsyncIterable[dict]) -> AsyncIterator[dict]:
+        """
+        Stream the chunks of a source through the stages.
+
+        Args:
+            source (AsyncIterable[dict]): Chunks, e.g. from stream_source or file_source
+
+        Yields:
+            dict: Processed chunks, in the order of the source
+
+        Raises:
+            Exception: The first error raised by the source or a stage
+        """
+        queues = [asyncio.Queue(self.max_queued_chunks) for _ in range(len(self.stages) + 1)]
+        tasks = [asyncio.create_task(self._read(source, queues[0]))]
+        for stage, inbox, outbox in zip(self.stages, queues[:-1], queues[1:]):
+            tasks.append(asyncio.create_task(self._run_stage(stage, inbox, outbox)))
+
+        try:
+            while True:
+                item = await queues[-1].get()
+                if item is _END:
+                    break
+                if isinstance(item, _Failure):
+                    raise item.exception
+                yield item
+        finally:
+            # Stop the workers if the consumer leaves early or an error occurred
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _read(self, source: AsyncIterable[dict], outbox: asyncio.Queue):
+        """Pull the chunks of the source; waits while the first queue is full."""
+        try:
+            async for chunk in source:
+                await outbox.put(chunk)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exception:
+            await outbox.put(_Failure(exception))
+            return
+        await outbox.put(_END)
+
+    async def _run_stage(self, stage: Stage, inbox: asyncio.Queue, outbox: asyncio.Queue):
+        """Apply a stage to the chunks of its queue, one at a time and in order."""
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await inbox.get()
+            if item is not _END and not isinstance(item, _Failure):
+                try:
+                    if stage.cpu_bound:
+                        item = await loop.run_in_executor(self.executor, stage, item)
+                    else:
+                        item = stage(item)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as exception:
+                    item = _Failure(exception)
+            await outbox.put(item)
+            if item is _END or isinstance(item, _Failure):
+                return
+
+
+def split_columns(rows: np.ndarray, fields: dict) -> dict:
+    """
+    Split the columns of a block of samples into the fields of a chunk.
+
+    Args:
+        rows (np.ndarray): Samples of shape (samples, columns)
+        fields (dict): Field name -> column index (a (samples,) field) or list
+        of column indices (a (samples, channels) field)
+
+    Returns:
+        dict: The chunk
+    """
+    return {name: rows[:, columns] for name, columns in fields.items()}
+
+
+async def array_source(chunk: dict, chunk_samples: int = 256) -> AsyncIterator[dict]:
+    """
+    Cut in-memory recordings into chunks.
+
+    Args:
+        chunk (dict): Named arrays sharing their first axis
+        chunk_samples (int): Number of samples per chunk. Defaults to 256.
+
+    Yields:
+        dict: Chunks of chunk_samples samples (the last one may be shorter)
+    """
+    length = len(next(iter(chunk.values())))
+    for start in range(0, length, chunk_samples):
+        yield {name: values[start : start + chunk_samples] for name, values in chunk.items()}
+        # Let the other tasks run between chunks
+        await asyncio.sleep(0)
+
+
+async def stream_source(
+    reader: asyncio.StreamReader,
+    fields: dict,
+    chunk_samples: int = 256,
+    dtype: Union[str, np.dtype] = "<f4",
+) -> AsyncIterator[dict]:
+    """
+    Read chunks of binary samples from a stream, e.g. a socket.
+
+    Every sample is a row of values of the given dtype, one per column.
+
+    Args:
+        reader (asyncio.StreamReader): Stream to read
+        fields (dict): Columns of every field, see split_columns
+        chunk_samples (int): Number of samples per chunk. Defaults to 256.
+        dtype (str | np.dtype): Type of the values. Defaults to little-endian float32.
+
+    Yields:
+        dict: Chunks of chunk_samples samples; the last one, at the end of
+        the stream, may be shorter (an incomplete last sample is dropped)
+    """
+    dtype = np.dtype(dtype)
+    columns = max(max(np.atleast_1d(indices)) for indices in fields.values()) + 1
+    row_bytes = columns * dtype.itemsize
+    while True:
+        try:
+            data = await reader.readexactly(chunk_samples * row_bytes)
+        except asyncio.IncompleteReadError as error:
+            data = error.partial[: len(error.partial) // row_bytes * row_bytes]
+            if data:
+                yield split_columns(np.frombuffer(data, dtype=dtype).reshape(-1, columns), fields)
+            return
+        yield split_columns(np.frombuffer(data, dtype=dtype).reshape(-1, columns), fields)
+
+
+async def write_stream(
+    writer: asyncio.StreamWriter,
+    chunk: dict,
+    fields: list[str],
+    dtype: Union[str, np.dtype] = "<f4",
+):
+    """
+    Write fields of a chunk to a stream as binary samples, one row of columns per sample.
+
+    Waits until the stream buffer is drained, which slows the pipeline down
+    when the receiver does not keep up.
+
+    Args:
+        writer (asyncio.StreamWriter): Stream to write
+        chunk (dict): Chunk to write
+        fields (list[str]): Fields written, in the order of the columns
+        dtype (str | np.dtype): Type of the values. Defaults to little-endian float32.
+    """
+    length = len(chunk[fields[0]])
+    rows = np.concatenate([np.asarray(chunk[name]).reshape(length, -1) for name in fields], axis=1)
+    writer.write(np.ascontiguousarray(rows, dtype=dtype).tobytes())
+    await writer.drain()
+
+
+async def file_source(
+    path: str,
+    fields: dict,
+    chunk_samples: int = 256,
+    follow: bool = False,
+    poll_interval: float = 0.1,
+    idle_timeout: float = None,
+) -> AsyncIterator[dict]:
+    """
+    Read chunks from a text recording, one sample per line, optionally following it as it grows.
+
+    Args:
+        path (str): Text file, with the columns of every sample separated by whitespace
+        fields (dict): Columns of every field, see split_columns
+        chunk_samples (int): Maximum number of samples per chunk. Defaults to 256.
+        follow (bool): Keep waiting for new lines at the end of the file,
+        like tail -f. Defaults to False, which stops at the end of the file.
+        poll_interval (float): Seconds between two checks for new lines when
+        following. Defaults to 0.1.
+        idle_timeout (float): Stop following after this many seconds without
+        a new line. Defaults to None, which follows forever.
+
+    Yields:
+        dict: Chunks of the complete lines available, at most chunk_samples samples each
+    """
+    with open(path, "rb") as f:
+        pending = b""
+        last_line_time = time.monotonic()
+        while True:
+            lines = []
+            while len(lines) < chunk_samples:
+                line = f.readline()
+                if not line:
+                    break
+                if not line.endswith(b"\n"):
+                    # A line still being written: keep it for the next read
+                    pending += line
+                    continue
+                line = (pending + line).strip()
+                pending = b""
+                if line:
+                    lines.append(line.split())
+
+            if lines:
+                last_line_time = time.monotonic()
+                rows = np.array(lines, dtype=np.float64).reshape(len(lines), -1)
+                yield split_columns(rows, fields)
+                await asyncio.sleep(0)
+            elif not follow:
+                if pending.strip():
+                    yield split_columns(np.array([pending.split()], dtype=np.float64), fields)
+                return
+            elif idle_timeout is not None and time.monotonic() - last_line_time > idle_timeout:
+                return
+            else:
+                await asyncio.sleep(poll_interval)
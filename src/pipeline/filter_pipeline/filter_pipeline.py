@@ -0,0 +1,213 @@
+"""
+Synchronous pipeline chaining FIR, IIR, SOS and adaptive stages.
+
+A Pipeline applies its stages in order to chunks of samples (dicts of named
+arrays, see pipeline.stages) and keeps their state between chunks, so a
+recording can be processed in one call or chunk by chunk. It is itself a
+Stage, and can run as a single stage of an AsyncPipeline.
+
+Compared with calling the stages one after the other, a pipeline:
+- checks the fields, shapes and dtypes of the first chunk against the
+  stages once, and only compares the following chunks with that layout;
+- filters a field through consecutive linear stages in a single output
+  buffer, in place, instead of allocating an array per stage;
+- fuses consecutive linear stages on the same field into one filter when it
+  is built: FIR taps are convolved, transfer functions multiplied and
+  second-order sections stacked, which saves a pass over the samples per
+  fused stage.
+
+Example:
+    b, a = compute_impulse_response_coefficient(filter_order=4, fs=64, fc=[0.5, 4])
+    pipeline = Pipeline([IIRStage(b, a, field="ppg"), AdaptiveStage(filter_order=50, learning_rate=8e-5)])
+    chunk = pipeline({"ppg": ppg, "accelerometer": accelerometer})
+    ppg_clean = chunk["ppg_clean"]
+"""
+from typing import Optional
+
+import numpy as np
+
+from pipeline.stages.stages import FIRStage, IIRStage, LinearStage, SOSStage, Stage
+
+# Highest order of a direct form filter created by fusion. Above it, the
+# stages are kept separate: the poles of a high-order direct form are very
+# sensitive to coefficient rounding, and its per-sample loop grows with the order.
+MAX_FUSED_ORDER = 8
+
+
+class Pipeline(Stage):
+    def __init__(self, stages: list[Stage], fuse: bool = True, max_fused_order: int = MAX_FUSED_ORDER):
+        """
+        Initialize the pipeline.
+
+        Args:
+            stages (list[Stage]): Stages applied in order to every chunk
+            fuse (bool): Fuse consecutive linear stages filtering the same
+            field. Defaults to True.
+            max_fused_order (int): Highest order of a direct form IIR filter
+            created by fusion. Defaults to MAX_FUSED_ORDER.
+
+        Raises:
+            ValueError: If there are no stages
+        """
+        if len(stages) == 0:
+            raise ValueError("The pipeline must have at least one stage")
+        self.max_fused_order = max_fused_order
+        self.stages = fuse_stages(stages, max_fused_order) if fuse else list(stages)
+        # Trailing shape and dtype of the input fields, set by the first chunk
+        self._layout: Optional[dict] = None
+
+    @property
+    def input_fields(self) -> tuple:
+        produced = set()
+        fields = []
+        for stage in self.stages:
+            fields += [name for name in stage.input_fields if name not in produced and name not in fields]
+            produced.update(stage.output_fields)
+        return tuple(fields)
+
+    @property
+    def output_fields(self) -> tuple:
+        return tuple(dict.fromkeys(name for stage in self.stages for name in stage.output_fields))
+
+    def process(self, chunk: dict) -> dict:
+        """
+        Process a chunk.
+
+        Args:
+            chunk (dict): Named arrays of the chunk. Its fields must have the
+            same trailing shapes and dtypes as in the first chunk.
+
+        Returns:
+            dict: The chunk with the output fields of all the stages
+
+        Raises:
+            ValueError: If the chunk does not match the stages, or the layout of the first chunk
+        """
+        if self._layout is None:
+            self._layout = self._validate(chunk)
+        else:
+            for name, (shape, dtype) in self._layout.items():
+                x = chunk[name]
+                if x.shape[1:] != shape or x.dtype != dtype:
+                    raise ValueError(
+                        f"Field '{name}' changed from {shape} {dtype} to {x.shape[1:]} {x.dtype} since the first chunk"
+                    )
+
+        chunk = dict(chunk)
+        # Arrays allocated by this call, which later linear stages can overwrite
+        owned = {}
+        for stage in self.stages:
+            if not stage.linear:
+                chunk = stage(chunk)
+                continue
+
+            x = chunk[stage.field]
+            columns = np.asarray(x, dtype=np.float64).reshape(len(x), -1)
+            in_place = (
+                stage.output_field == stage.field
+                and owned.get(stage.field) is x
+                and sum(value is x for value in chunk.values()) == 1
+            )
+            y = stage.filter(columns, out=columns if in_place else np.empty(columns.shape))
+            y = y.reshape(x.shape)
+            chunk[stage.output_field] = y
+            owned[stage.output_field] = y
+        return chunk
+
+    def reset(self):
+        """Reset the state of all the stages."""
+        for stage in self.stages:
+            stage.reset()
+
+    def _validate(self, chunk: dict) -> dict:
+        """
+        Check the fields of the first chunk against the stages.
+
+        Returns:
+            dict: Trailing shape and dtype of every input field of the pipeline
+        """
+        layout = {}
+        for name in self.input_fields:
+            if name not in chunk:
+                raise ValueError(f"The chunk has no field '{name}'")
+            x = chunk[name]
+            if not isinstance(x, np.ndarray) or x.ndim == 0:
+                raise ValueError(f"Field '{name}' must be an array of samples")
+            if not (np.issubdtype(x.dtype, np.floating) or np.issubdtype(x.dtype, np.integer)):
+                raise ValueError(f"Field '{name}' must have a real dtype, not {x.dtype}")
+            layout[name] = (x.shape[1:], x.dtype)
+
+        lengths = {len(chunk[name]) for name in layout}
+        if len(lengths) > 1:
+            raise ValueError("The fields of a chunk must have the same number of samples")
+        return layout
+
+
+def fuse_stages(stages: list[Stage], max_fused_order: int = MAX_FUSED_ORDER) -> list[Stage]:
+    """
+    Fuse consecutive linear stages where the first output is only read by the second stage.
+
+    The second stage must filter the output field of the first one and
+    overwrite it, and neither stage may have processed samples yet. Both
+    must start from zero state, or both from the steady state. The fused
+    stage reads the field of the first stage.
+
+    Args:
+        stages (list[Stage]): Stages of a pipeline
+        max_fused_order (int): Highest order of a direct form IIR filter
+        created by fusion. Defaults to MAX_FUSED_ORDER.
+
+    Returns:
+        list[Stage]: The stages, with fused stages replacing the stages they combine
+    """
+    fused = []
+    for stage in stages:
+        previous = fused[-1] if fused else None
+        if (
+            isinstance(previous, LinearStage)
+            and isinstance(stage, LinearStage)
+            and stage.field == previous.output_field
+            and stage.output_field == previous.output_field
+            and previous._filters is None
+            and stage._filters is None
+        ):
+            combined = _fuse_pair(previous, stage, max_fused_order)
+            if combined is not None:
+                fused[-1] = combined
+                continue
+        fused.append(stage)
+    return fused
+
+
+def _fuse_pair(first: LinearStage, second: LinearStage, max_fused_order: int) -> Optional[LinearStage]:
+    """Single stage equivalent to two linear stages, or None if they are kept separate."""
+    field, output_field = first.field, first.output_field
+    # A cascade started from zero (or steady) state is the product filter
+    # started from zero (or steady) state, which does not hold for other states
+    initial_conditions = first.initial_conditions
+    if not isinstance(initial_conditions, str) or not isinstance(second.initial_conditions, str):
+        return None
+    if initial_conditions != second.initial_conditions:
+        return None
+
+    if isinstance(first, SOSStage) or isinstance(second, SOSStage):
+        # Multiplying sections back into a direct form would lose their conditioning
+        if isinstance(first, SOSStage) and isinstance(second, SOSStage):
+            return SOSStage(
+                np.vstack((first.sos, second.sos)),
+                field=field,
+                output_field=output_field,
+                initial_conditions=initial_conditions,
+            )
+        return None
+
+    if isinstance(first, FIRStage) and isinstance(second, FIRStage):
+        return FIRStage(np.convolve(first.h, second.h), field=field, output_field=output_field)
+
+    b1, a1 = first.transfer_function()
+    b2, a2 = second.transfer_function()
+    b = np.convolve(b1, b2)
+    a = np.convolve(a1, a2)
+    if max(len(b), len(a)) - 1 > max_fused_order:
+        return None
+    return IIRStage(b, a, field=field, output_field=output_field, initial_conditions=initial_conditions)
@@ -0,0 +1,280 @@
+"""
+Stateful processing stages applied to chunks of sensor samples.
+
+A chunk is a dict of named NumPy arrays sharing their first axis (samples),
+for instance {"ppg": (samples,), "accelerometer": (samples, 3)}. A stage
+reads some fields of a chunk and returns a new chunk with its output fields
+added or replaced. Stages keep their filter state between chunks, so a
+recording processed chunk by chunk gives the same result as in one call.
+"""
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from adaptive.adaptive_algorithms.adaptive_algorithms import AdaptiveAlgorithm
+from adaptive.adaptive_filter_window.adaptive_filter_window_tapir import WindowedAdaptiveFilterTapir
+from fir.fir_window_array.fir_window_array import FIRWindowArray
+from iir.iir_window_array.iir_window_array import IIRWindowArray
+from iir.sos_filter.sos_filter import SOSFilter
+from iir.utils.coefficient import InitialConditions, sos_to_tf
+
+
+class Stage(ABC):
+    # Stages doing a Python loop per sample or heavy NumPy work run in an
+    # executor when driven by the asyncio pipeline, the others on the event loop
+    cpu_bound = True
+    # Linear time-invariant stages, which a Pipeline can fuse
+    linear = False
+
+    def __call__(self, chunk: dict) -> dict:
+        return self.process(chunk)
+
+    @property
+    def input_fields(self) -> tuple:
+        """Fields read by the stage, checked once by a Pipeline."""
+        return ()
+
+    @property
+    def output_fields(self) -> tuple:
+        """Fields written by the stage."""
+        return ()
+
+    @abstractmethod
+    def process(self, chunk: dict) -> dict:
+        """
+        Process a chunk.
+
+        Args:
+            chunk (dict): Named arrays of the chunk
+
+        Returns:
+            dict: The chunk with the output fields of the stage
+        """
+
+    def reset(self):
+        """Reset the state of the stage."""
+
+
+class LinearStage(Stage):
+    linear = True
+    # State the filter of every channel starts from, see IIRWindowArray
+    initial_conditions = "zeros"
+
+    def __init__(self, field: str, output_field: str = None):
+        """
+        Linear filter applied to a field of the chunks.
+
+        Every channel of the field is filtered by its own filter, created
+        with the first chunk.
+
+        Args:
+            field (str): Field filtered, of shape (samples,) or (samples, channels)
+            output_field (str): Field where the output is stored. Defaults to
+            None, which replaces the input field.
+        """
+        self.field = field
+        self.output_field = field if output_field is None else output_field
+        # One filter per channel, created with the first chunk
+        self._filters = None
+
+    @property
+    def input_fields(self) -> tuple:
+        return (self.field,)
+
+    @property
+    def output_fields(self) -> tuple:
+        return (self.output_field,)
+
+    def process(self, chunk: dict) -> dict:
+        x = np.asarray(chunk[self.field], dtype=np.float64)
+        columns = x.reshape(len(x), -1)
+        y = self.filter(columns, out=np.empty(columns.shape))
+        return {**chunk, self.output_field: y.reshape(x.shape)}
+
+    def filter(self, x: np.ndarray, out: np.ndarray) -> np.ndarray:
+        """
+        Filter the channels of a field, keeping the state between calls.
+
+        Args:
+            x (np.ndarray): Float64 input of shape (samples, channels)
+            out (np.ndarray): Float64 array of the same shape where the output
+            is written. It can be x itself, to filter in place.
+
+        Returns:
+            np.ndarray: out
+
+        Raises:
+            ValueError: If the number of channels changed since the first call
+        """
+        if self._filters is None:
+            self._filters = [self._create_filter() for _ in range(x.shape[1])]
+        elif len(self._filters) != x.shape[1]:
+            raise ValueError(f"Expected {len(self._filters)} channels in '{self.field}', got {x.shape[1]}")
+
+        for channel, channel_filter in enumerate(self._filters):
+            self._apply_filter(channel_filter, x[:, channel], out[:, channel])
+        return out
+
+    @abstractmethod
+    def transfer_function(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Transfer function of the stage.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Numerator and denominator coefficients (b, a)
+        """
+
+    def reset(self):
+        self._filters = None
+
+    @abstractmethod
+    def _create_filter(self):
+        """Create the filter of one channel."""
+
+    @abstractmethod
+    def _apply_filter(self, channel_filter, x: np.ndarray, out: np.ndarray):
+        """Filter one channel into out, which can share memory with x."""
+
+
+class FIRStage(LinearStage):
+    def __init__(self, h, field: str = "ppg", output_field: str = None):
+        """
+        FIR filter applied to a field of the chunks, with a FIRWindowArray per channel.
+
+        Args:
+            h (array): Filter coefficients
+            field (str): Field filtered. Defaults to 'ppg'.
+            output_field (str): Field where the output is stored. Defaults to
+            None, which replaces the input field.
+        """
+        super().__init__(field, output_field)
+        self.h = np.asarray(h, dtype=np.float64)
+
+    def transfer_function(self) -> tuple[np.ndarray, np.ndarray]:
+        return self.h, np.array([1.0])
+
+    def _create_filter(self):
+        return FIRWindowArray(self.h)
+
+    def _apply_filter(self, channel_filter, x, out):
+        channel_filter.apply_fir_filter(x, out=out)
+
+
+class IIRStage(LinearStage):
+    def __init__(
+        self, b, a, field: str = "ppg", output_field: str = None, initial_conditions: InitialConditions = "zeros"
+    ):
+        """
+        IIR filter applied to a field of the chunks, with an IIRWindowArray per channel.
+
+        Args:
+            b (array): Numerator coefficients
+            a (array): Denominator coefficients
+            field (str): Field filtered, of shape (samples,) or (samples, channels).
+            Defaults to 'ppg'.
+            output_field (str): Field where the output is stored. Defaults to
+            None, which replaces the input field.
+            initial_conditions (str | np.ndarray): 'zeros', 'steady' (the
+            steady state of the first sample of every channel) or a state of
+            shape (order,), see IIRWindowArray. Defaults to 'zeros'.
+        """
+        super().__init__(field, output_field)
+        self.b = b
+        self.a = a
+        self.initial_conditions = initial_conditions
+
+    def transfer_function(self) -> tuple[np.ndarray, np.ndarray]:
+        return np.asarray(self.b, dtype=np.float64), np.asarray(self.a, dtype=np.float64)
+
+    def _create_filter(self):
+        return IIRWindowArray(self.b, self.a, initial_conditions=self.initial_conditions)
+
+    def _apply_filter(self, channel_filter, x, out):
+        channel_filter.apply_iir_filter(x, out=out)
+
+
+class SOSStage(LinearStage):
+    def __init__(
+        self, sos, field: str = "ppg", output_field: str = None, initial_conditions: InitialConditions = "zeros"
+    ):
+        """
+        Cascade of second-order sections applied to a field of the chunks, with an SOSFilter per channel.
+
+        Args:
+            sos (np.ndarray): Second-order sections of shape (n_sections, 6)
+            field (str): Field filtered. Defaults to 'ppg'.
+            output_field (str): Field where the output is stored. Defaults to
+            None, which replaces the input field.
+            initial_conditions (str | np.ndarray): 'zeros', 'steady' (the
+            steady state of the first sample of every channel) or a state of
+            shape (n_sections, 2), see SOSFilter. Defaults to 'zeros'.
+        """
+        super().__init__(field, output_field)
+        self.sos = np.atleast_2d(np.asarray(sos, dtype=np.float64))
+        self.initial_conditions = initial_conditions
+
+    def transfer_function(self) -> tuple[np.ndarray, np.ndarray]:
+        return sos_to_tf(self.sos)
+
+    def _create_filter(self):
+        return SOSFilter(self.sos, initial_conditions=self.initial_conditions)
+
+    def _apply_filter(self, channel_filter, x, out):
+        channel_filter.apply_sos_filter_window(x, out=out)
+
+
+class AdaptiveStage(Stage):
+    def __init__(
+        self,
+        filter_order: int,
+        learning_rate: float,
+        input_field: str = "accelerometer",
+        desired_field: str = "ppg",
+        output_field: str = "artifact",
+        cleaned_field: str = "ppg_clean",
+        algorithm: AdaptiveAlgorithm = None,
+    ):
+        """
+        Motion artifact cancellation with the windowed TAPIR adaptive filter.
+
+        The reference channels (e.g. the accelerometer axes) are adapted
+        towards the desired signal (the PPG). The artifact estimate is the
+        mean of the channel outputs, and the cleaned signal is the desired
+        signal minus this estimate.
+
+        Args:
+            filter_order (int): Length of the FIR filter
+            learning_rate (float): Step size of the default LMS update
+            input_field (str): Reference channels, of shape (samples, channels).
+            Defaults to 'accelerometer'.
+            desired_field (str): Desired signal, of shape (samples,). Defaults to 'ppg'.
+            output_field (str): Field of the artifact estimate. Defaults to 'artifact'.
+            cleaned_field (str): Field of the cleaned signal. Defaults to 'ppg_clean'.
+            algorithm (AdaptiveAlgorithm): Optional weight update rule, see
+            WindowedAdaptiveFilterTapir. Defaults to None.
+        """
+        self.input_field = input_field
+        self.desired_field = desired_field
+        self.output_field = output_field
+        self.cleaned_field = cleaned_field
+        self.adaptive_filter = WindowedAdaptiveFilterTapir(filter_order, learning_rate, algorithm=algorithm)
+
+    @property
+    def input_fields(self) -> tuple:
+        return (self.input_field, self.desired_field)
+
+    @property
+    def output_fields(self) -> tuple:
+        return (self.output_field, self.cleaned_field)
+
+    def process(self, chunk: dict) -> dict:
+        x = np.asarray(chunk[self.input_field], dtype=np.float64)
+        desired_signal = np.asarray(chunk[self.desired_field], dtype=np.float64)
+        if x.ndim == 1:
+            x = x[:, np.newaxis]
+        output_signal = self.adaptive_filter.process_window(input_signal=x, desired_signal=desired_signal)
+        artifact = output_signal.mean(axis=1)
+        return {**chunk, self.output_field: artifact, self.cleaned_field: desired_signal - artifact}
+
+    def reset(self):
+        self.adaptive_filter.reset()
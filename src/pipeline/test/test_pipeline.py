@@ -0,0 +1,300 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import numpy as np
+import yaml
+from scipy import signal
+from adaptive.adaptive_filter_window.adaptive_filter_window_tapir import WindowedAdaptiveFilterTapir
+from iir.iir_window_array.iir_window_array import IIRWindowArray
+from pipeline.async_pipeline.async_pipeline import (
+    AsyncPipeline,
+    array_source,
+    file_source,
+    stream_source,
+    write_stream,
+)
+from pipeline.filter_pipeline.filter_pipeline import Pipeline
+from pipeline.stages.stages import AdaptiveStage, FIRStage, IIRStage, LinearStage, SOSStage, Stage
+
+
+def _load_recording(num_samples=2000):
+    with open("src/iir/test/coefficient_4th_order.yaml") as f:
+        coefficient = yaml.safe_load(f)
+    with open("src/iir/test/considered_ppg/considered_ppg_patient_1.txt", "rb") as f:
+        ppg = np.loadtxt(f)[:num_samples]
+    # Accelerometer axes correlated with the PPG, as during motion
+    rng = np.random.default_rng(0)
+    accelerometer = 0.5 * ppg[:, np.newaxis] + rng.standard_normal((len(ppg), 3))
+    return coefficient["b"], coefficient["a"], ppg, accelerometer
+
+
+def _reference(b, a, ppg, accelerometer, filter_order, learning_rate):
+    filtered = IIRWindowArray(b=b, a=a).apply_iir_filter(ppg)
+    adaptive_filter = WindowedAdaptiveFilterTapir(filter_order, learning_rate)
+    artifact = adaptive_filter.process_window(input_signal=accelerometer, desired_signal=filtered).mean(axis=1)
+    return filtered - artifact
+
+
+def _collect(pipeline, source):
+    async def collect():
+        return [chunk async for chunk in pipeline.process(source)]
+
+    return asyncio.run(collect())
+
+
+def test_async_pipeline():
+    b, a, ppg, accelerometer = _load_recording()
+    reference = _reference(b, a, ppg, accelerometer, filter_order=16, learning_rate=1e-6)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        stages = [IIRStage(b, a, field="ppg"), AdaptiveStage(filter_order=16, learning_rate=1e-6)]
+        pipeline = AsyncPipeline(stages, executor=executor)
+        chunks = _collect(pipeline, array_source({"ppg": ppg, "accelerometer": accelerometer}, chunk_samples=150))
+
+    assert [len(chunk["ppg"]) for chunk in chunks] == [150] * 13 + [50]
+    ppg_clean = np.concatenate([chunk["ppg_clean"] for chunk in chunks])
+    assert np.allclose(ppg_clean, reference, rtol=1e-10, atol=1e-10)
+    # The input fields are passed along with the outputs
+    assert np.array_equal(np.concatenate([chunk["accelerometer"] for chunk in chunks]), accelerometer)
+
+    # A multi-channel field is filtered channel by channel
+    stage = IIRStage(b, a, field="accelerometer", output_field="accelerometer_filtered")
+    y = stage({"accelerometer": accelerometer})["accelerometer_filtered"]
+    assert np.allclose(y[:, 2], IIRWindowArray(b=b, a=a).apply_iir_filter(accelerometer[:, 2]))
+    with pytest.raises(ValueError):
+        stage({"accelerometer": accelerometer[:, :2]})
+
+    with pytest.raises(ValueError):
+        AsyncPipeline(stages, max_queued_chunks=0)
+
+
+def test_async_pipeline_backpressure():
+    release = threading.Event()
+
+    class BlockedStage(Stage):
+        def process(self, chunk):
+            release.wait()
+            return chunk
+
+    pulled = []
+
+    async def source():
+        for index in range(100):
+            pulled.append(index)
+            yield {"index": np.array([index])}
+
+    async def run():
+        pipeline = AsyncPipeline([BlockedStage()], max_queued_chunks=2)
+        outputs = pipeline.process(source())
+        consumer = asyncio.ensure_future(outputs.__anext__())
+        await asyncio.sleep(0.2)
+        # The stage holds one chunk and its queue two: the source stops being read
+        pulled_while_blocked = len(pulled)
+        release.set()
+        first = await consumer
+        remaining = [chunk async for chunk in outputs]
+        return pulled_while_blocked, [first] + remaining
+
+    pulled_while_blocked, chunks = asyncio.run(run())
+    assert pulled_while_blocked <= 4
+    assert [int(chunk["index"][0]) for chunk in chunks] == list(range(100))
+
+
+def test_async_pipeline_error():
+    class FailingStage(Stage):
+        cpu_bound = False
+
+        def process(self, chunk):
+            if chunk["ppg"][0] >= 4:
+                raise RuntimeError("Sensor disconnected")
+            return chunk
+
+    processed = []
+
+    async def run():
+        pipeline = AsyncPipeline([FailingStage()])
+        async for chunk in pipeline.process(array_source({"ppg": np.arange(10.0)}, chunk_samples=2)):
+            processed.append(chunk)
+
+    with pytest.raises(RuntimeError, match="Sensor disconnected"):
+        asyncio.run(run())
+    assert len(processed) == 2
+
+
+def test_stream_source():
+    b, a, ppg, accelerometer = _load_recording(num_samples=1000)
+    rows = np.column_stack((ppg, accelerometer)).astype("<f4")
+    ppg = rows[:, 0].astype(np.float64)
+    accelerometer = rows[:, 1:].astype(np.float64)
+    reference = _reference(b, a, ppg, accelerometer, filter_order=8, learning_rate=1e-6)
+
+    async def handle_connection(reader, writer):
+        stages = [IIRStage(b, a, field="ppg"), AdaptiveStage(filter_order=8, learning_rate=1e-6)]
+        source = stream_source(reader, fields={"ppg": 0, "accelerometer": [1, 2, 3]}, chunk_samples=64)
+        async for chunk in AsyncPipeline(stages).process(source):
+            await write_stream(writer, chunk, fields=["ppg_clean"])
+        writer.close()
+
+    async def run():
+        server = await asyncio.start_server(handle_connection, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        # Send the samples in pieces unrelated to the chunks, the last sample incomplete
+        data = rows.tobytes() + b"\x00\x00"
+        for start in range(0, len(data), 1000):
+            writer.write(data[start : start + 1000])
+            await writer.drain()
+        writer.write_eof()
+        response = await reader.read()
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return np.frombuffer(response, dtype="<f4")
+
+    ppg_clean = asyncio.run(run())
+    assert len(ppg_clean) == len(reference)
+    assert np.allclose(ppg_clean, reference, rtol=1e-5, atol=1e-5)
+
+
+def test_file_source(tmp_path):
+    path = tmp_path / "recording.txt"
+    rows = np.arange(40.0).reshape(10, 4)
+    path.write_text("".join(" ".join(str(value) for value in row) + "\n" for row in rows[:6]))
+
+    async def append_rows():
+        await asyncio.sleep(0.05)
+        with open(path, "a") as f:
+            # A line written in two steps
+            f.write("24.0 25.0")
+            f.flush()
+            await asyncio.sleep(0.05)
+            f.write(" 26.0 27.0\n")
+            f.write("".join(" ".join(str(value) for value in row) + "\n" for row in rows[7:]))
+
+    async def run():
+        writer = asyncio.ensure_future(append_rows())
+        source = file_source(
+            path, {"ppg": 0, "accelerometer": [1, 2, 3]}, chunk_samples=4, follow=True, poll_interval=0.01, idle_timeout=0.2
+        )
+        chunks = [chunk async for chunk in source]
+        await writer
+        return chunks
+
+    chunks = asyncio.run(run())
+    assert len(chunks[0]["ppg"]) == 4
+    assert np.array_equal(np.concatenate([chunk["ppg"] for chunk in chunks]), rows[:, 0])
+    assert np.array_equal(np.concatenate([chunk["accelerometer"] for chunk in chunks]), rows[:, 1:])
+
+    async def read_once():
+        return [chunk async for chunk in file_source(path, {"ppg": 0}, chunk_samples=3)]
+
+    assert [len(chunk["ppg"]) for chunk in asyncio.run(read_once())] == [3, 3, 3, 1]
+
+
+def test_pipeline():
+    b, a, ppg, accelerometer = _load_recording()
+    reference = _reference(b, a, ppg, accelerometer, filter_order=16, learning_rate=1e-6)
+
+    pipeline = Pipeline([IIRStage(b, a, field="ppg"), AdaptiveStage(filter_order=16, learning_rate=1e-6)])
+    assert pipeline.input_fields == ("ppg", "accelerometer")
+    assert pipeline.output_fields == ("ppg", "artifact", "ppg_clean")
+    chunk = pipeline({"ppg": ppg, "accelerometer": accelerometer})
+    assert np.allclose(chunk["ppg_clean"], reference, rtol=1e-10, atol=1e-10)
+
+    # Chunk by chunk, after a reset
+    pipeline.reset()
+    ppg_clean = np.concatenate(
+        [
+            pipeline({"ppg": ppg[start : start + 300], "accelerometer": accelerometer[start : start + 300]})["ppg_clean"]
+            for start in range(0, len(ppg), 300)
+        ]
+    )
+    assert np.allclose(ppg_clean, reference, rtol=1e-10, atol=1e-10)
+
+    # The layout is checked against the first chunk
+    with pytest.raises(ValueError):
+        pipeline({"ppg": ppg[:10], "accelerometer": accelerometer[:10, :2]})
+    with pytest.raises(ValueError):
+        pipeline({"ppg": ppg[:10].astype(np.float32), "accelerometer": accelerometer[:10]})
+    with pytest.raises(ValueError):
+        Pipeline([IIRStage(b, a)])({"accelerometer": accelerometer})
+    with pytest.raises(ValueError):
+        Pipeline([IIRStage(b, a)])({"ppg": ppg.astype(np.complex128)})
+    with pytest.raises(ValueError):
+        Pipeline([AdaptiveStage(filter_order=16, learning_rate=1e-6)])({"ppg": ppg, "accelerometer": accelerometer[:10]})
+    with pytest.raises(ValueError):
+        Pipeline([])
+
+    # A stage missing a method of its base is caught at construction
+    class IncompleteStage(LinearStage):
+        def _create_filter(self):
+            return None
+
+    with pytest.raises(TypeError):
+        IncompleteStage(field="ppg")
+
+
+def test_pipeline_fusion():
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal((1000, 2))
+    h1 = signal.firwin(numtaps=11, cutoff=8, fs=64)
+    h2 = signal.firwin(numtaps=5, cutoff=20, fs=64)
+    b, a = signal.butter(N=2, Wn=[0.5, 4], btype="bandpass", fs=64)
+    sos = signal.butter(N=4, Wn=[0.5, 4], btype="bandpass", fs=64, output="sos")
+
+    def sequential(x):
+        y = signal.lfilter(h1, 1, x, axis=0)
+        y = signal.lfilter(h2, 1, y, axis=0)
+        y = signal.sosfilt(sos, y, axis=0)
+        y = signal.sosfilt(sos, y, axis=0)
+        return signal.lfilter(b, a, y, axis=0)
+
+    def stages():
+        return [FIRStage(h1, field="x"), FIRStage(h2, field="x"), SOSStage(sos, field="x"), SOSStage(sos, field="x"), IIRStage(b, a, field="x")]
+
+    # FIR taps convolved, sections stacked; SOS and direct form are kept apart
+    pipeline = Pipeline(stages())
+    assert [type(stage) for stage in pipeline.stages] == [FIRStage, SOSStage, IIRStage]
+    assert len(pipeline.stages[0].h) == 15
+    assert len(pipeline.stages[1].sos) == 8
+
+    reference = sequential(x)
+    for fuse in (True, False):
+        pipeline = Pipeline(stages(), fuse=fuse)
+        x_input = x.copy()
+        y = np.concatenate([pipeline({"x": x_input[start : start + 128]})["x"] for start in range(0, len(x), 128)])
+        assert np.allclose(y, reference, rtol=1e-9, atol=1e-9)
+        # The stages write in their own buffer, never in the input
+        assert np.array_equal(x_input, x)
+
+    # Transfer functions are multiplied up to max_fused_order
+    pipeline = Pipeline([FIRStage(h2, field="x"), IIRStage(b, a, field="x")])
+    assert [type(stage) for stage in pipeline.stages] == [IIRStage]
+    assert np.allclose(pipeline({"x": x})["x"], signal.lfilter(b, a, signal.lfilter(h2, 1, x, axis=0), axis=0))
+    assert len(Pipeline([FIRStage(h1, field="x"), IIRStage(b, a, field="x")]).stages) == 2
+    assert len(Pipeline([IIRStage(b, a, field="x"), IIRStage(b, a, field="x")]).stages) == 1
+    assert len(Pipeline([IIRStage(b, a, field="x"), IIRStage(b, a, field="x")], max_fused_order=4).stages) == 2
+
+    # Stages whose intermediate output is kept are not fused
+    pipeline = Pipeline([FIRStage(h1, field="x", output_field="y"), FIRStage(h2, field="y", output_field="z")])
+    assert len(pipeline.stages) == 2
+    chunk = pipeline({"x": x})
+    assert np.array_equal(chunk["x"], x)
+    assert np.allclose(chunk["y"], signal.lfilter(h1, 1, x, axis=0))
+    assert np.allclose(chunk["z"], signal.lfilter(h2, 1, chunk["y"], axis=0))
+
+    # Stages are only fused with stages starting from the same initial conditions
+    assert len(Pipeline([IIRStage(b, a, field="x"), IIRStage(b, a, field="x", initial_conditions="steady")]).stages) == 2
+    assert len(Pipeline([FIRStage(h2, field="x"), IIRStage(b, a, field="x", initial_conditions="steady")]).stages) == 2
+    pipeline = Pipeline([SOSStage(sos, field="x", initial_conditions="steady"), SOSStage(sos, field="x", initial_conditions="steady")])
+    assert len(pipeline.stages) == 1
+    y = pipeline({"x": x + 10})["x"]
+    zi = signal.sosfilt_zi(np.concatenate([sos, sos]))[:, :, np.newaxis] * (x[0] + 10)
+    assert np.allclose(y, signal.sosfilt(np.concatenate([sos, sos]), x + 10, axis=0, zi=zi)[0], rtol=1e-9, atol=1e-9)